@@ -0,0 +1,54 @@
+/*
+ * TEARIS - Interfaz C del clasificador de ambiente (Edge Impulse)
+ * La carga tearis_environment.py con ctypes; se compila con `make` en IA/.
+ */
+
+#include <string.h>
+#include "edge-impulse-sdk/classifier/ei_run_classifier.h"
+
+extern "C" {
+
+/* Muestras por inferencia (1 s a EI_CLASSIFIER_FREQUENCY Hz) */
+size_t tearis_ei_sample_count(void) {
+    return EI_CLASSIFIER_RAW_SAMPLE_COUNT;
+}
+
+int tearis_ei_frequency(void) {
+    return EI_CLASSIFIER_FREQUENCY;
+}
+
+size_t tearis_ei_label_count(void) {
+    return EI_CLASSIFIER_LABEL_COUNT;
+}
+
+const char *tearis_ei_label(size_t index) {
+    return index < EI_CLASSIFIER_LABEL_COUNT ? ei_classifier_inferencing_categories[index] : "";
+}
+
+/*
+ * Clasifica una ventana de audio mono en escala [-1, 1]
+ * scores: un valor por etiqueta, en el orden de tearis_ei_label
+ * Devuelve 0 o el código de error de Edge Impulse
+ */
+int tearis_ei_classify(const float *samples, size_t count, float *scores) {
+    if (count != EI_CLASSIFIER_RAW_SAMPLE_COUNT) {
+        return -1;
+    }
+    signal_t signal;
+    int err = numpy::signal_from_buffer(samples, count, &signal);
+    if (err != 0) {
+        return err;
+    }
+    ei_impulse_result_t result;
+    memset(&result, 0, sizeof(result));
+    EI_IMPULSE_ERROR res = run_classifier(&signal, &result, false);
+    if (res != EI_IMPULSE_OK) {
+        return (int)res;
+    }
+    for (size_t i = 0; i < EI_CLASSIFIER_LABEL_COUNT; i++) {
+        scores[i] = result.classification[i].value;
+    }
+    return 0;
+}
+
+}
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Backends de E/S de audio
+'portaudio' usa sounddevice sobre la placa real; 'alsa-mmap' habla con ALSA
+directamente y procesa sobre el ring de hardware (tearis_alsa.py); 'null'
+simula un dispositivo sin hardware para bancos de prueba y generadores de carga.
+"""
+
+import threading
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger("TEARIS-AUDIO")
+
+BACKENDS = ("portaudio", "alsa-mmap", "null")
+# Períodos del ring de 'alsa-mmap': el latency= que se le pide a PortAudio
+# (0.25 s) serían 12 períodos de 960 y ~0.5 s de lazo
+ALSA_PERIODS = 2
+# Fallas que se pueden inyectar en el backend nulo (tearis_supervisor.py)
+FAULTS = ("die", "stall")
+
+
+class CallbackFlags:
+    """Equivalente mínimo de sd.CallbackFlags para los backends propios"""
+
+    def __init__(self, output_underflow=False, input_overflow=False):
+        self.output_underflow = output_underflow
+        self.input_overflow = input_overflow
+
+    def __bool__(self):
+        return self.output_underflow or self.input_overflow
+
+    def __str__(self):
+        flags = []
+        if self.input_overflow:
+            flags.append("input overflow")
+        if self.output_underflow:
+            flags.append("output underflow")
+        return ", ".join(flags)
+
+
+def tone_source(samplerate, channels):
+    """Entrada por defecto del backend nulo: un segundo de tono de 440 Hz con ruido"""
+    t = np.arange(samplerate) / float(samplerate)
+    tone = 0.1 * np.sin(2 * np.pi * 440.0 * t)
+    noise = 0.01 * np.random.default_rng(0).standard_normal(samplerate)
+    return np.repeat((tone + noise)[:, None], channels, axis=1)
+
+
+class NullStream:
+    """
+    Dispositivo simulado: llama al callback al ritmo del reloj real
+
+    Si el callback termina después del deadline de su bloque se cuenta un
+    xrun y el siguiente callback recibe output_underflow, igual que ALSA.
+
+    Args:
+        source: array (frames, channels) que se repite como entrada; si es
+                None se genera un tono de 440 Hz con ruido
+    """
+
+    def __init__(self, samplerate, blocksize, channels, dtype, callback,
+                 source=None, **kwargs):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.callback = callback
+        self.period = blocksize / float(samplerate)
+        # Sin buffers de hardware: el lazo salida -> entrada es un bloque
+        self.latency = (0.0, 0.0)
+        if source is None:
+            source = tone_source(samplerate, channels)
+        self.source = self._to_dtype(np.asarray(source, dtype=np.float32))
+        self.active = False
+        self.closed = False
+        self.xruns = 0
+        self.callbacks = 0
+        self.max_callback_ms = 0.0
+        self._stalled = False
+        self._thread = None
+
+    def inject_fault(self, kind):
+        """
+        Simula una falla del dispositivo
+
+        Args:
+            kind: 'die' (el stream se detiene solo, como tras un reset de
+                  la placa) o 'stall' (sigue activo pero no llama más al
+                  callback, como un driver trabado)
+        """
+        if kind not in FAULTS:
+            raise ValueError(f"Falla desconocida: {kind} (opciones: {', '.join(FAULTS)})")
+        logger.warning(f"💥 Falla inyectada en backend nulo: {kind}")
+        if kind == "die":
+            self.active = False
+        else:
+            self._stalled = True
+
+    def _to_dtype(self, data):
+        if self.dtype == np.int16:
+            return np.clip(data * 32767.0, -32768, 32767).astype(np.int16)
+        return data.astype(self.dtype)
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self._thread = threading.Thread(target=self._run, name="null-audio", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        indata = np.empty((self.blocksize, self.channels), dtype=self.dtype)
+        outdata = np.empty_like(indata)
+        pos = 0
+        underflow = False
+        deadline = time.monotonic() + self.period
+        while self.active:
+            if self._stalled:
+                time.sleep(self.period)
+                continue
+            idx = (pos + np.arange(self.blocksize)) % self.source.shape[0]
+            indata[:] = self.source[idx]
+            pos = (pos + self.blocksize) % self.source.shape[0]
+            start = time.monotonic()
+            try:
+                self.callback(indata, outdata, self.blocksize, None,
+                              CallbackFlags(output_underflow=underflow))
+            except Exception as e:
+                logger.error(f"❌ Callback abortado en backend nulo: {e}")
+                self.active = False
+                break
+            end = time.monotonic()
+            self.callbacks += 1
+            self.max_callback_ms = max(self.max_callback_ms, (end - start) * 1000.0)
+            underflow = end > deadline
+            if underflow:
+                self.xruns += 1
+                # Tras un xrun el dispositivo se reprograma desde ahora
+                deadline = end + self.period
+            else:
+                time.sleep(max(0.0, deadline - time.monotonic()))
+                deadline += self.period
+
+    def stop(self):
+        self.active = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+
+def resolve_device(backend, device):
+    """
+    Resuelve una sola vez los nombres de dispositivo a índices de PortAudio,
+    para que reabrir el stream (tearis_supervisor.py) no vuelva a recorrer
+    la lista de dispositivos; los demás backends los usan tal cual
+    """
+    if backend != "portaudio" or device is None:
+        return device
+    import sounddevice as sd
+    resolved = []
+    for name, kind in zip(device, ("input", "output")):
+        try:
+            resolved.append(sd.query_devices(name, kind)["index"])
+        except (ValueError, sd.PortAudioError) as e:
+            logger.warning(f"⚠️ No se pudo resolver el dispositivo {name}: {e}")
+            resolved.append(name)
+    return tuple(resolved)
+
+
+def stream_latency(stream):
+    """(entrada, salida) en segundos que informa un stream abierto; (0, 0) si no informa"""
+    latency = getattr(stream, "latency", None)
+    if latency is None:
+        return 0.0, 0.0
+    if isinstance(latency, (tuple, list)):
+        return float(latency[0]), float(latency[1])
+    # Streams de un solo sentido informan un número
+    return float(latency), 0.0
+
+
+def open_stream(backend, device, samplerate, blocksize, channels, dtype,
+                callback, latency=None, **kwargs):
+    """
+    Crea el stream full-duplex del backend pedido (sin iniciarlo)
+
+    Args:
+        backend: 'portaudio', 'alsa-mmap' o 'null'
+        device: tupla (entrada, salida); ignorado en 'null'
+        latency: sugerencia de buffer de PortAudio; 'alsa-mmap' usa
+                 ALSA_PERIODS períodos salvo que se pase periods=
+    """
+    if backend == "null":
+        return NullStream(samplerate, blocksize, channels, dtype, callback, **kwargs)
+    if backend == "alsa-mmap":
+        from tearis_alsa import AlsaMmapStream
+        kwargs.setdefault("periods", ALSA_PERIODS)
+        return AlsaMmapStream(device, samplerate, blocksize, channels, dtype, callback,
+                              latency=latency, **kwargs)
+    if backend == "portaudio":
+        import sounddevice as sd
+        return sd.Stream(device=device, samplerate=samplerate, blocksize=blocksize,
+                         channels=channels, dtype=dtype, callback=callback,
+                         latency=latency)
+    raise ValueError(f"Backend de audio desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
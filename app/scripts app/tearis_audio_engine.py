@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Motor de audio en proceso propio
+El callback de audio corre en un proceso dedicado (sin D-Bus ni GLib) que
+el servidor BLE supervisa. Los parámetros viajan por un bloque de control
+en memoria compartida y el audio de monitoreo por un anillo compartido,
+así el lado BLE nunca toca el camino de tiempo real.
+
+Uso (comparación de jitter un proceso vs. proceso separado):
+    python3 tearis_audio_engine.py
+"""
+
+import os
+import time
+import threading
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS
+from tearis_fir import apply_profiles
+from tearis_limiter import normalize_mode
+from tearis_audio_backends import open_stream, resolve_device
+from tearis_rt import RealtimeHardening
+from tearis_supervisor import StreamSupervisor
+
+logger = logging.getLogger("TEARIS-ENGINE")
+
+BLOCKSIZE = 960
+
+MODES = ("normal", "escuela", "transporte")
+
+# Toggles de DSP en el bloque de control
+FLAG_RNNOISE = 1 << 0
+FLAG_NOISE_MUTE = 1 << 1
+
+MODE_FLAGS = {
+    "normal": 0,
+    "escuela": FLAG_RNNOISE | FLAG_NOISE_MUTE,
+    "transporte": 0,
+}
+
+CONTROL_DTYPE = np.dtype([
+    # Escribe el servidor BLE (protegido por seq: impar = escritura en curso)
+    ("seq", np.uint64),
+    ("mode_id", np.int32),
+    ("flags", np.uint32),
+    ("gain_db", np.float64),
+    ("gain_set_at", np.float64),
+    ("gain_snap", np.uint32),
+    ("stop", np.uint32),
+    ("reset", np.uint32),
+    # Escribe solo el motor
+    ("heartbeat", np.uint64),
+    ("callbacks", np.uint64),
+    ("xruns", np.uint64),
+    ("callback_max_ms", np.float64),
+    ("jitter_avg_ms", np.float64),
+    ("jitter_max_ms", np.float64),
+    ("slider_to_sound_avg_ms", np.float64),
+    ("slider_to_sound_max_ms", np.float64),
+    ("output_latency_ms", np.float64),
+    ("vad", np.float32, (CHANNELS,)),
+    ("rnnoise", np.uint32),
+    ("active", np.uint32),
+    ("recoveries", np.uint32),
+    ("recover_ms", np.float64),
+])
+
+
+class ControlBlock:
+    """Parámetros y estadísticas compartidos entre servidor BLE y motor"""
+
+    def __init__(self, name=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=CONTROL_DTYPE.itemsize)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.block = np.ndarray((), dtype=CONTROL_DTYPE, buffer=self.shm.buf)
+        if self.owner:
+            self.block[()] = np.zeros((), dtype=CONTROL_DTYPE)
+        self._last_seq = 0
+        # Escriben dos hilos del servidor (gatt-io: volumen; aplicador: modo), y
+        # seq += 1 no es atómico: sin el lock un seq impar traba al lector para siempre
+        self.write_lock = threading.RLock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # ---------- Lado BLE ----------
+
+    def write_params(self, **params):
+        """Actualiza parámetros de forma atómica para el lector (seqlock)"""
+        b = self.block
+        with self.write_lock:
+            b["seq"] += 1
+            for key, value in params.items():
+                b[key] = value
+            b["seq"] += 1
+
+    # ---------- Lado motor ----------
+
+    def read_params(self):
+        """Copia consistente de los parámetros si cambiaron, si no None"""
+        b = self.block
+        for _ in range(10):
+            seq = int(b["seq"])
+            if seq == self._last_seq:
+                return None
+            if seq & 1:
+                continue
+            snapshot = b.copy()
+            if int(b["seq"]) == seq:
+                self._last_seq = seq
+                return snapshot
+        return None
+
+    def publish_stats(self, stats, vad, active):
+        b = self.block
+        b["heartbeat"] += 1
+        b["callbacks"] = stats["callbacks"]
+        b["xruns"] = stats["xruns"]
+        b["callback_max_ms"] = stats["callback_max_ms"]
+        b["jitter_avg_ms"] = stats["jitter_avg_ms"]
+        b["jitter_max_ms"] = stats["jitter_max_ms"]
+        b["slider_to_sound_avg_ms"] = stats["slider_to_sound_avg_ms"]
+        b["slider_to_sound_max_ms"] = stats["slider_to_sound_max_ms"]
+        b["output_latency_ms"] = stats["output_latency_ms"]
+        b["vad"] = vad
+        b["rnnoise"] = stats["rnnoise"]
+        b["active"] = active
+
+    def close(self):
+        del self.block
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ShmRing:
+    """
+    Anillo de bloques de audio en memoria compartida (un escritor, un lector).
+    Si el lector se atrasa, el escritor descarta el bloque en vez de esperar.
+    """
+
+    def __init__(self, name=None, slots=8, frames=BLOCKSIZE, channels=CHANNELS, dtype=np.float32):
+        header = 4 * 8
+        dtype = np.dtype(dtype)
+        size = header + slots * frames * channels * dtype.itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        # [escritura, lectura, descartados, slots]
+        self.header = np.ndarray((4,), dtype=np.uint64, buffer=self.shm.buf)
+        if self.owner:
+            self.header[:] = (0, 0, 0, slots)
+        slots = int(self.header[3])
+        self.data = np.ndarray((slots, frames, channels), dtype=dtype,
+                               buffer=self.shm.buf, offset=header)
+        self.slots = slots
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, block):
+        """Llamado desde el callback: nunca bloquea"""
+        w, r = int(self.header[0]), int(self.header[1])
+        if w - r >= self.slots:
+            self.header[2] += 1
+            return False
+        n = min(block.shape[0], self.data.shape[1])
+        self.data[w % self.slots, :n] = block[:n]
+        self.header[0] = w + 1
+        return True
+
+    def read(self):
+        """Copia del bloque más antiguo o None si está vacío"""
+        w, r = int(self.header[0]), int(self.header[1])
+        if r == w:
+            return None
+        block = self.data[r % self.slots].copy()
+        self.header[1] = r + 1
+        return block
+
+    @property
+    def dropped(self):
+        return int(self.header[2])
+
+    def close(self):
+        del self.header, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ParamApplier:
+    """
+    Lado motor del bloque de control: aplica a la cadena los parámetros que
+    escribió el servidor BLE (fuera del callback)
+    """
+
+    def __init__(self, control, pipeline):
+        self.control = control
+        self.pipeline = pipeline
+        self.mode = None
+        self.flags = None
+        self.reset = 0
+        self.gain_set_at = 0.0
+        self.gain_snap = 0
+
+    def poll(self):
+        """Aplica los parámetros nuevos; False si no cambiaron"""
+        params = self.control.read_params()
+        if params is None:
+            return False
+        pipeline = self.pipeline
+        # Cambios pesados (crear RNNoise) acá, nunca en el callback
+        new_mode = MODES[int(params["mode_id"])]
+        new_flags = int(params["flags"])
+        if new_mode != self.mode or new_flags != self.flags:
+            pipeline.set_mode(new_mode, rnnoise=bool(new_flags & FLAG_RNNOISE))
+            pipeline.vad.noise_mute = bool(new_flags & FLAG_NOISE_MUTE)
+            self.mode, self.flags = new_mode, new_flags
+        if int(params["reset"]) != self.reset:
+            self.reset = int(params["reset"])
+            pipeline.reset_stats()
+        # Solo las escrituras de la app miden latencia slider -> sonido
+        track = float(params["gain_set_at"]) != self.gain_set_at
+        self.gain_set_at = float(params["gain_set_at"])
+        # Compensación de un paso de hardware: contador, para no repetirla en cada cambio
+        snap = int(params["gain_snap"]) != self.gain_snap
+        self.gain_snap = int(params["gain_snap"])
+        pipeline.gain_ramp.set_target(float(params["gain_db"]), track=track, set_at=self.gain_set_at, snap=snap)
+        return True
+
+
+# ========================================
+# Proceso del motor
+# ========================================
+def engine_main(control_name, ring_name, backend, device, blocksize=BLOCKSIZE, realtime=False,
+                dtype="float32", channel_strategy="stereo", beamformer="off", denoiser="rnnoise", feedback=False,
+                subband=False):
+    """
+    Punto de entrada del proceso de audio
+
+    Args:
+        realtime: aplicar tearis_rt (SCHED_FIFO, mlockall, GC programado)
+        dtype: formato del stream ('float32' o 'int16')
+        channel_strategy: estrategia de canales de RNNoise
+        beamformer: método de tearis_beamformer ('off', 'das', 'mvdr')
+        denoiser: reductor de ruido ('rnnoise' o 'spectral')
+        feedback: cancelador de realimentación de tearis_feedback
+        subband: cancelador sobre la banda baja de tearis_subband
+    """
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    control = ControlBlock(control_name)
+    ring = ShmRing(ring_name, frames=blocksize, dtype=dtype)
+    pipeline = AudioPipeline(tap=ring.write, blocksize=blocksize, dtype=dtype,
+                             channel_strategy=channel_strategy, beamformer=beamformer, denoiser=denoiser,
+                             feedback=feedback, subband=subband)
+    apply_profiles(pipeline)
+    callback = pipeline.callback
+    rt = None
+    if realtime:
+        rt = RealtimeHardening().prepare()
+        callback = rt.wrap(callback)
+    params = ParamApplier(control, pipeline)
+    # El supervisor reabre el stream sobre la misma cadena si se cae o se traba
+    device = resolve_device(backend, device)
+
+    def recovered(event, detail):
+        if event == "recovered":
+            control.block["recover_ms"] = detail["recover_ms"]
+            control.block["recoveries"] += 1
+
+    supervisor = StreamSupervisor(
+        lambda: pipeline.attach_stream(open_stream(backend, device=device, samplerate=SAMPLE_RATE,
+                                                   blocksize=blocksize, channels=CHANNELS, dtype=dtype,
+                                                   callback=callback, latency=0.25)),
+        heartbeat=lambda: pipeline.callbacks, on_event=recovered, on_restart=pipeline.resume)
+    supervisor.start()
+    logger.info(f"✅ Motor de audio activo ({backend})")
+    try:
+        while not control.block["stop"]:
+            params.poll()
+            control.publish_stats(pipeline.get_stats(), pipeline.get_vad(), supervisor.active)
+            time.sleep(0.005)
+    finally:
+        supervisor.stop()
+        if rt:
+            rt.stop()
+        control.block["active"] = 0
+        ring.close()
+        control.close()
+        logger.info("✅ Motor de audio detenido")
+
+
+class AudioEngineProcess:
+    """
+    Supervisor del motor de audio del lado del servidor BLE: crea la
+    memoria compartida, lanza el proceso y lo relanza si muere
+
+    Args:
+        on_event: función(evento, detalle) de tearis_supervisor; avisa las
+                  recuperaciones del stream dentro del motor y los relanzamientos
+    """
+
+    def __init__(self, backend, device, blocksize=BLOCKSIZE, realtime=False, dtype="float32",
+                 channel_strategy="stereo", beamformer="off", denoiser="rnnoise", feedback=False, subband=False,
+                 on_event=None):
+        self.backend = backend
+        self.device = device
+        self.blocksize = blocksize
+        self.realtime = realtime
+        self.dtype = np.dtype(dtype).name
+        self.channel_strategy = channel_strategy
+        self.beamformer = beamformer
+        self.denoiser = denoiser
+        self.feedback = feedback
+        self.subband = subband
+        self.on_event = on_event
+        self.control = ControlBlock()
+        self.ring = ShmRing(frames=blocksize, dtype=dtype)
+        self.process = None
+        self.restarts = 0
+        self._supervising = False
+        self._supervisor = None
+        self._wake = threading.Event()
+        self.set_mode("normal")
+
+    @property
+    def active(self):
+        return bool(self.process and self.process.is_alive() and self.control.block["active"])
+
+    def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self.control.block["stop"] = 0
+        self.process = ctx.Process(target=engine_main, name="tearis-audio",
+                                   args=(self.control.name, self.ring.name, self.backend,
+                                         self.device, self.blocksize, self.realtime, self.dtype,
+                                         self.channel_strategy, self.beamformer, self.denoiser,
+                                         self.feedback, self.subband), daemon=True)
+        self.process.start()
+        logger.info(f"🚀 Motor de audio lanzado (pid {self.process.pid})")
+        if not self._supervising:
+            self._supervising = True
+            self._wake.clear()
+            self._supervisor = threading.Thread(target=self._supervise, name="engine-supervisor", daemon=True)
+            self._supervisor.start()
+
+    def _supervise(self):
+        recoveries = int(self.control.block["recoveries"])
+        while True:
+            self._wake.wait(1.0)
+            # stop() puede haber cerrado el bloque de control mientras esperaba
+            if not self._supervising:
+                break
+            if self.process and not self.process.is_alive():
+                self.restarts += 1
+                logger.warning(f"⚠️ Motor de audio caído (código {self.process.exitcode}), relanzando...")
+                if self.on_event:
+                    self.on_event("down", {"reason": "motor caído", "silent_ms": 0.0})
+                self.start()
+            current = int(self.control.block["recoveries"])
+            if current != recoveries and self.on_event:
+                self.on_event("recovered", {"reason": "motor", "silent_ms": 0.0,
+                                            "recover_ms": float(self.control.block["recover_ms"]),
+                                            "attempts": 1})
+            recoveries = current
+
+    def set_mode(self, mode):
+        mode = normalize_mode(mode)
+        mode_id = MODES.index(mode) if mode in MODES else 0
+        self.control.write_params(mode_id=mode_id, flags=MODE_FLAGS.get(mode, 0))
+
+    def set_gain(self, gain_db, track=True, snap=False):
+        params = {"gain_db": gain_db}
+        if track:
+            params["gain_set_at"] = time.monotonic()
+        with self.control.write_lock:
+            if snap:
+                params["gain_snap"] = int(self.control.block["gain_snap"]) + 1
+            self.control.write_params(**params)
+
+    def reset_stats(self):
+        with self.control.write_lock:
+            self.control.write_params(reset=int(self.control.block["reset"]) + 1)
+
+    def read_tap(self):
+        return self.ring.read()
+
+    def get_vad(self):
+        return self.control.block["vad"].copy()
+
+    def get_stats(self):
+        b = self.control.block
+        return {
+            "xruns": int(b["xruns"]),
+            "callbacks": int(b["callbacks"]),
+            "callback_max_ms": float(b["callback_max_ms"]),
+            "jitter_avg_ms": float(b["jitter_avg_ms"]),
+            "jitter_max_ms": float(b["jitter_max_ms"]),
+            "rnnoise": bool(b["rnnoise"]),
+            "slider_to_sound_avg_ms": float(b["slider_to_sound_avg_ms"]),
+            "slider_to_sound_max_ms": float(b["slider_to_sound_max_ms"]),
+            "output_latency_ms": float(b["output_latency_ms"]),
+            "heartbeat": int(b["heartbeat"]),
+            "restarts": self.restarts,
+            "recoveries": int(b["recoveries"]),
+            "recover_ms": float(b["recover_ms"]),
+            "tap_dropped": self.ring.dropped,
+        }
+
+    def stop(self):
+        # Primero el vigilante: que no relance el motor ni lea el bloque que close() libera
+        self._supervising = False
+        self._wake.set()
+        if self._supervisor and self._supervisor is not threading.current_thread():
+            self._supervisor.join(timeout=2.0)
+        self._supervisor = None
+        self.control.block["stop"] = 1
+        if self.process:
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+
+    def close(self):
+        self.stop()
+        self.ring.close()
+        self.control.close()
+
+
+# ========== BENCHMARK ==========
+
+def _control_load(read_tap, stop):
+    """
+    Imita al lado BLE saturado: empaqueta byte a byte el último bloque de
+    monitoreo sin pausa, como el marshalling de D-Bus con notificaciones seguidas
+    """
+    last = np.zeros((BLOCKSIZE, CHANNELS), dtype=np.float32)
+    while not stop.is_set():
+        block = read_tap()
+        if block is not None:
+            last = block
+        data = (last * 32767).astype(np.int16).tobytes()
+        [int(b) for b in data]
+
+
+def benchmark(seconds=5.0):
+    """
+    Jitter del callback con la misma carga de control en ambas arquitecturas
+    (backend nulo, sin hardware)
+
+    Con un solo núcleo los dos procesos se turnan la misma CPU y no hay nada
+    que aislar: ahí se informa la medición pero no se exige la mejora.
+
+    Returns:
+        dict con jitter/xruns de cada arquitectura
+    """
+    import queue
+    results = {}
+
+    # Un solo proceso: callback y carga BLE comparten el GIL
+    taps = queue.Queue(maxsize=5)
+
+    def tap(block):
+        try:
+            taps.put_nowait(block.copy())
+        except queue.Full:
+            pass
+
+    def read_queue():
+        try:
+            return taps.get_nowait()
+        except queue.Empty:
+            return None
+
+    pipeline = AudioPipeline(tap=tap)
+    stream = open_stream("null", None, SAMPLE_RATE, BLOCKSIZE, CHANNELS, np.float32, pipeline.callback)
+    stop = threading.Event()
+    load = threading.Thread(target=_control_load, args=(read_queue, stop), daemon=True)
+    stream.start()
+    load.start()
+    time.sleep(1.0)
+    pipeline.reset_stats()
+    time.sleep(seconds)
+    stop.set()
+    stream.close()
+    results["single"] = pipeline.get_stats()
+
+    # Proceso separado: la misma carga solo lee del anillo compartido
+    engine = AudioEngineProcess("null", None)
+    engine.start()
+    # El proceso nuevo tarda en importar: medir recién con el motor andando
+    deadline = time.monotonic() + 10.0
+    while engine.get_stats()["callbacks"] < 50 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop = threading.Event()
+    load = threading.Thread(target=_control_load, args=(engine.read_tap, stop), daemon=True)
+    load.start()
+    time.sleep(1.0)
+    engine.reset_stats()
+    time.sleep(seconds)
+    stop.set()
+    results["split"] = engine.get_stats()
+    engine.close()
+
+    single, split = results["single"], results["split"]
+    cores = len(os.sched_getaffinity(0))
+    ran = single["callbacks"] > 0 and split["callbacks"] > 0
+    isolated = split["jitter_avg_ms"] < single["jitter_avg_ms"] and split["xruns"] <= single["xruns"]
+    return {
+        "cores": cores,
+        "single_jitter_avg_ms": results["single"]["jitter_avg_ms"],
+        "single_jitter_max_ms": results["single"]["jitter_max_ms"],
+        "single_xruns": results["single"]["xruns"],
+        "split_jitter_avg_ms": results["split"]["jitter_avg_ms"],
+        "split_jitter_max_ms": results["split"]["jitter_max_ms"],
+        "split_xruns": results["split"]["xruns"],
+        "compared": cores > 1,
+        "ok": ran and (isolated or cores == 1),
+    }
+
+
+def main():
+    print("=" * 60)
+    print("TEARIS - Jitter del callback: un proceso vs. motor separado")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Un proceso:       jitter prom {r['single_jitter_avg_ms']:.3f} ms | "
+          f"máx {r['single_jitter_max_ms']:.3f} ms | xruns {r['single_xruns']}")
+    print(f"Motor separado:   jitter prom {r['split_jitter_avg_ms']:.3f} ms | "
+          f"máx {r['split_jitter_max_ms']:.3f} ms | xruns {r['split_xruns']}")
+    if not r["compared"]:
+        print("⚠️ Un solo núcleo: el motor no tiene CPU propia, la comparación no aplica")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
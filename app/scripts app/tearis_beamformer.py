@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Beamformer de dos micrófonos
+Combina los dos INMP441 en el dominio STFT para favorecer a quien habla
+de frente (la docente en modo "escuela") y entrega un solo canal mejorado,
+copiado a ambas salidas: RNNoise limpia ese canal con una sola llamada
+por frame en lugar de dos.
+
+Métodos:
+    das:  delay-and-sum con vectores de dirección precalculados
+    mvdr: mínima varianza sin distorsión en la dirección de mirada; la
+          covarianza de ruido se actualiza en los frames sin voz según el
+          VAD de RNNoise (o con toda la señal, MPDR, si no hay VAD), con
+          carga diagonal. Con dos micrófonos es la solución cerrada del
+          GSC (haz fijo + canal de bloqueo + cancelador adaptativo).
+
+Uso (escena simulada de dos micrófonos, SNR y CPU por frame):
+    python3 tearis_beamformer.py
+"""
+
+import logging
+import numpy as np
+
+from tearis_dsp_graph import Node
+
+logger = logging.getLogger("TEARIS-BEAM")
+
+SAMPLE_RATE = 48000
+SPEED_OF_SOUND = 343.0
+# Separación entre micrófonos (uno por auricular) y dirección de mirada:
+# 0° es de frente, con los micrófonos sobre el eje oído-oído
+MIC_SPACING = 0.15
+LOOK_ANGLE = 0.0
+
+BEAM_METHODS = ("off", "das", "mvdr")
+# Modos en los que el beamformer queda en el grafo
+BEAM_MODES = ("escuela",)
+
+# STFT: ventana raíz de Hann de 10 ms con 50 % de solapamiento
+WINDOW = 480
+HOP = 240
+
+MVDR_FORGETTING = 0.98    # covarianza de ruido (~250 ms por actualización)
+MVDR_LOADING = 0.05       # carga diagonal relativa a la potencia media
+VAD_HANGOVER = 5          # frames de 10 ms tras la voz sin actualizar el ruido
+
+
+def steering_vectors(spacing=MIC_SPACING, angle_deg=LOOK_ANGLE, n_fft=WINDOW,
+                     sample_rate=SAMPLE_RATE, channels=2):
+    """
+    Vectores de dirección (canales, bins) de un arreglo lineal uniforme
+    centrado, para una fuente lejana a `angle_deg` de la perpendicular
+    """
+    positions = (np.arange(channels) - (channels - 1) / 2.0) * spacing
+    delays = positions * np.sin(np.radians(angle_deg)) / SPEED_OF_SOUND
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    return np.exp(-2j * np.pi * freqs[None, :] * delays[:, None])
+
+
+class Beamformer:
+    """
+    Análisis/síntesis STFT por saltos de HOP muestras
+
+    Args:
+        method: 'das' o 'mvdr'
+        spacing: separación entre micrófonos en metros
+        look_angle: dirección de mirada en grados (0 = de frente)
+    """
+
+    def __init__(self, method="mvdr", spacing=MIC_SPACING, look_angle=LOOK_ANGLE,
+                 sample_rate=SAMPLE_RATE):
+        if method not in BEAM_METHODS or method == "off":
+            raise ValueError(f"Método de beamforming desconocido: {method} (opciones: das, mvdr)")
+        self.method = method
+        self.spacing = spacing
+        self.look_angle = look_angle
+        self.window = np.sqrt(np.hanning(WINDOW + 1)[:WINDOW]).astype(np.float32)
+        d = steering_vectors(spacing, look_angle, WINDOW, sample_rate)
+        self.d1 = d[0].astype(np.complex64)
+        self.d2 = d[1].astype(np.complex64)
+        bins = self.d1.shape[0]
+        # Pesos del haz fijo: w = d / M (se aplican como conj(w) X)
+        self.w1 = self.d1 / 2.0
+        self.w2 = self.d2 / 2.0
+        # Covarianza de ruido por bin: p11, p22 reales y p12 complejo
+        self.p11 = np.ones(bins, dtype=np.float32)
+        self.p22 = np.ones(bins, dtype=np.float32)
+        self.p12 = np.zeros(bins, dtype=np.complex64)
+        self._n1 = np.empty(bins, dtype=np.complex64)
+        self._n2 = np.empty(bins, dtype=np.complex64)
+        self._tmp = np.empty(bins, dtype=np.complex64)
+        self._den = np.empty(bins, dtype=np.float32)
+        self._y = np.empty(bins, dtype=np.complex64)
+        self._frame = np.zeros((2, WINDOW), dtype=np.float32)
+        self._overlap = np.zeros(HOP, dtype=np.float32)
+        self.hops = 0
+        self.noise_updates = 0
+
+    def reset(self):
+        self._frame[:] = 0.0
+        self._overlap[:] = 0.0
+        self.p11[:] = 1.0
+        self.p22[:] = 1.0
+        self.p12[:] = 0.0
+
+    def _update_noise(self, x1, x2):
+        a = MVDR_FORGETTING
+        self.p11 *= a
+        self.p11 += (1.0 - a) * (x1.real ** 2 + x1.imag ** 2)
+        self.p22 *= a
+        self.p22 += (1.0 - a) * (x2.real ** 2 + x2.imag ** 2)
+        self.p12 *= a
+        np.multiply(x1, np.conj(x2), out=self._tmp)
+        self._tmp *= 1.0 - a
+        self.p12 += self._tmp
+        self.noise_updates += 1
+
+    def _update_weights(self):
+        """w = Φ⁻¹d / (dᴴΦ⁻¹d) con Φ 2x2 cargada; el determinante se cancela"""
+        load = MVDR_LOADING * 0.5 * (self.p11 + self.p22) + 1e-9
+        a11 = self.p11 + load
+        a22 = self.p22 + load
+        # n = adj(Φ) d
+        np.multiply(a22, self.d1, out=self._n1)
+        np.multiply(self.p12, self.d2, out=self._tmp)
+        self._n1 -= self._tmp
+        np.multiply(a11, self.d2, out=self._n2)
+        np.multiply(np.conj(self.p12), self.d1, out=self._tmp)
+        self._n2 -= self._tmp
+        # dᴴ n es real y positivo para Φ definida positiva
+        np.multiply(np.conj(self.d1), self._n1, out=self._tmp)
+        self._den[:] = self._tmp.real
+        np.multiply(np.conj(self.d2), self._n2, out=self._tmp)
+        self._den += self._tmp.real
+        np.divide(self._n1, self._den, out=self.w1)
+        np.divide(self._n2, self._den, out=self.w2)
+
+    def process_hop(self, src, dst, speech=None):
+        """
+        HOP muestras (HOP, 2) de `src` a `dst` (ambos canales iguales)
+
+        Args:
+            speech: True si el VAD detecta voz (no se actualiza el ruido);
+                    None sin VAD: MPDR con toda la señal
+        """
+        frame = self._frame
+        frame[:, :HOP] = frame[:, HOP:]
+        frame[:, HOP:] = src.T
+        spectrum = np.fft.rfft(frame * self.window, axis=1)
+        x1, x2 = spectrum[0], spectrum[1]
+        if self.method == "mvdr":
+            if not speech:
+                self._update_noise(x1, x2)
+            self._update_weights()
+        y = self._y
+        np.multiply(np.conj(self.w1), x1, out=y)
+        np.multiply(np.conj(self.w2), x2, out=self._tmp)
+        y += self._tmp
+        out = np.fft.irfft(y, WINDOW).astype(np.float32)
+        out *= self.window
+        out[:HOP] += self._overlap
+        self._overlap[:] = out[HOP:]
+        dst[:] = out[:HOP, None]
+        self.hops += 1
+
+    def get_stats(self):
+        return {
+            "method": self.method,
+            "hops": self.hops,
+            "noise_update_ratio": self.noise_updates / self.hops if self.hops else 0.0,
+            "latency_ms": 1000.0 * (WINDOW - HOP) / SAMPLE_RATE,
+        }
+
+
+class BeamformerNode(Node):
+    """
+    Beamformer antes de RNNoise: un canal mejorado en ambas salidas
+
+    Args:
+        vad: VADScheduler de la cadena; el MVDR solo aprende el ruido en
+             los frames que RNNoise marcó como no-voz
+    """
+
+    frame_size = HOP
+    channels = 2
+
+    def __init__(self, beamformer, vad=None, name="beamformer"):
+        super().__init__(name)
+        self.beamformer = beamformer
+        self.vad = vad
+
+    def process(self, src, dst):
+        speech = None
+        vad = self.vad
+        if vad is not None and vad.frames:
+            speech = vad.quiet_run < VAD_HANGOVER
+        self.beamformer.process_hop(src, dst, speech)
+
+
+# ========== BENCHMARK ==========
+
+def benchmark(seconds=10.0):
+    """
+    Escena simulada (docente de frente + fuente de ruido lateral + ruido
+    difuso) por la cadena sin beamformer, con delay-and-sum y con MVDR.
+    Con la salida alineada al retardo completo de la cadena la ganancia en
+    la banda de voz es de unos +2 dB (DAS) y +3 a +4 dB (MVDR)
+    """
+    from tearis_offline import synth_array, compare_beamformers
+
+    noisy, clean = synth_array(seconds)
+    results = compare_beamformers(noisy, clean)
+    # Ganancia en la banda de voz (ver tearis_offline.SPEECH_BAND)
+    off = results["off"]["band_snr_db"]
+    results["das_gain_db"] = results["das"]["band_snr_db"] - off
+    results["mvdr_gain_db"] = results["mvdr"]["band_snr_db"] - off
+    # Presupuesto: el MVDR debe mejorar al delay-and-sum y entrar holgado en el bloque
+    results["ok"] = (results["mvdr_gain_db"] > results["das_gain_db"] > 0.0
+                     and results["mvdr"]["beam_pct"] < 25.0)
+    return results
+
+
+def main():
+    from tearis_offline import print_beam_comparison
+
+    print("=" * 60)
+    print("TEARIS - Beamformer: escena simulada de dos micrófonos")
+    print("=" * 60)
+    r = benchmark()
+    print_beam_comparison(r)
+    print(f"Ganancia de SNR en la banda de voz: delay-and-sum {r['das_gain_db']:+.1f} dB | MVDR {r['mvdr_gain_db']:+.1f} dB")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
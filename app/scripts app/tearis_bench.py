@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Suite de benchmarks
+Corre los benchmarks de cada etapa y falla si alguno excede su presupuesto
+
+Uso:
+    python3 tearis_bench.py            # todos
+    python3 tearis_bench.py limiter    # solo los indicados
+"""
+
+import sys
+import importlib
+
+# nombre -> (módulo, función). Cada función devuelve un dict con 'ok'
+BENCHMARKS = {
+    "limiter": ("tearis_limiter", "benchmark"),
+    "vad": ("tearis_vad", "benchmark"),
+    "engine": ("tearis_audio_engine", "benchmark"),
+    "rt": ("tearis_rt", "benchmark"),
+    "alsa": ("tearis_alsa", "benchmark"),
+    "graph": ("tearis_dsp_graph", "benchmark"),
+    "int16": ("tearis_pipeline", "benchmark"),
+    "channels": ("tearis_offline", "benchmark"),
+    "memory": ("tearis_memory", "benchmark"),
+    "rtlog": ("tearis_rtlog", "benchmark"),
+    "beam": ("tearis_beamformer", "benchmark"),
+    "fir": ("tearis_fir", "benchmark"),
+    "env": ("tearis_environment", "benchmark"),
+    "supervisor": ("tearis_supervisor", "benchmark"),
+    "gatt_io": ("tearis_gatt_io", "benchmark"),
+    "corpus": ("tearis_corpus", "benchmark"),
+    "spectrum": ("tearis_spectrum", "benchmark"),
+    "denoise": ("tearis_denoise", "benchmark"),
+    "feedback": ("tearis_feedback", "benchmark"),
+    "hub": ("tearis_hub", "benchmark"),
+    "dose": ("tearis_dose", "benchmark"),
+    "command": ("tearis_command", "benchmark"),
+    "subband": ("tearis_subband", "benchmark"),
+}
+
+
+def run(names=None):
+    """Ejecuta los benchmarks pedidos y devuelve {nombre: resultado}"""
+    results = {}
+    for name in names or BENCHMARKS:
+        module_name, func_name = BENCHMARKS[name]
+        func = getattr(importlib.import_module(module_name), func_name)
+        try:
+            results[name] = func()
+        except Exception as e:
+            results[name] = {"ok": False, "error": str(e)}
+    return results
+
+
+def main():
+    names = sys.argv[1:] or None
+    unknown = [n for n in names or [] if n not in BENCHMARKS]
+    if unknown:
+        print(f"❌ Benchmarks desconocidos: {', '.join(unknown)}")
+        print(f"   Disponibles: {', '.join(BENCHMARKS)}")
+        return 2
+
+    print("=" * 60)
+    print("TEARIS - Suite de benchmarks")
+    print("=" * 60)
+    results = run(names)
+    failed = 0
+    for name, result in results.items():
+        ok = result.get("ok", False)
+        failed += 0 if ok else 1
+        detail = " | ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                            for k, v in result.items() if k != "ok")
+        print(f"{'✅' if ok else '❌'} {name}: {detail}")
+    print()
+    print(f"{len(results) - failed}/{len(results)} benchmarks OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Generador de carga GATT
+Reproduce trazas de comandos de la app (arrastre del slider de volumen,
+cambios de modo, altas/bajas de notificaciones) contra el servidor
+registrado en el BlueZ simulado y reporta latencias y xruns.
+
+Uso:
+    python3 tearis_ble_loadgen.py slider --hz 60 --seconds 10
+    python3 tearis_ble_loadgen.py mix --hz 30
+    python3 tearis_ble_loadgen.py sockets --hz 60   # AcquireNotify/AcquireWrite
+    python3 tearis_ble_loadgen.py profile --hz 2    # mismo perfil: escrituras sueltas vs. lote
+    python3 tearis_ble_loadgen.py traza.jsonl --speed 2
+
+Formato de traza (una línea JSON por comando):
+    {"t": 0.016, "op": "write", "chrc": "volume", "value": [64]}
+    op: write | read | start_notify | stop_notify | acquire_notify | acquire_write | release
+    (con acquire_write, las escrituras siguientes a esa característica van por el socket)
+"""
+
+import sys
+import json
+import socket
+import time
+import argparse
+import logging
+import numpy as np
+import dbus
+import dbus.exceptions
+import dbus.mainloop.glib
+from gi.repository import GLib
+
+from tearis_command import encode_batch, decode_ack, HEADER as COMMAND_HEADER
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger("TEARIS-LOADGEN")
+
+BLUEZ_SERVICE_NAME = 'org.bluez'
+GATT_CHRC_IFACE = 'org.bluez.GattCharacteristic1'
+DBUS_PROP_IFACE = 'org.freedesktop.DBus.Properties'
+MOCK_IFACE = 'org.tearis.BluezMock1'
+DEBUG_IFACE = 'org.tearis.Debug1'
+ACQUIRE_MTU = 247
+
+CHARACTERISTICS = {
+    'battery': '12345678-1234-5678-1234-56789abcdef1',
+    'mode': '12345678-1234-5678-1234-56789abcdef2',
+    'status': '12345678-1234-5678-1234-56789abcdef3',
+    'volume': '12345678-1234-5678-1234-56789abcdef4',
+    'audio': '12345678-1234-5678-1234-56789abcdef5',
+    'command': '12345678-1234-5678-1234-56789abcdef9',
+}
+
+
+# ========== TRAZAS SINTÉTICAS ==========
+
+def trace_slider(hz=60.0, seconds=10.0):
+    """Arrastre continuo del slider de volumen: triangular 0 -> 85 -> 0"""
+    n = int(hz * seconds)
+    t = np.arange(n) / hz
+    phase = (t / 2.0) % 1.0
+    values = np.round(85 * (1 - np.abs(2 * phase - 1))).astype(int)
+    return [{"t": float(ti), "op": "write", "chrc": "volume", "value": [int(v)]}
+            for ti, v in zip(t, values)]
+
+
+def trace_mode_flap(hz=5.0, seconds=10.0):
+    """Cambios de modo alternados normal/escuela"""
+    modes = ["normal", "escuela"]
+    return [{"t": i / hz, "op": "write", "chrc": "mode", "value": list(modes[i % 2].encode())}
+            for i in range(int(hz * seconds))]
+
+
+def trace_notify(hz=2.0, seconds=10.0):
+    """Suscripción y baja repetida a audio y batería"""
+    events = []
+    for i in range(int(hz * seconds)):
+        op = "start_notify" if i % 2 == 0 else "stop_notify"
+        for chrc in ("audio", "battery"):
+            events.append({"t": i / hz, "op": op, "chrc": chrc})
+    return events
+
+
+def trace_sockets(hz=60.0, seconds=10.0):
+    """Audio y slider por los sockets adquiridos, como BlueZ con un cliente suscripto"""
+    events = [{"t": 0.0, "op": "acquire_notify", "chrc": "audio"},
+              {"t": 0.0, "op": "acquire_write", "chrc": "volume"}]
+    events += [dict(e, t=e["t"] + 0.5) for e in trace_slider(hz, seconds)]
+    events += [{"t": seconds + 0.5, "op": "release", "chrc": "audio"},
+               {"t": seconds + 0.5, "op": "release", "chrc": "volume"}]
+    return events
+
+
+def trace_profile(hz=2.0, seconds=10.0):
+    """
+    Cambios de perfil alternando normal/escuela: el mismo modo y volumen
+    por las características sueltas y, medio período después, en un lote
+    de la característica de comandos (la confirmación se mide como
+    ack:command)
+    """
+    profiles = [("escuela", 60), ("normal", 70)]
+    events = [{"t": 0.0, "op": "start_notify", "chrc": "command"}]
+    for i in range(int(hz * seconds)):
+        mode, volume = profiles[i % 2]
+        t = 0.5 + i / hz
+        events.append({"t": t, "op": "write", "chrc": "mode", "value": list(mode.encode())})
+        events.append({"t": t, "op": "write", "chrc": "volume", "value": [volume]})
+        batch = encode_batch(i, mode=mode, volume=volume)
+        events.append({"t": t + 0.5 / hz, "op": "write", "chrc": "command", "value": list(batch)})
+    return events
+
+
+def trace_mix(hz=30.0, seconds=10.0):
+    """Slider + flapping de modo + notificaciones a la vez"""
+    events = trace_slider(hz, seconds) + trace_mode_flap(hz / 10.0, seconds) + trace_notify(hz / 15.0, seconds)
+    return sorted(events, key=lambda e: e["t"])
+
+
+SYNTHETIC_TRACES = {
+    "slider": trace_slider,
+    "mode_flap": trace_mode_flap,
+    "notify": trace_notify,
+    "mix": trace_mix,
+    "sockets": trace_sockets,
+    "profile": trace_profile,
+}
+
+
+def load_trace(path):
+    """Lee una traza grabada en formato JSON lines"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ========== GENERADOR ==========
+
+class LoadGenerator:
+    """Dispara los comandos de una traza de forma asíncrona y mide cada respuesta"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        mock = bus.get_object(BLUEZ_SERVICE_NAME, '/')
+        sender, app_path, chrcs = mock.GetApplication(dbus_interface=MOCK_IFACE)
+        self.sender = str(sender)
+        self.app_path = str(app_path)
+        self.paths = {name: str(chrcs[uuid]) for name, uuid in CHARACTERISTICS.items() if uuid in chrcs}
+        self.latencies = {}
+        self.errors = {}
+        self.notifications = {}
+        self.notify_bytes = 0
+        self.sockets = {}         # característica -> socket adquirido
+        self.pending = 0
+        self.commands_sent = {}   # secuencia del lote -> instante de envío
+        bus.add_signal_receiver(self._on_notify, signal_name='PropertiesChanged',
+                                dbus_interface=DBUS_PROP_IFACE, bus_name=self.sender,
+                                path_keyword='path')
+
+    def _on_notify(self, interface, changed, invalidated, path=None):
+        if 'Value' in changed:
+            self.notifications[path] = self.notifications.get(path, 0) + 1
+            self.notify_bytes += len(changed['Value'])
+            if path == self.paths.get('command'):
+                self._on_ack(bytes(changed['Value']))
+
+    def _on_ack(self, data):
+        """Confirmación de un lote: ida y vuelta desde la escritura"""
+        ack = decode_ack(data)
+        sent = self.commands_sent.pop(ack["seq"], None)
+        if sent is None:
+            return
+        if ack["status"]:
+            self.errors["ack:command"] = self.errors.get("ack:command", 0) + 1
+        self.latencies.setdefault("ack:command", []).append((time.perf_counter() - sent) * 1000.0)
+
+    def _acquired(self, name, kind, fd):
+        sock = socket.socket(fileno=fd.take())
+        self.sockets[(name, kind)] = sock
+        if kind == "notify":
+            sock.setblocking(False)
+            GLib.io_add_watch(sock.fileno(), GLib.IO_IN | GLib.IO_HUP, self._on_socket_notify, name)
+
+    def _on_socket_notify(self, fd, condition, name):
+        sock = self.sockets.get((name, "notify"))
+        if sock is None:
+            return False
+        try:
+            data = sock.recv(ACQUIRE_MTU)
+        except BlockingIOError:
+            return True
+        if not data:
+            return False
+        path = self.paths[name]
+        self.notifications[path] = self.notifications.get(path, 0) + 1
+        self.notify_bytes += len(data)
+        if name == "command":
+            self._on_ack(data)
+        return True
+
+    def _release(self, name):
+        for kind in ("notify", "write"):
+            sock = self.sockets.pop((name, kind), None)
+            if sock:
+                sock.close()
+
+    def audio_stats(self):
+        """Contadores del stream de audio del servidor (xruns, callbacks)"""
+        app = self.bus.get_object(self.sender, '/')
+        return {str(k): v for k, v in app.GetAudioStats(dbus_interface=DEBUG_IFACE).items()}
+
+    def _fire(self, event):
+        op = event["op"]
+        key = f"{op}:{event['chrc']}"
+        chrc = self.bus.get_object(self.sender, self.paths[event["chrc"]])
+        start = time.perf_counter()
+
+        def done(*args):
+            self.latencies.setdefault(key, []).append((time.perf_counter() - start) * 1000.0)
+            self.pending -= 1
+
+        def failed(e):
+            self.errors[key] = self.errors.get(key, 0) + 1
+            self.pending -= 1
+
+        if op == "write" and event["chrc"] == "command":
+            self.commands_sent[COMMAND_HEADER.unpack_from(bytes(event["value"]))[1]] = start
+        write_sock = self.sockets.get((event["chrc"], "write"))
+        if op == "write" and write_sock:
+            # Escritura sin respuesta por el socket adquirido: la latencia es el send
+            write_sock.send(bytes(event["value"]))
+            self.latencies.setdefault(f"socket_{key}", []).append((time.perf_counter() - start) * 1000.0)
+            return False
+        if op == "release":
+            self._release(event["chrc"])
+            return False
+
+        self.pending += 1
+        handlers = {"reply_handler": done, "error_handler": failed, "dbus_interface": GATT_CHRC_IFACE}
+        if op in ("acquire_notify", "acquire_write"):
+            kind = op.split("_")[1]
+
+            def acquired(fd, mtu):
+                self._acquired(event["chrc"], kind, fd)
+                done()
+
+            method = chrc.AcquireNotify if kind == "notify" else chrc.AcquireWrite
+            method({"mtu": dbus.UInt16(ACQUIRE_MTU)}, reply_handler=acquired, error_handler=failed,
+                   dbus_interface=GATT_CHRC_IFACE)
+        elif op == "write":
+            chrc.WriteValue(dbus.Array(event["value"], signature='y'), {}, **handlers)
+        elif op == "read":
+            chrc.ReadValue({}, **handlers)
+        elif op == "start_notify":
+            chrc.StartNotify(**handlers)
+        elif op == "stop_notify":
+            chrc.StopNotify(**handlers)
+        else:
+            self.pending -= 1
+            raise ValueError(f"Operación desconocida: {op}")
+        return False
+
+    def run(self, trace, speed=1.0, drain_s=2.0):
+        """Reproduce la traza y devuelve el reporte"""
+        before = self.audio_stats()
+        loop = GLib.MainLoop()
+        duration = 0.0
+        for event in trace:
+            due = event["t"] / speed
+            duration = max(duration, due)
+            GLib.timeout_add(int(due * 1000), self._fire, event)
+
+        def check_done():
+            if self.pending <= 0:
+                loop.quit()
+                return False
+            return True
+
+        def finish():
+            GLib.timeout_add(50, check_done)
+            return False
+
+        GLib.timeout_add(int((duration + drain_s) * 1000), finish)
+        started = time.monotonic()
+        loop.run()
+        elapsed = time.monotonic() - started
+        after = self.audio_stats()
+        return self.report(elapsed, before, after)
+
+    def report(self, elapsed, before, after):
+        ops = {}
+        for key, values in self.latencies.items():
+            v = np.asarray(values)
+            ops[key] = {
+                "count": len(values),
+                "errors": self.errors.get(key, 0),
+                "p50_ms": float(np.percentile(v, 50)),
+                "p90_ms": float(np.percentile(v, 90)),
+                "p99_ms": float(np.percentile(v, 99)),
+                "max_ms": float(v.max()),
+            }
+        for key, count in self.errors.items():
+            ops.setdefault(key, {"count": 0, "errors": count})
+        return {
+            "elapsed_s": elapsed,
+            "ops": ops,
+            "notifications": sum(self.notifications.values()),
+            "notify_bytes": self.notify_bytes,
+            "xruns": int(after.get("xruns", 0)) - int(before.get("xruns", 0)),
+            "callback_max_ms": float(after.get("callback_max_ms", 0.0)),
+            "slider_to_sound_avg_ms": float(after.get("slider_to_sound_avg_ms", 0.0)),
+            "slider_to_sound_max_ms": float(after.get("slider_to_sound_max_ms", 0.0)),
+            "volume_hw_avg_ms": float(after.get("volume_hw_avg_ms", 0.0)),
+            "volume_coalesced": int(after.get("volume_coalesced", 0)) - int(before.get("volume_coalesced", 0)),
+        }
+
+
+def print_report(report):
+    print("=" * 70)
+    print(f"TEARIS - Carga GATT ({report['elapsed_s']:.1f} s)")
+    print("=" * 70)
+    for key, r in sorted(report["ops"].items()):
+        if r["count"]:
+            print(f"{key:<22} n={r['count']:<5} err={r['errors']:<3} p50 {r['p50_ms']:.2f} ms | "
+                  f"p90 {r['p90_ms']:.2f} ms | p99 {r['p99_ms']:.2f} ms | max {r['max_ms']:.2f} ms")
+        else:
+            print(f"{key:<22} n=0     err={r['errors']}")
+    print(f"🔔 Notificaciones: {report['notifications']} ({report['notify_bytes']} bytes)")
+    print(f"{'✅' if report['xruns'] == 0 else '⚠️'} Xruns durante la carga: {report['xruns']} "
+          f"| callback máx {report['callback_max_ms']:.2f} ms")
+    print(f"🎚️ Slider → sonido: prom {report['slider_to_sound_avg_ms']:.1f} ms máx {report['slider_to_sound_max_ms']:.1f} ms "
+          f"| hardware prom {report['volume_hw_avg_ms']:.1f} ms | escrituras colapsadas {report['volume_coalesced']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga GATT para TEARIS")
+    parser.add_argument("trace", help=f"traza sintética ({', '.join(SYNTHETIC_TRACES)}) o archivo .jsonl")
+    parser.add_argument("--hz", type=float, default=None, help="frecuencia de comandos (sintéticas)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duración (sintéticas)")
+    parser.add_argument("--speed", type=float, default=1.0, help="factor de velocidad de reproducción")
+    parser.add_argument("--json", action="store_true", help="imprimir el reporte como JSON")
+    args = parser.parse_args()
+
+    if args.trace in SYNTHETIC_TRACES:
+        kwargs = {"seconds": args.seconds}
+        if args.hz:
+            kwargs["hz"] = args.hz
+        trace = SYNTHETIC_TRACES[args.trace](**kwargs)
+    else:
+        trace = load_trace(args.trace)
+
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    bus = dbus.SessionBus()
+    try:
+        gen = LoadGenerator(bus)
+    except dbus.exceptions.DBusException as e:
+        logger.error(f"❌ No hay servidor registrado en el BlueZ simulado: {e}")
+        return 1
+
+    logger.info(f"🚀 Reproduciendo {len(trace)} comandos contra {gen.sender}")
+    report = gen.run(trace, speed=args.speed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if report["xruns"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Sustituto local de BlueZ sobre el bus de sesión
+Publica 'org.bluez' con un adaptador falso (GattManager1 y
+LEAdvertisingManager1) para que el servidor se registre sin hardware.
+
+Uso:
+    dbus-run-session -- bash -c '
+        python3 tearis_bluez_mock.py &
+        TEARIS_DBUS_BUS=session TEARIS_AUDIO_BACKEND=null python3 tearis_pi_server.py &
+        python3 tearis_ble_loadgen.py slider'
+"""
+
+import logging
+import dbus
+import dbus.exceptions
+import dbus.mainloop.glib
+import dbus.service
+from gi.repository import GLib
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+logger = logging.getLogger("TEARIS-BLUEZ-MOCK")
+
+BLUEZ_SERVICE_NAME = 'org.bluez'
+ADAPTER_PATH = '/org/bluez/hci0'
+ADAPTER_IFACE = 'org.bluez.Adapter1'
+GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
+GATT_SERVICE_IFACE = 'org.bluez.GattService1'
+GATT_CHRC_IFACE = 'org.bluez.GattCharacteristic1'
+LE_ADVERTISING_MANAGER_IFACE = 'org.bluez.LEAdvertisingManager1'
+DBUS_OM_IFACE = 'org.freedesktop.DBus.ObjectManager'
+DBUS_PROP_IFACE = 'org.freedesktop.DBus.Properties'
+MOCK_IFACE = 'org.tearis.BluezMock1'
+
+
+class MockAdapter(dbus.service.Object):
+    """Adaptador hci0 falso: acepta aplicaciones GATT y anuncios"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.applications = {}   # (sender, path) -> {uuid: ruta de característica}
+        self.advertisements = []
+        dbus.service.Object.__init__(self, bus, ADAPTER_PATH)
+
+    def get_properties(self):
+        return {
+            ADAPTER_IFACE: {'Address': '00:00:00:00:00:00', 'Name': 'tearis-mock', 'Powered': True},
+            GATT_MANAGER_IFACE: {},
+            LE_ADVERTISING_MANAGER_IFACE: {},
+        }
+
+    @dbus.service.method(GATT_MANAGER_IFACE, in_signature='oa{sv}',
+                         sender_keyword='sender', async_callbacks=('reply', 'error'))
+    def RegisterApplication(self, path, options, sender=None, reply=None, error=None):
+        # Igual que BlueZ: leer el árbol de objetos antes de responder
+        def on_objects(objects):
+            chrcs = {}
+            for obj_path, ifaces in objects.items():
+                if GATT_CHRC_IFACE in ifaces:
+                    chrcs[str(ifaces[GATT_CHRC_IFACE]['UUID'])] = str(obj_path)
+            self.applications[(str(sender), str(path))] = chrcs
+            logger.info(f"✅ Aplicación {path} de {sender} registrada ({len(chrcs)} características)")
+            reply()
+
+        def on_error(e):
+            logger.error(f"❌ No se pudo leer la aplicación {path}: {e}")
+            error(e)
+
+        app = self.bus.get_object(sender, path)
+        app.GetManagedObjects(dbus_interface=DBUS_OM_IFACE,
+                              reply_handler=on_objects, error_handler=on_error)
+
+    @dbus.service.method(GATT_MANAGER_IFACE, in_signature='o', sender_keyword='sender')
+    def UnregisterApplication(self, path, sender=None):
+        self.applications.pop((str(sender), str(path)), None)
+        logger.info(f"🛑 Aplicación {path} eliminada")
+
+    @dbus.service.method(LE_ADVERTISING_MANAGER_IFACE, in_signature='oa{sv}', sender_keyword='sender')
+    def RegisterAdvertisement(self, path, options, sender=None):
+        self.advertisements.append((str(sender), str(path)))
+        logger.info(f"✅ Anuncio {path} registrado")
+
+    @dbus.service.method(LE_ADVERTISING_MANAGER_IFACE, in_signature='o', sender_keyword='sender')
+    def UnregisterAdvertisement(self, path, sender=None):
+        if (str(sender), str(path)) in self.advertisements:
+            self.advertisements.remove((str(sender), str(path)))
+
+
+class MockRoot(dbus.service.Object):
+    """Raíz de org.bluez: ObjectManager y consultas para el generador de carga"""
+
+    def __init__(self, bus, adapter):
+        self.adapter = adapter
+        dbus.service.Object.__init__(self, bus, '/')
+
+    @dbus.service.method(DBUS_OM_IFACE, out_signature='a{oa{sa{sv}}}')
+    def GetManagedObjects(self):
+        return {dbus.ObjectPath(ADAPTER_PATH): self.adapter.get_properties()}
+
+    @dbus.service.method(MOCK_IFACE, out_signature='soa{so}')
+    def GetApplication(self):
+        """Última aplicación registrada: (bus, ruta, {uuid: característica})"""
+        if not self.adapter.applications:
+            raise dbus.exceptions.DBusException('org.bluez.Error.DoesNotExist: No application registered')
+        (sender, path), chrcs = list(self.adapter.applications.items())[-1]
+        return (sender, dbus.ObjectPath(path),
+                dbus.Dictionary({u: dbus.ObjectPath(p) for u, p in chrcs.items()}, signature='so'))
+
+
+def main():
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    bus = dbus.SessionBus()
+    name = dbus.service.BusName(BLUEZ_SERVICE_NAME, bus)
+    adapter = MockAdapter(bus)
+    root = MockRoot(bus, adapter)
+    logger.info(f"🧪 BlueZ simulado en el bus de sesión ({ADAPTER_PATH})")
+    try:
+        GLib.MainLoop().run()
+    except KeyboardInterrupt:
+        logger.info("👋 BlueZ simulado detenido")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
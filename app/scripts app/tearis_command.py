@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Protocolo binario de comandos por lotes
+Una sola escritura GATT lleva todos los parámetros de un perfil (modo,
+volumen, bandas de EQ, interruptores de la cadena DSP) con un número de
+secuencia. El servidor aplica el lote como una transacción: un único grafo
+nuevo (AudioPipeline.transaction) y un único proceso de amixer en modo
+script, y confirma con una notificación. El camino anterior necesitaba una
+escritura por característica (modo en ASCII, volumen) y un amixer por
+control, y la EQ no se podía elegir.
+
+Lote (little endian):
+    versión u8 | secuencia u16 | ítems hasta el final
+    ítem: tipo u8 | largo u8 | valor (largo bytes)
+Los tipos desconocidos se saltean (el largo alcanza para eso), así una app
+más nueva puede hablarle a un servidor más viejo dentro de la misma versión.
+Un perfil completo ocupa 20 bytes: entra en una escritura con MTU 23.
+
+Confirmación (notificación, ACK.size = 8 bytes):
+    versión u8 | estado u8 | secuencia u16 | ítems aplicados u8 | reservado u8 | aplicación u16 (0.1 ms)
+
+Uso (de la escritura a la confirmación de un cambio de perfil, lote vs. escrituras sueltas):
+    python3 tearis_command.py
+"""
+
+import time
+import shutil
+import threading
+import struct
+import logging
+import subprocess
+import numpy as np
+
+logger = logging.getLogger("TEARIS-COMMAND")
+
+VERSION = 1
+HEADER = struct.Struct("<BH")
+ITEM = struct.Struct("<BB")
+ACK = struct.Struct("<BBHBBH")
+
+# Tipos de parámetro
+PARAM_MODE = 0x01         # u8: índice de MODE_IDS
+PARAM_VOLUME = 0x02       # u8: % de amixer (el tope lo pone el servidor)
+PARAM_EQ = 0x03           # 5 x i8: dB de EQ1..EQ5 del WM8960
+PARAM_TOGGLES = 0x04      # u8 máscara | u8 valores: solo cambian los bits de la máscara
+PARAM_BEAMFORMER = 0x05   # u8: índice de BEAMFORMER_IDS
+
+MODE_IDS = ("normal", "escuela", "transporte", "auto")
+BEAMFORMER_IDS = ("off", "das", "mvdr")
+TOGGLE_FEEDBACK = 0x01    # cancelador de realimentación
+TOGGLE_SPECTRAL = 0x02    # reductor espectral en lugar de RNNoise
+TOGGLES = {"feedback": TOGGLE_FEEDBACK, "spectral": TOGGLE_SPECTRAL}
+EQ_BANDS = 5
+EQ_RANGE_DB = 12
+
+# Estados de la confirmación
+ACK_OK = 0
+ACK_BAD_VERSION = 1
+ACK_MALFORMED = 2
+ACK_BAD_VALUE = 3
+ACK_UNSUPPORTED = 4       # p. ej. interruptores DSP con el motor en otro proceso
+ACK_FAILED = 5
+ACK_NAMES = ("ok", "versión", "mal formado", "valor inválido", "no soportado", "falló")
+
+# EQ del WM8960 que el servidor aplica en cada modo (dB por banda, EQ1..EQ5).
+# Es la única tabla del dispositivo: la usan el cambio de modo y los lotes
+# sin EQ, y tearis_corpus la reproduce en software para evaluar los modos
+EQ_PRESETS = {
+    # Plano
+    "normal": (0, 0, 0, 0, 0),
+    # Realce de la banda de voz
+    "escuela": (0, +3, +6, +3, 0),
+    # Plano
+    "transporte": (0, 0, 0, 0, 0),
+}
+
+
+class CommandError(ValueError):
+    """Lote rechazado entero; status es el código de la confirmación"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ========================================
+# Codificación
+# ========================================
+def encode_batch(seq, mode=None, volume=None, eq=None, toggles=None, beamformer=None):
+    """
+    Lote con los parámetros dados (None = no se toca)
+
+    Args:
+        mode: nombre de MODE_IDS
+        volume: 0-100 (%)
+        eq: 5 valores en dB (-12 a +12)
+        toggles: {'feedback': bool, 'spectral': bool}
+        beamformer: nombre de BEAMFORMER_IDS
+    """
+    items = []
+    if mode is not None:
+        items.append((PARAM_MODE, bytes([MODE_IDS.index(mode)])))
+    if volume is not None:
+        items.append((PARAM_VOLUME, bytes([int(volume)])))
+    if eq is not None:
+        items.append((PARAM_EQ, struct.pack(f"<{EQ_BANDS}b", *(int(v) for v in eq))))
+    if toggles:
+        mask = values = 0
+        for name, on in toggles.items():
+            mask |= TOGGLES[name]
+            values |= TOGGLES[name] if on else 0
+        items.append((PARAM_TOGGLES, bytes([mask, values])))
+    if beamformer is not None:
+        items.append((PARAM_BEAMFORMER, bytes([BEAMFORMER_IDS.index(beamformer)])))
+    out = bytearray(HEADER.pack(VERSION, seq & 0xFFFF))
+    for kind, value in items:
+        out += ITEM.pack(kind, len(value)) + value
+    return bytes(out)
+
+
+def decode_batch(data):
+    """
+    Lote -> {seq, params}; params tiene solo las claves presentes (mode,
+    volume, eq, toggles, beamformer). Lanza CommandError si no se puede
+    aplicar entero.
+    """
+    data = bytes(data)
+    if len(data) < HEADER.size:
+        raise CommandError(ACK_MALFORMED, f"Lote de {len(data)} bytes")
+    version, seq = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise CommandError(ACK_BAD_VERSION, f"Versión {version} (se espera {VERSION})")
+    params = {}
+    offset = HEADER.size
+    while offset < len(data):
+        if offset + ITEM.size > len(data):
+            raise CommandError(ACK_MALFORMED, "Ítem cortado")
+        kind, length = ITEM.unpack_from(data, offset)
+        offset += ITEM.size
+        value = data[offset:offset + length]
+        offset += length
+        if len(value) != length:
+            raise CommandError(ACK_MALFORMED, f"Valor cortado (tipo {kind})")
+        _decode_item(kind, value, params)
+    return {"seq": seq, "params": params}
+
+
+def _decode_item(kind, value, params):
+    def expect(size):
+        if len(value) != size:
+            raise CommandError(ACK_MALFORMED, f"Tipo {kind}: {len(value)} bytes (se esperan {size})")
+
+    if kind == PARAM_MODE:
+        expect(1)
+        if value[0] >= len(MODE_IDS):
+            raise CommandError(ACK_BAD_VALUE, f"Modo {value[0]}")
+        params["mode"] = MODE_IDS[value[0]]
+    elif kind == PARAM_VOLUME:
+        expect(1)
+        if value[0] > 100:
+            raise CommandError(ACK_BAD_VALUE, f"Volumen {value[0]}%")
+        params["volume"] = value[0]
+    elif kind == PARAM_EQ:
+        expect(EQ_BANDS)
+        bands = struct.unpack(f"<{EQ_BANDS}b", value)
+        if any(abs(b) > EQ_RANGE_DB for b in bands):
+            raise CommandError(ACK_BAD_VALUE, f"EQ fuera de ±{EQ_RANGE_DB} dB: {bands}")
+        params["eq"] = bands
+    elif kind == PARAM_TOGGLES:
+        expect(2)
+        mask, values = value
+        params["toggles"] = {name: bool(values & bit) for name, bit in TOGGLES.items() if mask & bit}
+    elif kind == PARAM_BEAMFORMER:
+        expect(1)
+        if value[0] >= len(BEAMFORMER_IDS):
+            raise CommandError(ACK_BAD_VALUE, f"Beamformer {value[0]}")
+        params["beamformer"] = BEAMFORMER_IDS[value[0]]
+    # Tipos desconocidos: se saltean
+
+
+def encode_ack(seq, status=ACK_OK, applied=0, apply_ms=0.0):
+    return ACK.pack(VERSION, status, seq & 0xFFFF, applied, 0, int(min(max(apply_ms, 0.0) * 10, 0xFFFF)))
+
+
+def decode_ack(data):
+    version, status, seq, applied, _, apply_tenths = ACK.unpack(bytes(data))
+    return {"version": version, "status": status, "seq": seq, "applied": applied,
+            "apply_ms": apply_tenths / 10.0}
+
+
+def merge_batches(batches):
+    """
+    Lotes pendientes -> parámetros combinados (el último gana por parámetro);
+    quien llama descarta antes los que no se pueden aplicar, para que uno
+    inválido no arrastre a los demás
+    """
+    params = {}
+    for batch in batches:
+        for key, value in batch["params"].items():
+            if key == "toggles":
+                params["toggles"] = dict(params.get("toggles", {}), **value)
+            else:
+                params[key] = value
+    return params
+
+
+def eq_commands(bands):
+    """Comandos de amixer (modo script) para las 5 bandas de EQ"""
+    return [f"sset EQ{i} {int(v):+d}" for i, v in enumerate(bands, start=1)]
+
+
+def mixer_script(commands):
+    """Comandos para `amixer -s`: un solo proceso aplica todo el lote"""
+    return "".join(f"{command}\n" for command in commands)
+
+
+# ========== BENCHMARK ==========
+
+# Intervalo de conexión BLE típico de un teléfono: cada PDU sale en el
+# próximo evento de conexión
+CONN_INTERVAL_MS = 30.0
+
+
+def _mixer(script):
+    """Un proceso de mezclador; sin amixer (fuera de la Pi) se mide el fork con `true`"""
+    if shutil.which("amixer"):
+        subprocess.run(["amixer", "-c", "1", "-s"], input=script, text=True, check=False,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        subprocess.run(["true"], check=False)
+
+
+class _BleLink:
+    """Enlace simulado en tiempo real: un PDU espera al próximo evento de conexión"""
+
+    def __init__(self, interval_ms):
+        self.interval = interval_ms / 1000.0
+        self.t0 = time.perf_counter()
+
+    def next_event(self):
+        now = time.perf_counter()
+        k = int((now - self.t0) / self.interval) + 1
+        time.sleep(max(0.0, self.t0 + k * self.interval - now))
+
+    def write(self):
+        """Escritura con respuesta: petición en un evento, respuesta en el siguiente"""
+        self.next_event()
+        self.next_event()
+
+
+class _ProfileServer:
+    """
+    Lado servidor de los dos caminos sobre un ControlApplier y una cadena
+    real, como en tearis_pi_server: las escrituras solo encolan y el hilo
+    aplicador hace el trabajo
+    """
+
+    def __init__(self, pipeline, link):
+        from tearis_control import ControlApplier
+
+        self.pipeline = pipeline
+        self.link = link
+        self.done = threading.Event()
+        self.apply_ms = 0.0
+        self.acked = None
+        self.controls = ControlApplier(min_interval={"mode": 0.0, "volume": 0.0, "profile": 0.0})
+        self.controls.register("mode", self._legacy_mode)
+        self.controls.register("volume", self._legacy_volume)
+        self.controls.register("profile", self._batch)
+        self.controls.start()
+
+    def _timed(self, apply):
+        start = time.perf_counter()
+        apply()
+        self.apply_ms += 1000.0 * (time.perf_counter() - start)
+
+    def _legacy_mode(self, data):
+        # ModeCharacteristic: ASCII decodificado byte a byte; set_mode -> un amixer por banda
+        mode = ''.join(chr(b) for b in data)
+
+        def apply():
+            self.pipeline.set_mode(mode)
+            for command in eq_commands(EQ_PRESETS[mode]):
+                _mixer(mixer_script([command]))
+        self._timed(apply)
+
+    def _legacy_volume(self, data):
+        self._timed(lambda: _mixer(mixer_script([f"sset Headphone {data[0]}%"])))
+        self.done.set()
+
+    def _batch(self, data):
+        start = time.perf_counter()
+        batch = decode_batch(data)
+        params = batch["params"]
+        with self.pipeline.transaction():
+            self.pipeline.set_mode(params["mode"])
+        eq = params.get("eq", EQ_PRESETS[params["mode"]])
+        _mixer(mixer_script(eq_commands(eq) + [f"sset Headphone {params['volume']}%"]))
+        self.apply_ms += 1000.0 * (time.perf_counter() - start)
+        ack = encode_ack(batch["seq"], ACK_OK, len(params), self.apply_ms)
+        # Notificación: sale en el primer evento de conexión tras aplicar
+        self.link.next_event()
+        self.acked = decode_ack(ack)
+        self.done.set()
+
+    def stop(self):
+        self.controls.stop()
+
+
+def _legacy_profile(server, profile):
+    """
+    Camino anterior: escritura de modo y de volumen, cada una esperando su
+    respuesta. No hay confirmación de aplicado: cuenta como tal el primer
+    evento de conexión con las dos escrituras respondidas y aplicadas (lo
+    antes que una notificación o una relectura podría reportarlo)
+
+    Returns:
+        (escrituras GATT, procesos de amixer, ms de la primera escritura a la confirmación)
+    """
+    start = time.perf_counter()
+    server.link.write()
+    server.controls.submit("mode", profile["mode"].encode())
+    server.link.write()
+    server.controls.submit("volume", bytes([profile["volume"]]))
+    server.done.wait(5.0)
+    server.link.next_event()
+    return 2, EQ_BANDS + 1, 1000.0 * (time.perf_counter() - start)
+
+
+def _batch_profile(server, profile, seq):
+    """Camino nuevo: un lote en una escritura, confirmado por notify al aplicarlo"""
+    start = time.perf_counter()
+    data = encode_batch(seq, **profile)
+    server.link.next_event()
+    server.controls.submit("profile", data)
+    server.done.wait(5.0)
+    if server.acked is None or server.acked["seq"] != seq or server.acked["status"] != ACK_OK:
+        raise RuntimeError(f"Lote {seq} sin confirmación válida")
+    return 1, 1, 1000.0 * (time.perf_counter() - start)
+
+
+def benchmark(rounds=10, conn_interval_ms=CONN_INTERVAL_MS):
+    """
+    Cambio de perfil (modo con su EQ + volumen) idéntico por los dos caminos
+    sobre una cadena real y un enlace simulado en tiempo real: se mide
+    desde la primera escritura hasta la confirmación de aplicado
+    """
+    from tearis_pipeline import AudioPipeline
+
+    # Lo único que el camino anterior puede cambiar: modo (con su EQ) y volumen
+    profiles = [{"mode": "escuela", "volume": 60}, {"mode": "normal", "volume": 70}]
+    results = {}
+    for name in ("legacy", "batch"):
+        pipeline = AudioPipeline(blocksize=960, denoiser="spectral")
+        count = [0]
+        build = pipeline.build_graph
+
+        def counting_build(build=build, count=count):
+            count[0] += 1
+            return build()
+
+        pipeline.build_graph = counting_build
+        server = _ProfileServer(pipeline, _BleLink(conn_interval_ms))
+        latencies, applies = [], []
+        try:
+            for i in range(rounds):
+                profile = profiles[i % len(profiles)]
+                server.done.clear()
+                server.apply_ms = 0.0
+                if name == "legacy":
+                    writes, forks, elapsed = _legacy_profile(server, profile)
+                else:
+                    writes, forks, elapsed = _batch_profile(server, profile, i)
+                latencies.append(elapsed)
+                applies.append(server.apply_ms)
+        finally:
+            server.stop()
+            pipeline.stop_rnnoise()
+        results[name] = {
+            "writes": writes,
+            "mixer_processes": forks,
+            "graph_rebuilds": count[0] / rounds,
+            "server_ms": float(np.median(applies)),
+            "rtt_ms": float(np.median(latencies)),
+        }
+    # Perfil completo (con EQ e interruptores) para el tope de MTU
+    size = len(encode_batch(0xFFFF, mode="escuela", volume=60, eq=EQ_PRESETS["escuela"],
+                            toggles={"feedback": True, "spectral": True}))
+    return {
+        "legacy": results["legacy"],
+        "batch": results["batch"],
+        "batch_bytes": size,
+        "ack_bytes": ACK.size,
+        "conn_interval_ms": conn_interval_ms,
+        "mixer": "amixer" if shutil.which("amixer") else "true (sin amixer)",
+        "speedup": results["legacy"]["rtt_ms"] / results["batch"]["rtt_ms"],
+        # Un lote entra en una escritura de MTU 23, un solo grafo nuevo y menos ida y vuelta
+        "ok": (size <= 20 and results["batch"]["graph_rebuilds"] == 1.0
+               and results["batch"]["rtt_ms"] < results["legacy"]["rtt_ms"]),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Comandos por lotes: cambio de perfil (modo + volumen)")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Lote: {r['batch_bytes']} bytes | confirmación: {r['ack_bytes']} bytes | mezclador: {r['mixer']}")
+    for name in ("legacy", "batch"):
+        p = r[name]
+        print(f"{name:<7} {p['writes']} escrituras | {p['mixer_processes']} amixer | {p['graph_rebuilds']:.0f} grafos "
+              f"| servidor {p['server_ms']:.1f} ms | escritura -> confirmación {p['rtt_ms']:.0f} ms "
+              f"(intervalo {r['conn_interval_ms']:.0f} ms)")
+    print(f"Lote {r['speedup']:.1f}x más rápido con el mismo perfil")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Aplicador de controles (volumen, modo)
+Las escrituras BLE se confirman al instante: el aplicador se queda solo con
+el último valor de cada control y lo aplica desde un hilo propio a una tasa
+acotada, sin forks de amixer en el hilo de GLib.
+"""
+
+import time
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger("TEARIS-CONTROL")
+
+# Intervalo mínimo entre aplicaciones de un mismo control (segundos)
+CONTROL_MIN_INTERVAL = {
+    "volume": 0.05,  # 20 Hz: amixer por paso
+    "mode": 0.25,    # cambios de modo (EQ + RNNoise)
+}
+
+
+def volume_to_db(percent):
+    """
+    Ganancia aproximada del auricular del WM8960 para un % de amixer
+    (0-127 pasos de 1 dB, 127 = +6 dB)
+    """
+    return 127.0 * float(percent) / 100.0 - 121.0
+
+
+class ControlApplier:
+    """
+    Colapsa ráfagas de escrituras al último valor por control y las aplica
+    desde un hilo trabajador respetando CONTROL_MIN_INTERVAL
+    """
+
+    def __init__(self, min_interval=None):
+        self.min_interval = dict(CONTROL_MIN_INTERVAL, **(min_interval or {}))
+        self._handlers = {}
+        self._pending = {}        # control -> (valor, instante de escritura)
+        self._last_applied = {}   # control -> instante de la última aplicación
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.running = False
+        self.submitted = {}
+        self.applied = {}
+        self.coalesced = {}
+        self.latency_sum = {}
+        self.latency_max = {}
+
+    def register(self, control, handler):
+        """Asocia un control con la función que lo aplica"""
+        self._handlers[control] = handler
+        for stats in (self.submitted, self.applied, self.coalesced):
+            stats.setdefault(control, 0)
+        self.latency_sum.setdefault(control, 0.0)
+        self.latency_max.setdefault(control, 0.0)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._worker, name="control-applier", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def submit(self, control, value):
+        """Encola el valor nuevo (reemplaza al pendiente) y vuelve enseguida"""
+        if control not in self._handlers:
+            raise KeyError(f"Control desconocido: {control}")
+        with self._lock:
+            if control in self._pending:
+                self.coalesced[control] += 1
+            self._pending[control] = (value, time.monotonic())
+            self.submitted[control] += 1
+        self._wake.set()
+
+    def _worker(self):
+        timeout = None
+        while self.running:
+            self._wake.wait(timeout)
+            self._wake.clear()
+            now = time.monotonic()
+            ready = []
+            next_due = None
+            with self._lock:
+                for control in list(self._pending):
+                    due = self._last_applied.get(control, 0.0) + self.min_interval.get(control, 0.0)
+                    if due <= now:
+                        ready.append((control,) + self._pending.pop(control))
+                    else:
+                        next_due = due if next_due is None else min(next_due, due)
+
+            for control, value, submitted_at in ready:
+                try:
+                    self._handlers[control](value)
+                except Exception as e:
+                    logger.error(f"❌ Error aplicando {control}={value}: {e}")
+                done = time.monotonic()
+                self._last_applied[control] = done
+                self.applied[control] += 1
+                self.latency_sum[control] += done - submitted_at
+                self.latency_max[control] = max(self.latency_max[control], done - submitted_at)
+
+            timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+
+    def get_stats(self):
+        """Escrituras recibidas, aplicadas, colapsadas y latencia de aplicación"""
+        return {
+            control: {
+                "submitted": self.submitted[control],
+                "applied": self.applied[control],
+                "coalesced": self.coalesced[control],
+                "avg_ms": 1000.0 * self.latency_sum[control] / self.applied[control] if self.applied[control] else 0.0,
+                "max_ms": 1000.0 * self.latency_max[control],
+            }
+            for control in self._handlers
+        }
+
+
+class GainRamp:
+    """
+    Ganancia de software con rampa, aplicada en el callback de audio.
+    Cubre la diferencia entre el volumen pedido y el último paso de hardware
+    aplicado, así el sonido sigue al dedo aunque amixer vaya atrasado.
+
+    Args:
+        slew_db: variación máxima por bloque en dB
+        max_db: ganancia de software máxima
+    """
+
+    def __init__(self, slew_db=3.0, max_db=12.0):
+        self.slew_db = slew_db
+        self.max_db = max_db
+        self.current_db = 0.0
+        self.target_db = 0.0
+        self._target_set_at = None
+        self._snap = False
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_count = 0
+
+    def set_target(self, gain_db, track=True, set_at=None, snap=False):
+        """
+        Nueva ganancia objetivo (llamado desde fuera del callback)
+
+        Args:
+            track: medir la latencia escritura -> sonido de este cambio
+                   (False para las compensaciones tras un paso de hardware)
+            set_at: instante time.monotonic() de la escritura, si ocurrió
+                    en otro proceso
+            snap: llegar al objetivo en el próximo bloque, sin el límite de
+                  slew_db (compensación de un paso de hardware: con la
+                  rampa el paso se oiría como un exceso de ganancia)
+        """
+        self.target_db = min(self.max_db, float(gain_db))
+        if snap:
+            self._snap = True
+        if track:
+            self._target_set_at = set_at or time.monotonic()
+
+    def process(self, block):
+        """Aplica la ganancia en el lugar, con rampa lineal dentro del bloque"""
+        # snap antes que el objetivo: set_target escribe el objetivo primero
+        snap = self._snap
+        target = self.target_db
+        start_db = self.current_db
+        delta = target - start_db
+        if snap or abs(delta) <= self.slew_db:
+            end_db = target
+            self._snap = False
+        else:
+            end_db = start_db + np.copysign(self.slew_db, delta)
+        self.current_db = end_db
+        if start_db != 0.0 or end_db != 0.0:
+            g0 = 10.0 ** (start_db / 20.0)
+            g1 = 10.0 ** (end_db / 20.0)
+            if g0 == g1:
+                block *= np.float32(g1)
+            else:
+                ramp = np.linspace(g0, g1, block.shape[0], dtype=np.float32)
+                block *= ramp[:, None] if block.ndim == 2 else ramp
+        set_at = self._target_set_at
+        if set_at is not None and end_db == target:
+            # Escritura -> sonido: la salida ya refleja el valor pedido
+            latency = time.monotonic() - set_at
+            self._target_set_at = None
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latency_count += 1
+        return block
+
+    def get_stats(self):
+        return {
+            "gain_db": self.current_db,
+            "slider_to_sound_avg_ms": 1000.0 * self.latency_sum / self.latency_count if self.latency_count else 0.0,
+            "slider_to_sound_max_ms": 1000.0 * self.latency_max,
+            "ramps": self.latency_count,
+        }
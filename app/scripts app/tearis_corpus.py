@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Evaluación por lotes sobre corpus de grabaciones
+Mezcla voz limpia con ruido de aula o de transporte a SNR fijos, pasa
+cada clip por la cadena de cada configuración (modo, RNNoise, EQ del
+WM8960 reproducido en software, beamformer) en un pool de procesos y
+calcula métricas objetivas vectorizadas por lote de clips.
+
+El corpus se guarda como arrays .npy int16 que los procesos abren
+mapeados en memoria: cada tarea lee solo sus clips, sin copiar el corpus
+a cada proceso. Los resultados van a un .npz columnar (un array por
+métrica, una fila por clip y configuración) para comparar corridas.
+
+Uso:
+    python3 tearis_corpus.py build corpus/ --clips 400                # material sintético
+    python3 tearis_corpus.py build corpus/ --speech voces/ --noise ruidos/
+    python3 tearis_corpus.py eval corpus/ -o resultados.npz --workers 4
+    python3 tearis_corpus.py show resultados.npz otra_corrida.npz
+    python3 tearis_corpus.py scaling corpus/                          # tiempo vs. procesos
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import logging
+import tempfile
+import multiprocessing
+import numpy as np
+
+from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS
+from tearis_offline import (BLOCKSIZE, SPEECH_BAND, read_wav, to_stereo, synth_speech,
+                            synth_noise, mix_at_snr, propagate, process)
+
+logger = logging.getLogger("TEARIS-CORPUS")
+
+CLIP_SECONDS = 3.0
+NOISE_KINDS = ("aula", "transporte")
+SNR_LEVELS = (-5.0, 0.0, 5.0, 10.0)
+PCM_SCALE = 32767.0
+PEAK = 0.9                # pico máximo de la mezcla antes de pasar a int16
+
+# Configuraciones por defecto: modo de la cadena + EQ del WM8960 en software
+CONFIGS = {
+    "normal": {"mode": "normal"},
+    "escuela": {"mode": "escuela"},
+    "escuela_mvdr": {"mode": "escuela", "beamformer": "mvdr"},
+    "escuela_spectral": {"mode": "escuela", "denoiser": "spectral"},
+    "transporte": {"mode": "transporte"},
+}
+
+CHUNK = 16                # clips por tarea del pool
+MAX_LAG = 960             # retardo máximo de la cadena a buscar (20 ms)
+SEG_FRAME = 960           # tramas de 20 ms para SNR segmental y distancia espectral
+SEG_RANGE = (-10.0, 35.0)
+ACTIVE_DB = -40.0         # tramas con voz: energía sobre el máximo del clip
+
+METRICS = ("snr_in_db", "snr_out_db", "snr_gain_db", "segsnr_in_db", "segsnr_out_db",
+           "lsd_in_db", "lsd_out_db", "band_keep_db", "rtf")
+
+
+# ========== EQ DEL WM8960 EN SOFTWARE ==========
+
+def preset_sos(mode, sample_rate=SAMPLE_RATE):
+    """
+    Filas SOS que aproximan el EQ de 5 bandas del WM8960 para un modo
+
+    Returns:
+        filas [b0, b1, b2, 1, a1, a2] para AudioPipeline.set_eq
+    """
+    from tearis_dsp_graph import rbj_peaking, rbj_shelf
+    from tearis_command import EQ_PRESETS
+    from wm8960_control import EQ_BAND_FREQS
+
+    gains = EQ_PRESETS[mode]
+    rows = [rbj_shelf(EQ_BAND_FREQS[0], gains[0], sample_rate=sample_rate)]
+    rows += [rbj_peaking(f0, g, q=0.9, sample_rate=sample_rate)
+             for f0, g in zip(EQ_BAND_FREQS[1:4], gains[1:4])]
+    rows.append(rbj_shelf(EQ_BAND_FREQS[4], gains[4], high=True, sample_rate=sample_rate))
+    # Las bandas en 0 dB son identidad: no cuestan en el grafo
+    return [row for row, g in zip(rows, gains) if g != 0]
+
+
+def rnnoise_available():
+    """True si la librería RNNoise carga (sin ella los modos corren sin RNNoise)"""
+    from tearis_pipeline import RNNoiseProcessor
+    try:
+        RNNoiseProcessor()
+        return True
+    except RuntimeError:
+        return False
+
+
+def build_pipeline(config, rnnoise=True):
+    """Cadena de una configuración: {mode, eq=True, beamformer='off', channels='stereo', denoiser='rnnoise'}"""
+    denoiser = config.get("denoiser", "rnnoise")
+    pipeline = AudioPipeline(blocksize=BLOCKSIZE, channel_strategy=config.get("channels", "stereo"),
+                             beamformer=config.get("beamformer", "off"), denoiser=denoiser)
+    mode = config["mode"]
+    if config.get("eq", True):
+        pipeline.set_eq(mode, preset_sos(mode))
+    # Sin librnnoise el pipeline caería al espectral: se apaga para no mezclar motores
+    pipeline.set_mode(mode, rnnoise=None if rnnoise or denoiser != "rnnoise" else False)
+    return pipeline
+
+
+# ========== CORPUS ==========
+
+def synth_classroom(n, seed=0):
+    """Ruido de aula: voces de compañeros desde varios ángulos más murmullo rosado"""
+    rng = np.random.default_rng(seed)
+    seconds = n / SAMPLE_RATE
+    noise = np.zeros((n, CHANNELS), dtype=np.float32)
+    for k in range(4):
+        voice = np.roll(synth_speech(seconds, seed=seed * 10 + k + 1), rng.integers(n))
+        noise += rng.uniform(0.5, 1.0) * propagate(voice, rng.uniform(-90.0, 90.0))
+    noise /= np.std(noise) + 1e-12
+    noise += 0.3 * synth_noise(n, correlation=0.5, seed=seed + 11)
+    return noise
+
+
+def synth_transport(n, seed=0):
+    """Ruido de transporte: retumbo de motor (armónicos de 30-60 Hz) sobre ruido marrón"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / SAMPLE_RATE
+    f0 = rng.uniform(30.0, 60.0) * (1.0 + 0.05 * np.sin(2 * np.pi * rng.uniform(0.05, 0.2) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    engine = sum(np.sin(k * phase + rng.uniform(0, 2 * np.pi)) / k for k in range(1, 7))
+    # Marrón: ruido rosado integrado y sin deriva
+    rumble = np.cumsum(synth_noise(n, correlation=0.95, seed=seed + 13), axis=0)
+    rumble -= np.convolve(rumble[:, 0], np.ones(4800) / 4800, mode="same")[:, None]
+    rumble /= np.std(rumble) + 1e-12
+    noise = engine[:, None] / np.std(engine) + rumble
+    noise += 0.2 * synth_noise(n, correlation=0.8, seed=seed + 17)
+    return noise.astype(np.float32)
+
+
+SYNTH_NOISES = {"aula": synth_classroom, "transporte": synth_transport}
+
+
+def _load_wavs(paths):
+    clips = []
+    for path in paths:
+        audio, rate = read_wav(path)
+        if rate != SAMPLE_RATE:
+            logger.warning(f"⚠️ {path}: {rate} Hz (se omite, la cadena trabaja a {SAMPLE_RATE} Hz)")
+            continue
+        clips.append(audio)
+    return clips
+
+
+def _segment(audio, n, rng):
+    """Segmento de `n` muestras (con relleno en silencio si el audio es más corto)"""
+    if audio.shape[0] <= n:
+        out = np.zeros((n,) + audio.shape[1:], dtype=np.float32)
+        out[:audio.shape[0]] = audio
+        return out
+    start = rng.integers(audio.shape[0] - n)
+    return audio[start:start + n].astype(np.float32)
+
+
+def build_corpus(path, clips=200, seconds=CLIP_SECONDS, snrs=SNR_LEVELS, speech_dir=None,
+                 noise_dir=None, seed=0):
+    """
+    Genera el corpus mezclado en `path` (noisy.npy, clean.npy, index.npz)
+
+    Args:
+        speech_dir: WAVs de voz limpia; sin él, voz sintética
+        noise_dir: WAVs de ruido en subcarpetas por tipo (ruidos/aula/*.wav,
+                   ruidos/transporte/*.wav); sin él, ruido sintético
+
+    Returns:
+        dict del índice {noise, snr_db, clips, frames}
+    """
+    os.makedirs(path, exist_ok=True)
+    n = int(seconds * SAMPLE_RATE)
+    rng = np.random.default_rng(seed)
+    speech = _load_wavs(sorted(glob.glob(os.path.join(speech_dir, "*.wav")))) if speech_dir else None
+    if speech_dir and not speech:
+        raise RuntimeError(f"No hay WAVs de voz utilizables en {speech_dir}")
+    noises = {}
+    if noise_dir:
+        for kind_dir in sorted(glob.glob(os.path.join(noise_dir, "*", ""))):
+            loaded = _load_wavs(sorted(glob.glob(os.path.join(kind_dir, "*.wav"))))
+            if loaded:
+                noises[os.path.basename(os.path.dirname(kind_dir))] = loaded
+        if not noises:
+            raise RuntimeError(f"No hay WAVs de ruido en subcarpetas de {noise_dir}")
+    kinds = tuple(noises) if noises else NOISE_KINDS
+
+    shape = (clips, n, CHANNELS)
+    noisy = np.lib.format.open_memmap(os.path.join(path, "noisy.npy"), mode="w+", dtype=np.int16, shape=shape)
+    clean = np.lib.format.open_memmap(os.path.join(path, "clean.npy"), mode="w+", dtype=np.int16, shape=shape)
+    noise_col = np.empty(clips, dtype=f"U{max(len(k) for k in kinds)}")
+    snr_col = np.empty(clips, dtype=np.float32)
+    for i in range(clips):
+        kind = kinds[i % len(kinds)]
+        snr = snrs[(i // len(kinds)) % len(snrs)]
+        if speech:
+            voice = _segment(to_stereo(speech[rng.integers(len(speech))]), n, rng)
+        else:
+            mono = synth_speech(seconds, seed=seed + i)
+            voice = np.stack([mono, rng.uniform(0.85, 1.0) * mono], axis=1)
+        if noises:
+            noise = _segment(to_stereo(noises[kind][rng.integers(len(noises[kind]))]), n, rng)
+        else:
+            noise = SYNTH_NOISES[kind](n, seed=seed + 1000 + i)
+        mix = mix_at_snr(voice, noise, snr)
+        scale = min(1.0, PEAK / (np.max(np.abs(mix)) + 1e-12))
+        noisy[i] = np.round(mix * scale * PCM_SCALE)
+        clean[i] = np.round(voice * scale * PCM_SCALE)
+        noise_col[i] = kind
+        snr_col[i] = snr
+    noisy.flush()
+    clean.flush()
+    del noisy, clean
+    np.savez(os.path.join(path, "index.npz"), noise=noise_col, snr_db=snr_col,
+             rate=SAMPLE_RATE, seconds=seconds)
+    logger.info(f"💾 Corpus: {clips} clips de {seconds:.1f} s ({', '.join(kinds)}) en {path}")
+    return load_index(path)
+
+
+def load_index(path):
+    with np.load(os.path.join(path, "index.npz")) as index:
+        noise, snr = index["noise"], index["snr_db"]
+    clips, frames, _ = np.load(os.path.join(path, "noisy.npy"), mmap_mode="r").shape
+    return {"noise": noise, "snr_db": snr, "clips": clips, "frames": frames}
+
+
+# ========== MÉTRICAS (vectorizadas por lote) ==========
+
+def _rows(audio):
+    """(clips, frames, canales) -> (clips * canales, frames) float64"""
+    return np.ascontiguousarray(np.swapaxes(audio, 1, 2), dtype=np.float64).reshape(-1, audio.shape[1])
+
+
+def align_batch(reference, estimate, max_lag=MAX_LAG):
+    """
+    Retardo de la cadena por clip (correlación cruzada del primer canal)
+
+    Returns:
+        (referencia, estimación) recortadas a frames - max_lag y alineadas
+    """
+    k, n, _ = reference.shape
+    ref = reference[:, :, 0].astype(np.float64)
+    est = estimate[:, :, 0].astype(np.float64)
+    spectrum = np.fft.rfft(est, 2 * n, axis=1) * np.conj(np.fft.rfft(ref, 2 * n, axis=1))
+    lags = np.argmax(np.fft.irfft(spectrum, axis=1)[:, :max_lag + 1], axis=1)
+    m = n - max_lag
+    idx = lags[:, None] + np.arange(m)[None, :]
+    return reference[:, :m], estimate[np.arange(k)[:, None], idx]
+
+
+def _band_starts(n):
+    """
+    Bandas de tercio de octava (desde 50 Hz) de un rfft de n muestras
+
+    Returns:
+        (primer bin de cada banda, banda de cada bin)
+    """
+    freqs = np.fft.rfftfreq(n, 1.0 / SAMPLE_RATE)
+    edges = 50.0 * 2.0 ** (np.arange(31) / 3.0)
+    bands, starts, index = np.unique(np.searchsorted(edges, freqs), return_index=True, return_inverse=True)
+    return starts, index
+
+
+def speech_component(ref, est):
+    """
+    Parte de `est` que es la voz: proyección sobre `ref` con una ganancia
+    compleja por banda de tercio de octava, así el EQ de la cadena (módulo
+    y fase de los biquads) no cuenta como error y lo que baja el ruido en
+    sus bandas sí suma
+
+    Returns:
+        señal de voz en la salida, mismas dimensiones que ref
+    """
+    n = ref.shape[1]
+    starts, band = _band_starts(n)
+    r = np.fft.rfft(ref, axis=1)
+    e = np.fft.rfft(est, axis=1)
+    cross = np.add.reduceat(np.conj(r) * e, starts, axis=1)
+    power = np.add.reduceat(r.real ** 2 + r.imag ** 2, starts, axis=1)
+    gain = cross / (power + 1e-20)
+    return np.fft.irfft(r * gain[:, band], n=n, axis=1)
+
+
+def snr(target, est):
+    """SNR por fila de la salida respecto de su componente de voz"""
+    return 10.0 * np.log10(np.sum(target ** 2, axis=1) / (np.sum((est - target) ** 2, axis=1) + 1e-20) + 1e-20)
+
+
+def _frames(x):
+    f = x.shape[1] // SEG_FRAME
+    return x[:, :f * SEG_FRAME].reshape(x.shape[0], f, SEG_FRAME)
+
+
+def active_frames(ref):
+    """Tramas con voz: energía a menos de ACTIVE_DB del máximo del clip"""
+    energy = np.sum(_frames(ref) ** 2, axis=2)
+    return energy > np.max(energy, axis=1, keepdims=True) * 10.0 ** (ACTIVE_DB / 10.0)
+
+
+def segmental_snr(target, est, active):
+    """SNR segmental (tramas de 20 ms, recortado a SEG_RANGE) sobre las tramas con voz"""
+    t = _frames(target)
+    e = _frames(est) - t
+    seg = 10.0 * np.log10(np.sum(t ** 2, axis=2) / (np.sum(e ** 2, axis=2) + 1e-20) + 1e-20)
+    seg = np.clip(seg, *SEG_RANGE)
+    return np.sum(seg * active, axis=1) / np.maximum(np.sum(active, axis=1), 1)
+
+
+def log_spectral_distance(ref, est, active):
+    """
+    Distancia log-espectral (dB) a la voz limpia en la banda de voz, con la
+    ganancia global compensada y un piso de -50 dB respecto del pico del
+    clip; incluye la coloración del EQ y el ruido residual
+    """
+    window = np.hanning(SEG_FRAME)
+    freqs = np.fft.rfftfreq(SEG_FRAME, 1.0 / SAMPLE_RATE)
+    band = (freqs >= SPEECH_BAND[0]) & (freqs <= SPEECH_BAND[1])
+    pr = np.abs(np.fft.rfft(_frames(ref) * window, axis=2)[:, :, band]) ** 2
+    pe = np.abs(np.fft.rfft(_frames(est) * window, axis=2)[:, :, band]) ** 2
+    pe *= np.sum(pr * active[:, :, None], axis=(1, 2), keepdims=True) / (
+        np.sum(pe * active[:, :, None], axis=(1, 2), keepdims=True) + 1e-20)
+    floor = 1e-5 * np.max(pr, axis=(1, 2), keepdims=True) + 1e-20
+    diff = 10.0 * np.log10((pr + floor) / (pe + floor))
+    lsd = np.sqrt(np.mean(diff ** 2, axis=2))
+    return np.sum(lsd * active, axis=1) / np.maximum(np.sum(active, axis=1), 1)
+
+
+def band_preservation(ref, est):
+    """
+    Parte de la voz que sobrevive en SPEECH_BAND: proyección de la salida
+    sobre la voz limpia en esa banda (0 dB intacta, negativo = voz
+    atenuada por la supresión o el EQ); el ruido residual no la afecta
+    """
+    n = ref.shape[1]
+    freqs = np.fft.rfftfreq(n, 1.0 / SAMPLE_RATE)
+    band = (freqs >= SPEECH_BAND[0]) & (freqs <= SPEECH_BAND[1])
+    r = np.fft.rfft(ref, axis=1)[:, band]
+    e = np.fft.rfft(est, axis=1)[:, band]
+    gain = np.sum((np.conj(r) * e).real, axis=1) / (np.sum(np.abs(r) ** 2, axis=1) + 1e-20)
+    return 20.0 * np.log10(np.maximum(gain, 1e-6))
+
+
+def clip_metrics(clean, noisy, out):
+    """
+    Métricas de un lote de clips ya alineados (clips, frames, canales),
+    promediadas entre canales
+
+    Returns:
+        {métrica: array (clips,)} sin 'rtf'
+    """
+    k = clean.shape[0]
+    ref, mix, est = _rows(clean), _rows(noisy), _rows(out)
+    active = active_frames(ref)
+    voice_in = speech_component(ref, mix)
+    voice_out = speech_component(ref, est)
+    snr_in, snr_out = snr(voice_in, mix), snr(voice_out, est)
+    metrics = {
+        "snr_in_db": snr_in,
+        "snr_out_db": snr_out,
+        "snr_gain_db": snr_out - snr_in,
+        "segsnr_in_db": segmental_snr(voice_in, mix, active),
+        "segsnr_out_db": segmental_snr(voice_out, est, active),
+        "lsd_in_db": log_spectral_distance(ref, mix, active),
+        "lsd_out_db": log_spectral_distance(ref, est, active),
+        "band_keep_db": band_preservation(ref, est),
+    }
+    return {name: values.reshape(k, -1).mean(axis=1) for name, values in metrics.items()}
+
+
+# ========== EVALUACIÓN EN PARALELO ==========
+
+_corpus = {}
+
+
+def _open_corpus(path):
+    """Corpus mapeado en memoria, abierto una vez por proceso"""
+    if path not in _corpus:
+        _corpus[path] = (np.load(os.path.join(path, "noisy.npy"), mmap_mode="r"),
+                         np.load(os.path.join(path, "clean.npy"), mmap_mode="r"))
+    return _corpus[path]
+
+
+def _init_worker():
+    # Los avisos de cada cadena (RNNoise, modo) se repetirían por clip
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _eval_chunk(task):
+    """Una configuración sobre los clips [start, stop): cadena nueva por clip"""
+    path, name, config, rnnoise, start, stop = task
+    noisy_pcm, clean_pcm = _open_corpus(path)
+    noisy = noisy_pcm[start:stop].astype(np.float32) / PCM_SCALE
+    clean = clean_pcm[start:stop].astype(np.float32) / PCM_SCALE
+    out = np.empty_like(noisy)
+    rtf = np.empty(stop - start)
+    for i in range(stop - start):
+        pipeline = build_pipeline(config, rnnoise)
+        out[i], timing = process(noisy[i], pipeline)
+        rtf[i] = timing["rtf"]
+        pipeline.stop_rnnoise()
+    ref, est = align_batch(clean, out)
+    metrics = clip_metrics(ref, noisy[:, :ref.shape[1]], est)
+    metrics["rtf"] = rtf
+    return name, start, metrics
+
+
+def evaluate(path, configs=None, workers=None, chunk=CHUNK):
+    """
+    Todas las configuraciones sobre todo el corpus en un pool de procesos
+
+    Args:
+        configs: {nombre: config} (ver CONFIGS y build_pipeline)
+        workers: procesos del pool (None: todos los núcleos)
+
+    Returns:
+        dict columnar {config, clip, noise, snr_db, <METRICS>, wall_s, workers}
+    """
+    configs = configs or CONFIGS
+    workers = workers or os.cpu_count() or 1
+    index = load_index(path)
+    clips = index["clips"]
+    rnnoise = rnnoise_available()
+    if not rnnoise:
+        logger.warning("⚠️ RNNoise no disponible: los modos se evalúan sin RNNoise (EQ, beamformer, limitador)")
+    names = list(configs)
+    tasks = [(path, name, configs[name], rnnoise, start, min(start + chunk, clips))
+             for name in names for start in range(0, clips, chunk)]
+    columns = {metric: np.zeros((len(names), clips), dtype=np.float32) for metric in METRICS}
+    start_t = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for name, start, metrics in pool.imap_unordered(_eval_chunk, tasks):
+            row = names.index(name)
+            for metric, values in metrics.items():
+                columns[metric][row, start:start + len(values)] = values
+    wall = time.perf_counter() - start_t
+    results = {
+        "config": np.repeat(np.array(names), clips),
+        "clip": np.tile(np.arange(clips, dtype=np.int32), len(names)),
+        "noise": np.tile(index["noise"], len(names)),
+        "snr_db": np.tile(index["snr_db"], len(names)),
+    }
+    results.update({metric: values.reshape(-1) for metric, values in columns.items()})
+    results["wall_s"] = wall
+    results["workers"] = workers
+    results["configs"] = json.dumps(configs)
+    logger.info(f"✅ {len(names)} configuraciones x {clips} clips en {wall:.1f} s con {workers} procesos")
+    return results
+
+
+def save_results(path, results):
+    """Archivo columnar comprimido: un array por columna"""
+    np.savez_compressed(path, **{key: np.asarray(value) for key, value in results.items()})
+
+
+def load_results(path):
+    with np.load(path) as data:
+        return {key: data[key] if data[key].ndim else data[key].item() for key in data.files}
+
+
+def summarize(results):
+    """
+    Promedios por configuración, tipo de ruido y SNR de entrada
+
+    Returns:
+        [(config, ruido, snr, {métrica: promedio})]
+    """
+    rows = []
+    keys = np.stack([results["config"], results["noise"], results["snr_db"].astype(str)], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    for g, (config, noise, level) in enumerate(groups):
+        mask = inverse == g
+        rows.append((config, noise, float(level), {m: float(np.mean(results[m][mask])) for m in METRICS}))
+    return sorted(rows, key=lambda row: row[:3])
+
+
+def scaling(path, configs=None, worker_counts=None, chunk=CHUNK):
+    """
+    Tiempo de reloj de la misma evaluación con 1..N procesos
+
+    Returns:
+        {runs: {procesos: {wall_s, clips_per_s, speedup, efficiency}},
+         identical, cores, results (de la primera corrida)}
+    """
+    cores = os.cpu_count() or 1
+    if worker_counts is None:
+        worker_counts = sorted({1, cores} | {2 ** k for k in range(1, 8) if 2 ** k < cores})
+    runs = {}
+    reference = None
+    identical = True
+    for workers in worker_counts:
+        results = evaluate(path, configs, workers, chunk)
+        runs[workers] = {"wall_s": results["wall_s"], "clips_per_s": len(results["clip"]) / results["wall_s"]}
+        if reference is None:
+            reference = results
+        else:
+            identical = identical and all(np.array_equal(reference[m], results[m])
+                                          for m in METRICS if m != "rtf")
+    base = runs[worker_counts[0]]["wall_s"] * worker_counts[0]
+    for workers, r in runs.items():
+        r["speedup"] = base / r["wall_s"]
+        r["efficiency"] = r["speedup"] / workers
+    return {"runs": runs, "identical": identical, "cores": cores, "results": reference}
+
+
+# ========== BENCHMARK ==========
+
+def benchmark(clips=16, seconds=1.0):
+    """
+    Corpus sintético chico: escalado con los procesos disponibles, métricas
+    finitas e idénticas con cualquier cantidad de procesos, y el reductor
+    de ruido mejorando el SNR (el EQ de transporte es plano, así que su
+    ΔSNR sobre ruido de motor se informa pero no se exige)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        build_corpus(tmp, clips=clips, seconds=seconds, snrs=(0.0, 5.0))
+        report = scaling(tmp, worker_counts=sorted({1, 2, max(2, min(4, os.cpu_count() or 1))}), chunk=4)
+    results = report.pop("results")
+    rows = summarize(results)
+    transport = float(np.mean([m["snr_gain_db"] for config, noise, _, m in rows
+                               if config == "transporte" and noise == "transporte"]))
+    finite = all(np.all(np.isfinite(results[m])) for m in METRICS)
+    report["clips"] = len(results["clip"])
+    for name in CONFIGS:
+        report[f"{name}_snr_gain_db"] = float(np.mean(results["snr_gain_db"][results["config"] == name]))
+    report["transport_snr_gain_db"] = transport
+    report["ok"] = (finite and report["identical"]
+                    and report["escuela_spectral_snr_gain_db"] > report["escuela_snr_gain_db"])
+    return report
+
+
+def print_summary(rows, label=None):
+    if label:
+        print(f"--- {label}")
+    print(f"{'config':<14} {'ruido':<11} {'SNR in':>7} {'ΔSNR':>7} {'segSNR':>13} {'LSD':>13} {'voz':>7} {'RTF':>6}")
+    for config, noise, snr, m in rows:
+        print(f"{config:<14} {noise:<11} {snr:5.0f}dB {m['snr_gain_db']:+6.1f} "
+              f"{m['segsnr_in_db']:5.1f}->{m['segsnr_out_db']:5.1f} "
+              f"{m['lsd_in_db']:5.1f}->{m['lsd_out_db']:5.1f} {m['band_keep_db']:+6.1f} {m['rtf']:6.3f}")
+
+
+def print_scaling(report):
+    print(f"{'procesos':>8} {'reloj':>8} {'clips/s':>8} {'speedup':>8} {'eficiencia':>10}")
+    for workers, r in report["runs"].items():
+        print(f"{workers:8d} {r['wall_s']:7.2f}s {r['clips_per_s']:8.1f} {r['speedup']:7.2f}x {100 * r['efficiency']:9.0f}%")
+    print(f"Núcleos: {report['cores']} | resultados idénticos entre corridas: {'sí' if report['identical'] else 'NO'}")
+
+
+def _parse_configs(names):
+    if not names:
+        return None
+    unknown = [n for n in names if n not in CONFIGS]
+    if unknown:
+        raise ValueError(f"Configuración desconocida: {', '.join(unknown)} (opciones: {', '.join(CONFIGS)})")
+    return {name: CONFIGS[name] for name in names}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    parser = argparse.ArgumentParser(description="Evaluación por lotes de TEARIS sobre corpus")
+    sub = parser.add_subparsers(dest="command")
+    build = sub.add_parser("build", help="generar el corpus mezclado")
+    build.add_argument("corpus")
+    build.add_argument("--clips", type=int, default=200)
+    build.add_argument("--seconds", type=float, default=CLIP_SECONDS)
+    build.add_argument("--snr", type=float, action="append", help="SNR de mezcla (repetible)")
+    build.add_argument("--speech", help="carpeta de WAVs de voz limpia")
+    build.add_argument("--noise", help="carpeta con subcarpetas de WAVs por tipo de ruido")
+    build.add_argument("--seed", type=int, default=0)
+    run = sub.add_parser("eval", help="evaluar configuraciones sobre el corpus")
+    run.add_argument("corpus")
+    run.add_argument("-o", "--output", default="resultados.npz")
+    run.add_argument("--config", action="append", help=f"configuración ({', '.join(CONFIGS)}); repetible")
+    run.add_argument("--workers", type=int)
+    show = sub.add_parser("show", help="resumen de uno o más archivos de resultados")
+    show.add_argument("results", nargs="+")
+    scale = sub.add_parser("scaling", help="tiempo de reloj con 1..N procesos")
+    scale.add_argument("corpus")
+    scale.add_argument("--config", action="append")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "build":
+            build_corpus(args.corpus, clips=args.clips, seconds=args.seconds,
+                         snrs=tuple(args.snr) if args.snr else SNR_LEVELS,
+                         speech_dir=args.speech, noise_dir=args.noise, seed=args.seed)
+        elif args.command == "eval":
+            results = evaluate(args.corpus, _parse_configs(args.config), args.workers)
+            save_results(args.output, results)
+            logger.info(f"💾 {args.output}")
+            print_summary(summarize(results))
+        elif args.command == "show":
+            for path in args.results:
+                print_summary(summarize(load_results(path)), label=path)
+        elif args.command == "scaling":
+            print_scaling(scaling(args.corpus, _parse_configs(args.config)))
+        else:
+            print("=" * 60)
+            print("TEARIS - Evaluación por lotes: corpus sintético chico")
+            print("=" * 60)
+            r = benchmark()
+            for name in CONFIGS:
+                print(f"{name:<14} ΔSNR promedio {r[f'{name}_snr_gain_db']:+.1f} dB")
+            print_scaling(r)
+            print(f"Transporte sobre ruido de motor: ΔSNR {r['transport_snr_gain_db']:+.1f} dB")
+            return 0 if r["ok"] else 1
+    except (RuntimeError, ValueError) as e:
+        logger.error(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
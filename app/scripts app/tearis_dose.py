@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Dosímetro de exposición sonora
+Estima la dosis que realmente llega al oído desde la salida procesada: la
+señal pasa por una ponderación A (cascada SOS diseñada una vez por tasa de
+muestreo) y la energía de cada bloque se acumula en Leq de 1 s, 1 min y de
+la sesión, con pico sin ponderar. Todo es incremental: O(1) por bloque y
+sin historia salvo un array compacto con el Leq de cada minuto.
+
+Calibración: CAL_DB es el nivel (dB SPL) que da un seno de escala completa
+con el auricular del WM8960 a 0 dB; el volumen de hardware se suma con
+set_volume_db (la rampa de software ya viene en las muestras). La dosis
+sigue el criterio de CRITERION_DB durante 8 h con intercambio de 3 dB (NIOSH)
+y, al pasar LIMIT_PCT, avisa para bajar el tope de volumen.
+
+Registro (little endian, RECORD.size = 16 bytes, entra en un MTU de 23):
+    versión u8 | flags u8 | minutos u16 | Leq 1 s | Leq 1 min | Leq sesión
+    | pico 1 s | pico sesión | dosis
+Niveles en u16 de 0.1 dB SPL y dosis en u16 de 0.1 %.
+
+Uso (exactitud de la ponderación y costo por bloque):
+    python3 tearis_dose.py
+"""
+
+import os
+import time
+import struct
+import logging
+import functools
+import numpy as np
+
+from tearis_dsp_graph import SOSNode
+
+logger = logging.getLogger("TEARIS-DOSE")
+
+SAMPLE_RATE = 48000
+# dB SPL de un seno de 0 dBFS con el auricular a 0 dB (medir con acoplador por modelo)
+CAL_DB = float(os.environ.get('TEARIS_DOSE_CAL_DB', '110'))
+# Criterio de 8 h y dosis (%) que dispara el tope de volumen seguro
+CRITERION_DB = float(os.environ.get('TEARIS_DOSE_CRITERION_DB', '85'))
+LIMIT_PCT = float(os.environ.get('TEARIS_DOSE_LIMIT', '100'))
+CRITERION_S = 8 * 3600.0
+MAX_MINUTES = 24 * 60     # historia por minuto: 5.6 kB de float32
+
+RECORD_VERSION = 1
+RECORD = struct.Struct("<BBHHHHHHH")
+FLAG_EXCEEDED = 0x01      # dosis sobre LIMIT_PCT
+FLAG_CLIP = 0x02          # pico a menos de 0.1 dB de la escala completa
+FULL_SCALE_MS = 0.5       # potencia media de un seno de escala completa
+
+# Polos de la ponderación A (IEC 61672-1), Hz
+A_POLES_HZ = (20.598997, 107.65265, 737.86223, 12194.217)
+
+
+@functools.lru_cache(maxsize=None)
+def a_weighting_sos(sample_rate=SAMPLE_RATE):
+    """
+    Ponderación A como 3 biquads (filas [b0, b1, b2, 1, a1, a2]), 0 dB a 1 kHz
+
+    Transformación bilineal; el polo de 12.2 kHz va pre-distorsionado para
+    que a 48 kHz el error quede bajo 0.7 dB hasta 12.5 kHz (clase 1).
+    El resultado se cachea por tasa y es de solo lectura.
+    """
+    k = 2.0 * sample_rate
+
+    def pole(f):
+        s = -2.0 * np.pi * f
+        return (k + s) / (k - s)
+
+    def section(zero, p, q):
+        return [1.0, -2.0 * zero, zero * zero, 1.0, -(p + q), p * q]
+
+    f1, f2, f3, f4 = A_POLES_HZ
+    f4 = sample_rate / np.pi * np.tan(np.pi * f4 / sample_rate)
+    sos = np.array([section(1.0, pole(f1), pole(f1)),
+                    section(1.0, pole(f2), pole(f3)),
+                    section(-1.0, pole(f4), pole(f4))])
+    sos[0, :3] /= abs(sos_response(sos, 1000.0, sample_rate))
+    sos.flags.writeable = False
+    return sos
+
+
+def sos_response(sos, freq, sample_rate=SAMPLE_RATE):
+    """Respuesta compleja de la cascada en `freq` (Hz)"""
+    z = np.exp(-2j * np.pi * np.asarray(freq, dtype=np.float64) / sample_rate)
+    h = 1.0
+    for b0, b1, b2, a0, a1, a2 in sos:
+        h = h * (b0 + b1 * z + b2 * z * z) / (a0 + a1 * z + a2 * z * z)
+    return h
+
+
+def allowed_seconds(level_db, criterion_db=CRITERION_DB, exchange_db=3.0):
+    """Tiempo permitido a un nivel constante (8 h al criterio, la mitad cada 3 dB)"""
+    return CRITERION_S / 2.0 ** ((level_db - criterion_db) / exchange_db)
+
+
+def _db(power):
+    return 10.0 * np.log10(power) if power > 0 else 0.0
+
+
+def _tenths(level_db):
+    return int(round(min(max(level_db, 0.0), 6553.5) * 10))
+
+
+class ExposureMeter:
+    """
+    Leq A de 1 s, 1 min y sesión, pico y dosis desde el tap de salida
+
+    Args:
+        calibration_db: dB SPL de un seno de escala completa con el auricular a 0 dB
+        criterion_db: nivel de 8 h que equivale al 100 % de dosis
+        limit_pct: dosis que dispara on_exceeded (una vez por sesión)
+        on_exceeded: función(dosis_pct) no bloqueante, llamada desde el callback
+    """
+
+    def __init__(self, calibration_db=CAL_DB, criterion_db=CRITERION_DB, limit_pct=LIMIT_PCT,
+                 on_exceeded=None, channels=2, sample_rate=SAMPLE_RATE):
+        self.calibration_db = calibration_db
+        self.criterion_db = criterion_db
+        self.limit_pct = limit_pct
+        self.on_exceeded = on_exceeded
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.weighting = SOSNode(a_weighting_sos(sample_rate), name="a_weighting")
+        self.volume_db = 0.0
+        self._scale = 1.0
+        self._buf = None
+        self._energy = np.zeros(channels)
+        self.minutes = np.full(MAX_MINUTES, np.nan, dtype=np.float32)
+        # Energía de la sesión para el 100 %: potencia del criterio durante 8 h
+        self._dose_energy = 10.0 ** (criterion_db / 10.0) * CRITERION_S * sample_rate
+        self.set_volume_db(0.0)
+        self.reset()
+
+    def set_volume_db(self, gain_db):
+        """Ganancia del auricular de hardware (tearis_control.volume_to_db)"""
+        self.volume_db = float(gain_db)
+        # Potencia media (escala completa = 1) -> potencia relativa a 20 µPa
+        self._scale = 10.0 ** ((self.calibration_db + self.volume_db) / 10.0) / FULL_SCALE_MS
+
+    def reset(self):
+        """Sesión nueva: acumuladores, historia y dosis a cero (fuera del callback)"""
+        self._sec_sum = 0.0
+        self._sec_n = 0
+        self._sec_peak = 0.0
+        self._min_sum = 0.0
+        self._min_n = 0
+        self._session_sum = 0.0
+        self._session_n = 0
+        self.leq_1s = 0.0
+        self.leq_1min = 0.0
+        self.peak_1s_db = 0.0
+        self.peak_db = 0.0
+        self.peak_fs = 0.0
+        self.minutes[:] = np.nan
+        self.minute_count = 0
+        self.seconds = 0
+        self.exceeded = False
+        self.blocks = 0
+        self.compute_time = 0.0
+        self.compute_max = 0.0
+        self.started = time.monotonic()
+
+    # ---------- Callback de audio ----------
+
+    def tap(self, block):
+        """Acumula un bloque de salida (nodo al final del grafo)"""
+        start = time.perf_counter()
+        n = block.shape[0]
+        if self._buf is None or self._buf.shape[0] != n:
+            self._prepare(n)
+        buf = self._buf
+        # Con E/S int16 el tap recibe la salida del códec tal cual
+        if block.dtype == np.int16:
+            np.multiply(block, 1.0 / 32768.0, out=buf)
+        else:
+            np.copyto(buf, block)
+        peak = float(np.max(np.abs(buf)))
+        self.weighting.process(None, buf)
+        # Oído más expuesto: el canal de más energía
+        np.einsum("ij,ij->j", buf, buf, out=self._energy)
+        energy = float(self._energy.max()) * self._scale
+        self._sec_sum += energy
+        self._sec_n += n
+        self._sec_peak = max(self._sec_peak, peak)
+        if self._sec_n >= self.sample_rate:
+            self._close_second()
+        self.blocks += 1
+        elapsed = time.perf_counter() - start
+        self.compute_time += elapsed
+        self.compute_max = max(self.compute_max, elapsed)
+
+    def _prepare(self, n):
+        self.weighting.prepare(n, self.channels, self.sample_rate)
+        self._buf = np.zeros((n, self.channels), dtype=np.float32)
+
+    def _close_second(self):
+        self.leq_1s = _db(self._sec_sum / self._sec_n)
+        peak = self._sec_peak
+        self.peak_1s_db = _db(peak * peak * self._scale)
+        self.peak_db = max(self.peak_db, self.peak_1s_db)
+        self.peak_fs = max(self.peak_fs, peak)
+        self._min_sum += self._sec_sum
+        self._min_n += self._sec_n
+        self._session_sum += self._sec_sum
+        self._session_n += self._sec_n
+        self._sec_sum = 0.0
+        self._sec_n = 0
+        self._sec_peak = 0.0
+        self.seconds += 1
+        if self._min_n >= 60 * self.sample_rate:
+            self.leq_1min = _db(self._min_sum / self._min_n)
+            self.minutes[self.minute_count % MAX_MINUTES] = self.leq_1min
+            self.minute_count += 1
+            self._min_sum = 0.0
+            self._min_n = 0
+        if not self.exceeded and self.dose_pct >= self.limit_pct:
+            self.exceeded = True
+            if self.on_exceeded:
+                self.on_exceeded(self.dose_pct)
+
+    # ---------- Lecturas ----------
+
+    @property
+    def dose_pct(self):
+        """Dosis de la sesión (segundos cerrados) respecto del criterio de 8 h"""
+        return 100.0 * self._session_sum / self._dose_energy
+
+    @property
+    def leq_session(self):
+        return _db(self._session_sum / self._session_n) if self._session_n else 0.0
+
+    def minute_history(self):
+        """Leq de cada minuto, del más viejo al más nuevo (hasta MAX_MINUTES)"""
+        count = min(self.minute_count, MAX_MINUTES)
+        start = self.minute_count - count
+        return np.roll(self.minutes, -(start % MAX_MINUTES))[:count].copy()
+
+    def record(self):
+        """Registro binario de RECORD.size bytes para la característica de dosis"""
+        flags = (FLAG_EXCEEDED if self.exceeded else 0) | (FLAG_CLIP if self.peak_fs > 0.9886 else 0)
+        return RECORD.pack(RECORD_VERSION, flags, min(self.minute_count, 0xFFFF),
+                           _tenths(self.leq_1s), _tenths(self.leq_1min), _tenths(self.leq_session),
+                           _tenths(self.peak_1s_db), _tenths(self.peak_db),
+                           int(round(min(self.dose_pct, 6553.5) * 10)))
+
+    def get_stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "leq_1s_db": self.leq_1s,
+            "leq_1min_db": self.leq_1min,
+            "leq_session_db": self.leq_session,
+            "peak_1s_db": self.peak_1s_db,
+            "peak_db": self.peak_db,
+            "dose_pct": self.dose_pct,
+            "exceeded": self.exceeded,
+            "minutes": self.minute_count,
+            "volume_db": self.volume_db,
+            "compute_avg_us": 1e6 * self.compute_time / self.blocks if self.blocks else 0.0,
+            "compute_max_us": 1e6 * self.compute_max,
+            "cpu_pct": 100.0 * self.compute_time / elapsed,
+        }
+
+
+def decode_record(data):
+    """Registro -> dict (lado app / pruebas)"""
+    version, flags, minutes, leq_1s, leq_1min, leq_session, peak_1s, peak, dose = RECORD.unpack(data)
+    return {
+        "version": version,
+        "exceeded": bool(flags & FLAG_EXCEEDED),
+        "clip": bool(flags & FLAG_CLIP),
+        "minutes": minutes,
+        "leq_1s_db": leq_1s / 10.0,
+        "leq_1min_db": leq_1min / 10.0,
+        "leq_session_db": leq_session / 10.0,
+        "peak_1s_db": peak_1s / 10.0,
+        "peak_db": peak / 10.0,
+        "dose_pct": dose / 10.0,
+    }
+
+
+# ========== BENCHMARK ==========
+
+# Ponderación A nominal (IEC 61672-1, tabla 3)
+IEC_A_DB = {63.0: -26.2, 125.0: -16.1, 250.0: -8.6, 500.0: -3.2, 1000.0: 0.0,
+            2000.0: 1.2, 4000.0: 1.0, 8000.0: -1.1}
+
+
+def _tone_leq(freq, level_dbfs, seconds=2.0, blocksize=960, meter=None):
+    meter = meter or ExposureMeter(calibration_db=100.0)
+    n = int(seconds * meter.sample_rate)
+    t = np.arange(n) / meter.sample_rate
+    tone = (10.0 ** (level_dbfs / 20.0) * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    audio = np.stack([tone, tone], axis=1)
+    for i in range(0, n - blocksize + 1, blocksize):
+        meter.tap(audio[i:i + blocksize])
+    return meter
+
+
+def benchmark(blocksize=960):
+    """
+    Tonos de nivel conocido por el tap: Leq contra la ponderación A nominal,
+    dosis de 1 min a 94 dB(A) contra el criterio, disparo del tope y costo
+    por bloque
+    """
+    # Ponderación: Leq del último segundo de tonos de 0 dBFS calibrados a 100 dB SPL
+    errors = {}
+    for freq, nominal in IEC_A_DB.items():
+        meter = _tone_leq(freq, 0.0, seconds=2.0, blocksize=blocksize)
+        errors[freq] = meter.leq_1s - (100.0 + nominal)
+    # Dosis: 1 kHz a 94 dB(A) con volumen -6 dB (calibración 100): permitido 1 h
+    fired = []
+    meter = ExposureMeter(calibration_db=100.0, limit_pct=1.5, on_exceeded=fired.append)
+    meter.set_volume_db(-6.0)
+    _tone_leq(1000.0, 0.0, seconds=61.0, blocksize=blocksize, meter=meter)
+    expected_dose = 100.0 * 61.0 / allowed_seconds(94.0)
+    record = decode_record(meter.record())
+    stats = meter.get_stats()
+    # Costo con ruido (las muestras no cambian el costo, sí el tamaño de bloque)
+    cost_meter = ExposureMeter()
+    rng = np.random.default_rng(0)
+    block = (0.1 * rng.standard_normal((blocksize, 2))).astype(np.float32)
+    for _ in range(50):
+        cost_meter.tap(block)
+    times = []
+    for _ in range(500):
+        start = time.perf_counter()
+        cost_meter.tap(block)
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1e6
+    budget_us = 1e6 * blocksize / SAMPLE_RATE
+    max_error = max(abs(e) for e in errors.values())
+    result = {
+        "weighting_error_db": {f: round(e, 2) for f, e in errors.items()},
+        "max_weighting_error_db": max_error,
+        "leq_1min_db": stats["leq_1min_db"],
+        "leq_session_db": stats["leq_session_db"],
+        "dose_pct": stats["dose_pct"],
+        "expected_dose_pct": expected_dose,
+        "exceeded": stats["exceeded"],
+        "fired": len(fired),
+        "record_bytes": RECORD.size,
+        "record": record,
+        "history_bytes": meter.minutes.nbytes,
+        "tap_avg_us": float(times.mean()),
+        "tap_p99_us": float(np.percentile(times, 99)),
+        "cpu_pct": 100.0 * float(times.mean()) / budget_us,
+    }
+    # Presupuesto: ponderación a ±1 dB de la nominal (clase 1 admite +1.5 dB a 8 kHz),
+    # dosis a 1 %, un solo disparo y < 2 % de CPU
+    result["ok"] = (max_error <= 1.0 and abs(stats["leq_1min_db"] - 94.0) <= 0.1
+                    and abs(stats["dose_pct"] / expected_dose - 1.0) <= 0.01
+                    and len(fired) == 1 and record["exceeded"] and result["cpu_pct"] < 2.0)
+    return result
+
+
+def main():
+    print("=" * 60)
+    print("TEARIS - Dosímetro: ponderación A, dosis y costo por bloque")
+    print("=" * 60)
+    r = benchmark()
+    print("Error de la ponderación A: " + " ".join(f"{f:.0f} Hz {e:+.2f}" for f, e in r["weighting_error_db"].items()))
+    print(f"94 dB(A) durante 61 s: Leq 1 min {r['leq_1min_db']:.2f} dB | dosis {r['dose_pct']:.3f}% "
+          f"(esperada {r['expected_dose_pct']:.3f}%) | tope {'disparado' if r['fired'] else 'NO disparado'}")
+    print(f"Registro GATT: {r['record_bytes']} bytes | historia por minuto: {r['history_bytes']} bytes")
+    print(f"Costo: {r['tap_avg_us']:.0f} µs por bloque (p99 {r['tap_p99_us']:.0f}) | CPU {r['cpu_pct']:.2f}%")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
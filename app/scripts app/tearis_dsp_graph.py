@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Grafo DSP
+Los nodos (RNNoise, filtros SOS, ganancia, limitador, taps) declaran su
+tamaño de frame y sus canales; el grafo se compila una vez por tamaño de
+bloque en un plan plano, con buffers preasignados y procesamiento en el
+lugar siempre que el nodo lo permite. Cada nodo lleva sus contadores de
+tiempo para ver en qué se va el presupuesto del bloque.
+
+Uso (tiempos por nodo de la cadena de cada modo):
+    python3 tearis_dsp_graph.py
+"""
+
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger("TEARIS-DSP")
+
+SAMPLE_RATE = 48000
+
+# Slots del plan: entrada del callback, salida del callback, buffer propio
+# y buffer de trabajo float (solo con E/S int16)
+SLOT_IN, SLOT_OUT, SLOT_SCRATCH, SLOT_WORK = 0, 1, 2, 3
+
+# Escala de PCM de 16 bits (la que usa RNNoise)
+PCM16_SCALE = 32768.0
+
+# Sub-bloque de SOSNode (muestras): acota las matrices precalculadas
+SOS_SUBBLOCK = 32
+
+
+# ========================================
+# Nodos
+# ========================================
+class Node:
+    """
+    Etapa del grafo
+
+    Atributos que declara cada subclase:
+        frame_size: frames por llamada (None = cualquier bloque); el grafo
+                    parte el bloque en trozos de este tamaño
+        channels: canales que acepta (None = los del grafo)
+        in_place: procesa sobre el mismo buffer; si es False recibe un
+                  buffer de salida aparte
+        accepts_pcm16: puede leer directo la entrada int16 del callback
+                       (escribe float en escala [-1, 1])
+        sink: solo lee el audio (taps); al final del grafo corre sobre la
+              salida ya convertida al formato del stream
+    """
+
+    frame_size = None
+    channels = None
+    in_place = True
+    accepts_pcm16 = False
+    sink = False
+
+    def __init__(self, name=None):
+        self.name = name or type(self).__name__
+        self.reset_timing()
+
+    def prepare(self, blocksize, channels, sample_rate):
+        """Reserva memoria para el tamaño de bloque (fuera del callback)"""
+
+    def process(self, src, dst):
+        """Procesa `src` en `dst` (mismo array si in_place)"""
+        raise NotImplementedError
+
+    def reset_timing(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+
+class GainNode(Node):
+    """Rampa de ganancia de software (tearis_control.GainRamp)"""
+
+    def __init__(self, ramp, name="gain"):
+        super().__init__(name)
+        self.ramp = ramp
+
+    def process(self, src, dst):
+        self.ramp.process(dst)
+
+
+class LimiterNode(Node):
+    """Limitador de picos look-ahead (tearis_limiter.PeakLimiter)"""
+
+    def __init__(self, limiter, name="limiter"):
+        super().__init__(name)
+        self.limiter = limiter
+
+    def process(self, src, dst):
+        self.limiter.process(dst)
+
+
+class VADGateNode(Node):
+    """Atenuación de ruido puro sostenido (tearis_vad.VADScheduler)"""
+
+    def __init__(self, vad, name="vad_gate"):
+        super().__init__(name)
+        self.vad = vad
+
+    def process(self, src, dst):
+        self.vad.apply_gate(dst)
+
+
+class TapNode(Node):
+    """
+    Copia de monitoreo (BLE, grabación, clasificador); no modifica el audio.
+    Con E/S int16 recibe la salida int16 tal cual va al códec.
+
+    Args:
+        func: recibe el bloque; debe ser no bloqueante
+        stage: etapa de tearis_vad.STAGE_POLICIES que decide si corre
+        vad: VADScheduler que aplica la política de la etapa
+    """
+
+    sink = True
+
+    def __init__(self, func, stage=None, vad=None, name="tap"):
+        super().__init__(name)
+        self.func = func
+        self.stage = stage
+        self.vad = vad
+
+    def process(self, src, dst):
+        if self.vad is not None and self.stage and not self.vad.should_run(self.stage):
+            return
+        start = time.perf_counter()
+        self.func(dst)
+        if self.vad is not None and self.stage:
+            self.vad.record(self.stage, time.perf_counter() - start)
+
+
+class SOSNode(Node):
+    """
+    Cascada de biquads (filas [b0, b1, b2, 1, a1, a2], como scipy/iir1)
+
+    Sin scipy: la cascada se pasa a espacio de estados y el bloque se parte
+    en sub-bloques de SOS_SUBBLOCK muestras. Para ese tamaño se precalculan
+    las matrices que llevan (entrada, estado) -> (salida, estado siguiente):
+    el estado avanza de sub-bloque en sub-bloque (matrices de orden x orden)
+    y las salidas de todos los sub-bloques salen de dos productos en lote.
+    El costo por muestra es O(SOS_SUBBLOCK + orden) en lugar de O(bloque),
+    exacto respecto del filtro muestra a muestra y sin asignar memoria en
+    el callback.
+    """
+
+    def __init__(self, sos, name="sos"):
+        super().__init__(name)
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        self.A, self.B, self.C, self.D = self._state_space(self.sos)
+        self.blocksize = None
+
+    @staticmethod
+    def _state_space(sos):
+        """Realización (A, B, C, D) de la cascada de biquads en forma directa II transpuesta"""
+        order = 2 * sos.shape[0]
+        A = np.zeros((order, order))
+        B = np.zeros(order)
+        C = np.zeros(order)
+        D = 1.0
+        for i, (b0, b1, b2, a0, a1, a2) in enumerate(sos):
+            b0, b1, b2, a1, a2 = b0 / a0, b1 / a0, b2 / a0, a1 / a0, a2 / a0
+            k = 2 * i
+            # La entrada de esta sección es la salida de la anterior: C x + D u
+            A[k, :] += (b1 - a1 * b0) * C
+            A[k + 1, :] += (b2 - a2 * b0) * C
+            A[k, k] += -a1
+            A[k, k + 1] += 1.0
+            A[k + 1, k] += -a2
+            B[k] = (b1 - a1 * b0) * D
+            B[k + 1] = (b2 - a2 * b0) * D
+            C = b0 * C
+            C[k] += 1.0
+            D = b0 * D
+        return A, B, C, D
+
+    def prepare(self, blocksize, channels, sample_rate):
+        if self.blocksize == blocksize and self.state.shape[1] == channels:
+            return
+        # Sub-bloque: el mayor divisor del bloque que no pase de SOS_SUBBLOCK
+        n = max(d for d in range(1, min(SOS_SUBBLOCK, blocksize) + 1) if blocksize % d == 0)
+        order = self.A.shape[0]
+        # Respuesta al impulso h[0..n-1] y respuesta a cada estado inicial
+        h = np.empty(n)
+        observ = np.empty((n, order))
+        reach = np.empty((order, n))
+        row = self.C.copy()
+        vec = self.B.copy()
+        h[0] = self.D
+        for k in range(n):
+            observ[k] = row
+            reach[:, n - 1 - k] = vec
+            if k + 1 < n:
+                h[k + 1] = row @ self.B
+            row = row @ self.A
+            vec = self.A @ vec
+        toeplitz = np.zeros((n, n))
+        for k in range(n):
+            toeplitz[k:, k] = h[:n - k]
+        self.T = toeplitz.astype(np.float32)
+        self.O = observ.astype(np.float32)
+        self.R = reach.astype(np.float32)
+        self.An = np.linalg.matrix_power(self.A, n).astype(np.float32)
+        subblocks = blocksize // n
+        self.state = np.zeros((order, channels), dtype=np.float32)
+        # Estado al comienzo de cada sub-bloque (el último es el del bloque siguiente)
+        self._x = np.zeros((subblocks + 1, order, channels), dtype=np.float32)
+        self._u = np.empty((blocksize, channels), dtype=np.float32)
+        self._u3 = self._u.reshape(subblocks, n, channels)
+        self._y = np.empty((subblocks, n, channels), dtype=np.float32)
+        self._yx = np.empty_like(self._y)
+        self._step = np.empty((order, channels), dtype=np.float32)
+        self.blocksize = blocksize
+
+    def process(self, src, dst):
+        u, x = self._u3, self._x
+        np.copyto(self._u, dst)
+        x[0] = self.state
+        for j in range(u.shape[0]):
+            np.matmul(self.An, x[j], out=x[j + 1])
+            np.matmul(self.R, u[j], out=self._step)
+            x[j + 1] += self._step
+        np.matmul(self.T, u, out=self._y)
+        np.matmul(self.O, x[:-1], out=self._yx)
+        self._y += self._yx
+        self.state[:] = x[-1]
+        np.copyto(dst, self._y.reshape(dst.shape))
+
+
+# ---------- Diseño de biquads (RBJ Audio EQ Cookbook, como iir1/RBJ) ----------
+
+def _rbj(b, a):
+    return np.array([b[0] / a[0], b[1] / a[0], b[2] / a[0], 1.0, a[1] / a[0], a[2] / a[0]])
+
+
+def rbj_peaking(f0, gain_db, q=1.0, sample_rate=SAMPLE_RATE):
+    amp = 10.0 ** (gain_db / 40.0)
+    w0 = 2 * np.pi * f0 / sample_rate
+    alpha = np.sin(w0) / (2 * q)
+    cos = np.cos(w0)
+    return _rbj([1 + alpha * amp, -2 * cos, 1 - alpha * amp],
+                [1 + alpha / amp, -2 * cos, 1 - alpha / amp])
+
+
+def rbj_highpass(f0, q=0.7071, sample_rate=SAMPLE_RATE):
+    w0 = 2 * np.pi * f0 / sample_rate
+    alpha = np.sin(w0) / (2 * q)
+    cos = np.cos(w0)
+    return _rbj([(1 + cos) / 2, -(1 + cos), (1 + cos) / 2],
+                [1 + alpha, -2 * cos, 1 - alpha])
+
+
+def rbj_shelf(f0, gain_db, high=False, sample_rate=SAMPLE_RATE):
+    """Shelving bajo (o alto con high=True), pendiente S = 1"""
+    amp = 10.0 ** (gain_db / 40.0)
+    w0 = 2 * np.pi * f0 / sample_rate
+    cos = np.cos(w0)
+    alpha = np.sin(w0) / 2 * np.sqrt(2.0)
+    sq = 2 * np.sqrt(amp) * alpha
+    sign = -1 if high else 1
+    return _rbj([amp * ((amp + 1) - sign * (amp - 1) * cos + sq),
+                 sign * 2 * amp * ((amp - 1) - sign * (amp + 1) * cos),
+                 amp * ((amp + 1) - sign * (amp - 1) * cos - sq)],
+                [(amp + 1) + sign * (amp - 1) * cos + sq,
+                 -sign * 2 * ((amp - 1) + sign * (amp + 1) * cos),
+                 (amp + 1) + sign * (amp - 1) * cos - sq])
+
+
+# ========================================
+# Grafo
+# ========================================
+class DSPGraph:
+    """
+    Cadena lineal de nodos compilada a un plan plano
+
+    compile() valida tamaños de frame y canales, reserva los buffers y
+    decide dónde vive el audio entre etapas: los nodos en el lugar
+    trabajan directo sobre la salida del callback y solo los que no lo son
+    alternan con un buffer propio. run() solo recorre el plan.
+
+    Con E/S int16 el audio se procesa en un buffer float de trabajo: la
+    entrada se convierte una sola vez (o la lee directo un nodo que acepta
+    PCM16, como RNNoise) y la salida se convierte una vez antes de los taps.
+    """
+
+    def __init__(self, nodes, name="graph"):
+        self.nodes = list(nodes)
+        self.name = name
+        self.schedule = None
+        self.blocksize = None
+
+    def compile(self, blocksize, channels, sample_rate=SAMPLE_RATE, dtype=np.float32):
+        for node in self.nodes:
+            if node.frame_size and blocksize % node.frame_size:
+                raise ValueError(f"{node.name}: bloque de {blocksize} no es múltiplo de {node.frame_size}")
+            if node.channels not in (None, channels):
+                raise ValueError(f"{node.name}: espera {node.channels} canales, el grafo tiene {channels}")
+            node.prepare(blocksize, channels, sample_rate)
+
+        self.dtype = np.dtype(dtype)
+        pcm16 = self.dtype == np.int16
+        if not pcm16 and self.dtype != np.float32:
+            raise ValueError(f"Formato de stream no soportado: {self.dtype}")
+        self.scratch = np.zeros((blocksize, channels), dtype=np.float32)
+        self.work = np.zeros((blocksize, channels), dtype=np.float32) if pcm16 else None
+        work = SLOT_WORK if pcm16 else SLOT_OUT
+        # Conversión entre slots: (None, origen, destino, factor)
+        to_work = 1.0 / PCM16_SCALE if pcm16 else 1.0
+        body = list(self.nodes)
+        tail = []
+        while body and body[-1].sink:
+            tail.insert(0, body.pop())
+
+        schedule = []
+        current = SLOT_IN
+        for node in body:
+            step = node.frame_size or blocksize
+            chunks = [slice(i, i + step) for i in range(0, blocksize, step)]
+            if current == SLOT_IN and (node.in_place or (pcm16 and not node.accepts_pcm16)):
+                schedule.append((None, SLOT_IN, work, to_work))
+                current = work
+            if node.in_place:
+                schedule.append((node, current, current, chunks))
+            else:
+                dst = SLOT_SCRATCH if current == work else work
+                schedule.append((node, current, dst, chunks))
+                current = dst
+        if current != SLOT_OUT:
+            factor = PCM16_SCALE if pcm16 and current != SLOT_IN else 1.0
+            schedule.append((None, current, SLOT_OUT, factor))
+        for node in tail:
+            step = node.frame_size or blocksize
+            schedule.append((node, SLOT_OUT, SLOT_OUT, [slice(i, i + step) for i in range(0, blocksize, step)]))
+        self.schedule = schedule
+        self.blocksize = blocksize
+        self.channels = channels
+        self.budget_ns = 1e9 * blocksize / sample_rate
+        return self
+
+    def run(self, indata, outdata):
+        """Ejecuta el plan compilado (llamado desde el callback de audio)"""
+        slots = (indata, outdata, self.scratch, self.work)
+        for node, src, dst, chunks in self.schedule:
+            if node is None:
+                # Copia o conversión de formato en una sola pasada
+                if chunks == 1.0:
+                    np.copyto(slots[dst], slots[src], casting="unsafe")
+                else:
+                    np.multiply(slots[src], chunks, out=slots[dst], casting="unsafe")
+                continue
+            start = time.perf_counter_ns()
+            a, b = slots[src], slots[dst]
+            if len(chunks) == 1:
+                node.process(a, b)
+            else:
+                for chunk in chunks:
+                    node.process(a[chunk], b[chunk])
+            elapsed = time.perf_counter_ns() - start
+            node.calls += 1
+            node.total_ns += elapsed
+            if elapsed > node.max_ns:
+                node.max_ns = elapsed
+
+    def reset_timing(self):
+        for node in self.nodes:
+            node.reset_timing()
+
+    def get_timing(self):
+        """Tiempo por nodo: promedio y máximo en µs y % del presupuesto del bloque"""
+        timing = {}
+        for node in self.nodes:
+            avg_ns = node.total_ns / node.calls if node.calls else 0.0
+            timing[node.name] = {
+                "calls": node.calls,
+                "avg_us": avg_ns / 1000.0,
+                "max_us": node.max_ns / 1000.0,
+                "budget_pct": 100.0 * avg_ns / self.budget_ns if self.schedule else 0.0,
+            }
+        return timing
+
+    def describe(self):
+        names = ("in", "out", "scratch", "work")
+        return " -> ".join(
+            f"{'copy' if chunks == 1.0 else 'convert'}({names[src]}→{names[dst]})" if node is None else
+            f"{node.name}[{names[src]}{'' if src == dst else '→' + names[dst]}"
+            f"{'' if len(chunks) == 1 else f' x{len(chunks)}'}]"
+            for node, src, dst, chunks in self.schedule)
+
+
+def log_timing(timing, log=logger):
+    for name, t in timing.items():
+        log.info(f"   ⏱️ {name:<10} prom {t['avg_us']:7.1f} µs | máx {t['max_us']:7.1f} µs | "
+                 f"{t['budget_pct']:5.2f}% del bloque")
+
+
+# ========== BENCHMARK ==========
+
+def _sos_reference(sos, x):
+    """Filtro muestra a muestra (DF2T) para verificar SOSNode"""
+    y = x.astype(np.float64).copy()
+    for b0, b1, b2, a0, a1, a2 in sos:
+        s1 = np.zeros(y.shape[1])
+        s2 = np.zeros(y.shape[1])
+        out = np.empty_like(y)
+        for n in range(y.shape[0]):
+            v = y[n]
+            o = b0 * v + s1
+            s1 = b1 * v - a1 * o + s2
+            s2 = b2 * v - a2 * o
+            out[n] = o
+        y = out
+    return y
+
+
+def benchmark(blocks=500, blocksize=960):
+    """
+    Verifica SOSNode contra el filtro muestra a muestra y mide el tiempo
+    por nodo de la cadena de cada modo (RNNoise solo si está compilado)
+    """
+    from tearis_pipeline import AudioPipeline, CHANNELS
+
+    rng = np.random.default_rng(0)
+    sos = np.vstack([rbj_highpass(100.0), rbj_peaking(2500.0, 4.0, 1.2), rbj_shelf(6000.0, -3.0, high=True)])
+    x = (0.1 * rng.standard_normal((3 * blocksize, CHANNELS))).astype(np.float32)
+    node = SOSNode(sos)
+    node.prepare(blocksize, CHANNELS, SAMPLE_RATE)
+    y = np.empty_like(x)
+    for i in range(0, x.shape[0], blocksize):
+        block = x[i:i + blocksize].copy()
+        node.process(block, block)
+        y[i:i + blocksize] = block
+    sos_error = float(np.max(np.abs(y - _sos_reference(sos, x))))
+
+    results = {"sos_max_error": sos_error}
+    indata = (0.1 * rng.standard_normal((blocksize, CHANNELS))).astype(np.float32)
+    outdata = np.empty_like(indata)
+    for mode in ("normal", "escuela", "transporte"):
+        pipeline = AudioPipeline(tap=lambda block: None)
+        pipeline.set_mode(mode)
+        for _ in range(blocks):
+            pipeline.callback(indata, outdata, blocksize, None, None)
+        timing = pipeline.graph.get_timing()
+        results[mode] = {"plan": pipeline.graph.describe(), "nodes": timing,
+                         "total_us": sum(t["avg_us"] for t in timing.values())}
+        pipeline.stop_rnnoise()
+    results["ok"] = sos_error < 1e-4
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Grafo DSP: tiempo por nodo")
+    print("=" * 60)
+    r = benchmark()
+    print(f"SOS por bloques vs. muestra a muestra: error máx {r['sos_max_error']:.2e}")
+    for mode in ("normal", "escuela", "transporte"):
+        print(f"\n[{mode}] {r[mode]['plan']}")
+        for name, t in r[mode]["nodes"].items():
+            print(f"   {name:<10} prom {t['avg_us']:7.1f} µs | máx {t['max_us']:7.1f} µs | "
+                  f"{t['budget_pct']:5.2f}% del bloque")
+        print(f"   total      {r[mode]['total_us']:7.1f} µs")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Detección de ambiente en cascada y cambio de modo automático
+Primera etapa (casi gratis, en cada bloque): energía por bandas y flujo
+espectral del audio de entrada. Solo cuando esos rasgos cambian de forma
+sostenida corre la segunda etapa, el clasificador de Edge Impulse de IA/
+(MFCC + red, "Bocina" / "voces"), y su resultado elige el modo con
+histéresis. Si el usuario elige un modo desde la app, el automático queda
+en pausa hasta que la app vuelva a escribir "auto".
+
+El clasificador se compila como librería compartida:
+    cd IA && make            # -> IA/build/libtearis_ei.so (o TEARIS_EI_LIB)
+
+Uso (CPU de la cascada vs. inferencia continua sobre una escena simulada):
+    python3 tearis_environment.py
+"""
+
+import os
+import time
+import threading
+import logging
+import ctypes
+import numpy as np
+
+from tearis_limiter import normalize_mode
+
+logger = logging.getLogger("TEARIS-ENV")
+
+SAMPLE_RATE = 48000
+FEATURE_FRAME = 960            # 20 ms por cálculo de rasgos
+FEATURE_HOP = 4800             # un frame de rasgos cada 100 ms
+BAND_EDGES = (0, 250, 500, 1000, 2000, 4000, 8000, 24000)
+
+# Etiquetas del modelo (IA/model-parameters/model_variables.h) -> modo
+LABEL_MODES = {"voces": "escuela", "Bocina": "transporte"}
+QUIET_MODE = "normal"
+EI_THRESHOLD = 0.6             # EI_CLASSIFIER_THRESHOLD del modelo
+
+# Primera etapa
+FEATURE_SMOOTHING = 0.8        # promedio de ~0.5 s de los rasgos
+CHANGE_DB = 6.0                # cambio medio por banda que dispara la segunda etapa
+FLUX_CHANGE = 0.12             # cambio del flujo espectral normalizado
+QUIET_DB = -50.0               # nivel suavizado por debajo del cual no se infiere
+QUIET_HOLD_S = 10.0            # silencio sostenido que cuenta como ambiente "normal"
+RECHECK_S = 120.0              # reconfirmar aunque no cambie nada
+MIN_INTERVAL_S = 2.0           # entre inferencias
+
+# Histéresis del cambio de modo
+CONFIRMATIONS = 2              # inferencias seguidas con el mismo resultado
+CONFIRM_DELAY_S = 3.0          # espera hasta la inferencia de confirmación
+MIN_DWELL_S = 30.0             # tiempo mínimo en un modo antes de cambiar
+
+
+def _find_ei_lib():
+    here = os.path.dirname(os.path.abspath(__file__))
+    candidates = [
+        os.environ.get("TEARIS_EI_LIB"),
+        "/opt/tearis/libtearis_ei.so",
+        os.path.join(here, "..", "..", "IA", "build", "libtearis_ei.so"),
+    ]
+    for path in candidates:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+# ========================================
+# Segunda etapa: clasificador de Edge Impulse
+# ========================================
+class EdgeImpulseClassifier:
+    """
+    Modelo de IA/ cargado con ctypes (ver IA/tearis_ei.cpp)
+
+    Recibe 1 s de audio mono a 48 kHz, lo remuestrea a la frecuencia del
+    modelo y devuelve {etiqueta: probabilidad}.
+    """
+
+    def __init__(self, lib_path=None):
+        lib_path = lib_path or _find_ei_lib()
+        if not lib_path:
+            raise RuntimeError("No se encontró el clasificador compilado (cd IA && make)")
+        self.lib = ctypes.CDLL(lib_path)
+        self.lib.tearis_ei_sample_count.restype = ctypes.c_size_t
+        self.lib.tearis_ei_frequency.restype = ctypes.c_int
+        self.lib.tearis_ei_label_count.restype = ctypes.c_size_t
+        self.lib.tearis_ei_label.restype = ctypes.c_char_p
+        self.lib.tearis_ei_label.argtypes = [ctypes.c_size_t]
+        self.lib.tearis_ei_classify.restype = ctypes.c_int
+        self.lib.tearis_ei_classify.argtypes = [ctypes.POINTER(ctypes.c_float), ctypes.c_size_t,
+                                                ctypes.POINTER(ctypes.c_float)]
+        self.samples = int(self.lib.tearis_ei_sample_count())
+        self.rate = int(self.lib.tearis_ei_frequency())
+        self.labels = [self.lib.tearis_ei_label(i).decode()
+                       for i in range(self.lib.tearis_ei_label_count())]
+        # Ventana de entrada a 48 kHz y posiciones del remuestreo
+        self.window = int(round(self.samples * SAMPLE_RATE / self.rate))
+        self._positions = np.arange(self.samples) * (SAMPLE_RATE / self.rate)
+        self._grid = np.arange(self.window)
+        self._input = np.zeros(self.samples, dtype=np.float32)
+        self._scores = np.zeros(len(self.labels), dtype=np.float32)
+        self._in_ptr = self._input.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+        self._scores_ptr = self._scores.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+        logger.info(f"🧠 Clasificador de ambiente: {lib_path} ({', '.join(self.labels)})")
+
+    def classify(self, audio):
+        """`audio`: self.window muestras mono a 48 kHz"""
+        self._input[:] = np.interp(self._positions, self._grid, audio)
+        err = self.lib.tearis_ei_classify(self._in_ptr, self.samples, self._scores_ptr)
+        if err != 0:
+            raise RuntimeError(f"Edge Impulse devolvió {err}")
+        return dict(zip(self.labels, self._scores.tolist()))
+
+
+class StandInClassifier:
+    """
+    Reemplazo del modelo de IA/ para medir la cascada sin la librería
+    compilada: mismo trabajo aproximado (remuestreo a 44.1 kHz, MFCC de
+    50 frames x 13 coeficientes y una red densa de pesos fijos) y puntajes
+    de reglas simples sobre el mismo espectro (pico tonal -> "Bocina",
+    modulación silábica -> "voces"). La red copia la forma de la de
+    IA/tflite-model (conv 13->8, pool, conv 8->16, pool, densa 208->2).
+    No se usa en el equipo.
+    """
+
+    labels = ["Bocina", "voces"]
+
+    def __init__(self, rate=44100, cepstra=13, filters=32, fft=1024, seed=0):
+        self.rate = rate
+        self.samples = rate
+        self.window = int(round(self.samples * SAMPLE_RATE / rate))
+        self._positions = np.arange(self.samples) * (SAMPLE_RATE / rate)
+        self._grid = np.arange(self.window)
+        self.frame = int(0.02 * rate)
+        self.frames = self.samples // self.frame
+        self.fft = fft
+        self._hamming = np.hamming(self.frame).astype(np.float32)
+        freqs = np.fft.rfftfreq(fft, 1.0 / rate)
+        self._tonal_band = (freqs >= 200.0) & (freqs < 2000.0)
+        # Banco mel triangular y DCT-II
+        mel = 2595.0 * np.log10(1.0 + np.array([0.0, rate / 2.0]) / 700.0)
+        hz = 700.0 * (10.0 ** (np.linspace(mel[0], mel[1], filters + 2) / 2595.0) - 1.0)
+        self._mel = np.zeros((freqs.shape[0], filters), dtype=np.float32)
+        for m in range(filters):
+            lo, mid, hi = hz[m:m + 3]
+            self._mel[:, m] = np.clip(np.minimum((freqs - lo) / (mid - lo), (hi - freqs) / (hi - mid)), 0.0, None)
+        k = np.arange(filters)
+        self._dct = np.cos(np.pi / filters * (k[:, None] + 0.5) * np.arange(cepstra)[None, :]).astype(np.float32)
+        rng = np.random.default_rng(seed)
+        self._conv1 = (rng.standard_normal((3 * cepstra, 8)) / np.sqrt(3 * cepstra)).astype(np.float32)
+        self._conv2 = (rng.standard_normal((3 * 8, 16)) / np.sqrt(3 * 8)).astype(np.float32)
+        self._dense = (rng.standard_normal((13 * 16, len(self.labels))) / np.sqrt(13 * 16)).astype(np.float32)
+        self._input = np.zeros(self.samples, dtype=np.float32)
+
+    def classify(self, audio):
+        """`audio`: self.window muestras mono a 48 kHz"""
+        x = self._input
+        x[:] = np.interp(self._positions, self._grid, audio)
+        x[1:] -= 0.98 * x[:-1].copy()
+        frames = x[:self.frames * self.frame].reshape(self.frames, self.frame) * self._hamming
+        power = np.abs(np.fft.rfft(frames, n=self.fft, axis=1)) ** 2
+        mfcc = np.log(power @ self._mel + 1e-10) @ self._dct
+        # La red de pesos fijos solo aporta el costo de la inferencia
+        self._network(mfcc)
+
+        energy_db = 10.0 * np.log10(power.sum(axis=1) + 1e-12)
+        loud = energy_db > energy_db.max() - 30.0
+        modulation = float(np.std(energy_db[loud])) if np.count_nonzero(loud) > 2 else 0.0
+        average = power[:, self._tonal_band].mean(axis=0)
+        peak_db = 10.0 * np.log10(average.max() / (np.median(average) + 1e-20) + 1e-12)
+        horn = 1.0 / (1.0 + np.exp(-(peak_db - 12.0) / 2.0))
+        voices = (1.0 - horn) / (1.0 + np.exp(-(modulation - 4.5) / 0.7))
+        return {"Bocina": float(horn), "voces": float(voices)}
+
+    def _network(self, features):
+        x = features
+        for weights in (self._conv1, self._conv2):
+            padded = np.pad(x, ((1, 1), (0, 0)))
+            windows = np.lib.stride_tricks.sliding_window_view(padded, 3, axis=0)
+            x = np.maximum(windows.reshape(x.shape[0], -1) @ weights, 0.0)
+            if x.shape[0] % 2:
+                x = np.vstack([x, x[-1:]])
+            x = x.reshape(-1, 2, x.shape[1]).max(axis=1)
+        logits = x.reshape(-1) @ self._dense
+        return np.exp(logits - logits.max()) / np.sum(np.exp(logits - logits.max()))
+
+
+# ========================================
+# Primera etapa: rasgos por bandas
+# ========================================
+class BandFeatures:
+    """Energía por bandas (dBFS) y flujo espectral normalizado de cada frame"""
+
+    def __init__(self, frame=FEATURE_FRAME, sample_rate=SAMPLE_RATE, edges=BAND_EDGES):
+        self.window = np.hanning(frame).astype(np.float32)
+        self.norm = 4.0 / float(np.sum(self.window)) ** 2
+        freqs = np.fft.rfftfreq(frame, 1.0 / sample_rate)
+        bands = len(edges) - 1
+        self.matrix = np.zeros((freqs.shape[0], bands), dtype=np.float32)
+        for b in range(bands):
+            self.matrix[(freqs >= edges[b]) & (freqs < edges[b + 1]), b] = 1.0
+        self._prev = np.zeros(freqs.shape[0], dtype=np.float32)
+        self.bands_db = np.full(bands, -120.0)
+        self.flux = 0.0
+        self.level_db = -120.0
+
+    def update(self, frame):
+        magnitude = np.abs(np.fft.rfft(frame * self.window)).astype(np.float32)
+        power = magnitude * magnitude
+        bands_db = 10.0 * np.log10(self.norm * (power @ self.matrix) + 1e-12)
+        flux = float(np.sum(np.maximum(magnitude - self._prev, 0.0)) / (np.sum(magnitude) + 1e-9))
+        self._prev = magnitude
+        a = FEATURE_SMOOTHING
+        self.bands_db = a * self.bands_db + (1.0 - a) * bands_db
+        self.flux = a * self.flux + (1.0 - a) * flux
+        level_db = 10.0 * np.log10(self.norm * float(np.sum(power)) + 1e-12)
+        self.level_db = a * self.level_db + (1.0 - a) * level_db
+        return self.bands_db, self.flux
+
+
+class MonoRing:
+    """Últimos segundos del audio de entrada, en mono; se escribe desde el callback"""
+
+    def __init__(self, seconds=2.0, sample_rate=SAMPLE_RATE):
+        self.size = int(seconds * sample_rate)
+        self.data = np.zeros(self.size, dtype=np.float32)
+        self.written = 0
+
+    def write(self, block):
+        n = block.shape[0]
+        pos = self.written % self.size
+        first = min(n, self.size - pos)
+        np.add(block[:first, 0], block[:first, -1], out=self.data[pos:pos + first])
+        self.data[pos:pos + first] *= 0.5
+        if first < n:
+            np.add(block[first:, 0], block[first:, -1], out=self.data[:n - first])
+            self.data[:n - first] *= 0.5
+        self.written += n
+
+    def read(self, start, out):
+        """Copia a `out` las muestras desde `start` (índice absoluto)"""
+        n = out.shape[0]
+        pos = start % self.size
+        first = min(n, self.size - pos)
+        out[:first] = self.data[pos:pos + first]
+        if first < n:
+            out[first:] = self.data[:n - first]
+        return out
+
+
+# ========================================
+# Cascada
+# ========================================
+class EnvironmentCascade:
+    """
+    Rasgos baratos en cada frame, clasificador solo ante cambios, y modo
+    con histéresis
+
+    Args:
+        apply_mode: función que cambia el modo (se llama desde el hilo de
+                    la cascada)
+        classifier: segunda etapa; None intenta cargar el de Edge Impulse
+        auto: arrancar con el cambio automático habilitado
+        dwell: tiempo mínimo (s) en un modo antes de cambiar
+        vad: función sin argumentos que devuelve el VADScheduler de la
+             cadena (o None); en silencios largos la reconfirmación
+             periódica no corre el clasificador, un cambio de escena sí
+    """
+
+    def __init__(self, apply_mode, classifier=None, auto=True, current_mode="normal", dwell=MIN_DWELL_S,
+                 vad=None):
+        self.apply_mode = apply_mode
+        self.dwell = dwell
+        self.vad = vad
+        if classifier is None:
+            try:
+                classifier = EdgeImpulseClassifier()
+            except (RuntimeError, OSError) as e:
+                logger.warning(f"⚠️ {e}: sin cambio automático de modo")
+        self.classifier = classifier
+        self.auto = auto and classifier is not None
+        self.current = normalize_mode(current_mode)
+        self.ring = MonoRing()
+        self.features = BandFeatures()
+        self._frame = np.zeros(FEATURE_FRAME, dtype=np.float32)
+        self._window = np.zeros(classifier.window if classifier else SAMPLE_RATE, dtype=np.float32)
+        self._consumed = 0
+        self._reference = None
+        self._reference_flux = 0.0
+        self._last_inference = -1e9
+        self._last_skip = -1e9
+        self._last_switch = -1e9
+        self._quiet_since = None
+        self._confirm_at = None
+        self.candidate = None
+        self.votes = 0
+        self.last_scores = {}
+        self._running = False
+        self._thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.inferences = 0
+        self.switches = 0
+        self.stage1_time = 0.0
+        self.stage2_time = 0.0
+        self.started = time.monotonic()
+
+    # ---------- Callback de audio ----------
+
+    def tap(self, block):
+        """Copia el bloque de entrada al ring (nodo al inicio del grafo)"""
+        self.ring.write(block)
+
+    # ---------- Control ----------
+
+    def set_auto(self, enabled):
+        enabled = bool(enabled) and self.classifier is not None
+        if enabled and not self.auto:
+            # Volver a automático: decidir desde cero con la escena actual
+            self._reference = None
+            self.candidate, self.votes = None, 0
+        self.auto = enabled
+        logger.info(f"🤖 Modo automático {'activado' if enabled else 'desactivado'}")
+
+    def override(self, mode):
+        """El usuario eligió un modo: se respeta hasta que vuelva a pedir 'auto'"""
+        self.current = normalize_mode(mode)
+        if self.auto:
+            logger.info(f"✋ Modo {self.current} elegido por el usuario: automático en pausa")
+        self.auto = False
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="env-cascade", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def _worker(self):
+        while self._running:
+            time.sleep(0.1)
+            self.poll(time.monotonic())
+
+    # ---------- Etapas ----------
+
+    def poll(self, now):
+        """Procesa los frames nuevos del ring y decide si correr el clasificador"""
+        written = self.ring.written
+        if written - self._consumed > self.ring.size:
+            self._consumed = written - FEATURE_FRAME
+        triggered = False
+        while written - self._consumed >= FEATURE_HOP:
+            start = time.perf_counter()
+            self.ring.read(self._consumed, self._frame)
+            self._consumed += FEATURE_HOP
+            bands, flux = self.features.update(self._frame)
+            self.frames += 1
+            triggered = triggered or self._changed(bands, flux)
+            self.stage1_time += time.perf_counter() - start
+        if not self.auto or written < self._window.shape[0]:
+            return
+        if self.features.level_db < QUIET_DB:
+            # Silencio: no hace falta la red para saber que no hay voces ni
+            # bocinas; las pausas cortas (entre frases) no votan
+            if self._quiet_since is None:
+                self._quiet_since = now
+            elif now - self._quiet_since >= QUIET_HOLD_S:
+                self.last_scores = {}
+                self._vote(QUIET_MODE, now)
+            return
+        self._quiet_since = None
+        due = self._confirm_at is not None and now >= self._confirm_at
+        recheck = now - max(self._last_inference, self._last_skip) >= RECHECK_S
+        if (triggered or due or recheck) and now - self._last_inference >= MIN_INTERVAL_S:
+            vad = self.vad() if self.vad else None
+            # Sin voz hace rato: solo un cambio de escena (p. ej. una bocina) justifica la red
+            if vad is not None and not vad.should_run("classifier", force=triggered or due):
+                self._last_skip = now
+                return
+            self._infer(written, now, vad)
+
+    def _changed(self, bands, flux):
+        if self._reference is None:
+            return True
+        change_db = float(np.mean(np.abs(bands - self._reference)))
+        return change_db > CHANGE_DB or abs(flux - self._reference_flux) > FLUX_CHANGE
+
+    def _infer(self, written, now, vad=None):
+        start = time.perf_counter()
+        self.ring.read(written - self._window.shape[0], self._window)
+        scores = self.classifier.classify(self._window)
+        elapsed = time.perf_counter() - start
+        self.stage2_time += elapsed
+        if vad is not None:
+            vad.record("classifier", elapsed)
+        self.inferences += 1
+        self.last_scores = scores
+        self._last_inference = now
+        self._reference = self.features.bands_db.copy()
+        self._reference_flux = self.features.flux
+        label, score = max(scores.items(), key=lambda item: item[1])
+        mode = LABEL_MODES.get(label, QUIET_MODE) if score >= EI_THRESHOLD else QUIET_MODE
+        self._vote(mode, now)
+
+    def _vote(self, mode, now):
+        """Histéresis: CONFIRMATIONS resultados iguales y self.dwell en el modo actual"""
+        if mode == self.current:
+            self.candidate, self.votes, self._confirm_at = None, 0, None
+            return
+        if mode == self.candidate:
+            self.votes += 1
+        else:
+            self.candidate, self.votes = mode, 1
+        if self.votes < CONFIRMATIONS:
+            self._confirm_at = now + CONFIRM_DELAY_S
+            return
+        if now - self._last_switch < self.dwell:
+            return
+        logger.info(f"🤖 Ambiente: {self.current} -> {mode} | {self._describe_scores()}")
+        self.current = mode
+        self._last_switch = now
+        self.switches += 1
+        self.candidate, self.votes, self._confirm_at = None, 0, None
+        self.apply_mode(mode)
+
+    def _describe_scores(self):
+        return ", ".join(f"{label} {score:.2f}" for label, score in self.last_scores.items()) or "silencio"
+
+    # ---------- Métricas ----------
+
+    def get_stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "auto": self.auto,
+            "mode": self.current,
+            "candidate": self.candidate,
+            "frames": self.frames,
+            "inferences": self.inferences,
+            "switches": self.switches,
+            "stage1_us_per_frame": 1e6 * self.stage1_time / self.frames if self.frames else 0.0,
+            "stage2_ms_per_inference": 1e3 * self.stage2_time / self.inferences if self.inferences else 0.0,
+            "cpu_pct": 100.0 * (self.stage1_time + self.stage2_time) / elapsed,
+            "scores": dict(self.last_scores),
+        }
+
+
+# ========== BENCHMARK ==========
+
+def _scene(seconds, seed=0):
+    """Aula en silencio -> clase (voces) -> calle (bocinas y tránsito), en tercios"""
+    from tearis_offline import synth_speech, synth_noise
+
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    third = n // 3
+    audio = 0.001 * rng.standard_normal(n).astype(np.float32)
+    speech = synth_speech(third / SAMPLE_RATE, seed=seed)
+    audio[third:2 * third] += speech[:third]
+    t = np.arange(n - 2 * third) / SAMPLE_RATE
+    horn = 0.2 * np.sign(np.sin(2 * np.pi * 420.0 * t)) * (np.sin(2 * np.pi * 0.4 * t) > 0.6)
+    traffic = 0.05 * synth_noise(n - 2 * third, channels=1, seed=seed + 1)[:, 0]
+    audio[2 * third:] += (horn + traffic).astype(np.float32)
+    return np.repeat(audio[:, None], 2, axis=1)
+
+
+def benchmark(seconds=90.0, blocksize=960):
+    """
+    Misma escena por la cascada y por inferencia continua (una ventana de
+    1 s por segundo): inferencias, CPU promedio y modos elegidos. Sin la
+    librería de IA/ compilada se mide con StandInClassifier
+    """
+    try:
+        classifier = EdgeImpulseClassifier()
+    except (RuntimeError, OSError) as e:
+        logger.info(f"ℹ️ {e}: se mide con el clasificador de reemplazo")
+        classifier = StandInClassifier()
+    audio = _scene(seconds)
+
+    modes = []
+    cascade = EnvironmentCascade(modes.append, classifier=classifier, dwell=5.0)
+    for i in range(0, audio.shape[0] - blocksize + 1, blocksize):
+        cascade.tap(audio[i:i + blocksize])
+        now = (i + blocksize) / SAMPLE_RATE
+        if (i // blocksize) % 5 == 4:
+            cascade.poll(now)
+    stats = cascade.get_stats()
+    cascade_s = cascade.stage1_time + cascade.stage2_time
+
+    # Inferencia continua: una ventana por segundo de audio
+    window = np.ascontiguousarray(audio[:classifier.window, 0])
+    start = time.perf_counter()
+    always = int(seconds)
+    for _ in range(always):
+        classifier.classify(window)
+    always_s = time.perf_counter() - start
+
+    return {
+        "classifier": type(classifier).__name__,
+        "inferences_cascade": stats["inferences"],
+        "inferences_always_on": always,
+        "stage1_us_per_frame": stats["stage1_us_per_frame"],
+        "stage2_ms_per_inference": stats["stage2_ms_per_inference"],
+        "cascade_cpu_pct": 100.0 * cascade_s / seconds,
+        "always_on_cpu_pct": 100.0 * always_s / seconds,
+        "modes": " -> ".join(modes) or "-",
+        "ok": cascade_s < always_s,
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Ambiente en cascada vs. inferencia continua")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Clasificador: {r['classifier']}")
+    print(f"Cascada:   {r['inferences_cascade']} inferencias | CPU prom {r['cascade_cpu_pct']:.3f}% "
+          f"(rasgos {r['stage1_us_per_frame']:.1f} µs/frame, red {r['stage2_ms_per_inference']:.2f} ms)")
+    print(f"Continua:  {r['inferences_always_on']} inferencias | CPU prom {r['always_on_cpu_pct']:.3f}%")
+    print(f"Modos elegidos: {r['modes']}")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
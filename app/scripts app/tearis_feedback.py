@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Cancelador de realimentación acústica
+En los modos de paso directo la salida de los auriculares (abiertos) se
+filtra de vuelta a los INMP441 y, con ganancia alta, el lazo silba. El
+cancelador modela ese camino con la salida que la cadena ya entregó como
+referencia y resta su estimación de los micrófonos antes del resto de la
+cadena.
+
+Filtro adaptivo NLMS en frecuencia por bloques particionados (PBFDAF):
+bloques de 480 muestras (un frame de RNNoise), FFT de 960 y PARTITIONS
+particiones del camino (80 ms) después del retardo del lazo: un bloque
+del stream (la referencia de un frame es la salida de hace un bloque) más
+el retardo fijo de los buffers de entrada y salida del códec, que la
+ventana de 80 ms no alcanza a cubrir (con latency=0.25 son ~500 ms). Ese
+retardo se estima de la latencia que informa el stream (set_delay) y se
+descuenta en la cola de referencia, con una partición de margen para que
+el camino real empiece dentro de la ventana. Por frame cuesta 5 FFT por
+canal: referencia, estimación, error y la restricción de gradiente de una
+sola partición por vez (alternada, como el MDF de Speex). Se modela el camino de cada auricular
+a su micrófono; el cruce entre lados queda fuera (la cabeza lo atenúa).
+
+Protección contra divergencia: si la salida del cancelador supera a la
+de los micrófonos se entrega el micrófono sin tocar; si eso se sostiene,
+o el filtro deja de ser finito o gana más que MAX_PATH_DB, se reinicia.
+
+Uso (camino de fuga simulado en lazo cerrado, convergencia y CPU):
+    python3 tearis_feedback.py
+"""
+
+import logging
+import numpy as np
+
+from tearis_dsp_graph import Node, PCM16_SCALE
+
+logger = logging.getLogger("TEARIS-FEEDBACK")
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+FRAME_SIZE = 480          # bloque del filtro = frame de RNNoise
+FFT_SIZE = 2 * FRAME_SIZE
+PARTITIONS = 8            # largo del camino modelado: 8 x 10 ms
+
+# Paso variable (como el MDF de Speex): por bin, la fracción del error que
+# es realimentación residual. La voz propia en los micrófonos es mucho más
+# fuerte que la fuga, y con paso fijo el filtro nunca se asienta
+STEP = 0.25               # paso fijo hasta la primera convergencia
+STEP_MAX = 0.5            # tope del paso variable
+SPEC_AVERAGE = FRAME_SIZE / SAMPLE_RATE        # promedio de |E|², |Y|² por bin
+LEAK_BETA0 = 2.0 * FRAME_SIZE / SAMPLE_RATE    # correlación error/estimación
+LEAK_BETA_MAX = 0.5 * FRAME_SIZE / SAMPLE_RATE
+MIN_LEAK = 0.005
+POWER_SMOOTHING = 0.9     # potencia de la referencia por bin
+REGULARIZATION = 1e-6     # piso de la potencia (referencia en silencio)
+REF_FRAMES = 16           # cola de frames de salida pendientes de usar
+DELAY_MARGIN_S = 0.010    # margen del retardo fijo: el error de la latencia informada
+
+# Divergencia
+DIVERGE_RATIO = 2.0       # error más fuerte que el micrófono (potencia)
+DIVERGE_FRAMES = 50       # frames seguidos (~0.5 s) antes de reiniciar
+MAX_PATH_DB = 12.0        # ganancia máxima plausible del camino modelado
+PATH_CHECK_FRAMES = 100   # cada cuánto se revisa esa ganancia (~1 s)
+METRIC_SMOOTHING = 0.95   # ERLE (~200 ms)
+
+
+class FeedbackCanceller:
+    """
+    PBFDAF con un filtro por canal (salida del auricular -> su micrófono)
+
+    Args:
+        partitions: particiones de FRAME_SIZE del camino modelado
+        step: paso NLMS inicial (0-1), hasta que la estimación de fuga
+              permite el paso variable
+        delay: retardo fijo del lazo más allá de un bloque, en segundos
+               (latencia de entrada + salida del stream; ver set_delay)
+    """
+
+    def __init__(self, partitions=PARTITIONS, step=STEP, channels=CHANNELS, sample_rate=SAMPLE_RATE,
+                 delay=0.0):
+        self.partitions = partitions
+        self.step = step
+        self.channels = channels
+        self.sample_rate = sample_rate
+        # Promedios por frame con las mismas constantes en segundos a otra tasa
+        # (frames de 20 ms en la banda baja de tearis_subband)
+        scale = SAMPLE_RATE / sample_rate
+        self._spec_average = SPEC_AVERAGE * scale
+        self._leak_beta0 = LEAK_BETA0 * scale
+        self._leak_beta_max = LEAK_BETA_MAX * scale
+        bins = FFT_SIZE // 2 + 1
+        shape = (partitions, channels, bins)
+        # Espectros de referencia en anillo; el filtro va por retardo de partición
+        self.X = np.zeros(shape, dtype=np.complex128)
+        self.W = np.zeros(shape, dtype=np.complex128)
+        self._Xo = np.zeros(shape, dtype=np.complex128)
+        self._G = np.zeros(shape, dtype=np.complex128)
+        self._Y = np.zeros((channels, bins), dtype=np.complex128)
+        self._order = [(p - np.arange(partitions)) % partitions for p in range(partitions)]
+        self.power = np.full((channels, bins), REGULARIZATION)
+        self._Eh = np.zeros((channels, bins))
+        self._Yh = np.zeros((channels, bins))
+        self._Pey = np.ones(channels)
+        self._Pyy = np.ones(channels)
+        self.leak = np.zeros(channels)
+        self._sum_adapt = np.zeros(channels)
+        self.adapted = np.zeros(channels, dtype=bool)
+        self._xbuf = np.zeros((channels, FFT_SIZE))
+        self._ebuf = np.zeros((channels, FFT_SIZE))
+        self._pos = 0
+        self.max_path = 10.0 ** (MAX_PATH_DB / 10.0)
+        self.frames = 0
+        self.resets = 0
+        self.bypassed = 0
+        self.underruns = 0
+        self.overruns = 0
+        self._diverging = 0
+        self.mic_power = 0.0
+        self.err_power = 0.0
+        self.set_delay(delay)
+        logger.info(f"✅ Cancelador de realimentación: {partitions} particiones "
+                    f"({1000.0 * partitions * FRAME_SIZE / sample_rate:.0f} ms) tras "
+                    f"{1000.0 * self.delay / sample_rate:.0f} ms de retardo fijo, paso {step}")
+
+    # ---------- Referencia ----------
+
+    def set_delay(self, seconds):
+        """
+        Retardo fijo del lazo (latencia de entrada + salida del stream): la
+        cola de referencia retiene ese retardo en frames antes de entregar
+        la salida, así cada frame de micrófonos se compara con la salida de
+        entonces. Fuera del callback (al abrir el stream); el filtro aprende
+        de nuevo
+        """
+        frames = max(0, int((seconds - DELAY_MARGIN_S) * self.sample_rate / FRAME_SIZE))
+        self.delay_frames = frames
+        self.delay = frames * FRAME_SIZE
+        # Cola de frames de salida: los escribe el tap del final de la cadena
+        self._ref_slots = REF_FRAMES + frames
+        self._ref = np.zeros((self._ref_slots, FRAME_SIZE, self.channels), dtype=np.float32)
+        self._ref_write = 0
+        self._ref_read = 0
+        if self.frames:
+            self.reset()
+
+    def push_reference(self, block):
+        """Salida de la cadena tal como va al códec (float o int16); desde el tap final"""
+        scale = 1.0 / PCM16_SCALE if block.dtype == np.int16 else 1.0
+        for i in range(0, block.shape[0] - FRAME_SIZE + 1, FRAME_SIZE):
+            if self._ref_write - self._ref_read >= self._ref_slots:
+                # Nadie consume (cancelador fuera del grafo): se pisa el más viejo
+                self._ref_read += 1
+                self.overruns += 1
+            np.multiply(block[i:i + FRAME_SIZE], scale, out=self._ref[self._ref_write % self._ref_slots],
+                        casting="unsafe")
+            self._ref_write += 1
+
+    def _next_reference(self):
+        pending = self._ref_write - self._ref_read
+        if pending <= self.delay_frames:
+            # Todavía dentro del retardo fijo: solo cuenta si la cola está vacía
+            if not pending:
+                self.underruns += 1
+            return None
+        frame = self._ref[self._ref_read % self._ref_slots]
+        self._ref_read += 1
+        return frame
+
+    # ---------- Filtro ----------
+
+    def process_into(self, src, dst):
+        """
+        Un frame de micrófonos (FRAME_SIZE, canales) -> micrófonos sin la
+        realimentación estimada en `dst` (puede ser el mismo array)
+        """
+        ref = self._next_reference()
+        n = FRAME_SIZE
+        pos = self._pos = (self._pos + 1) % self.partitions
+        # Referencia: último bloque de 2n muestras -> espectro de la partición 0
+        self._xbuf[:, :n] = self._xbuf[:, n:]
+        if ref is None:
+            self._xbuf[:, n:] = 0.0
+        else:
+            self._xbuf[:, n:] = ref.T
+        X0 = self.X[pos] = np.fft.rfft(self._xbuf, axis=1)
+        np.take(self.X, self._order[pos], axis=0, out=self._Xo)
+        np.multiply(self.W, self._Xo, out=self._G)
+        self._G.sum(axis=0, out=self._Y)
+        echo = np.fft.irfft(self._Y, n=FFT_SIZE, axis=1)[:, n:]
+
+        mic = src.T
+        err = mic - echo
+        self.frames += 1
+        mic_p = float(np.dot(mic.ravel(), mic.ravel()))
+        err_p = float(np.dot(err.ravel(), err.ravel()))
+        a = METRIC_SMOOTHING
+        self.mic_power = a * self.mic_power + (1 - a) * mic_p
+        self.err_power = a * self.err_power + (1 - a) * err_p
+
+        if err_p > DIVERGE_RATIO * mic_p + 1e-12:
+            # Nunca peor que no cancelar
+            self.bypassed += 1
+            self._diverging += 1
+            if dst is not src:
+                dst[:] = src
+        else:
+            self._diverging = 0
+            dst[:] = err.T
+
+        # Adaptación: gradiente de todas las particiones con paso normalizado por bin
+        self.power *= POWER_SMOOTHING
+        self.power += (1 - POWER_SMOOTHING) * (X0.real ** 2 + X0.imag ** 2)
+        self._ebuf[:, n:] = err
+        E = np.fft.rfft(self._ebuf, axis=1)
+        E *= self._step(err, echo, E) / (self.partitions * self.power + REGULARIZATION)
+        np.conjugate(self._Xo, out=self._G)
+        self._G *= E
+        self.W += self._G
+        # Restricción de gradiente alternada: una partición por frame
+        j = self.frames % self.partitions
+        w = np.fft.irfft(self.W[j], n=FFT_SIZE, axis=1)
+        w[:, n:] = 0.0
+        self.W[j] = np.fft.rfft(w, axis=1)
+
+        if self._diverging >= DIVERGE_FRAMES or not np.isfinite(self.W[j]).all():
+            self.reset("divergencia")
+        elif self.frames % PATH_CHECK_FRAMES == 0 and self.path_gain() > self.max_path:
+            self.reset("ganancia del camino fuera de rango")
+
+    def _step(self, err, echo, E):
+        """
+        Paso por canal y bin: fracción estimada de realimentación residual
+        en el error, con la fuga medida por la correlación entre las
+        fluctuaciones de |E|² y |Y|² (Valin, MDF de Speex)
+        """
+        Ef = E.real ** 2 + E.imag ** 2
+        Yf = self._Y.real ** 2 + self._Y.imag ** 2
+        self._Eh += self._spec_average * (Ef - self._Eh)
+        self._Yh += self._spec_average * (Yf - self._Yh)
+        dY = Yf - self._Yh
+        pey = np.sum((Ef - self._Eh) * dY, axis=1)
+        pyy = np.sum(dY * dY, axis=1)
+        see = np.sum(err * err, axis=1) + 1e-9
+        syy = np.sum(echo * echo, axis=1)
+        sey = np.sum(err * echo, axis=1)
+        alpha = np.minimum(self._leak_beta0 * syy, self._leak_beta_max * see) / see
+        self._Pey += alpha * (pey - self._Pey)
+        self._Pyy += alpha * (pyy - self._Pyy)
+        np.maximum(self._Pyy, 1e-12, out=self._Pyy)
+        self.leak = np.clip(self._Pey / self._Pyy, MIN_LEAK, 1.0)
+        # Relación residual/error de todo el frame: piso del paso por bin
+        rer = np.clip(np.maximum(3.0 * self.leak * syy / see, sey * sey / (see * syy + 1e-18)), 0.0, STEP_MAX)
+
+        Ef += 1e-12
+        step = (0.7 * self.leak[:, None]) * Yf / Ef + 0.3 * rer[:, None]
+        np.minimum(step, STEP_MAX, out=step)
+        if not self.adapted.all():
+            # Arranque: paso fijo hasta acumular una pasada por todas las particiones
+            sxx = np.sum(self._xbuf[:, FRAME_SIZE:] ** 2, axis=1)
+            rate = np.where(self.adapted, 0.0, np.minimum(self.step, self.step * sxx / see))
+            self._sum_adapt += rate
+            self.adapted |= (self._sum_adapt > self.partitions) & (self.leak > 0.03)
+            step[~self.adapted] = rate[~self.adapted, None]
+        return step
+
+    def reset(self, reason=None):
+        """Vuelve el filtro a cero (la cola de referencia se conserva)"""
+        self.W[:] = 0.0
+        self.power[:] = REGULARIZATION
+        self._Eh[:] = 0.0
+        self._Yh[:] = 0.0
+        self._Pey[:] = 1.0
+        self._Pyy[:] = 1.0
+        self._sum_adapt[:] = 0.0
+        self.adapted[:] = False
+        self._diverging = 0
+        self.resets += 1
+        if reason:
+            logger.warning(f"⚠️ Cancelador de realimentación reiniciado: {reason}")
+
+    # ---------- Métricas ----------
+
+    def impulse_response(self):
+        """Camino estimado en el tiempo (canales, partitions * FRAME_SIZE), desde el retardo del lazo (un bloque + delay)"""
+        h = np.fft.irfft(self.W, n=FFT_SIZE, axis=2)[:, :, :FRAME_SIZE]
+        return h.transpose(1, 0, 2).reshape(self.channels, -1)
+
+    def path_gain(self):
+        """Energía del camino estimado (suma de h^2 del canal más fuerte)"""
+        h = self.impulse_response()
+        return float(np.max(np.sum(h * h, axis=1)))
+
+    def get_stats(self):
+        gain = self.path_gain()
+        return {
+            "partitions": self.partitions,
+            "delay_ms": 1000.0 * self.delay / self.sample_rate,
+            "frames": self.frames,
+            "erle_db": 10.0 * np.log10((self.mic_power + 1e-12) / (self.err_power + 1e-12)),
+            "path_gain_db": 10.0 * np.log10(gain) if gain > 0 else float("-inf"),
+            "leak": float(np.max(self.leak)),
+            "adapted": bool(self.adapted.all()),
+            "resets": self.resets,
+            "bypass_ratio": self.bypassed / self.frames if self.frames else 0.0,
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+        }
+
+
+class FeedbackNode(Node):
+    """Cancelador antes del beamformer y de RNNoise, por frames de 480 muestras"""
+
+    frame_size = FRAME_SIZE
+
+    def __init__(self, canceller, name="feedback"):
+        super().__init__(name)
+        self.canceller = canceller
+
+    def process(self, src, dst):
+        self.canceller.process_into(src, dst)
+
+
+# ========== BENCHMARK ==========
+
+def benchmark(seconds=12.0):
+    """
+    Lazo cerrado con fuga simulada detrás de los buffers del stream del
+    servidor (tearis_offline): sin silbido, ganancia estable agregada, ERLE
+    sobre la fuga en la banda del silbido y costo por frame
+    """
+    from tearis_offline import compare_feedback
+    results = compare_feedback(seconds=seconds)
+    on, off = results["on"], results["off"]
+    results["ok"] = (on["howl_db"] < off["howl_db"] - 6.0 and on["stable_gain_db"] > 3.0
+                     and on["howl_erle_db"] > 6.0 and on["cpu_pct"] < 10.0 and on["resets"] == 0)
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s:%(name)s: %(message)s')
+    from tearis_offline import print_feedback_comparison
+    print("=" * 60)
+    print("TEARIS - Cancelador de realimentación (fuga simulada, lazo cerrado)")
+    print("=" * 60)
+    r = benchmark()
+    print_feedback_comparison(r)
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Perfil auditivo personal con FIR largos
+Los 5 bandas del EQ del WM8960 no alcanzan para seguir la curva de
+sensibilidad de cada usuario (audiograma o prueba de confort). Este módulo
+diseña un FIR de fase mínima a partir de esa curva, lo guarda junto con
+el modo y lo aplica con convolución por FFT particionada uniforme
+(overlap-save), al tamaño de frame de 480 muestras y sin latencia extra.
+
+Uso:
+    python3 tearis_fir.py design escuela 250:0 500:5 1000:10 2000:15 4000:20 8000:10
+    python3 tearis_fir.py show
+    python3 tearis_fir.py remove escuela
+    python3 tearis_fir.py                  # benchmark vs. convolución directa
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import logging
+import numpy as np
+
+from tearis_dsp_graph import Node
+from tearis_limiter import normalize_mode
+
+logger = logging.getLogger("TEARIS-FIR")
+
+SAMPLE_RATE = 48000
+FIR_BLOCK = 480           # partición = frame de la cadena (10 ms)
+FIR_TAPS = 2048           # largo por defecto del diseño
+MAX_BOOST_DB = 20.0       # tope de realce por banda (el limitador sigue detrás)
+MAX_CUT_DB = -30.0
+
+# Perfiles por modo: {modo: {"curve": [[Hz, dB], ...], "taps": n, "fir": base64}}
+PROFILE_PATH = os.path.expanduser(os.environ.get("TEARIS_PROFILE_PATH", "~/.tearis/profiles.json"))
+
+# Espectros de particiones ya calculados, por (hash de los coeficientes, bloque)
+_SPECTRA_CACHE = {}
+
+
+# ========================================
+# Convolución particionada
+# ========================================
+def partition_spectra(taps, block=FIR_BLOCK):
+    """
+    FFT de 2*block de cada partición de `block` coeficientes (P, block+1),
+    cacheada: cambiar de modo y volver no recalcula nada
+    """
+    taps = np.ascontiguousarray(taps, dtype=np.float32)
+    key = (hashlib.sha1(taps.tobytes()).hexdigest(), block)
+    spectra = _SPECTRA_CACHE.get(key)
+    if spectra is None:
+        parts = -(-taps.shape[0] // block)
+        padded = np.zeros((parts, 2 * block), dtype=np.float32)
+        padded[:, :block].flat[:taps.shape[0]] = taps
+        spectra = np.fft.rfft(padded, axis=1).astype(np.complex64)
+        _SPECTRA_CACHE[key] = spectra
+    return spectra
+
+
+class PartitionedConvolver:
+    """
+    Overlap-save con particiones uniformes y línea de retardo en frecuencia
+
+    Cada bloque es una FFT por canal, P productos complejos acumulados
+    contra la línea de retardo (un ring de espectros de entrada) y una IFFT.
+    La salida corresponde al bloque de entrada actual: no agrega latencia.
+
+    Args:
+        taps: coeficientes del FIR
+        block: muestras por llamada (y por partición)
+    """
+
+    def __init__(self, taps, channels=2, block=FIR_BLOCK):
+        self.block = block
+        self.channels = channels
+        self.taps = np.asarray(taps, dtype=np.float32)
+        # Particiones al revés: así las dos mitades del ring quedan alineadas
+        # con tramos contiguos de espectros (ver process)
+        self.spectra = partition_spectra(self.taps, block)[::-1].copy()
+        self.parts = self.spectra.shape[0]
+        bins = block + 1
+        self.fdl = np.zeros((self.parts, channels, bins), dtype=np.complex64)
+        self.index = 0
+        self._input = np.zeros((channels, 2 * block), dtype=np.float32)
+        self._acc = np.zeros((channels, bins), dtype=np.complex64)
+
+    def reset(self):
+        self.fdl[:] = 0
+        self._input[:] = 0.0
+        self.index = 0
+
+    def process(self, src, dst):
+        """`block` muestras (block, canales) de `src` a `dst` (puede ser el mismo)"""
+        block = self.block
+        buf = self._input
+        buf[:, :block] = buf[:, block:]
+        buf[:, block:] = src.T
+        idx = self.index
+        self.fdl[idx] = np.fft.rfft(buf, axis=1)
+        # Retardo p del ring está en (idx - p) % P: los espectros 0..idx van
+        # con las particiones invertidas P-1-idx..P-1 y el resto con 0..P-2-idx
+        split = self.parts - 1 - idx
+        acc = self._acc
+        np.einsum("pk,pck->ck", self.spectra[split:], self.fdl[:idx + 1], out=acc)
+        if split:
+            acc += np.einsum("pk,pck->ck", self.spectra[:split], self.fdl[idx + 1:])
+        self.index = (idx + 1) % self.parts
+        dst[:] = np.fft.irfft(acc, 2 * block, axis=1)[:, block:].T
+
+
+class FIRNode(Node):
+    """FIR largo del perfil auditivo (convolución particionada por frame)"""
+
+    frame_size = FIR_BLOCK
+
+    def __init__(self, taps, name="fir"):
+        super().__init__(name)
+        self.taps = np.asarray(taps, dtype=np.float32)
+        self.convolver = None
+
+    def prepare(self, blocksize, channels, sample_rate):
+        if self.convolver is None or self.convolver.channels != channels:
+            self.convolver = PartitionedConvolver(self.taps, channels)
+
+    def process(self, src, dst):
+        self.convolver.process(src, dst)
+
+
+# ========================================
+# Diseño desde la curva del usuario
+# ========================================
+def interpolate_curve(curve, freqs):
+    """
+    Ganancia en dB en `freqs` interpolando la curva en frecuencia
+    logarítmica; fuera de sus extremos se mantiene el valor del borde
+
+    Args:
+        curve: [(Hz, dB), ...] como un audiograma (250, 500, ... 8000 Hz)
+    """
+    points = sorted((float(f), float(g)) for f, g in curve)
+    f = np.log2([p[0] for p in points])
+    g = np.clip([p[1] for p in points], MAX_CUT_DB, MAX_BOOST_DB)
+    return np.interp(np.log2(np.maximum(freqs, 1.0)), f, g)
+
+
+def design_fir(curve, taps=FIR_TAPS, sample_rate=SAMPLE_RATE):
+    """
+    FIR de fase mínima con la respuesta en magnitud de `curve`
+
+    Fase mínima por el cepstro real (la energía queda al principio del
+    filtro y el retardo de grupo es mínimo: apto para un audífono, a
+    diferencia de uno de fase lineal de miles de coeficientes). Se diseña
+    con 8x de resolución y se recorta con media ventana de Hann.
+
+    Returns:
+        coeficientes float32 de largo `taps`
+    """
+    n = 8 * taps
+    freqs = np.fft.rfftfreq(n, 1.0 / sample_rate)
+    magnitude = 10.0 ** (interpolate_curve(curve, freqs) / 20.0)
+    cepstrum = np.fft.irfft(np.log(np.maximum(magnitude, 1e-6)), n)
+    # Plegado: c[0], 2*c[1..n/2-1], c[n/2], 0 -> espectro de fase mínima
+    fold = np.zeros(n)
+    fold[0] = cepstrum[0]
+    fold[1:n // 2] = 2.0 * cepstrum[1:n // 2]
+    fold[n // 2] = cepstrum[n // 2]
+    h = np.fft.irfft(np.exp(np.fft.rfft(fold)), n)[:taps]
+    h *= np.hanning(2 * taps)[taps:]
+    return h.astype(np.float32)
+
+
+def fir_response_db(taps, freqs, sample_rate=SAMPLE_RATE):
+    """Magnitud en dB del FIR en `freqs` (para verificar el diseño)"""
+    n = 1 << int(np.ceil(np.log2(max(len(taps), 2) * 8)))
+    spectrum = np.abs(np.fft.rfft(taps, n))
+    bins = np.fft.rfftfreq(n, 1.0 / sample_rate)
+    return 20.0 * np.log10(np.interp(freqs, bins, spectrum) + 1e-12)
+
+
+# ========================================
+# Perfiles guardados con los modos
+# ========================================
+def load_profiles(path=PROFILE_PATH):
+    """{modo: {"curve", "taps", "fir" (np.float32)}}; vacío si no hay archivo"""
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ No se pudieron leer los perfiles de {path}: {e}")
+        return {}
+    profiles = {}
+    for mode, entry in raw.items():
+        fir = np.frombuffer(base64.b64decode(entry["fir"]), dtype="<f4").astype(np.float32)
+        profiles[normalize_mode(mode)] = {"curve": entry["curve"], "taps": len(fir), "fir": fir}
+    return profiles
+
+
+def save_profile(mode, curve, taps=FIR_TAPS, path=PROFILE_PATH):
+    """Diseña el FIR de `curve` y lo guarda para `mode`; devuelve los coeficientes"""
+    fir = design_fir(curve, taps)
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        raw = {}
+    raw[normalize_mode(mode)] = {
+        "curve": [[float(f), float(g)] for f, g in curve],
+        "taps": int(taps),
+        "fir": base64.b64encode(fir.astype("<f4").tobytes()).decode(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(raw, f, indent=1)
+    os.replace(tmp, path)
+    return fir
+
+
+def remove_profile(mode, path=PROFILE_PATH):
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return False
+    if raw.pop(normalize_mode(mode), None) is None:
+        return False
+    with open(path, "w") as f:
+        json.dump(raw, f, indent=1)
+    return True
+
+
+def apply_profiles(pipeline, path=PROFILE_PATH):
+    """Carga los perfiles guardados en la cadena (FIR por modo)"""
+    profiles = load_profiles(path)
+    for mode, profile in profiles.items():
+        pipeline.set_fir(mode, profile["fir"])
+        logger.info(f"👂 Perfil auditivo de '{mode}': {profile['taps']} coeficientes")
+    return profiles
+
+
+# ========== BENCHMARK ==========
+
+def _direct(taps, x, block):
+    """Convolución directa bloque a bloque con historia (referencia)"""
+    history = np.zeros((len(taps) - 1, x.shape[1]), dtype=np.float32)
+    y = np.empty_like(x)
+    times = []
+    for i in range(0, x.shape[0], block):
+        start = time.perf_counter()
+        chunk = np.concatenate([history, x[i:i + block]])
+        for ch in range(x.shape[1]):
+            y[i:i + block, ch] = np.convolve(chunk[:, ch], taps, mode="valid")
+        history = chunk[block:]
+        times.append(time.perf_counter() - start)
+    return y, times
+
+
+def benchmark(lengths=(256, 1024, 2048, 4096, 8192, 16384), blocks=100):
+    """
+    µs por frame de 480 muestras (estéreo) según el largo del FIR:
+    convolución particionada vs. directa, con el error entre ambas
+    """
+    rng = np.random.default_rng(0)
+    x = (0.1 * rng.standard_normal((blocks * FIR_BLOCK, 2))).astype(np.float32)
+    results = {}
+    ok = True
+    for length in lengths:
+        taps = (rng.standard_normal(length) * np.exp(-np.arange(length) / (length / 4.0))).astype(np.float32)
+        taps /= np.sum(np.abs(taps))
+        conv = PartitionedConvolver(taps)
+        y = np.empty_like(x)
+        times = []
+        for i in range(0, x.shape[0], FIR_BLOCK):
+            start = time.perf_counter()
+            conv.process(x[i:i + FIR_BLOCK], y[i:i + FIR_BLOCK])
+            times.append(time.perf_counter() - start)
+        reference, direct_times = _direct(taps, x, FIR_BLOCK)
+        error = float(np.max(np.abs(y - reference)))
+        results[length] = {
+            "partitioned_us": 1e6 * float(np.median(times)),
+            "direct_us": 1e6 * float(np.median(direct_times)),
+            "max_error": error,
+        }
+        ok = ok and error < 1e-4
+    # La particionada tiene que ganar en los largos que justifican el FIR
+    long = [r for n, r in results.items() if n >= 2048]
+    ok = ok and all(r["partitioned_us"] < r["direct_us"] for r in long)
+
+    curve = [(250, 0), (500, 5), (1000, 10), (2000, 15), (4000, 20), (8000, 10)]
+    fir = design_fir(curve)
+    check = np.array([500.0, 1000.0, 2000.0, 4000.0])
+    design_error = float(np.max(np.abs(fir_response_db(fir, check) - interpolate_curve(curve, check))))
+    out = {f"fir_{n}": r for n, r in results.items()}
+    out["design_error_db"] = design_error
+    out["ok"] = ok and design_error < 1.0
+    return out
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    args = sys.argv[1:]
+    if args and args[0] == "design":
+        if len(args) < 3:
+            print("Uso: tearis_fir.py design <modo> <Hz:dB> [<Hz:dB> ...] [--taps N]")
+            return 2
+        taps = FIR_TAPS
+        if "--taps" in args:
+            i = args.index("--taps")
+            taps = int(args[i + 1])
+            args = args[:i] + args[i + 2:]
+        curve = [tuple(float(v) for v in point.split(":")) for point in args[2:]]
+        fir = save_profile(args[1], curve, taps)
+        freqs = np.array([f for f, _ in curve])
+        print(f"✅ Perfil '{normalize_mode(args[1])}' guardado en {PROFILE_PATH} ({len(fir)} coeficientes)")
+        for f, target, got in zip(freqs, interpolate_curve(curve, freqs), fir_response_db(fir, freqs)):
+            print(f"   {f:7.0f} Hz: pedido {target:+5.1f} dB | FIR {got:+5.1f} dB")
+        return 0
+    if args and args[0] == "show":
+        for mode, profile in load_profiles().items():
+            points = ", ".join(f"{f:g} Hz {g:+g} dB" for f, g in profile["curve"])
+            print(f"{mode}: {profile['taps']} coeficientes | {points}")
+        return 0
+    if args and args[0] == "remove":
+        return 0 if len(args) > 1 and remove_profile(args[1]) else 1
+
+    print("=" * 60)
+    print("TEARIS - FIR particionado vs. convolución directa (µs por frame)")
+    print("=" * 60)
+    r = benchmark()
+    for key, value in r.items():
+        if key.startswith("fir_"):
+            print(f"{key[4:]:>6} coef: particionada {value['partitioned_us']:8.1f} µs | "
+                  f"directa {value['direct_us']:9.1f} µs | error {value['max_error']:.1e}")
+    print(f"Diseño desde la curva: error máx {r['design_error_db']:.2f} dB")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Camino rápido GATT por sockets (AcquireNotify / AcquireWrite)
+Si una característica publica NotifyAcquired / WriteAcquired, BlueZ le
+pide un socket en lugar de usar PropertiesChanged y WriteValue: la
+aplicación crea un socketpair SOCK_SEQPACKET, le entrega un extremo por
+D-Bus y por el otro cada notificación es un send() y cada escritura un
+recv() de un paquete ATT, desde un hilo de E/S propio, sin pasar por GLib
+ni armar un dbus.Array byte a byte. Si BlueZ nunca llama a Acquire* (o con
+TEARIS_GATT_SOCKETS=0) queda el camino por D-Bus de siempre.
+
+Uso (notificaciones/s y CPU, socket vs. señal D-Bus simulada):
+    python3 tearis_gatt_io.py
+"""
+
+import time
+import socket
+import selectors
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger("TEARIS-GATT-IO")
+
+ATT_HEADER = 3             # opcode + handle de cada notificación
+DEFAULT_MTU = 23           # MTU ATT mínimo si BlueZ no informa el negociado
+POLL_S = 0.01              # período de las fuentes de notificación (como el timeout de GLib)
+MAX_PENDING = 64           # notificaciones encoladas por socket antes de descartar
+
+
+class GattSocketIO:
+    """
+    Dueño de los sockets adquiridos y de su hilo de E/S
+
+    Cada socket se identifica con un nombre (la ruta de la característica
+    y el sentido). Las notificaciones llegan por `notify` (desde cualquier
+    hilo) o por una fuente que el hilo consulta cada POLL_S; se parten en
+    paquetes de MTU - 3 bytes. Las escrituras se entregan al handler desde
+    el hilo de E/S. Cuando BlueZ cierra su extremo (baja de la suscripción
+    o desconexión) el socket se libera y se llama a `on_release`.
+    """
+
+    def __init__(self, poll_s=POLL_S):
+        self.poll_s = poll_s
+        self._sockets = {}
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._running = False
+        self._thread = None
+        self.stats = {}
+
+    # ---------- Adquisición (desde el hilo de GLib) ----------
+
+    def _acquire(self, name, kind, mtu, **entry):
+        self.release(name)
+        local, remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        local.setblocking(False)
+        entry.update(sock=local, kind=kind, mtu=int(mtu), pending=deque(maxlen=MAX_PENDING))
+        with self._lock:
+            self._sockets[name] = entry
+            self._selector.register(local, selectors.EVENT_READ, name)
+        self.stats.setdefault(name, {"packets": 0, "messages": 0, "bytes": 0, "dropped": 0})
+        self._wake()
+        logger.info(f"🔌 Socket GATT adquirido: {name} ({kind}, MTU {mtu})")
+        return remote
+
+    def acquire_notify(self, name, mtu, source=None, on_release=None):
+        """
+        Socket para notificaciones; devuelve el extremo de BlueZ, que quien
+        llama cierra después de pasarlo por D-Bus
+
+        Args:
+            source: función sin argumentos que el hilo consulta cada POLL_S
+                    y devuelve bytes a notificar o None
+        """
+        return self._acquire(name, "notify", mtu, source=source, on_release=on_release)
+
+    def acquire_write(self, name, mtu, handler, on_release=None):
+        """
+        Socket para escrituras sin respuesta; `handler(bytes)` corre en el
+        hilo de E/S con cada paquete
+        """
+        return self._acquire(name, "write", mtu, handler=handler, on_release=on_release)
+
+    def acquired(self, name):
+        return name in self._sockets
+
+    def release(self, name):
+        with self._lock:
+            entry = self._sockets.pop(name, None)
+            if entry is None:
+                return None
+            self._selector.unregister(entry["sock"])
+        entry["sock"].close()
+        return entry
+
+    # ---------- Datos ----------
+
+    def notify(self, name, payload):
+        """Encola una notificación; False si la característica no tiene socket"""
+        entry = self._sockets.get(name)
+        if entry is None:
+            return False
+        entry["pending"].append(bytes(payload))
+        self._wake()
+        return True
+
+    def _send(self, name, entry, payload):
+        """Un mensaje en paquetes de MTU - 3; si BlueZ no vacía el socket se descarta el resto"""
+        sock = entry["sock"]
+        chunk = max(entry["mtu"] - ATT_HEADER, 1)
+        stats = self.stats[name]
+        view = memoryview(payload)
+        for offset in range(0, len(view), chunk):
+            try:
+                sock.send(view[offset:offset + chunk])
+            except BlockingIOError:
+                stats["dropped"] += 1
+                return
+            except OSError:
+                self._released(name)
+                return
+            stats["packets"] += 1
+        stats["messages"] += 1
+        stats["bytes"] += len(view)
+
+    def _released(self, name):
+        entry = self.release(name)
+        if entry is None:
+            return
+        logger.info(f"🔌 Socket GATT liberado: {name}")
+        if entry["on_release"]:
+            entry["on_release"]()
+
+    # ---------- Hilo de E/S ----------
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="gatt-io", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wake()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        for name in list(self._sockets):
+            self.release(name)
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while self._running:
+            events = self._selector.select(max(0.0, next_poll - time.monotonic()))
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        self._wake_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._readable(key.data)
+            with self._lock:
+                entries = [(name, e) for name, e in self._sockets.items() if e["kind"] == "notify"]
+            now = time.monotonic()
+            poll = now >= next_poll
+            if poll:
+                next_poll = now + self.poll_s
+            for name, entry in entries:
+                pending = entry["pending"]
+                while pending:
+                    self._send(name, entry, pending.popleft())
+                if poll and entry["source"] and name in self._sockets:
+                    payload = entry["source"]()
+                    while payload is not None and name in self._sockets:
+                        self._send(name, entry, payload)
+                        payload = entry["source"]()
+
+    def _readable(self, name):
+        entry = self._sockets.get(name)
+        if entry is None:
+            return
+        try:
+            data = entry["sock"].recv(entry["mtu"])
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            # BlueZ cerró su extremo: baja de la suscripción o desconexión
+            self._released(name)
+            return
+        if entry["kind"] == "write":
+            stats = self.stats[name]
+            stats["packets"] += 1
+            stats["messages"] += 1
+            stats["bytes"] += len(data)
+            try:
+                entry["handler"](data)
+            except Exception as e:
+                logger.error(f"❌ Error aplicando escritura por socket en {name}: {e}")
+
+    def get_stats(self):
+        return {name: dict(stats, acquired=name in self._sockets) for name, stats in self.stats.items()}
+
+
+# ========== BENCHMARK ==========
+
+class _Byte(int):
+    """Como dbus.Byte: un objeto Python por byte del valor"""
+
+
+_PACK_BYTE = None
+
+
+def _signal_standin(path, payload):
+    """
+    Trabajo del camino por señal para una notificación: un objeto por byte
+    (el dbus.Array de dbus.Byte), un append por elemento y el mensaje
+    PropertiesChanged serializado
+    """
+    import struct
+
+    global _PACK_BYTE
+    if _PACK_BYTE is None:
+        _PACK_BYTE = struct.Struct("B").pack
+    value = [_Byte(b) for b in payload]
+    array = b"".join([_PACK_BYTE(v) for v in value])
+    body = bytearray()
+    iface = b"org.bluez.GattCharacteristic1"
+    body += struct.pack("<I", len(iface)) + iface + b"\0"
+    body += b"\0" * (-len(body) % 4)
+    entries = bytearray(b"\0" * (-(len(body) + 4) % 8))
+    entries += struct.pack("<I", 5) + b"Value\0" + b"\x02ay\0"
+    entries += b"\0" * (-(len(body) + 4 + len(entries)) % 4)
+    entries += struct.pack("<I", len(array)) + array
+    body += struct.pack("<I", len(entries)) + entries
+    body += b"\0" * (-len(body) % 4) + struct.pack("<I", 0)
+    header = struct.pack("<cBBBII", b"l", 4, 0, 1, len(body), 0) + path
+    header += b"\0" * (-len(header) % 8)
+    return header + bytes(body)
+
+
+def _drain(sock, total, done):
+    """Lee hasta `total` bytes y anota el instante del último"""
+    received = 0
+    while received < total:
+        data = sock.recv(65536)
+        if not data:
+            break
+        received += len(data)
+    done.append((received, time.perf_counter()))
+
+
+def benchmark(messages=20000, mtu=247):
+    """
+    Capacidad de notificaciones de un paquete ATT (MTU - 3 bytes de audio
+    del tap) con un lector que hace de BlueZ: por el socket adquirido
+    (un send por notificación) y por el camino de señal simulado (objeto
+    por byte, mensaje D-Bus serializado y un salto extra por un hilo que
+    hace de dbus-daemon). Mide mensajes/s y CPU del proceso por mensaje
+    """
+    chunk = mtu - ATT_HEADER
+    packet = bytes(range(256))[:chunk]
+    results = {}
+
+    # Socket adquirido: el mismo _send del hilo de E/S, bloqueante para medir capacidad
+    io = GattSocketIO()
+    remote = io.acquire_notify("audio", mtu)
+    entry = io._sockets["audio"]
+    entry["sock"].setblocking(True)
+    done = []
+    reader = threading.Thread(target=_drain, args=(remote, messages * chunk, done))
+    reader.start()
+    start, cpu = time.perf_counter(), time.process_time()
+    for _ in range(messages):
+        io._send("audio", entry, packet)
+    reader.join()
+    cpu = time.process_time() - cpu
+    received, last = done[0]
+    io.stop()
+    remote.close()
+    results["socket"] = {"msgs_per_s": received / chunk / (last - start),
+                         "cpu_us": 1e6 * cpu / messages, "ok": received == messages * chunk}
+
+    # Señal: app -> "dbus-daemon" -> "bluetoothd"
+    app, daemon_in = socket.socketpair()
+    daemon_out, bluez = socket.socketpair()
+    path = b"/org/bluez/example/service0/char4"
+    size = len(_signal_standin(path, packet))
+
+    def relay():
+        pending = messages * size
+        while pending > 0:
+            data = daemon_in.recv(65536)
+            if not data:
+                break
+            daemon_out.sendall(data)
+            pending -= len(data)
+
+    done = []
+    threads = [threading.Thread(target=relay), threading.Thread(target=_drain, args=(bluez, messages * size, done))]
+    for t in threads:
+        t.start()
+    start, cpu = time.perf_counter(), time.process_time()
+    for _ in range(messages):
+        app.sendall(_signal_standin(path, packet))
+    for t in threads:
+        t.join()
+    cpu = time.process_time() - cpu
+    received, last = done[0]
+    for sock in (app, daemon_in, daemon_out, bluez):
+        sock.close()
+    results["signal"] = {"msgs_per_s": received / size / (last - start), "cpu_us": 1e6 * cpu / messages}
+
+    fast, slow = results["socket"], results["signal"]
+    # Audio del tap (48 kHz estéreo int16) en notificaciones de este MTU
+    needed = 48000 * 2 * 2 / chunk
+    return {
+        "socket_msgs_per_s": fast["msgs_per_s"],
+        "socket_cpu_us_per_msg": fast["cpu_us"],
+        "signal_msgs_per_s": slow["msgs_per_s"],
+        "signal_cpu_us_per_msg": slow["cpu_us"],
+        "audio_msgs_per_s": needed,
+        "socket_audio_cpu_pct": needed * fast["cpu_us"] / 1e4,
+        "signal_audio_cpu_pct": needed * slow["cpu_us"] / 1e4,
+        "ok": fast["ok"] and fast["msgs_per_s"] > slow["msgs_per_s"] and fast["cpu_us"] < slow["cpu_us"],
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Notificaciones GATT: socket adquirido vs. señal D-Bus")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Socket:  {r['socket_msgs_per_s']:.0f} msg/s | CPU {r['socket_cpu_us_per_msg']:.1f} µs/msg")
+    print(f"Señal:   {r['signal_msgs_per_s']:.0f} msg/s | CPU {r['signal_cpu_us_per_msg']:.1f} µs/msg (simulada)")
+    print(f"Audio del tap ({r['audio_msgs_per_s']:.0f} msg/s): socket {r['socket_audio_cpu_pct']:.1f}% CPU | "
+          f"señal {r['signal_audio_cpu_pct']:.1f}% CPU")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Modo hub: un servidor para varios auriculares o placas
+Un registro de dispositivos crea, por cada uno, su bloque de control y su
+anillo de monitoreo (los de tearis_audio_engine.py), así el servidor BLE
+maneja cada dispositivo como un motor de audio independiente. Las cadenas
+DSP corren en un pool de procesos, uno por núcleo (fijado con afinidad):
+los dispositivos se reparten por carga estimada y cada proceso atiende a
+los suyos por deadline más cercano (EDF). Los dispositivos con reloj
+propio (placas ALSA/PortAudio) corren en su callback dentro del proceso
+de su núcleo; los simulados ('null', 'file') los reloja el planificador.
+
+Dispositivos (TEARIS_HUB_DEVICES, separados por ';'):
+    nombre=backend[:dispositivo]
+    aula1=portaudio:hw:1,0;aula2=alsa-mmap:hw:2,0;banco=null;clip=file:/ruta/clip.wav
+
+Uso (streams por núcleo sin xruns con dispositivos nulos):
+    python3 tearis_hub.py
+"""
+
+import os
+import re
+import time
+import heapq
+import threading
+import logging
+import multiprocessing
+import numpy as np
+
+from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS
+from tearis_fir import apply_profiles
+from tearis_audio_backends import (open_stream, resolve_device, tone_source, CallbackFlags,
+                                   BACKENDS)
+from tearis_audio_engine import (ControlBlock, ShmRing, ParamApplier, AudioEngineProcess,
+                                 BLOCKSIZE)
+from tearis_supervisor import StreamSupervisor
+from tearis_rt import isolated_cpus
+
+logger = logging.getLogger("TEARIS-HUB")
+
+# Backends que reloja el planificador (sin hardware)
+CLOCKED_BACKENDS = ("null", "file")
+# Costo relativo de cada modo para repartir dispositivos entre núcleos
+MODE_COST = {"normal": 1.0, "transporte": 1.0, "escuela": 3.0}
+POLL_S = 0.005            # control y estadísticas, entre frames
+STATS_S = 0.05
+
+
+# ========================================
+# Registro de dispositivos
+# ========================================
+def parse_devices(spec):
+    """
+    'nombre=backend[:dispositivo];...' -> [{name, backend, device, card}]
+
+    card es el número de placa de ALSA para amixer (hw:N,...) o None
+    """
+    devices = []
+    for i, entry in enumerate(part.strip() for part in spec.split(";")):
+        if not entry:
+            continue
+        name, _, target = entry.rpartition("=")
+        name = name.strip() or f"dev{i}"
+        backend, _, device = target.partition(":")
+        backend = backend.strip()
+        if backend not in BACKENDS and backend != "file":
+            raise ValueError(f"{name}: backend desconocido {backend} (opciones: {', '.join(BACKENDS + ('file',))})")
+        if backend == "file" and not device:
+            raise ValueError(f"{name}: 'file' necesita la ruta del WAV")
+        if any(d["name"] == name for d in devices):
+            raise ValueError(f"Dispositivo repetido: {name}")
+        card = re.match(r"(?:plug)?hw:(\d+)", device)
+        devices.append({
+            "name": name,
+            "backend": backend,
+            "device": device or None,
+            "card": int(card.group(1)) if card else None,
+        })
+    return devices
+
+
+def hub_cores(cores=None):
+    """Núcleos del pool: los aislados si hay, si no todos los de la afinidad del proceso"""
+    if cores:
+        return list(cores)
+    return isolated_cpus() or sorted(os.sched_getaffinity(0))
+
+
+def assign_devices(devices, cores, mode="normal"):
+    """
+    Reparto por carga estimada (el más caro primero al núcleo más libre)
+
+    Returns:
+        {núcleo: [índices de dispositivo]}
+    """
+    cost = MODE_COST.get(mode, 1.0)
+    heap = [(0.0, i, core) for i, core in enumerate(cores)]
+    placement = {core: [] for core in cores}
+    for index in sorted(range(len(devices)), key=lambda i: -devices[i].get("cost", cost)):
+        load, order, core = heapq.heappop(heap)
+        placement[core].append(index)
+        heapq.heappush(heap, (load + devices[index].get("cost", cost), order, core))
+    return {core: indices for core, indices in placement.items() if indices}
+
+
+# ========================================
+# Proceso de un núcleo
+# ========================================
+class ClockedDevice:
+    """Dispositivo simulado que reloja el planificador: bloque k listo en release, vence en release + period"""
+
+    def __init__(self, spec, pipeline, blocksize, dtype):
+        self.name = spec["name"]
+        self.pipeline = pipeline
+        self.blocksize = blocksize
+        self.period = blocksize / float(SAMPLE_RATE)
+        if spec["backend"] == "file":
+            from tearis_offline import read_wav, to_stereo
+            audio, rate = read_wav(spec["device"])
+            if rate != SAMPLE_RATE:
+                raise ValueError(f"{spec['device']}: {rate} Hz (la cadena trabaja a {SAMPLE_RATE} Hz)")
+            source = to_stereo(audio)
+        else:
+            source = tone_source(SAMPLE_RATE, CHANNELS)
+        dtype = np.dtype(dtype)
+        if dtype == np.int16:
+            source = np.clip(source * 32767.0, -32768, 32767)
+        self.source = source.astype(dtype)
+        self.indata = np.empty((blocksize, CHANNELS), dtype=dtype)
+        self.outdata = np.empty_like(self.indata)
+        self.pos = 0
+        self.release = 0.0
+        self.underflow = False
+        self.active = True
+
+    @property
+    def deadline(self):
+        return self.release + self.period
+
+    def run_block(self):
+        """Un bloque por la cadena; True si terminó antes de su deadline"""
+        n = self.source.shape[0]
+        idx = (self.pos + np.arange(self.blocksize)) % n
+        np.take(self.source, idx, axis=0, out=self.indata)
+        self.pos = (self.pos + self.blocksize) % n
+        self.pipeline.callback(self.indata, self.outdata, self.blocksize, None,
+                               CallbackFlags(output_underflow=self.underflow))
+        end = time.monotonic()
+        self.underflow = end > self.deadline
+        # Tras un xrun el dispositivo se reprograma desde ahora, como NullStream
+        self.release = end if self.underflow else self.release + self.period
+        return not self.underflow
+
+
+def _release_entry(entry):
+    """Detiene el stream de un dispositivo del núcleo y cierra su memoria compartida"""
+    name, control, ring, pipeline, params, supervisor, is_active = entry
+    if supervisor:
+        supervisor.stop()
+    control.block["active"] = 0
+    ring.close()
+    control.close()
+
+
+def hub_worker_main(core, specs, blocksize=BLOCKSIZE, dtype="float32", pipeline_kwargs=None):
+    """
+    Proceso de un núcleo: cadenas de sus dispositivos y planificador EDF
+
+    Args:
+        core: núcleo al que se fija el proceso (None: sin afinidad)
+        specs: dispositivos de parse_devices con control_name y ring_name
+    """
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    if core is not None:
+        try:
+            os.sched_setaffinity(0, {core})
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo fijar el núcleo {core}: {e}")
+    entries = []
+    clocked = []
+    for spec in specs:
+        control = ControlBlock(spec["control_name"])
+        ring = ShmRing(spec["ring_name"], frames=blocksize, dtype=dtype)
+        pipeline = AudioPipeline(tap=ring.write, blocksize=blocksize, dtype=dtype, **(pipeline_kwargs or {}))
+        apply_profiles(pipeline)
+        params = ParamApplier(control, pipeline)
+        params.poll()
+        if spec["backend"] in CLOCKED_BACKENDS:
+            device = ClockedDevice(spec, pipeline, blocksize, dtype)
+            clocked.append(device)
+            supervisor = None
+            is_active = lambda device=device: device.active
+        else:
+            resolved = resolve_device(spec["backend"], (spec["device"], spec["device"]))
+            supervisor = StreamSupervisor(
+                lambda backend=spec["backend"], resolved=resolved, pipeline=pipeline: pipeline.attach_stream(
+                    open_stream(backend, device=resolved, samplerate=SAMPLE_RATE, blocksize=blocksize,
+                                channels=CHANNELS, dtype=dtype, callback=pipeline.callback, latency=0.25)),
+                heartbeat=lambda pipeline=pipeline: pipeline.callbacks, on_restart=pipeline.resume)
+            supervisor.start()
+            is_active = lambda supervisor=supervisor: supervisor.active
+        control.block["active"] = 1
+        entries.append((spec["name"], control, ring, pipeline, params, supervisor, is_active))
+    logger.info(f"✅ Núcleo {core}: {', '.join(spec['name'] for spec in specs)}")
+
+    start = time.monotonic()
+    for device in clocked:
+        device.release = start
+    next_poll = start
+    try:
+        while entries:
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll = now + POLL_S
+                for entry in list(entries):
+                    name, control, ring, pipeline, params, supervisor, is_active = entry
+                    if control.block["stop"]:
+                        # Solo este dispositivo: su stream o su reloj, su anillo y su bloque de control
+                        entries.remove(entry)
+                        clocked = [d for d in clocked if d.name != name]
+                        _release_entry(entry)
+                        logger.info(f"🛑 {name} detenido (núcleo {core})")
+                        continue
+                    params.poll()
+                    control.publish_stats(pipeline.get_stats(), pipeline.get_vad(), is_active())
+                continue
+            # EDF: el bloque listo que vence primero
+            ready = [d for d in clocked if d.active and d.release <= now]
+            if ready:
+                min(ready, key=lambda d: d.deadline).run_block()
+                continue
+            wake = min([d.release for d in clocked if d.active] + [next_poll])
+            time.sleep(max(0.0, wake - time.monotonic()))
+    finally:
+        for entry in entries:
+            _release_entry(entry)
+        logger.info(f"✅ Núcleo {core} detenido")
+
+
+# ========================================
+# Lado servidor BLE
+# ========================================
+class HubDevice(AudioEngineProcess):
+    """
+    Un dispositivo del hub con la interfaz de AudioEngineProcess (modo,
+    ganancia, tap, estadísticas); el proceso es el del núcleo que lo atiende
+    """
+
+    def __init__(self, hub, index, spec, blocksize=BLOCKSIZE, dtype="float32"):
+        self.hub = hub
+        self.index = index
+        self.name = spec["name"]
+        self.backend = spec["backend"]
+        self.device = spec["device"]
+        self.card = spec["card"]
+        self.core = None
+        self.blocksize = blocksize
+        self.dtype = np.dtype(dtype).name
+        self.on_event = None
+        self.control = ControlBlock()
+        self.ring = ShmRing(frames=blocksize, dtype=dtype)
+        self.restarts = 0
+        self.set_mode("normal")
+
+    @property
+    def process(self):
+        return self.hub.workers.get(self.core)
+
+    @property
+    def active(self):
+        process = self.process
+        return bool(process and process.is_alive() and self.control.block["active"])
+
+    def spec(self):
+        return {"name": self.name, "backend": self.backend, "device": self.device, "card": self.card,
+                "control_name": self.control.name, "ring_name": self.ring.name}
+
+    def start(self):
+        self.hub.start()
+
+    def stop(self):
+        """Saca el dispositivo de su núcleo (los demás siguen)"""
+        self.control.block["stop"] = 1
+
+    def close(self):
+        self.stop()
+
+
+class Hub:
+    """
+    Registro de dispositivos y pool de procesos por núcleo
+
+    Args:
+        devices: lista de parse_devices
+        cores: núcleos a usar (None: hub_cores())
+        mode: modo con el que se estima la carga del reparto
+        pipeline_kwargs: channel_strategy, beamformer, denoiser, feedback, subband
+    """
+
+    def __init__(self, devices, cores=None, blocksize=BLOCKSIZE, dtype="float32", mode="normal",
+                 on_event=None, **pipeline_kwargs):
+        if not devices:
+            raise ValueError("El hub necesita al menos un dispositivo")
+        self.blocksize = blocksize
+        self.dtype = np.dtype(dtype).name
+        self.pipeline_kwargs = pipeline_kwargs
+        self.on_event = on_event
+        self.devices = [HubDevice(self, i, spec, blocksize, dtype) for i, spec in enumerate(devices)]
+        self.placement = assign_devices(devices, hub_cores(cores), mode)
+        for core, indices in self.placement.items():
+            for i in indices:
+                self.devices[i].core = core
+        self.workers = {}
+        self.restarts = 0
+        self._supervising = False
+        for core, indices in self.placement.items():
+            names = ", ".join(self.devices[i].name for i in indices)
+            logger.info(f"🧭 Núcleo {core}: {names}")
+
+    def device(self, name):
+        for device in self.devices:
+            if device.name == name:
+                return device
+        raise KeyError(name)
+
+    def start(self):
+        """Lanza los procesos de núcleo que falten (idempotente)"""
+        for core in self.placement:
+            process = self.workers.get(core)
+            if process is None or not process.is_alive():
+                self._start_worker(core)
+        if not self._supervising:
+            self._supervising = True
+            threading.Thread(target=self._supervise, name="hub-supervisor", daemon=True).start()
+        return self
+
+    def _start_worker(self, core):
+        devices = [self.devices[i] for i in self.placement[core] if not self.devices[i].control.block["stop"]]
+        if not devices:
+            return
+        ctx = multiprocessing.get_context("spawn")
+        process = ctx.Process(target=hub_worker_main, name=f"tearis-hub-{core}",
+                              args=(core, [d.spec() for d in devices], self.blocksize, self.dtype,
+                                    self.pipeline_kwargs), daemon=True)
+        process.start()
+        self.workers[core] = process
+        logger.info(f"🚀 Núcleo {core}: proceso {process.pid} con {len(devices)} dispositivo(s)")
+
+    def _supervise(self):
+        while self._supervising:
+            time.sleep(1.0)
+            for core, process in list(self.workers.items()):
+                if not self._supervising or process.is_alive():
+                    continue
+                self.restarts += 1
+                logger.warning(f"⚠️ Proceso del núcleo {core} caído (código {process.exitcode}), relanzando...")
+                for i in self.placement[core]:
+                    device = self.devices[i]
+                    device.restarts += 1
+                    if device.on_event:
+                        device.on_event("down", {"reason": "núcleo caído", "silent_ms": 0.0})
+                self._start_worker(core)
+
+    def get_stats(self):
+        """Por dispositivo: núcleo, xruns, callbacks y si está activo"""
+        stats = {}
+        for device in self.devices:
+            s = device.get_stats()
+            stats[device.name] = {"core": device.core, "active": device.active, "xruns": s["xruns"],
+                                  "callbacks": s["callbacks"], "callback_max_ms": s["callback_max_ms"],
+                                  "tap_dropped": s["tap_dropped"]}
+        return stats
+
+    def close(self):
+        self._supervising = False
+        for device in self.devices:
+            device.stop()
+        for process in self.workers.values():
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        self.workers = {}
+        for device in self.devices:
+            device.ring.close()
+            device.control.close()
+
+
+# ========== BENCHMARK ==========
+
+def _run_hub(count, mode, seconds, cores, backend="null"):
+    devices = [{"name": f"{backend}{i}", "backend": backend, "device": None, "card": None}
+               for i in range(count)]
+    hub = Hub(devices, cores=cores, mode=mode, denoiser="spectral")
+    for device in hub.devices:
+        device.set_mode(mode)
+    hub.start()
+    try:
+        # Arranque: creación de cadenas y primer modo
+        deadline = time.monotonic() + 30.0
+        while not all(d.active for d in hub.devices) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(1.0)
+        for device in hub.devices:
+            device.reset_stats()
+        time.sleep(0.2)
+        before = {d.name: d.get_stats()["callbacks"] for d in hub.devices}
+        time.sleep(seconds)
+        stats = hub.get_stats()
+    finally:
+        hub.close()
+    xruns = sum(s["xruns"] for s in stats.values())
+    expected = seconds * SAMPLE_RATE / BLOCKSIZE
+    delivered = min((s["callbacks"] - before[name]) / expected for name, s in stats.items())
+    return xruns, delivered
+
+
+def streams_per_core(mode="escuela", seconds=3.0, max_streams=16):
+    """
+    Cuántos dispositivos nulos atiende un núcleo sin xruns (duplicando y
+    luego bisecando)
+
+    Returns:
+        {streams, mode, runs: [(dispositivos, xruns, fracción de bloques entregados)]}
+    """
+    core = [hub_cores()[0]]
+    runs = []
+
+    def clean(count):
+        xruns, delivered = _run_hub(count, mode, seconds, core)
+        runs.append((count, xruns, delivered))
+        return xruns == 0 and delivered > 0.95
+
+    good, bad = 0, None
+    count = 1
+    while count <= max_streams:
+        if not clean(count):
+            bad = count
+            break
+        good = count
+        count *= 2
+    if bad is not None:
+        while bad - good > 1:
+            mid = (good + bad) // 2
+            if clean(mid):
+                good = mid
+            else:
+                bad = mid
+    return {"streams": good, "mode": mode, "runs": sorted(runs)}
+
+
+def benchmark(seconds=3.0):
+    """Streams por núcleo sin xruns en modo normal y en escuela (reductor espectral)"""
+    results = {}
+    for mode in ("normal", "escuela"):
+        r = streams_per_core(mode, seconds)
+        results[f"{mode}_streams_per_core"] = r["streams"]
+        results[f"{mode}_runs"] = r["runs"]
+    results["cores"] = len(hub_cores())
+    results["ok"] = results["escuela_streams_per_core"] >= 1
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Hub: streams por núcleo sin xruns (dispositivos nulos)")
+    print("=" * 60)
+    r = benchmark()
+    for mode in ("normal", "escuela"):
+        runs = " ".join(f"{n}:{x}xr/{d * 100:.0f}%" for n, x, d in r[f"{mode}_runs"])
+        print(f"{mode:<8} {r[f'{mode}_streams_per_core']:3d} streams por núcleo  ({runs})")
+    print(f"Núcleos disponibles: {r['cores']} (capacidad total ~{r['escuela_streams_per_core'] * r['cores']} en escuela)")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
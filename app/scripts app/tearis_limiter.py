@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Limitador de picos con look-ahead
+Última etapa del callback de audio: protege contra transitorios bruscos
+que el tope de volumen del WM8960 (85%) no puede frenar.
+"""
+
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger("TEARIS-LIMITER")
+
+SAMPLE_RATE = 48000
+FRAME_SIZE = 480  # 10 ms @ 48 kHz
+
+# Presets por modo
+#   ceiling_db:   techo de salida en dBFS
+#   lookahead_ms: retardo agregado (ventana de anticipación)
+#   attack_ms:    duración de la bajada de ganancia (<= lookahead)
+#   release_ms:   tiempo para recuperar 20 dB de reducción
+LIMITER_PRESETS = {
+    "normal": {"ceiling_db": -3.0, "lookahead_ms": 2.0, "attack_ms": 1.5, "release_ms": 80.0},
+    "escuela": {"ceiling_db": -6.0, "lookahead_ms": 2.0, "attack_ms": 1.0, "release_ms": 150.0},
+    "transporte": {"ceiling_db": -6.0, "lookahead_ms": 2.0, "attack_ms": 1.0, "release_ms": 250.0},
+}
+
+# Nombres alternativos que puede mandar la app
+MODE_ALIASES = {
+    "mode_school": "escuela",
+    "school": "escuela",
+    "mode_transport": "transporte",
+    "transport": "transporte",
+    "mode_normal": "normal",
+}
+
+
+def normalize_mode(mode):
+    """Devuelve el nombre canónico del modo ('normal', 'escuela', 'transporte')"""
+    mode = str(mode).lower()
+    return MODE_ALIASES.get(mode, mode)
+
+
+def sliding_min(x, window):
+    """
+    Mínimo móvil de van Herk / Gil-Werman, vectorizado por bloques
+
+    Args:
+        x: array 1D
+        window: largo de la ventana
+
+    Returns:
+        array de len(x) - window + 1 valores, out[i] = min(x[i:i + window])
+    """
+    n = x.shape[0]
+    out_len = n - window + 1
+    nblocks = -(-n // window)
+    pad = nblocks * window - n
+    if pad:
+        x = np.concatenate([x, np.full(pad, np.inf, dtype=x.dtype)])
+    blocks = x.reshape(nblocks, window)
+    prefix = np.minimum.accumulate(blocks, axis=1).ravel()
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(suffix[:out_len], prefix[window - 1:window - 1 + out_len])
+
+
+class PeakLimiter:
+    """
+    Limitador de picos estéreo (ganancia enlazada entre canales)
+
+    Cadena por bloque, sin bucles por muestra:
+      1. ganancia objetivo por muestra a partir del pico entre canales
+      2. mínimo móvil sobre la ventana de look-ahead (hold)
+      3. release con pendiente máxima en dB (mínimo acumulado)
+      4. suavizado de ataque con media móvil (suma acumulada)
+      5. aplicación sobre la señal retrasada `lookahead` muestras
+
+    Como cada ganancia promediada ya cubre el pico que viene, la salida
+    nunca supera el techo.
+    """
+
+    def __init__(self, ceiling_db=-3.0, lookahead_ms=2.0, attack_ms=1.5,
+                 release_ms=80.0, channels=2, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.ceiling_db = float(ceiling_db)
+        self.ceiling = 10.0 ** (self.ceiling_db / 20.0)
+        self.lookahead = max(1, int(round(lookahead_ms * sample_rate / 1000.0)))
+        self.attack = min(self.lookahead + 1, max(1, int(round(attack_ms * sample_rate / 1000.0))))
+        # dB por muestra que puede subir la ganancia en el release
+        self.release_step = 20.0 / max(1.0, release_ms * sample_rate / 1000.0)
+
+        # Estado entre bloques
+        self._target_hist = np.zeros(self.lookahead, dtype=np.float64)
+        self._gain_hist = np.ones(self.attack - 1, dtype=np.float64)
+        self._release_prev = 0.0
+        self._delay = np.zeros((self.lookahead, channels), dtype=np.float32)
+        self._ramp = np.zeros(0)
+
+        # Métricas
+        self.blocks = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.max_reduction_db = 0.0
+
+    @classmethod
+    def from_mode(cls, mode, channels=2, sample_rate=SAMPLE_RATE):
+        """Crea un limitador con el preset del modo (o 'normal' si no existe)"""
+        preset = LIMITER_PRESETS.get(normalize_mode(mode), LIMITER_PRESETS["normal"])
+        return cls(channels=channels, sample_rate=sample_rate, **preset)
+
+    @property
+    def latency_ms(self):
+        """Latencia agregada por el look-ahead"""
+        return self.lookahead * 1000.0 / self.sample_rate
+
+    def process(self, block):
+        """
+        Limita un bloque en el lugar
+
+        Args:
+            block: numpy array (frames, channels) float32 en [-1, 1]
+        """
+        start = time.perf_counter()
+        n = block.shape[0]
+        if self._ramp.shape[0] < n:
+            self._ramp = self.release_step * np.arange(n, dtype=np.float64)
+        ramp = self._ramp[:n]
+
+        # 1. Ganancia objetivo en dB (<= 0)
+        peak = np.abs(block).max(axis=1).astype(np.float64)
+        np.maximum(peak, 1e-9, out=peak)
+        target = np.minimum(0.0, self.ceiling_db - 20.0 * np.log10(peak))
+
+        # 2. Hold sobre la ventana de look-ahead
+        hist = np.concatenate([self._target_hist, target])
+        held = sliding_min(hist, self.lookahead + 1)
+        self._target_hist = hist[-self.lookahead:]
+
+        # 3. Release: r[k] = min(held[k], r[k-1] + paso)
+        released = ramp + np.minimum(self._release_prev + self.release_step,
+                                     np.minimum.accumulate(held - ramp))
+        self._release_prev = released[-1]
+
+        # 4. Ataque: media móvil de la ganancia lineal
+        gain = 10.0 ** (released / 20.0)
+        if self.attack > 1:
+            ghist = np.concatenate([self._gain_hist, gain])
+            csum = np.concatenate([[0.0], np.cumsum(ghist)])
+            gain = (csum[self.attack:] - csum[:-self.attack]) / self.attack
+            self._gain_hist = ghist[-(self.attack - 1):]
+
+        # 5. Señal retrasada por el look-ahead
+        delayed = np.concatenate([self._delay, block])
+        self._delay = delayed[-self.lookahead:].copy()
+        np.multiply(delayed[:n], gain[:, None], out=block, casting='unsafe')
+
+        elapsed = time.perf_counter() - start
+        self.blocks += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.max_reduction_db = max(self.max_reduction_db, -float(released.min()))
+        return block
+
+    def get_stats(self):
+        """Métricas de costo y reducción desde la creación"""
+        avg = self.total_time / self.blocks if self.blocks else 0.0
+        return {
+            "latency_ms": self.latency_ms,
+            "avg_ms": avg * 1000.0,
+            "max_ms": self.max_time * 1000.0,
+            "max_reduction_db": self.max_reduction_db,
+            "blocks": self.blocks,
+        }
+
+
+# ========== BENCHMARK ==========
+
+def benchmark(mode="normal", blocks=2000, blocksize=FRAME_SIZE, seed=0):
+    """
+    Mide costo por bloque y verifica el techo con ruido + golpes fuertes
+
+    Returns:
+        dict con métricas y 'ok' (techo respetado y dentro del presupuesto)
+    """
+    rng = np.random.default_rng(seed)
+    limiter = PeakLimiter.from_mode(mode)
+    budget_ms = blocksize * 1000.0 / limiter.sample_rate
+    times = np.empty(blocks)
+    out_peak = 0.0
+
+    for i in range(blocks):
+        block = (0.05 * rng.standard_normal((blocksize, limiter.channels))).astype(np.float32)
+        if i % 7 == 0:
+            # Transitorio: portazo / grito
+            pos = rng.integers(0, blocksize - 16)
+            block[pos:pos + 16] = rng.choice([-1.0, 1.0], size=(16, 1)) * 0.99
+        t0 = time.perf_counter()
+        limiter.process(block)
+        times[i] = (time.perf_counter() - t0) * 1000.0
+        out_peak = max(out_peak, float(np.abs(block).max()))
+
+    out_peak_db = 20.0 * np.log10(max(out_peak, 1e-9))
+    result = {
+        "mode": mode,
+        "latency_ms": limiter.latency_ms,
+        "avg_ms": float(times.mean()),
+        "p99_ms": float(np.percentile(times, 99)),
+        "max_ms": float(times.max()),
+        "budget_ms": budget_ms,
+        "out_peak_db": out_peak_db,
+        "ceiling_db": limiter.ceiling_db,
+    }
+    result["ok"] = (out_peak_db <= limiter.ceiling_db + 0.01
+                    and result["p99_ms"] + limiter.latency_ms < budget_ms)
+    return result
+
+
+def main():
+    """Benchmark de los presets de cada modo"""
+    print("=" * 60)
+    print("TEARIS - Benchmark del limitador de picos")
+    print("=" * 60)
+    ok = True
+    for mode in LIMITER_PRESETS:
+        r = benchmark(mode)
+        ok = ok and r["ok"]
+        print(f"{'✅' if r['ok'] else '❌'} {mode:<11} latencia {r['latency_ms']:.2f} ms | "
+              f"CPU prom {r['avg_ms']:.3f} ms p99 {r['p99_ms']:.3f} ms max {r['max_ms']:.3f} ms "
+              f"(presupuesto {r['budget_ms']:.1f} ms) | pico {r['out_peak_db']:.2f} dBFS "
+              f"(techo {r['ceiling_db']:.1f})")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    exit(main())
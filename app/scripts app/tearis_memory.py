@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Contabilidad de memoria
+La Zero 2 W tiene 512 MB compartidos con la GPU: este módulo reporta el RSS
+por subsistema (imports, RNNoise, buffers de audio, objetos D-Bus), permite
+prender y apagar tracemalloc en caliente y verifica un presupuesto que
+hace fallar tearis_bench.py si se excede.
+
+Uso:
+    python3 tearis_memory.py            # imports + régimen estable con backend nulo
+    kill -USR2 <pid del servidor>       # prende tracemalloc / vuelca el top y lo apaga
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import threading
+import subprocess
+import tracemalloc
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger("TEARIS-MEM")
+
+# Presupuesto en régimen estable (deja lugar al modelo del clasificador)
+MEMORY_BUDGET = {
+    "rss_mb": 120.0,              # RSS total del proceso
+    "rss_growth_mb_per_min": 1.0, # crecimiento sostenido (fugas)
+    "alloc_per_min": 300000,      # asignaciones de objetos con GC por minuto
+}
+
+# Subsistemas cuyo costo de import se mide por separado, en este orden
+IMPORT_GROUPS = (
+    ("numpy", ("numpy",)),
+    ("portaudio", ("sounddevice",)),
+    ("dbus", ("dbus", "dbus.service", "dbus.mainloop.glib")),
+    ("gi", ("gi.repository.GLib",)),
+    ("tearis", ("tearis_pipeline", "tearis_audio_engine", "tearis_control")),
+)
+
+
+def rss_kb():
+    """RSS actual y pico (VmRSS, VmHWM) en kB"""
+    values = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    values[key] = int(value.split()[0])
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak, peak
+    return values.get("VmRSS", 0), values.get("VmHWM", 0)
+
+
+def import_report(groups=IMPORT_GROUPS):
+    """
+    RSS que agrega cada grupo de imports, medido en un intérprete nuevo
+    (en el servidor ya están todos cargados y no se pueden separar)
+
+    Returns:
+        {grupo: kB} más 'python' (intérprete vacío); los grupos que no se
+        pueden importar quedan en None
+    """
+    script = (
+        "import json, importlib, sys\n"
+        "sys.path.insert(0, sys.argv[1])\n"
+        "from tearis_memory import rss_kb\n"
+        "out = {'python': rss_kb()[0]}\n"
+        "for name, modules in json.loads(sys.argv[2]):\n"
+        "    before = rss_kb()[0]\n"
+        "    try:\n"
+        "        for m in modules: importlib.import_module(m)\n"
+        "        out[name] = rss_kb()[0] - before\n"
+        "    except Exception:\n"
+        "        out[name] = None\n"
+        "print(json.dumps(out))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        result = subprocess.run([sys.executable, "-c", script, here, json.dumps(groups)],
+                                capture_output=True, text=True, timeout=60)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (OSError, subprocess.TimeoutExpired, ValueError, IndexError) as e:
+        logger.error(f"❌ No se pudo medir los imports: {e}")
+        return {}
+
+
+def owned_array_bytes(obj, depth=3, _seen=None):
+    """
+    Bytes de arrays NumPy propios (no vistas) alcanzables desde `obj`
+    por atributos, listas, tuplas y dicts
+    """
+    import numpy as np
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if obj.base is None else 0
+    if depth <= 0:
+        return 0
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple, set)):
+        children = obj
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        children = vars(obj).values()
+    else:
+        return 0
+    return sum(owned_array_bytes(child, depth - 1, seen) for child in children)
+
+
+def pipeline_buffers(pipeline):
+    """Bytes de buffers de la cadena DSP por etapa (kB)"""
+    graph = pipeline.graph
+    buffers = {node.name: owned_array_bytes(node) / 1024.0 for node in graph.nodes}
+    buffers["graph"] = sum(a.nbytes for a in (graph.scratch, graph.work) if a is not None) / 1024.0 \
+        if graph.schedule else 0.0
+    return buffers
+
+
+class MemoryAccountant:
+    """
+    RSS por subsistema: cada `measure(nombre)` guarda lo que creció el RSS
+    mientras se ejecutaba el bloque (la última vez que se midió)
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.sources = {}
+        self.baseline_kb, _ = rss_kb()
+        self._monitor = None
+        self.samples = []
+
+    @contextmanager
+    def measure(self, name):
+        before, _ = rss_kb()
+        try:
+            yield
+        finally:
+            self.sections[name] = rss_kb()[0] - before
+
+    def add_source(self, name, func):
+        """Función que devuelve {etiqueta: kB} de buffers vivos (p. ej. pipeline_buffers)"""
+        self.sources[name] = func
+
+    def report(self):
+        rss, peak = rss_kb()
+        buffers = {}
+        for name, func in self.sources.items():
+            try:
+                for label, kb in func().items():
+                    buffers[f"{name}.{label}"] = kb
+            except Exception as e:
+                logger.debug(f"Fuente de memoria {name} falló: {e}")
+        return {
+            "rss_kb": rss,
+            "peak_kb": peak,
+            "baseline_kb": self.baseline_kb,
+            "sections": dict(self.sections),
+            "buffers": buffers,
+            "gc_objects": len(gc.get_objects()),
+            "tracemalloc": tracing.report() if tracemalloc.is_tracing() else None,
+        }
+
+    def log_report(self, log=logger):
+        r = self.report()
+        log.info(f"🧠 RSS {r['rss_kb'] / 1024:.1f} MB (pico {r['peak_kb'] / 1024:.1f} MB) | "
+                 f"objetos GC {r['gc_objects']}")
+        for name, kb in r["sections"].items():
+            log.info(f"   📦 {name:<12} {kb / 1024:7.2f} MB")
+        total = sum(r["buffers"].values())
+        if total:
+            top = sorted(r["buffers"].items(), key=lambda kv: -kv[1])[:5]
+            log.info(f"   🎚️ buffers de audio {total:.1f} kB ({', '.join(f'{k} {v:.0f} kB' for k, v in top)})")
+
+    def start_monitor(self, interval=60.0, log=logger):
+        """Reporte periódico con el crecimiento por minuto desde el último"""
+        def monitor():
+            last_rss, _ = rss_kb()
+            last_time = time.monotonic()
+            while self._monitor:
+                time.sleep(interval)
+                rss, _ = rss_kb()
+                now = time.monotonic()
+                growth = (rss - last_rss) / 1024.0 / ((now - last_time) / 60.0)
+                self.samples.append((now, rss))
+                log.info(f"🧠 RSS {rss / 1024:.1f} MB | {growth:+.2f} MB/min")
+                last_rss, last_time = rss, now
+        self._monitor = threading.Thread(target=monitor, name="memory-monitor", daemon=True)
+        self._monitor.start()
+
+    def stop_monitor(self):
+        self._monitor = None
+
+
+class TracemallocToggle:
+    """tracemalloc prendible en caliente, con diferencia contra la foto inicial"""
+
+    def __init__(self, frames=10):
+        self.frames = frames
+        self.baseline = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.baseline = tracemalloc.take_snapshot()
+            logger.info("🔬 tracemalloc activado")
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            self.baseline = None
+            logger.info("🔬 tracemalloc desactivado")
+
+    def toggle(self):
+        if tracemalloc.is_tracing():
+            self.log_top()
+            self.stop()
+        else:
+            self.start()
+
+    def top(self, limit=10):
+        """Líneas que más crecieron desde que se prendió"""
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        stats = snapshot.compare_to(self.baseline, "lineno") if self.baseline else snapshot.statistics("lineno")
+        return [str(stat) for stat in stats[:limit]]
+
+    def report(self):
+        current, peak = tracemalloc.get_traced_memory()
+        return {"traced_kb": current / 1024.0, "traced_peak_kb": peak / 1024.0}
+
+    def log_top(self, limit=10):
+        for line in self.top(limit):
+            logger.info(f"   🔬 {line}")
+
+
+# Instancias del proceso (el servidor y el pipeline registran acá)
+accountant = MemoryAccountant()
+tracing = TracemallocToggle()
+
+
+# ========== PRESUPUESTO ==========
+
+class AllocationCounter:
+    """
+    Asignaciones de objetos con GC: cada colección de generación 0 se
+    dispara tras `threshold[0]` asignaciones netas, así que colecciones x
+    umbral acota la tasa de asignación sin instrumentar el intérprete
+    """
+
+    def __init__(self):
+        self.collections = 0
+        gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self.collections += 1
+
+    def close(self):
+        gc.callbacks.remove(self._on_gc)
+
+    def allocations(self):
+        return self.collections * gc.get_threshold()[0]
+
+
+def check_budget(steady, budget=MEMORY_BUDGET):
+    """
+    Compara las mediciones de régimen estable con el presupuesto
+
+    Returns:
+        lista de violaciones (vacía si está todo dentro)
+    """
+    violations = []
+    for key, limit in budget.items():
+        if key in steady and steady[key] > limit:
+            violations.append(f"{key} {steady[key]:.2f} > {limit}")
+    return violations
+
+
+def steady_state(seconds=30.0, warmup=5.0):
+    """
+    Régimen estable de la cadena completa con backend nulo y tap hacia una
+    cola (como el servidor), en el proceso actual
+    """
+    import queue
+    import numpy as np
+    from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS
+    from tearis_audio_backends import open_stream
+
+    taps = queue.Queue(maxsize=5)
+
+    def tap(block):
+        try:
+            taps.put_nowait(block.copy())
+        except queue.Full:
+            pass
+
+    with accountant.measure("audio"):
+        pipeline = AudioPipeline(tap=tap, blocksize=960)
+        pipeline.set_mode("escuela")
+        stream = open_stream("null", None, SAMPLE_RATE, 960, CHANNELS, np.float32, pipeline.callback)
+        stream.start()
+    accountant.add_source("pipeline", lambda: pipeline_buffers(pipeline))
+
+    def drain():
+        while stream.active:
+            try:
+                taps.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    threading.Thread(target=drain, daemon=True).start()
+
+    time.sleep(warmup)
+    counter = AllocationCounter()
+    blocks_before = sys.getallocatedblocks()
+    rss_before, _ = rss_kb()
+    start = time.monotonic()
+    time.sleep(seconds)
+    elapsed_min = (time.monotonic() - start) / 60.0
+    rss_after, peak = rss_kb()
+    steady = {
+        "rss_mb": rss_after / 1024.0,
+        "rss_growth_mb_per_min": (rss_after - rss_before) / 1024.0 / elapsed_min,
+        "alloc_per_min": counter.allocations() / elapsed_min,
+        "net_blocks_per_min": (sys.getallocatedblocks() - blocks_before) / elapsed_min,
+    }
+    counter.close()
+    stream.close()
+    pipeline.stop_rnnoise()
+
+    report = accountant.report()
+    steady.update({
+        "peak_mb": peak / 1024.0,
+        "sections_kb": report["sections"],
+        "buffers_kb": sum(report["buffers"].values()),
+    })
+    return steady
+
+
+def benchmark(seconds=30.0, warmup=5.0):
+    """
+    Imports por subsistema y régimen estable de la cadena completa; falla
+    si se excede MEMORY_BUDGET. El régimen estable se mide en un intérprete
+    nuevo, como import_report: el RSS del proceso que llama (p. ej. la
+    suite de benchmarks) no cuenta
+    """
+    results = {"imports_kb": import_report()}
+    script = (
+        "import json, sys\n"
+        "sys.path.insert(0, sys.argv[1])\n"
+        "from tearis_memory import steady_state\n"
+        "print(json.dumps(steady_state(float(sys.argv[2]), float(sys.argv[3]))))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        result = subprocess.run([sys.executable, "-c", script, here, str(seconds), str(warmup)],
+                                capture_output=True, text=True, timeout=seconds + warmup + 60)
+        steady = json.loads(result.stdout.strip().splitlines()[-1])
+    except (OSError, subprocess.TimeoutExpired, ValueError, IndexError) as e:
+        return dict(results, error=f"No se pudo medir el régimen estable: {e}", violations=[], ok=False)
+
+    violations = check_budget(steady)
+    results.update(steady)
+    results.update({"violations": violations, "ok": not violations})
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Memoria: imports y régimen estable")
+    print("=" * 60)
+    r = benchmark()
+    if "error" in r:
+        print(f"❌ {r['error']}")
+        return 1
+    print("Imports (intérprete nuevo):")
+    for name, kb in r["imports_kb"].items():
+        print(f"   {name:<10} {'no disponible' if kb is None else f'{kb / 1024:7.2f} MB'}")
+    print(f"Cadena de audio: {r['sections_kb'].get('audio', 0) / 1024:.2f} MB "
+          f"(buffers {r['buffers_kb']:.1f} kB)")
+    print(f"RSS estable {r['rss_mb']:.1f} MB (pico {r['peak_mb']:.1f}) | "
+          f"crecimiento {r['rss_growth_mb_per_min']:+.2f} MB/min | "
+          f"asignaciones {r['alloc_per_min']:.0f}/min | bloques netos {r['net_blocks_per_min']:+.0f}/min")
+    for v in r["violations"]:
+        print(f"❌ Fuera de presupuesto: {v}")
+    if r["ok"]:
+        print("✅ Dentro del presupuesto")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
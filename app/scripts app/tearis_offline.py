@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Procesamiento offline
+Pasa archivos WAV (o material sintético) por la misma cadena del callback,
+bloque a bloque, para comparar configuraciones sin la placa.
+
+Uso:
+    python3 tearis_offline.py grabacion.wav -o limpia.wav --mode escuela --channels auto
+    python3 tearis_offline.py grabacion.wav --compare-channels
+    python3 tearis_offline.py --compare-channels          # material sintético
+    python3 tearis_offline.py --compare-beam              # escena de dos micrófonos
+    python3 tearis_offline.py --compare-feedback          # fuga simulada en lazo cerrado
+"""
+
+import sys
+import time
+import wave
+import argparse
+import logging
+import numpy as np
+
+from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS, CHANNEL_STRATEGIES
+from tearis_beamformer import BEAM_METHODS, MIC_SPACING, steering_vectors
+
+logger = logging.getLogger("TEARIS-OFFLINE")
+
+BLOCKSIZE = 960
+# Banda de voz para el SNR del beamformer: debajo de ~300 Hz dos micrófonos
+# a 15 cm casi no discriminan dirección
+SPEECH_BAND = (300.0, 8000.0)
+# Retardo máximo de la cadena a buscar al alinear: reductor 480 + look-ahead del
+# limitador 96 = 576 muestras, 816 con el beamformer; con margen (como MAX_LAG
+# de tearis_corpus)
+MAX_LAG = 1200
+# Latencia de entrada + salida del códec en el lazo de realimentación: el
+# servidor abre el stream con latency=0.25 en cada sentido
+STREAM_LATENCY = 0.5
+
+
+# ========== ARCHIVOS ==========
+
+def read_wav(path):
+    """WAV PCM de 16/24/32 bits -> (float32 (frames, canales) en [-1, 1], frecuencia)"""
+    with wave.open(path, "rb") as f:
+        channels = f.getnchannels()
+        width = f.getsampwidth()
+        rate = f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        data = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8).astype(np.float32) / 8388608.0
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"{path}: {8 * width} bits no soportado")
+    return data.reshape(-1, channels), rate
+
+
+def write_wav(path, audio, rate=SAMPLE_RATE):
+    """float [-1, 1] o int16 (frames, canales) -> WAV de 16 bits"""
+    audio = np.atleast_2d(np.asarray(audio))
+    if audio.shape[0] < audio.shape[1]:
+        audio = audio.T
+    if audio.dtype != np.int16:
+        audio = np.clip(audio * 32768.0, -32768, 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(audio.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(audio.astype("<i2").tobytes())
+
+
+def to_stereo(audio):
+    """Mono -> dos canales iguales; más de dos -> los dos primeros"""
+    if audio.shape[1] == 1:
+        return np.repeat(audio, CHANNELS, axis=1)
+    return audio[:, :CHANNELS]
+
+
+# ========== MATERIAL SINTÉTICO ==========
+
+def synth_speech(seconds=10.0, rate=SAMPLE_RATE, seed=0):
+    """
+    Señal tipo voz: armónicos de una f0 que varía, envolvente silábica de
+    ~4 Hz y pausas, con formantes aproximados por el decaimiento armónico
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * rate)
+    t = np.arange(n) / rate
+    f0 = 150.0 + 40.0 * np.sin(2 * np.pi * 0.3 * t) + 15.0 * np.sin(2 * np.pi * 1.7 * t + rng.uniform(0, np.pi))
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voiced = sum(np.sin(k * phase) / k ** 1.2 for k in range(1, 25))
+    syllables = np.clip(np.sin(2 * np.pi * 4.0 * t + rng.uniform(0, np.pi)), 0, None) ** 2
+    # Pausas de ~0.5 s cada ~2 s
+    pauses = (np.sin(2 * np.pi * 0.5 * t) > -0.7).astype(np.float64)
+    smooth = np.ones(int(0.02 * rate)) / int(0.02 * rate)
+    envelope = np.convolve(syllables * pauses, smooth, mode="same")
+    speech = voiced * envelope
+    return (0.25 * speech / (np.max(np.abs(speech)) + 1e-12)).astype(np.float32)
+
+
+def synth_noise(n, channels=CHANNELS, correlation=0.9, seed=1):
+    """Ruido de fondo rosado aproximado con la correlación pedida entre canales"""
+    rng = np.random.default_rng(seed)
+    common = rng.standard_normal(n)
+    noise = np.empty((n, channels))
+    for ch in range(channels):
+        own = rng.standard_normal(n)
+        noise[:, ch] = np.sqrt(correlation) * common + np.sqrt(1 - correlation) * own
+    # Espectro 1/f: amplitud escalada por 1/sqrt(f)
+    spectrum = np.fft.rfft(noise, axis=0)
+    freqs = np.fft.rfftfreq(n)
+    spectrum[1:] /= np.sqrt(freqs[1:] / freqs[1])[:, None]
+    spectrum[0] = 0
+    noise = np.fft.irfft(spectrum, n=n, axis=0)
+    return (noise / np.std(noise)).astype(np.float32)
+
+
+def mix_at_snr(clean, noise, snr_db):
+    """Escala el ruido para que la mezcla tenga el SNR pedido"""
+    p_clean = np.mean(clean.astype(np.float64) ** 2)
+    p_noise = np.mean(noise.astype(np.float64) ** 2)
+    gain = np.sqrt(p_clean / (p_noise * 10.0 ** (snr_db / 10.0) + 1e-20))
+    return (clean + gain * noise).astype(np.float32)
+
+
+def synth_stereo(seconds=10.0, snr_db=5.0, mic_correlation=0.98, seed=0):
+    """
+    Escena de auricular: la misma voz en ambos micrófonos (con una leve
+    diferencia de nivel) más ruido con correlación entre canales
+
+    Returns:
+        (mezcla, voz limpia), ambas (frames, 2)
+    """
+    speech = synth_speech(seconds, seed=seed)
+    clean = np.stack([speech, 0.9 * speech], axis=1)
+    noise = synth_noise(len(speech), correlation=mic_correlation, seed=seed + 1)
+    return mix_at_snr(clean, noise, snr_db), clean
+
+
+def propagate(signal, angle_deg, spacing=MIC_SPACING):
+    """Fuente lejana a `angle_deg` sobre los dos micrófonos (retardo fraccional exacto)"""
+    n = len(signal)
+    d = steering_vectors(spacing, angle_deg, n_fft=n)
+    spectrum = np.fft.rfft(signal.astype(np.float64))
+    return np.fft.irfft(spectrum[None, :] * d, n=n).T.astype(np.float32)
+
+
+def synth_array(seconds=10.0, snr_db=0.0, interferer_angle=60.0, diffuse=0.2,
+                spacing=MIC_SPACING, seed=0):
+    """
+    Escena de aula para el beamformer: la docente de frente, otra voz
+    (un compañero) a `interferer_angle` grados y ruido difuso sin
+    correlación entre micrófonos con `diffuse` de la potencia del ruido
+
+    Returns:
+        (mezcla, voz de frente en ambos micrófonos), ambas (frames, 2)
+    """
+    speech = synth_speech(seconds, seed=seed)
+    clean = propagate(speech, 0.0, spacing)
+    n = len(speech)
+    talker = propagate(synth_speech(seconds, seed=seed + 7), interferer_angle, spacing)
+    talker += 0.5 * propagate(synth_noise(n, channels=1, seed=seed + 3)[:, 0], interferer_angle, spacing)
+    talker /= np.std(talker)
+    ambient = synth_noise(n, correlation=0.0, seed=seed + 5)
+    noise = np.sqrt(1.0 - diffuse) * talker + np.sqrt(diffuse) * ambient
+    return mix_at_snr(clean, noise, snr_db), clean
+
+
+# ========== PROCESAMIENTO ==========
+
+def process(audio, pipeline, blocksize=BLOCKSIZE):
+    """
+    Pasa el audio por el callback de la cadena bloque a bloque
+
+    Returns:
+        (salida float32 del mismo largo, {block_us, block_max_us, rtf})
+    """
+    audio = to_stereo(np.asarray(audio, dtype=np.float32))
+    n = audio.shape[0]
+    padded = np.zeros((-(-n // blocksize) * blocksize, CHANNELS), dtype=np.float32)
+    padded[:n] = audio
+    out = np.empty_like(padded)
+    times = []
+    for i in range(0, padded.shape[0], blocksize):
+        start = time.perf_counter()
+        pipeline.callback(padded[i:i + blocksize], out[i:i + blocksize], blocksize, None, None)
+        times.append(time.perf_counter() - start)
+    times = np.asarray(times)
+    return out[:n], {
+        "block_us": 1e6 * float(times.mean()),
+        "block_max_us": 1e6 * float(times.max()),
+        "rtf": float(times.sum()) / (n / SAMPLE_RATE),
+    }
+
+
+def snr_db(reference, estimate, band=None):
+    """
+    SNR de `estimate` respecto de `reference` (alineadas) en dB
+
+    Args:
+        band: (f_baja, f_alta) en Hz para medir solo esa banda
+    """
+    reference = reference.astype(np.float64)
+    error = estimate.astype(np.float64) - reference
+    if band is not None:
+        reference, error = _band_limit(reference, band), _band_limit(error, band)
+    return float(10.0 * np.log10(np.sum(reference ** 2) / (np.sum(error ** 2) + 1e-20)))
+
+
+def _band_limit(audio, band):
+    spectrum = np.fft.rfft(audio, axis=0)
+    freqs = np.fft.rfftfreq(audio.shape[0], 1.0 / SAMPLE_RATE)
+    spectrum[(freqs < band[0]) | (freqs > band[1])] = 0
+    return np.fft.irfft(spectrum, n=audio.shape[0], axis=0)
+
+
+def _align(reference, estimate, max_lag=MAX_LAG):
+    """Retardo de la cadena (look-ahead del limitador, RNNoise) por correlación cruzada"""
+    ref = reference[:, 0].astype(np.float64)
+    est = estimate[:, 0].astype(np.float64)
+    n = len(ref)
+    spectrum = np.fft.rfft(est, 2 * n) * np.conj(np.fft.rfft(ref, 2 * n))
+    xcorr = np.fft.irfft(spectrum)
+    lag = int(np.argmax(xcorr[:max_lag + 1]))
+    return reference[:n - lag], estimate[lag:]
+
+
+def compare_channel_strategies(noisy, clean=None, mode="escuela", strategies=CHANNEL_STRATEGIES,
+                               denoiser="rnnoise"):
+    """
+    Misma entrada por cada estrategia de canales del reductor `denoiser`
+
+    Returns:
+        {estrategia: {block_us, denoise_us, rnnoise_calls, path, vs_stereo_db[, snr_db]}}
+        denoise_us es el costo del nodo del reductor por bloque; vs_stereo_db es el SNR de la salida respecto de la de 'stereo'
+        (alto = prácticamente igual); snr_db, respecto de la voz limpia
+    """
+    results = {}
+    outputs = {}
+    for strategy in strategies:
+        pipeline = AudioPipeline(blocksize=BLOCKSIZE, channel_strategy=strategy, denoiser=denoiser)
+        pipeline.set_mode(mode)
+        # Sin librnnoise el pipeline cae al reductor espectral: no sería esta comparación
+        if pipeline.active_denoiser != denoiser:
+            raise RuntimeError(f"Reductor {denoiser} no disponible: no hay nada que comparar")
+        out, timing = process(noisy, pipeline)
+        channel = pipeline.get_channel_stats()
+        outputs[strategy] = out
+        results[strategy] = {
+            "block_us": timing["block_us"],
+            "denoise_us": pipeline.get_node_timing().get(denoiser, {"avg_us": 0.0})["avg_us"],
+            "rnnoise_calls": channel["calls_per_frame"],
+            "path": channel["path"],
+            "correlation": channel["correlation"],
+        }
+        if clean is not None:
+            ref, est = _align(to_stereo(clean), out)
+            results[strategy]["snr_db"] = snr_db(ref, est)
+        pipeline.stop_rnnoise()
+    if "stereo" in outputs:
+        for strategy, out in outputs.items():
+            results[strategy]["vs_stereo_db"] = snr_db(outputs["stereo"], out) if strategy != "stereo" else float("inf")
+    return results
+
+
+def compare_beamformers(noisy, clean, mode="escuela", methods=BEAM_METHODS):
+    """
+    Misma escena sin beamformer y con cada método
+
+    Returns:
+        {método: {snr_db, band_snr_db, block_us, beam_us_per_frame, beam_pct,
+                  rnnoise_calls}}
+        band_snr_db es el SNR en SPEECH_BAND, beam_us_per_frame el costo del
+        beamformer por frame de 10 ms y beam_pct, su porcentaje del
+        presupuesto del bloque
+    """
+    results = {}
+    for method in methods:
+        pipeline = AudioPipeline(blocksize=BLOCKSIZE, beamformer=method)
+        pipeline.set_mode(mode)
+        out, timing = process(noisy, pipeline)
+        beam = pipeline.get_node_timing().get("beamformer", {"avg_us": 0.0, "budget_pct": 0.0})
+        ref, est = _align(to_stereo(clean), out)
+        results[method] = {
+            "snr_db": snr_db(ref, est),
+            "band_snr_db": snr_db(ref, est, band=SPEECH_BAND),
+            "block_us": timing["block_us"],
+            "beam_us_per_frame": beam["avg_us"] * 480.0 / BLOCKSIZE,
+            "beam_pct": beam["budget_pct"],
+            "rnnoise_calls": pipeline.get_channel_stats()["calls_per_frame"],
+        }
+        pipeline.stop_rnnoise()
+    return results
+
+
+# ========== REALIMENTACIÓN ==========
+
+def synth_leakage_path(peak_db=2.0, delay_ms=2.0, resonance_hz=2500.0, length_ms=30.0,
+                       rate=SAMPLE_RATE, seed=0):
+    """
+    Camino auricular -> micrófono de cada lado, más allá del retardo de un
+    bloque del lazo: retardo de conversión, resonancia de la copa abierta
+    y cola difusa que decae en ~8 ms
+
+    Args:
+        peak_db: ganancia del camino en su pico (> 0 dB: el lazo silba)
+
+    Returns:
+        taps (canales, muestras)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(length_ms * rate / 1000.0)
+    start = int(delay_ms * rate / 1000.0)
+    t = np.arange(n - start) / rate
+    paths = np.zeros((CHANNELS, n))
+    for ch in range(CHANNELS):
+        f = resonance_hz * rng.uniform(0.95, 1.05)
+        ring = np.sin(2 * np.pi * f * t) * np.exp(-t / 0.004)
+        tail = rng.standard_normal(len(t)) * np.exp(-t / 0.008)
+        paths[ch, start:] = ring + 0.3 * tail
+        peak = np.max(np.abs(np.fft.rfft(paths[ch], 8192)))
+        paths[ch] *= 10.0 ** (peak_db / 20.0) / peak
+    return paths
+
+
+def simulate_feedback(speech, pipeline, path, blocksize=BLOCKSIZE, on_block=None, latency=0.0):
+    """
+    Lazo cerrado: los micrófonos de cada bloque son la voz más la salida de
+    los bloques anteriores filtrada por `path` (el lazo tarda un bloque,
+    como un stream full-duplex, más los buffers del códec)
+
+    Args:
+        on_block: función(índice de bloque) llamada tras cada bloque
+        latency: retardo de los buffers de entrada + salida en segundos; la
+                 cadena lo recibe como la latencia que informaría el stream
+
+    Returns:
+        (salida float32, fuga que llegó a los micrófonos, timing como process)
+    """
+    speech = to_stereo(np.asarray(speech, dtype=np.float32))
+    n = -(-speech.shape[0] // blocksize) * blocksize
+    taps = path.shape[1]
+    pipeline.set_loop_latency(latency)
+    lead = blocksize + int(round(latency * SAMPLE_RATE)) + taps - 1
+    out = np.zeros((lead + n, CHANNELS), dtype=np.float32)
+    leak = np.zeros((n, CHANNELS), dtype=np.float32)
+    mic = np.zeros((blocksize, CHANNELS), dtype=np.float32)
+    times = []
+    for k, i in enumerate(range(0, n, blocksize)):
+        past = out[i:i + blocksize + taps - 1]
+        for ch in range(CHANNELS):
+            leak[i:i + blocksize, ch] = np.convolve(past[:, ch], path[ch], mode="valid")
+        mic[:] = leak[i:i + blocksize]
+        chunk = speech[i:i + blocksize]
+        mic[:len(chunk)] += chunk
+        start = time.perf_counter()
+        pipeline.callback(mic, out[lead + i:lead + i + blocksize], blocksize, None, None)
+        times.append(time.perf_counter() - start)
+        if on_block:
+            on_block(k)
+    times = np.asarray(times)
+    m = speech.shape[0]
+    return out[lead:lead + m], leak[:m], {
+        "block_us": 1e6 * float(times.mean()),
+        "block_max_us": 1e6 * float(times.max()),
+        "rtf": float(times.sum()) / (m / SAMPLE_RATE),
+    }
+
+
+def misalignment_db(estimate, path):
+    """Error normalizado del camino estimado ||h - ĥ||² / ||h||² en dB (peor canal)"""
+    taps = min(estimate.shape[1], path.shape[1])
+    error = np.sum((path[:, :taps] - estimate[:, :taps]) ** 2, axis=1) + np.sum(path[:, taps:] ** 2, axis=1)
+    return float(10.0 * np.log10(np.max(error / np.sum(path ** 2, axis=1))))
+
+
+def residual_loop_db(estimate, path, n_fft=8192):
+    """
+    Pico de |H - Ĥ| en dB (peor canal): ganancia del lazo que queda sin
+    cancelar. Con la cadena a 0 dB el lazo es estable si es negativo; lo
+    que baja respecto del pico de |H| es la ganancia estable agregada
+    """
+    taps = min(estimate.shape[1], path.shape[1])
+    residual = path.copy()
+    residual[:, :taps] -= estimate[:, :taps]
+    return float(20.0 * np.log10(np.max(np.abs(np.fft.rfft(residual, n_fft, axis=1)))))
+
+
+def howl_band(path, floor_db=10.0, n_fft=8192):
+    """Banda donde el camino queda a menos de `floor_db` de su pico (peor canal): donde el lazo puede silbar"""
+    gain = 20.0 * np.log10(np.max(np.abs(np.fft.rfft(path, n_fft, axis=1)), axis=0) + 1e-20)
+    near = np.fft.rfftfreq(n_fft, 1.0 / SAMPLE_RATE)[gain >= gain.max() - floor_db]
+    return float(near.min()), float(near.max())
+
+
+def leak_erle_db(out, leak, estimate, offset, start, band=None):
+    """
+    ERLE sobre la fuga sola: potencia de la fuga que llegó a los micrófonos
+    sobre la de la fuga menos la estimación del camino final aplicada a la
+    misma salida, desde la muestra `start` (peor canal). El ERLE del
+    cancelador compara micrófonos contra error y la voz propia, mucho más
+    fuerte que la fuga, lo tapa
+
+    Args:
+        offset: retardo de la salida que modela el filtro (bloque + retardo fijo)
+        band: (desde, hasta) en Hz; None, toda la banda
+    """
+    m = out.shape[0]
+    freqs = np.fft.rfftfreq(m - start, 1.0 / SAMPLE_RATE)
+    mask = np.ones(len(freqs), dtype=bool) if band is None else (freqs >= band[0]) & (freqs <= band[1])
+    worst = float("inf")
+    for ch in range(out.shape[1]):
+        echo = np.zeros(m)
+        echo[offset:] = np.convolve(out[:, ch].astype(np.float64), estimate[ch])[:m - offset]
+        target = leak[start:, ch].astype(np.float64)
+        residual = target - echo[start:]
+        power = [np.sum(np.abs(np.fft.rfft(x))[mask] ** 2) for x in (target, residual)]
+        worst = min(worst, 10.0 * np.log10(power[0] / (power[1] + 1e-20)))
+    return float(worst)
+
+
+def compare_feedback(seconds=12.0, peak_db=2.0, mode="normal", variants=("off", "on"), latency=STREAM_LATENCY):
+    """
+    Misma voz en lazo cerrado con la fuga simulada, sin y con cancelador
+
+    Args:
+        variants: 'off', 'on' y/o 'subband' (cancelador sobre la banda
+                  baja de tearis_subband)
+        latency: buffers de entrada + salida del códec en el lazo (s)
+
+    Returns:
+        {variante: {howl_db, leak_db[, residual_db, stable_gain_db,
+                     misalignment_db, converge_s, leak_erle_db, howl_erle_db, erle_db,
+                     us_per_frame, ref_us_per_frame, cpu_pct, resets,
+                     bypass_ratio]}, curve}
+        howl_db es el nivel de salida sobre el de la voz en la segunda
+        mitad (silbido: la salida se va al techo del limitador);
+        converge_s, cuándo el lazo residual baja de 0 dB; leak_erle_db y
+        howl_erle_db, el ERLE sobre la fuga en toda la banda y donde el
+        camino está a menos de 10 dB de su pico (con la voz propia siempre
+        presente el filtro no identifica bien el camino donde casi no hay
+        fuga, y ahí el ERLE de toda la banda queda chico); curve, (t,
+        desajuste, lazo residual) cada 0.5 s. Con 'subband' el camino
+        estimado es el de la banda baja y no se compara con el simulado
+        (sin residual_db, stable_gain_db, misalignment_db, converge_s ni
+        los ERLE sobre la fuga)
+    """
+    speech, _ = synth_stereo(seconds)
+    leakage = synth_leakage_path(peak_db)
+    hardware = int(round(latency * SAMPLE_RATE))
+    band = howl_band(leakage)
+    half = speech.shape[0] // 2
+    speech_rms = np.sqrt(np.mean(speech[half:].astype(np.float64) ** 2))
+    results = {}
+    curve = []
+    every = int(0.5 * SAMPLE_RATE / BLOCKSIZE)
+    for name in variants:
+        pipeline = AudioPipeline(blocksize=BLOCKSIZE, feedback=name != "off", subband=name == "subband")
+        pipeline.set_mode(mode)
+        # El camino visto desde la ventana del filtro: lo que el retardo fijo
+        # estimado deja sin descontar de los buffers del códec
+        pipeline.set_loop_latency(latency)
+        delay = pipeline.feedback.delay if pipeline.feedback and not pipeline.subband else 0
+        path = np.pad(leakage, ((0, 0), (hardware - delay, 0)))
+
+        def snapshot(k):
+            if pipeline.feedback and not pipeline.subband and (k + 1) % every == 0:
+                estimate = pipeline.feedback.impulse_response()
+                curve.append(((k + 1) * BLOCKSIZE / SAMPLE_RATE, misalignment_db(estimate, path),
+                              residual_loop_db(estimate, path)))
+
+        out, leak, timing = simulate_feedback(speech, pipeline, leakage, on_block=snapshot, latency=latency)
+        out_rms = np.sqrt(np.mean(out[half:].astype(np.float64) ** 2))
+        r = {
+            "howl_db": float(20.0 * np.log10(out_rms / speech_rms)),
+            "leak_db": float(10.0 * np.log10(np.mean(leak[half:].astype(np.float64) ** 2) / speech_rms ** 2 + 1e-20)),
+            "block_us": timing["block_us"],
+        }
+        if pipeline.feedback:
+            stats = pipeline.get_feedback_stats()
+            timing = pipeline.get_node_timing()
+            node = timing["feedback"]
+            if not pipeline.subband:
+                estimate = pipeline.feedback.impulse_response()
+                converged = [t for t, _, loop in curve if loop < 0.0]
+                r.update({
+                    "residual_db": curve[-1][2],
+                    "stable_gain_db": peak_db - curve[-1][2],
+                    "misalignment_db": curve[-1][1],
+                    "converge_s": converged[0] if converged else float("inf"),
+                    "leak_erle_db": leak_erle_db(out, leak, estimate, BLOCKSIZE + delay, half),
+                    "howl_erle_db": leak_erle_db(out, leak, estimate, BLOCKSIZE + delay, half, band),
+                })
+            r.update({
+                "erle_db": stats["erle_db"],
+                "delay_ms": stats["delay_ms"],
+                "us_per_frame": node["avg_us"] * 480.0 / BLOCKSIZE,
+                "ref_us_per_frame": timing["feedback_ref"]["avg_us"] * 480.0 / BLOCKSIZE,
+                "cpu_pct": node["budget_pct"],
+                "resets": stats["resets"],
+                "bypass_ratio": stats["bypass_ratio"],
+            })
+        results[name] = r
+        pipeline.stop_rnnoise()
+    results["curve"] = curve
+    return results
+
+
+def benchmark(seconds=10.0, repeats=3):
+    """
+    Estrategias de canales sobre la escena sintética de auricular (micrófonos
+    muy correlacionados), con RNNoise o, si no está, con el reductor
+    espectral: 'auto' tiene que pasar a mono, hacer las mismas llamadas al
+    reductor por frame que 'mono' (menos que 'stereo') y quedar cerca de su
+    salida. El ahorro de CPU se informa pero no se exige: con una sola CPU
+    compartida varía más que la diferencia, y el reductor espectral procesa
+    los dos canales en la misma rFFT vectorizada
+    """
+    noisy, clean = synth_stereo(seconds)
+    results = {"noisy_snr_db": snr_db(clean, noisy)}
+    denoiser = "rnnoise"
+    try:
+        results.update(compare_channel_strategies(noisy, clean))
+    except RuntimeError as e:
+        logger.warning(f"⚠️ {e}: se comparan las estrategias con el reductor espectral")
+        denoiser = "spectral"
+        results.update(compare_channel_strategies(noisy, clean, denoiser=denoiser))
+    results["denoiser"] = denoiser
+    stereo, auto = results["stereo"], results["auto"]
+    # Costo del reductor: el mínimo de varias corridas (una sola CPU compartida mete ruido)
+    for _ in range(repeats - 1):
+        again = compare_channel_strategies(noisy, strategies=("stereo", "auto"), denoiser=denoiser)
+        for strategy in ("stereo", "auto"):
+            results[strategy]["denoise_us"] = min(results[strategy]["denoise_us"], again[strategy]["denoise_us"])
+    results["auto_cpu_saving_pct"] = 100.0 * (1.0 - auto["denoise_us"] / stereo["denoise_us"])
+    results["ok"] = (auto["path"] == "mono" and auto["rnnoise_calls"] == results["mono"]["rnnoise_calls"]
+                     and auto["rnnoise_calls"] < stereo["rnnoise_calls"] and auto["snr_db"] >= stereo["snr_db"] - 1.0)
+    return results
+
+
+def print_comparison(results):
+    print(f"{'estrategia':<10} {'µs/bloque':>10} {'RNNoise/frame':>14} {'camino':>8} "
+          f"{'vs stereo':>10} {'SNR':>8}")
+    for strategy in CHANNEL_STRATEGIES:
+        if strategy not in results:
+            continue
+        r = results[strategy]
+        snr = f"{r['snr_db']:.1f} dB" if "snr_db" in r else "-"
+        print(f"{strategy:<10} {r['block_us']:10.1f} {r['rnnoise_calls']:14.2f} {str(r['path']):>8} "
+              f"{r['vs_stereo_db']:7.1f} dB {snr:>8}")
+
+
+def print_beam_comparison(results):
+    print(f"{'método':<8} {'SNR':>9} {'SNR voz':>9} {'µs/bloque':>10} {'beam µs/frame':>14} {'% bloque':>9} {'RNNoise/frame':>14}")
+    for method in BEAM_METHODS:
+        if method not in results:
+            continue
+        r = results[method]
+        print(f"{method:<8} {r['snr_db']:6.1f} dB {r['band_snr_db']:6.1f} dB {r['block_us']:10.1f} {r['beam_us_per_frame']:14.1f} "
+              f"{r['beam_pct']:8.1f}% {r['rnnoise_calls']:14.2f}")
+
+
+def print_feedback_comparison(results):
+    off, on = results["off"], results["on"]
+    print(f"Fuga en los micrófonos: {on['leak_db']:+.1f} dB con cancelador, {off['leak_db']:+.1f} dB sin él (respecto de la voz)")
+    print(f"Salida sobre la voz:    {on['howl_db']:+.1f} dB con cancelador, {off['howl_db']:+.1f} dB sin él")
+    print("Lazo residual (pico de |H - Ĥ|): " + " ".join(f"{t:.1f}s {loop:+.0f}" for t, _, loop in results["curve"][1::2]))
+    print(f"Lazo estable a los {on['converge_s']:.1f} s | residual {on['residual_db']:+.1f} dB | "
+          f"ganancia estable agregada {on['stable_gain_db']:.1f} dB")
+    print(f"Retardo fijo {on['delay_ms']:.0f} ms | desajuste del camino {on['misalignment_db']:+.1f} dB")
+    print(f"ERLE sobre la fuga: {on['howl_erle_db']:.1f} dB en la banda del silbido, {on['leak_erle_db']:.1f} dB "
+          f"en toda la banda (micrófonos/error {on['erle_db']:.1f} dB)")
+    print(f"CPU: {on['us_per_frame']:.1f} µs/frame ({on['cpu_pct']:.1f}% del bloque) | reinicios {on['resets']} | bypass {on['bypass_ratio'] * 100:.1f}%")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    parser = argparse.ArgumentParser(description="Procesamiento offline de TEARIS")
+    parser.add_argument("input", nargs="?", help="WAV de entrada (sin archivo: escena sintética)")
+    parser.add_argument("-o", "--output", help="WAV de salida")
+    parser.add_argument("--clean", help="WAV de referencia limpia (para SNR)")
+    parser.add_argument("--mode", default="escuela", help="modo de la cadena")
+    parser.add_argument("--channels", default="stereo", choices=CHANNEL_STRATEGIES,
+                        help="estrategia de canales de RNNoise")
+    parser.add_argument("--compare-channels", action="store_true",
+                        help="comparar CPU y calidad de todas las estrategias de canales")
+    parser.add_argument("--beamformer", default="off", choices=BEAM_METHODS,
+                        help="beamformer antes de RNNoise")
+    parser.add_argument("--compare-beam", action="store_true",
+                        help="comparar SNR y CPU sin beamformer, delay-and-sum y MVDR")
+    parser.add_argument("--compare-feedback", action="store_true",
+                        help="lazo cerrado con fuga simulada, sin y con cancelador de realimentación")
+    args = parser.parse_args()
+
+    if args.compare_feedback:
+        print_feedback_comparison(compare_feedback(mode=args.mode if args.mode != "escuela" else "normal"))
+        return 0
+
+    clean = None
+    if args.input:
+        audio, rate = read_wav(args.input)
+        if rate != SAMPLE_RATE:
+            logger.error(f"❌ {args.input}: {rate} Hz (la cadena trabaja a {SAMPLE_RATE} Hz)")
+            return 1
+        if args.clean:
+            clean, _ = read_wav(args.clean)
+    elif args.compare_beam or args.beamformer != "off":
+        audio, clean = synth_array()
+        logger.info(f"🧪 Escena sintética de aula: SNR de entrada {snr_db(clean, audio):.1f} dB")
+    else:
+        audio, clean = synth_stereo()
+        logger.info(f"🧪 Escena sintética: SNR de entrada {snr_db(clean, audio):.1f} dB")
+
+    if args.compare_channels:
+        try:
+            results = compare_channel_strategies(audio, clean, mode=args.mode)
+        except RuntimeError as e:
+            logger.error(f"❌ {e}")
+            return 1
+        print_comparison(results)
+        return 0
+
+    if args.compare_beam:
+        if clean is None:
+            logger.error("❌ --compare-beam necesita la referencia limpia (--clean)")
+            return 1
+        print_beam_comparison(compare_beamformers(audio, clean, mode=args.mode))
+        return 0
+
+    pipeline = AudioPipeline(blocksize=BLOCKSIZE, channel_strategy=args.channels,
+                             beamformer=args.beamformer)
+    pipeline.set_mode(args.mode)
+    out, timing = process(audio, pipeline)
+    logger.info(f"✅ {len(out) / SAMPLE_RATE:.1f} s procesados | {timing['block_us']:.1f} µs/bloque "
+                f"(máx {timing['block_max_us']:.1f}) | RTF {timing['rtf']:.3f}")
+    if clean is not None:
+        ref, est = _align(to_stereo(clean), out)
+        logger.info(f"📈 SNR: entrada {snr_db(to_stereo(clean), to_stereo(audio)):.1f} dB -> salida {snr_db(ref, est):.1f} dB")
+    if args.output:
+        write_wav(args.output, out)
+        logger.info(f"💾 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,13 +14,28 @@ import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
 from gi.repository import GLib
-from ctypes import c_ubyte
 import numpy as np
-import sounddevice as sd
 import queue
 import threading
-from ctypes import CDLL, c_void_p, POINTER, c_float
 import time
+import contextlib
+from tearis_limiter import normalize_mode
+from tearis_audio_backends import open_stream, resolve_device
+from tearis_control import ControlApplier, volume_to_db
+from tearis_pipeline import AudioPipeline
+from tearis_audio_engine import AudioEngineProcess
+from tearis_rt import RealtimeHardening
+from tearis_memory import accountant, tracing, import_report, pipeline_buffers
+from tearis_rtlog import rtlog
+from tearis_fir import apply_profiles
+from tearis_environment import EnvironmentCascade
+from tearis_supervisor import StreamSupervisor, status_text
+from tearis_gatt_io import GattSocketIO, DEFAULT_MTU
+from tearis_spectrum import SpectrumMonitor
+from tearis_hub import Hub, parse_devices
+from tearis_dose import ExposureMeter
+from tearis_command import (decode_batch, encode_ack, merge_batches, eq_commands, mixer_script, CommandError,
+                            EQ_PRESETS, ACK_OK, ACK_UNSUPPORTED, ACK_FAILED, ACK_NAMES, HEADER as COMMAND_HEADER)
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
@@ -33,6 +48,10 @@ MODE_UUID = '12345678-1234-5678-1234-56789abcdef2'
 STATUS_UUID = '12345678-1234-5678-1234-56789abcdef3'
 VOLUME_UUID = '12345678-1234-5678-1234-56789abcdef4'
 AUDIO_STREAM_UUID = '12345678-1234-5678-1234-56789abcdef5'
+SPECTRUM_UUID = '12345678-1234-5678-1234-56789abcdef6'
+HUB_UUID = '12345678-1234-5678-1234-56789abcdef7'
+DOSE_UUID = '12345678-1234-5678-1234-56789abcdef8'
+COMMAND_UUID = '12345678-1234-5678-1234-56789abcdef9'
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
@@ -41,6 +60,7 @@ GATT_CHRC_IFACE = 'org.bluez.GattCharacteristic1'
 DBUS_OM_IFACE = 'org.freedesktop.DBus.ObjectManager'
 DBUS_PROP_IFACE = 'org.freedesktop.DBus.Properties'
 LE_ADVERTISING_MANAGER_IFACE = 'org.bluez.LEAdvertisingManager1'
+DEBUG_IFACE = 'org.tearis.Debug1'
 
 # Nombre del dispositivo que verá la app
 ADAPTER_NAME = 'TEARIS-Audio'
@@ -53,11 +73,50 @@ FRAME_SIZE = 480
 # Variables de entorno para dispositivos de audio (configurado a hw:1,0)
 DEVICE_INPUT = os.environ.get('TEARIS_AUDIO_INPUT', 'hw:1,0')
 DEVICE_OUTPUT = os.environ.get('TEARIS_AUDIO_OUTPUT', 'hw:1,0')
+# 'portaudio' (placa real), 'alsa-mmap' (ALSA directo, usar plughw:) o 'null' (simulado)
+AUDIO_BACKEND = os.environ.get('TEARIS_AUDIO_BACKEND', 'portaudio')
+# 'inprocess' (callback en este proceso) o 'process' (motor de audio aparte)
+AUDIO_ENGINE = os.environ.get('TEARIS_AUDIO_ENGINE', 'inprocess')
+# 'float32' o 'int16' (formato nativo del códec, sin conversiones float intermedias)
+AUDIO_DTYPE = np.dtype(os.environ.get('TEARIS_AUDIO_DTYPE', 'float32'))
+# Estrategia de canales de RNNoise: 'stereo', 'mono', 'mid_side' o 'auto'
+CHANNEL_STRATEGY = os.environ.get('TEARIS_CHANNEL_STRATEGY', 'stereo')
+# Beamformer antes de RNNoise en modo escuela: 'off', 'das' o 'mvdr'
+BEAMFORMER = os.environ.get('TEARIS_BEAMFORMER', 'off')
+# Reductor de ruido de modo escuela: 'rnnoise' o 'spectral' (más liviano; también es el respaldo sin librnnoise)
+DENOISER = os.environ.get('TEARIS_DENOISER', 'rnnoise')
+# '1' cancela la fuga de los auriculares a los micrófonos (tearis_feedback.py)
+FEEDBACK = os.environ.get('TEARIS_FEEDBACK', '0') == '1'
+# '1' corre el cancelador sobre la banda baja de un banco QMF (tearis_subband.py): menos CPU, ~1 ms más de latencia
+SUBBAND = os.environ.get('TEARIS_SUBBAND', '0') == '1'
+# '1' mide al arrancar el RSS de cada grupo de imports (lanza un intérprete aparte)
+MEMORY_REPORT = os.environ.get('TEARIS_MEMORY_REPORT', '0') == '1'
+# '1' arranca con el cambio de modo automático por ambiente (tearis_environment.py);
+# la app lo pausa eligiendo un modo y lo reanuda escribiendo "auto"
+AUTO_MODE = os.environ.get('TEARIS_AUTO_MODE', '0') == '1'
+# '1' activa el modo de tiempo real del callback (tearis_rt.py)
+REALTIME = os.environ.get('TEARIS_REALTIME', '0') == '1'
+# '1' ofrece a BlueZ AcquireNotify/AcquireWrite (tearis_gatt_io.py); si BlueZ no los
+# usa, o con '0', todo va por PropertiesChanged/WriteValue
+GATT_SOCKETS = os.environ.get('TEARIS_GATT_SOCKETS', '1') == '1'
+# 'system' (BlueZ real) o 'session' (BlueZ simulado de tearis_bluez_mock.py)
+DBUS_BUS = os.environ.get('TEARIS_DBUS_BUS', 'system')
+# Modo hub (tearis_hub.py): 'nombre=backend[:dispositivo];...' maneja varios
+# dispositivos desde este servidor; vacío = un solo dispositivo como siempre
+HUB_DEVICES = os.environ.get('TEARIS_HUB_DEVICES', '')
+# Tope de volumen (%) cuando el dosímetro pasa la dosis de TEARIS_DOSE_LIMIT
+DOSE_SAFE_VOLUME = int(os.environ.get('TEARIS_DOSE_SAFE_VOLUME', '50'))
+# Espera extra tras la latencia de salida antes de subir el volumen de hardware:
+# la compensación entra en el próximo bloque (20 ms) y el motor la lee cada 5 ms
+HW_STEP_MARGIN_S = 0.03
 
 # Globals
 wm8960 = None
+controllers = []
+hub = None
 mainloop = None
 audio_queue = queue.Queue(maxsize=5)
+gatt_io = GattSocketIO()
 
 # ========================================
 # Clase para Anuncio BLE
@@ -89,220 +148,462 @@ class Advertisement(dbus.service.Object):
         if interface != LE_ADVERTISING_MANAGER_IFACE:
             raise dbus.exceptions.DBusException('org.freedesktop.DBus.Error.UnknownInterface: Interface not found')
         return self.get_properties()[LE_ADVERTISING_MANAGER_IFACE]
-# ========================================
-# RNNoise Processor Class
-# ========================================
-class RNNoiseProcessor:
-    def __init__(self, lib_path=None):
-        if lib_path is None:
-            lib_path = self._find_rnnoise_lib()
-        
-        if not lib_path:
-            raise RuntimeError("No se encontró librería RNNoise")
-        
-        logger.info(f"🔊 Cargando RNNoise desde: {lib_path}")
-        self.lib = CDLL(lib_path)
-        
-        self.lib.rnnoise_create.restype = c_void_p
-        self.lib.rnnoise_create.argtypes = [c_void_p]
-        self.lib.rnnoise_destroy.argtypes = [c_void_p]
-        
-        self.lib.rnnoise_process_frame.restype = c_float
-        self.lib.rnnoise_process_frame.argtypes = [
-            c_void_p,
-            POINTER(c_float),  # output
-            POINTER(c_float)   # input
-        ]
-        
-        self.states = [self.lib.rnnoise_create(None) for _ in range(CHANNELS)]
-        logger.info(f"✅ RNNoise inicializado con {CHANNELS} canales")
-    
-    def _find_rnnoise_lib(self):
-        possible_paths = [
-            "/home/tearis/rnnoise/.libs/librnnoise.so",
-            "/home/tearis/rnnoise/.libs/librnnoise.so.0",
-            "/home/tearis/rnnoise/.libs/librnnoise.so.0.4.1",
-            os.path.expanduser("~/rnnoise/.libs/librnnoise.so"),
-            os.path.expanduser("~/rnnoise/.libs/librnnoise.so.0"),
-            "/usr/local/lib/librnnoise.so",
-            "/usr/lib/librnnoise.so",
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
-        
-        return None
-    
-    def process_frame(self, audio_frame):
-        try:
-            audio_scaled = audio_frame * 32768.0
-            if audio_scaled.ndim == 1:
-                audio_scaled = audio_scaled.reshape(-1, 1)
-            if audio_scaled.shape[1] == 1:
-                audio_scaled = np.hstack([audio_scaled, audio_scaled])
-            if audio_scaled.shape[0] != FRAME_SIZE:
-                logger.warning(f"⚠️ Frame size mismatch: {audio_scaled.shape[0]} != {FRAME_SIZE}")
-                if audio_scaled.shape[0] < FRAME_SIZE:
-                    audio_scaled = np.pad(audio_scaled, ((0, FRAME_SIZE - audio_scaled.shape[0]), (0, 0)))
-                else:
-                    audio_scaled = audio_scaled[:FRAME_SIZE, :]
-            output = np.zeros_like(audio_scaled)
-            for ch in range(min(CHANNELS, audio_scaled.shape[1])):
-                channel_data = audio_scaled[:, ch].astype(np.float32)
-                output_buffer = np.zeros(FRAME_SIZE, dtype=np.float32)
-                self.lib.rnnoise_process_frame(self.states[ch], output_buffer.ctypes.data_as(POINTER(c_float)), channel_data.ctypes.data_as(POINTER(c_float)))
-                output[:, ch] = output_buffer
-            output = output / 32768.0
-            return output
-        except Exception as e:
-            logger.error(f"❌ Error procesando frame: {e}")
-            return audio_frame
-    
-    def __del__(self):
-        if hasattr(self, 'states'):
-            for state in self.states:
-                self.lib.rnnoise_destroy(state)
+def amixer(*args, card=1):
+    """Ejecuta amixer sobre la placa (1 por defecto) sin bloquear el servidor si falta ALSA; card=None no hace nada"""
+    if card is None:
+        return
+    try:
+        subprocess.run(["amixer", "-c", str(card), *args], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        logger.debug(f"amixer no disponible: {e}")
+
+def amixer_batch(commands, card=1):
+    """Varios comandos de amixer en un solo proceso (`amixer -s`, tearis_command.mixer_script)"""
+    if card is None or not commands:
+        return
+    try:
+        subprocess.run(["amixer", "-c", str(card), "-s"], input=mixer_script(commands), text=True, check=False,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        logger.debug(f"amixer no disponible: {e}")
 
 # ========================================
 # WM8960 Controller
 # ========================================
 class WM8960Controller:
-    def __init__(self):
-        logger.info("🎛️ Inicializando WM8960 Controller...")
+    """
+    Args:
+        engine: dispositivo del hub (tearis_hub.HubDevice); None crea la cadena
+                o el motor propio según TEARIS_AUDIO_ENGINE
+        card: placa de ALSA para amixer (None: sin mezclador, p. ej. dispositivo nulo)
+        name: nombre del dispositivo en el hub (logs y contabilidad de memoria)
+    """
+
+    def __init__(self, engine=None, card=1, name=None):
+        logger.info(f"🎛️ Inicializando WM8960 Controller{f' ({name})' if name else ''}...")
+        self.name = name
+        self.card = card
         self.mode = "normal"
         self.volume = 65
-        self.rnnoise_processor = None
-        self.audio_stream = None
-        self.rnnoise_enabled = False
+        self.requested_volume = self.volume
+        self.max_volume = 85
+        self.supervisor = None
+        self.engine = engine
+        self.rt = None
+        self.status = "OK"
+        self.status_listeners = []
+        self._metrics_running = False
+        # Lotes de la característica de comandos pendientes y quién recibe las confirmaciones
+        self._profile_lock = threading.Lock()
+        self._profile_pending = []
+        self.ack_listeners = []
+        # Cadena DSP en este proceso, o motor de audio en proceso aparte
+        suffix = f"_{name}" if name else ""
+        if self.engine:
+            # Dispositivo del hub: su cadena corre en el proceso de su núcleo
+            self.pipeline = None
+            self.engine.on_event = self._on_stream_event
+        else:
+            with accountant.measure("audio"):
+                if AUDIO_ENGINE == 'process':
+                    self.engine = AudioEngineProcess(AUDIO_BACKEND, (DEVICE_INPUT, DEVICE_OUTPUT), realtime=REALTIME, dtype=AUDIO_DTYPE, channel_strategy=CHANNEL_STRATEGY, beamformer=BEAMFORMER, denoiser=DENOISER, feedback=FEEDBACK, subband=SUBBAND, on_event=self._on_stream_event)
+                    self.pipeline = None
+                else:
+                    self.pipeline = AudioPipeline(channels=CHANNELS, sample_rate=SAMPLE_RATE, tap=self._queue_tap, blocksize=960, dtype=AUDIO_DTYPE, channel_strategy=CHANNEL_STRATEGY, beamformer=BEAMFORMER, denoiser=DENOISER, feedback=FEEDBACK, subband=SUBBAND)
+        if self.pipeline:
+            # Perfil auditivo de cada modo (tearis_fir.py design ...)
+            apply_profiles(self.pipeline)
+            accountant.add_source("pipeline" + suffix, lambda: pipeline_buffers(self.pipeline))
+        else:
+            accountant.add_source("engine" + suffix, lambda: {"tap_ring": self.engine.ring.data.nbytes / 1024.0})
+        if not name:
+            accountant.add_source("queue", lambda: {"tap": sum(b.nbytes for b in list(audio_queue.queue)) / 1024.0})
+        # Escrituras BLE: se confirman al instante y se aplican desde un hilo
+        self.controls = ControlApplier()
+        self.controls.register("volume", self.set_volume)
+        self.controls.register("mode", self.request_mode)
+        self.controls.register("auto_mode", self.set_auto_mode)
+        self.controls.register("safe_volume", self.apply_safe_volume)
+        self.controls.register("profile", self.apply_profiles)
+        self.controls.start()
+        # Detección de ambiente: necesita la entrada cruda, solo con la cadena en este proceso
+        self.environment = None
+        if self.pipeline:
+            self.environment = EnvironmentCascade(lambda mode: self.controls.submit("auto_mode", mode),
+                                                  auto=AUTO_MODE, vad=lambda: self.pipeline.vad)
+            self.pipeline.set_input_tap(self.environment.tap)
+            self.environment.start()
+        elif AUTO_MODE:
+            logger.warning("⚠️ El modo automático necesita TEARIS_AUDIO_ENGINE=inprocess")
+        # Telemetría de espectro para la app (corre solo con suscriptores) y
+        # dosímetro de exposición (siempre), ambos sobre la salida procesada
+        self.spectrum = None
+        self.dosimeter = None
+        if self.pipeline:
+            self.spectrum = SpectrumMonitor(vad=self._vad_probability, channels=CHANNELS, sample_rate=SAMPLE_RATE)
+            self.dosimeter = ExposureMeter(on_exceeded=lambda dose: self.controls.submit("safe_volume", dose),
+                                           channels=CHANNELS, sample_rate=SAMPLE_RATE)
+            self.dosimeter.set_volume_db(volume_to_db(self.volume))
+            self.pipeline.set_output_tap(self._output_tap)
+        else:
+            logger.warning("⚠️ La telemetría de espectro y el dosímetro necesitan TEARIS_AUDIO_ENGINE=inprocess")
         self.initialize_safe_defaults()
         self.start_audio_stream()
     
     def initialize_safe_defaults(self):
         logger.info("🔧 Configurando valores seguros iniciales...")
-        try_cmd = lambda args: subprocess.run(args, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        try_cmd(["amixer", "-c", "1", "sset", "Headphone", f"{self.volume}%"])
-        try_cmd(["amixer", "-c", "1", "sset", "Capture", "70%"])
-        try_cmd(["amixer", "-c", "1", "sset", "Left Output Mixer PCM", "on"])
-        try_cmd(["amixer", "-c", "1", "sset", "Right Output Mixer PCM", "on"])
+        amixer("sset", "Headphone", f"{self.volume}%", card=self.card)
+        amixer("sset", "Capture", "70%", card=self.card)
+        amixer("sset", "Left Output Mixer PCM", "on", card=self.card)
+        amixer("sset", "Right Output Mixer PCM", "on", card=self.card)
         logger.info("✅ WM8960: valores seguros aplicados")
     
-    def set_volume(self, vol):
-        vol = max(0, min(85, int(vol)))
+    def _set_software_gain(self, gain_db, track=True, snap=False):
+        if self.engine:
+            self.engine.set_gain(gain_db, track=track, snap=snap)
+        else:
+            self.pipeline.gain_ramp.set_target(gain_db, track=track, snap=snap)
+
+    def _step_hardware(self, vol, mixer):
+        """
+        Lleva el WM8960 a `vol` con los comandos `mixer` (incluido el del
+        volumen) y pasa la compensación de software de una vez, sin la
+        rampa. Hardware y software nunca suman más que el volumen pedido:
+        si el hardware sube, la compensación baja primero y amixer espera a
+        que ese bloque llegue al códec (latencia de salida del stream); si
+        baja, amixer va primero. Desde el aplicador, nunca en el hilo de GLib
+        """
+        raising = vol > self.volume
         self.volume = vol
+        offset_db = volume_to_db(self.requested_volume) - volume_to_db(vol)
+        if raising:
+            self._set_software_gain(offset_db, track=False, snap=True)
+            latency_ms = self.get_audio_stats()["output_latency_ms"] if self.stream_active() else 0.0
+            time.sleep(latency_ms / 1000.0 + HW_STEP_MARGIN_S)
+        amixer_batch(mixer, card=self.card)
+        if not raising:
+            self._set_software_gain(offset_db, track=False, snap=True)
+        if self.dosimeter:
+            self.dosimeter.set_volume_db(volume_to_db(vol))
+
+    def request_volume(self, vol):
+        """Volumen pedido por la app: rampa de software ya, hardware después"""
+        self.requested_volume = max(0, min(self.max_volume, int(vol)))
+        self._set_software_gain(volume_to_db(self.requested_volume) - volume_to_db(self.volume))
+        self.controls.submit("volume", self.requested_volume)
+
+    def set_volume(self, vol):
+        vol = max(0, min(self.max_volume, int(vol)))
         try:
-            subprocess.run(["amixer", "-c", "1", "sset", "Headphone", f"{self.volume}%"], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # El hardware absorbe el paso: el software cubre solo lo que falta
+            self._step_hardware(vol, [f"sset Headphone {vol}%"])
             logger.info(f"🔊 Volumen ajustado a {self.volume}%")
         except Exception as e:
             logger.error(f"❌ Error ajustando volumen: {e}")
     
-    def set_eq_flat(self):
-        for i in range(1, 6):
-            subprocess.run(["amixer", "-c", "1", "sset", f"EQ{i}", "0"], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        logger.info("🎚️ EQ: plana aplicada")
-    
-    def set_eq_school(self):
-        eq_settings = [("EQ1", "+0"), ("EQ2", "+3"), ("EQ3", "+6"), ("EQ4", "+3"), ("EQ5", "+0")]
-        for control, value in eq_settings:
-            subprocess.run(["amixer", "-c", "1", "sset", control, value], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        logger.info("🎚️ EQ: modo ESCUELA aplicado")
+    def set_eq_preset(self, mode):
+        """EQ del WM8960 del modo (tearis_command.EQ_PRESETS)"""
+        mode = normalize_mode(mode)
+        amixer_batch(eq_commands(EQ_PRESETS.get(mode, EQ_PRESETS["normal"])), card=self.card)
+        logger.info(f"🎚️ EQ: modo {mode.upper()} aplicado")
 
-    def start_audio_stream(self):
-        if self.audio_stream and self.audio_stream.active:
+    # ---------- Comandos por lotes (tearis_command.py) ----------
+
+    def submit_profile(self, batch):
+        """Lote decodificado de la app: se confirma al aplicarlo (junto con los que se acumulen)"""
+        with self._profile_lock:
+            self._profile_pending.append(batch)
+        self.controls.submit("profile", batch["seq"])
+
+    def apply_profiles(self, _seq):
+        """
+        Aplica los lotes pendientes como una sola transacción y confirma cada
+        uno con su propio estado: los que no se pueden aplicar se rechazan
+        solos, antes de combinar, y no arrastran a los demás
+        """
+        with self._profile_lock:
+            batches, self._profile_pending = self._profile_pending, []
+        if not batches:
             return
-        logger.info(f"🎤 Iniciando stream de audio base...")
-        
-        def main_audio_callback(indata, outdata, frames, time_info, status):
-            if status:
-                logger.warning(f"⚠️ Audio status: {status}")
+        start = time.perf_counter()
+        statuses = [None] * len(batches)
+        valid = []
+        for i, batch in enumerate(batches):
             try:
-                if self.rnnoise_enabled and self.rnnoise_processor:
-                    num_frames = indata.shape[0]
-                    if num_frames == FRAME_SIZE:
-                        processed = self.rnnoise_processor.process_frame(indata)
-                        outdata[:] = processed
-                    else:
-                        for i in range(0, num_frames, FRAME_SIZE):
-                            chunk = indata[i:i+FRAME_SIZE]
-                            if chunk.shape[0] == FRAME_SIZE:
-                                processed_chunk = self.rnnoise_processor.process_frame(chunk)
-                                outdata[i:i+FRAME_SIZE] = processed_chunk
-                            else:
-                                outdata[i:] = chunk
-                else:
-                    outdata[:] = indata
-                try:
-                    audio_queue.put_nowait(outdata.copy())
-                except queue.Full:
-                    pass
+                self._check_profile(batch["params"])
+                valid.append(i)
+            except CommandError as e:
+                statuses[i] = e.status
+                logger.warning(f"⚠️ Lote {batch['seq']} rechazado: {e}")
+        status = ACK_OK
+        if valid:
+            try:
+                self._apply_profile(merge_batches([batches[i] for i in valid]))
+            except CommandError as e:
+                status = e.status
+                logger.warning(f"⚠️ Lote rechazado: {e}")
             except Exception as e:
-                logger.error(f"❌ Error en callback: {e}")
-                outdata[:] = indata
+                status = ACK_FAILED
+                logger.error(f"❌ Error aplicando lote: {e}")
+        for i in valid:
+            statuses[i] = status
+        elapsed_ms = 1000.0 * (time.perf_counter() - start)
+        summary = " + ".join(f"{b['seq']} {ACK_NAMES[st]}" for b, st in zip(batches, statuses))
+        logger.info(f"📦 Lotes {summary} en {elapsed_ms:.1f} ms")
+        for batch, status in zip(batches, statuses):
+            ack = encode_ack(batch["seq"], status, len(batch["params"]) if status == ACK_OK else 0, elapsed_ms)
+            for func in self.ack_listeners:
+                func(ack)
+
+    def _check_profile(self, params):
+        """Lanza CommandError si el lote no se puede aplicar en esta configuración"""
+        dsp = [key for key in ("toggles", "beamformer") if key in params]
+        if dsp and not self.pipeline:
+            raise CommandError(ACK_UNSUPPORTED, f"{', '.join(dsp)} necesita TEARIS_AUDIO_ENGINE=inprocess")
+        if params.get("mode") == "auto" and not self.environment:
+            raise CommandError(ACK_UNSUPPORTED, "El modo automático necesita TEARIS_AUDIO_ENGINE=inprocess")
+
+    def _apply_profile(self, params):
+        """
+        Modo, EQ, volumen e interruptores DSP de una vez: todo se valida antes
+        de tocar nada, la cadena cambia con un solo grafo nuevo y el WM8960
+        con un solo amixer
+        """
+        self._check_profile(params)
+        mode = params.get("mode")
+        eq = params.get("eq")
+        mixer = []
+        with self.pipeline.transaction() if self.pipeline else contextlib.nullcontext():
+            if mode == "auto":
+                self.environment.set_auto(True)
+            elif mode is not None:
+                if self.environment:
+                    self.environment.override(mode)
+                self._apply_mode(mode)
+                if eq is None:
+                    eq = EQ_PRESETS.get(normalize_mode(mode), EQ_PRESETS["normal"])
+            toggles = params.get("toggles", {})
+            if "spectral" in toggles:
+                self.pipeline.set_denoiser("spectral" if toggles["spectral"] else "rnnoise")
+            if "feedback" in toggles:
+                self.pipeline.set_feedback(toggles["feedback"])
+            if "beamformer" in params:
+                self.pipeline.set_beamformer(params["beamformer"])
+        if eq is not None:
+            mixer += eq_commands(eq)
+        if "volume" in params:
+            # Con el volumen pedido en el hardware la compensación vuelve a 0 dB
+            self.requested_volume = max(0, min(self.max_volume, int(params["volume"])))
+            self._step_hardware(self.requested_volume, mixer + [f"sset Headphone {self.requested_volume}%"])
+        else:
+            amixer_batch(mixer, card=self.card)
+
+    def apply_safe_volume(self, dose_pct):
+        """Dosis superada (tearis_dose.py): baja el tope de volumen y, si hace falta, el volumen"""
+        self.max_volume = min(self.max_volume, DOSE_SAFE_VOLUME)
+        logger.warning(f"👂 Dosis de exposición {dose_pct:.0f}%: volumen limitado a {self.max_volume}%")
+        if self.requested_volume > self.max_volume:
+            self.request_volume(self.max_volume)
+        self._publish_status(f"DOSIS {dose_pct:.0f}%")
+
+    def _output_tap(self, block):
+        self.spectrum.tap(block)
+        self.dosimeter.tap(block)
+
+    def _queue_tap(self, block):
+        try:
+            audio_queue.put_nowait(block.copy())
+        except queue.Full:
+            pass
+
+    def _vad_probability(self):
+        """Probabilidad de voz del último frame de RNNoise, o None sin RNNoise"""
+        pipeline = self.pipeline
+        if not pipeline.rnnoise_enabled or not pipeline.vad.probs.size:
+            return None
+        return float(pipeline.vad.probs.max())
+
+    def read_tap(self):
+        """Próximo bloque procesado para el monitor BLE, o None"""
+        if self.engine:
+            return self.engine.read_tap()
+        try:
+            return audio_queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def stream_active(self):
+        if self.engine:
+            return self.engine.active
+        return bool(self.supervisor and self.supervisor.active)
+
+    def add_status_listener(self, func):
+        """func(texto) se llama con cada cambio de status (desde otro hilo)"""
+        self.status_listeners.append(func)
+
+    def _on_stream_event(self, event, detail):
+        """Caída/recuperación del stream (tearis_supervisor.py) -> característica de status"""
+        self._publish_status(status_text(event, detail))
+
+    def _publish_status(self, text):
+        self.status = text
+        for func in self.status_listeners:
+            func(self.status)
+
+    def inject_fault(self, kind):
+        """Falla simulada en el backend nulo, para medir la recuperación de punta a punta"""
+        stream = self.supervisor.stream if self.supervisor else None
+        if stream is None or not hasattr(stream, "inject_fault"):
+            raise ValueError("Inyección de fallas solo con TEARIS_AUDIO_BACKEND=null y motor inprocess")
+        stream.inject_fault(kind)
+
+    def start_audio_stream(self):
+        if self.stream_active():
+            return
+        logger.info(f"🎤 Iniciando stream de audio base...")
         
         try:
-            self.audio_stream = sd.Stream(device=(DEVICE_INPUT, DEVICE_OUTPUT), samplerate=SAMPLE_RATE, blocksize=960, channels=CHANNELS, dtype=np.float32, callback=main_audio_callback, latency=0.25)
-            self.audio_stream.start()
-            logger.info("✅ Stream de audio base activo")
+            if self.engine:
+                self.engine.start()
+            else:
+                if self.supervisor is None:
+                    callback = self.pipeline.callback
+                    if REALTIME:
+                        self.rt = RealtimeHardening().prepare()
+                        callback = self.rt.wrap(callback)
+                    # Dispositivos resueltos una vez: reabrir tras una caída no vuelve a buscarlos
+                    device = resolve_device(AUDIO_BACKEND, (DEVICE_INPUT, DEVICE_OUTPUT))
+                    self.supervisor = StreamSupervisor(
+                        lambda: self.pipeline.attach_stream(open_stream(AUDIO_BACKEND, device=device, samplerate=SAMPLE_RATE, blocksize=960, channels=CHANNELS, dtype=AUDIO_DTYPE, callback=callback, latency=0.25)),
+                        heartbeat=lambda: self.pipeline.callbacks, on_event=self._on_stream_event, on_restart=self.pipeline.resume)
+                self.supervisor.start()
+            logger.info(f"✅ Stream de audio base activo ({self.engine.backend if self.name else AUDIO_BACKEND}, motor {'hub' if self.name else AUDIO_ENGINE})")
+            if self._metrics_running:
+                return
+            self._metrics_running = True
             def metrics_thread():
-                while self.audio_stream.active:
+                # Sigue aunque el stream se caiga: el supervisor lo reabre
+                while self._metrics_running:
                     time.sleep(5)
-                    logger.info(f"⚙️ Buffer BLE: {audio_queue.qsize()} | RNNoise: {'ON' if self.rnnoise_enabled else 'OFF'} | Stream: OK")
+                    stats = self.get_audio_stats()
+                    logger.info(f"⚙️ {f'[{self.name}] ' if self.name else ''}RNNoise: {'ON' if stats['rnnoise'] else 'OFF'} | Stream: {'OK' if stats['active'] else 'CAÍDO'} | Xruns: {stats['xruns']} | Jitter prom {stats['jitter_avg_ms']:.2f} ms máx {stats['jitter_max_ms']:.2f} ms")
+                    if stats["recoveries"]:
+                        logger.info(f"🩹 Stream recuperado {stats['recoveries']} veces | último en {stats['recover_ms']:.0f} ms")
+                    if self.pipeline:
+                        if self.pipeline.rnnoise_enabled:
+                            vad = self.pipeline.vad.get_stats()
+                            logger.info(f"🗣️ VAD: voz {vad['speech_ratio'] * 100:.0f}% | media {vad['mean_vad']:.2f} | {'SILENCIO' if vad['silent'] else 'VOZ'}{' (mute)' if vad['muted'] else ''} | CPU ahorrado {vad['cpu_saved_pct']:.2f}%")
+                            ch = self.pipeline.get_channel_stats()
+                            logger.info(f"🎧 Canales: {ch['strategy']} -> {ch['path']} | correlación {ch['correlation']:.2f} | RNNoise x{ch['calls_per_frame']:.2f} por frame")
+                        beam = self.pipeline.get_beam_stats()
+                        if beam["active"]:
+                            logger.info(f"🎯 Beamformer {beam['method']}: ruido aprendido en {beam['noise_update_ratio'] * 100:.0f}% de los frames | +{beam['latency_ms']:.1f} ms")
+                        fb = self.pipeline.get_feedback_stats()
+                        if fb["active"]:
+                            logger.info(f"🔁 Realimentación: ERLE {fb['erle_db']:.1f} dB | camino {fb['path_gain_db']:.1f} dB | bypass {fb['bypass_ratio'] * 100:.1f}% | reinicios {fb['resets']}")
+                        lim = self.pipeline.limiter.get_stats()
+                        logger.info(f"🛡️ Limitador: {lim['latency_ms']:.1f} ms look-ahead | CPU prom {lim['avg_ms']:.3f} ms max {lim['max_ms']:.3f} ms | reducción máx {lim['max_reduction_db']:.1f} dB")
+                        logger.info(f"🧩 Grafo DSP: {self.pipeline.graph.describe()}")
+                        self.pipeline.log_node_timing()
+                    if self.environment and self.environment.classifier:
+                        env = self.environment.get_stats()
+                        logger.info(f"🤖 Ambiente: {env['mode']} ({'auto' if env['auto'] else 'manual'}) | {env['inferences']} inferencias | CPU {env['cpu_pct']:.2f}%")
+                    if self.dosimeter:
+                        dose = self.dosimeter.get_stats()
+                        logger.info(f"👂 Exposición: Leq 1 s {dose['leq_1s_db']:.1f} dB(A) | 1 min {dose['leq_1min_db']:.1f} | sesión {dose['leq_session_db']:.1f} | pico {dose['peak_db']:.1f} dB | dosis {dose['dose_pct']:.1f}% | {dose['compute_avg_us']:.0f} µs por bloque")
+                    if self.spectrum and self.spectrum.running:
+                        spec = self.spectrum.get_stats()
+                        logger.info(f"📈 Espectro: {spec['records']} registros de {spec['record_bytes']} bytes | {spec['bytes_per_s']:.0f} B/s | {spec['compute_avg_us']:.0f} µs por registro | CPU {spec['cpu_pct']:.2f}%")
+                    for name, io_stats in gatt_io.get_stats().items():
+                        if io_stats["acquired"]:
+                            logger.info(f"🔌 Socket {name.rsplit('/', 2)[-2]}/{name.rsplit('/', 1)[-1]}: {io_stats['messages']} mensajes | {io_stats['packets']} paquetes | {io_stats['dropped']} descartados")
+                    log_stats = rtlog.get_stats()
+                    if log_stats["suppressed"] or log_stats["dropped"]:
+                        logger.info(f"📝 Log RT ({log_stats['mode']}): {log_stats['logged']} líneas | {log_stats['suppressed']} deduplicadas | {log_stats['dropped']} descartadas")
             threading.Thread(target=metrics_thread, daemon=True).start()
         except Exception as e:
             logger.error(f"❌ Error creando Stream de audio: {e}")
 
-    def start_rnnoise(self):
-        if self.rnnoise_processor:
-            logger.info("ℹ️ RNNoise ya está inicializado.")
-            self.rnnoise_enabled = True
-            return
-        logger.info("🎤 Inicializando procesador RNNoise...")
-        try:
-            self.rnnoise_processor = RNNoiseProcessor()
-            self.rnnoise_enabled = True
-            logger.info("✅ RNNoise activado.")
-        except RuntimeError as e:
-            logger.error(f"❌ {e}")
-            logger.error("Compila RNNoise primero: cd ~/rnnoise && ./autogen.sh && ./configure && make")
-            self.rnnoise_enabled = False
-    
-    def stop_rnnoise(self):
-        if not self.rnnoise_enabled and not self.rnnoise_processor:
-            return
-        logger.info("🛑 Desactivando RNNoise...")
-        self.rnnoise_enabled = False
-        if self.rnnoise_processor:
-            del self.rnnoise_processor
-            self.rnnoise_processor = None
-            logger.info("✅ Procesador RNNoise limpiado")
+    def get_audio_stats(self):
+        """Contadores del stream para diagnóstico y generadores de carga"""
+        stats = self.engine.get_stats() if self.engine else self.pipeline.get_stats()
+        volume = self.controls.get_stats()["volume"]
+        if self.supervisor:
+            supervisor = self.supervisor.get_stats()
+            stats["recoveries"] = supervisor["recoveries"]
+            stats["recover_ms"] = supervisor["recover_last_ms"]
+        elif not self.engine:
+            stats["recoveries"], stats["recover_ms"] = 0, 0.0
+        stats.update({
+            "active": self.stream_active(),
+            "volume_hw_avg_ms": volume["avg_ms"],
+            "volume_coalesced": volume["coalesced"],
+        })
+        return stats
+
+    def get_vad(self):
+        """Probabilidad de voz del último frame por canal (ceros sin RNNoise)"""
+        if self.engine:
+            return self.engine.get_vad()
+        return self.pipeline.get_vad()
+
+    def request_mode(self, mode):
+        """Modo escrito por la app: 'auto' lo delega en la cascada, otro la pausa"""
+        if self.environment:
+            if mode.strip().lower() == "auto":
+                self.environment.set_auto(True)
+                return
+            self.environment.override(mode)
+        self.set_mode(mode)
+
+    def set_auto_mode(self, mode):
+        """Modo elegido por la cascada (se descarta si el usuario la pausó mientras tanto)"""
+        if self.environment and self.environment.auto:
+            self.set_mode(mode)
 
     def set_mode(self, mode):
+        # Acepta tanto "escuela" como "mode_school"
+        if normalize_mode(mode) == "escuela":
+            logger.info("🎓 MODO 'ESCUELA' RECIBIDO. ACTIVANDO RNNoise.")
+        else:
+            logger.info("🔧 MODO 'NORMAL/OTRO' RECIBIDO. ASEGURANDO RNNoise DESACTIVADO.")
+        self.set_eq_preset(mode)
+        self._apply_mode(mode)
+
+    def _apply_mode(self, mode):
+        """Limitador, VAD y RNNoise del modo (sin tocar el mezclador)"""
         self.mode = mode.lower()
-    
-        if not self.audio_stream or not self.audio_stream.active:
+        if not self.stream_active():
             self.start_audio_stream()
-    
-    # Ahora acepta tanto "escuela" como "mode_school"
-        if self.mode == "escuela" or self.mode == "mode_school":
-            logger.info("🎓 MODO 'ESCUELA' RECIBIDO. LLAMANDO A start_rnnoise().")
-            self.set_eq_school()
-            self.start_rnnoise()
+        if self.engine:
+            self.engine.set_mode(self.mode)
+            logger.info(f"✅ Modo {mode.upper()} enviado al motor de audio")
         else:
-            logger.info("🔧 MODO 'NORMAL/OTRO' RECIBIDO. ASEGURANDO RNNoise DESACTIVADO.")
-            self.set_eq_flat()
-            self.stop_rnnoise()
-    
-        logger.info(f"✅ Modo {mode.upper()} activado (RNNoise: {'ON' if self.rnnoise_enabled else 'OFF'})")
+            self.pipeline.set_mode(self.mode)
+            logger.info(f"✅ Modo {mode.upper()} activado (RNNoise: {self.pipeline.active_denoiser.upper() if self.pipeline.rnnoise_enabled else 'OFF'})")
 
 
     def cleanup(self):
         logger.info("🛑 Limpiando WM8960...")
-        self.stop_rnnoise()
-        if self.audio_stream:
-            self.audio_stream.stop()
-            self.audio_stream.close()
-            self.audio_stream = None
+        self._metrics_running = False
+        if self.environment:
+            self.environment.stop()
+        if self.spectrum:
+            self.spectrum.stop()
+        self.controls.stop()
+        if self.engine:
+            self.engine.close()
+            self.engine = None
+            logger.info("✅ Motor de audio detenido")
+        else:
+            self.pipeline.stop_rnnoise()
+        if self.supervisor:
+            self.supervisor.stop()
+            self.supervisor = None
             logger.info("✅ Stream de audio cerrado")
+        if self.rt:
+            self.rt.stop()
+            self.rt = None
 
 # ========================================
 # GATT Classes - Totalmente Formateadas
@@ -315,7 +616,7 @@ class Application(dbus.service.Object):
         self.path = '/'
         self.services = []
         dbus.service.Object.__init__(self, bus, self.path)
-        self.add_service(TearisService(bus, 0))
+        self.add_service(TearisService(bus, 0, controllers))
     
     def get_path(self):
         return dbus.ObjectPath(self.path)
@@ -333,6 +634,55 @@ class Application(dbus.service.Object):
                 response[chrc.get_path()] = chrc.get_properties()
         return dbus.Dictionary(response, signature='oa{sa{sv}}')
 
+    @dbus.service.method(DEBUG_IFACE, out_signature='a{sv}')
+    def GetAudioStats(self):
+        stats = wm8960.get_audio_stats()
+        return dbus.Dictionary({
+            'xruns': dbus.UInt32(stats['xruns']),
+            'callbacks': dbus.UInt32(stats['callbacks']),
+            'callback_max_ms': dbus.Double(stats['callback_max_ms']),
+            'active': dbus.Boolean(stats['active']),
+            'jitter_avg_ms': dbus.Double(stats['jitter_avg_ms']),
+            'jitter_max_ms': dbus.Double(stats['jitter_max_ms']),
+            'slider_to_sound_avg_ms': dbus.Double(stats['slider_to_sound_avg_ms']),
+            'slider_to_sound_max_ms': dbus.Double(stats['slider_to_sound_max_ms']),
+            'volume_hw_avg_ms': dbus.Double(stats['volume_hw_avg_ms']),
+            'volume_coalesced': dbus.UInt32(stats['volume_coalesced']),
+            'recoveries': dbus.UInt32(stats['recoveries']),
+            'recover_ms': dbus.Double(stats['recover_ms']),
+        }, signature='sv')
+
+    @dbus.service.method(DEBUG_IFACE, in_signature='s')
+    def InjectAudioFault(self, kind):
+        try:
+            wm8960.inject_fault(str(kind))
+        except ValueError as e:
+            raise dbus.exceptions.DBusException(f'org.freedesktop.DBus.Error.InvalidArgs: {e}')
+
+    @dbus.service.method(DEBUG_IFACE, out_signature='a{sv}')
+    def GetMemoryReport(self):
+        report = accountant.report()
+        out = {
+            'rss_kb': dbus.UInt32(report['rss_kb']),
+            'peak_kb': dbus.UInt32(report['peak_kb']),
+            'gc_objects': dbus.UInt32(report['gc_objects']),
+            'buffers_kb': dbus.Double(sum(report['buffers'].values())),
+            'tracemalloc': dbus.Boolean(report['tracemalloc'] is not None),
+        }
+        for name, kb in report['sections'].items():
+            out[f'section_{name}_kb'] = dbus.Int32(kb)
+        if report['tracemalloc']:
+            out['traced_kb'] = dbus.Double(report['tracemalloc']['traced_kb'])
+        return dbus.Dictionary(out, signature='sv')
+
+    @dbus.service.method(DEBUG_IFACE, in_signature='b')
+    def SetTracemalloc(self, enabled):
+        tracing.start() if enabled else tracing.stop()
+
+    @dbus.service.method(DEBUG_IFACE, in_signature='u', out_signature='as')
+    def GetTracemallocTop(self, limit):
+        return dbus.Array(tracing.top(int(limit)), signature='s')
+
 class Service(dbus.service.Object):
     PATH_BASE = '/org/bluez/example/service'
     
@@ -381,24 +731,36 @@ class Service(dbus.service.Object):
         return self.get_properties()[GATT_SERVICE_IFACE]
 
 class Characteristic(dbus.service.Object):
+    # Camino rápido (tearis_gatt_io.py): fuente que el hilo de E/S consulta
+    # con el socket de notificación adquirido
+    notify_source = None
+
     def __init__(self, bus, index, uuid, flags, service):
         self.path = service.path + '/char' + str(index)
         self.bus = bus
         self.uuid = uuid
         self.service = service
+        if GATT_SOCKETS and 'write' in flags:
+            flags = flags + ['write-without-response']
         self.flags = dbus.Array(flags, signature='s')
         self.value = dbus.Array([], signature='y')
+        self.notify_socket = self.path + '/notify'
+        self.write_socket = self.path + '/write'
         dbus.service.Object.__init__(self, bus, self.path)
     
     def get_properties(self):
-        return {
-            GATT_CHRC_IFACE: dbus.Dictionary({
-                'Service': dbus.ObjectPath(self.service.get_path()),
-                'UUID': dbus.String(self.uuid),
-                'Flags': self.flags,
-                'Value': self.value
-            }, signature='sv')
+        props = {
+            'Service': dbus.ObjectPath(self.service.get_path()),
+            'UUID': dbus.String(self.uuid),
+            'Flags': self.flags,
+            'Value': self.value
         }
+        # Con estas propiedades presentes BlueZ usa AcquireNotify/AcquireWrite
+        if GATT_SOCKETS and 'notify' in self.flags:
+            props['NotifyAcquired'] = dbus.Boolean(gatt_io.acquired(self.notify_socket))
+        if GATT_SOCKETS and 'write-without-response' in self.flags:
+            props['WriteAcquired'] = dbus.Boolean(gatt_io.acquired(self.write_socket))
+        return {GATT_CHRC_IFACE: dbus.Dictionary(props, signature='sv')}
     
     def get_path(self):
         return dbus.ObjectPath(self.path)
@@ -417,25 +779,111 @@ class Characteristic(dbus.service.Object):
     def PropertiesChanged(self, interface, changed, invalidated):
         pass
 
+    def notify_value(self, data):
+        """Notifica `data` (bytes) por el socket adquirido o, si no hay, por PropertiesChanged"""
+        self.value = dbus.Array(data, signature='y')
+        if gatt_io.notify(self.notify_socket, data):
+            return
+        if getattr(self, 'notifying', False):
+            self.PropertiesChanged(GATT_CHRC_IFACE, dbus.Dictionary({'Value': self.value}, signature='sv'), [])
+
+    def write_bytes(self, data):
+        """Escritura de la app (WriteValue o socket); la implementan las características con 'write'"""
+        raise dbus.exceptions.DBusException('org.bluez.Error.NotSupported: Write not supported')
+
+    def notify_acquired(self):
+        """BlueZ adquirió el socket de notificación (suscripción por el camino rápido)"""
+
+    def notify_released(self):
+        """BlueZ cerró el socket de notificación (baja o desconexión)"""
+
+    def _acquired_changed(self, prop, value):
+        if prop == 'NotifyAcquired' and not value:
+            self.notify_released()
+        self.PropertiesChanged(GATT_CHRC_IFACE, dbus.Dictionary({prop: dbus.Boolean(value)}, signature='sv'), [])
+        return False
+
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='hq')
+    def AcquireNotify(self, options):
+        if not GATT_SOCKETS or 'notify' not in self.flags:
+            raise dbus.exceptions.DBusException('org.bluez.Error.NotSupported: AcquireNotify not supported')
+        mtu = int(options.get('mtu', DEFAULT_MTU))
+        remote = gatt_io.acquire_notify(self.notify_socket, mtu, source=self.notify_source,
+                                        on_release=lambda: GLib.idle_add(self._acquired_changed, 'NotifyAcquired', False))
+        self.notify_acquired()
+        self._acquired_changed('NotifyAcquired', True)
+        fd = dbus.types.UnixFd(remote.fileno())
+        remote.close()
+        return fd, dbus.UInt16(mtu)
+
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='hq')
+    def AcquireWrite(self, options):
+        if not GATT_SOCKETS or 'write-without-response' not in self.flags:
+            raise dbus.exceptions.DBusException('org.bluez.Error.NotSupported: AcquireWrite not supported')
+        mtu = int(options.get('mtu', DEFAULT_MTU))
+        # write_bytes corre en el hilo de E/S, sin pasar por GLib
+        remote = gatt_io.acquire_write(self.write_socket, mtu, self.write_bytes,
+                                       on_release=lambda: GLib.idle_add(self._acquired_changed, 'WriteAcquired', False))
+        self._acquired_changed('WriteAcquired', True)
+        fd = dbus.types.UnixFd(remote.fileno())
+        remote.close()
+        return fd, dbus.UInt16(mtu)
+
+def device_uuid(uuid, device):
+    """UUID de una característica para el dispositivo N del hub (el 0 conserva los de siempre)"""
+    if not device:
+        return uuid
+    return f"{uuid[:19]}{0x1234 + device:04x}{uuid[23:]}"
+
+
 class TearisService(Service):
-    def __init__(self, bus, index):
+    """
+    Servicio TEARIS: las características de cada dispositivo del hub bajo el
+    mismo servicio; el dispositivo N usa los UUIDs con el cuarto grupo en
+    1234+N (el 0 conserva los de siempre), y HUB_UUID lista 'N:nombre'
+    """
+
+    def __init__(self, bus, index, controllers):
         Service.__init__(self, bus, index, SERVICE_UUID, True)
-        self.add_characteristic(BatteryCharacteristic(bus, 0, self))
-        self.add_characteristic(ModeCharacteristic(bus, 1, self))
-        self.add_characteristic(StatusCharacteristic(bus, 2, self))
-        self.add_characteristic(VolumeCharacteristic(bus, 3, self))
-        self.add_characteristic(AudioStreamCharacteristic(bus, 4, self))
+        self.add_characteristic(BatteryCharacteristic(bus, 0, self, controllers[0]))
+        for device, controller in enumerate(controllers):
+            chars = [ModeCharacteristic, StatusCharacteristic, VolumeCharacteristic, AudioStreamCharacteristic]
+            if controller.spectrum:
+                chars.append(SpectrumCharacteristic)
+            if controller.dosimeter:
+                chars.append(DoseCharacteristic)
+            chars.append(CommandCharacteristic)
+            for cls in chars:
+                self.add_characteristic(cls(bus, len(self.characteristics), self, controller, device))
+        if len(controllers) > 1:
+            self.add_characteristic(HubCharacteristic(bus, len(self.characteristics), self, controllers))
+
+class HubCharacteristic(Characteristic):
+    """Dispositivos del hub: 'N:nombre' separados por ';' (N es el índice de sus UUIDs)"""
+
+    def __init__(self, bus, index, service, controllers):
+        Characteristic.__init__(self, bus, index, HUB_UUID, ['read'], service)
+        text = ";".join(f"{i}:{c.name}" for i, c in enumerate(controllers))
+        self.value = dbus.Array(text.encode(), signature='y')
+
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
+    def ReadValue(self, options):
+        logger.info("🧭 Leyendo dispositivos del hub")
+        return self.value
 
 class BatteryCharacteristic(Characteristic):
-    def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, BATTERY_UUID, ['read', 'notify'], service)
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(BATTERY_UUID, device), ['read', 'notify'], service)
+        self.controller = controller
         self.value = dbus.Array([dbus.Byte(100)], signature='y')
         self.notifying = False
     
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
     def ReadValue(self, options):
         logger.info("🔋 Leyendo batería")
         return self.value
     
+    @dbus.service.method(GATT_CHRC_IFACE)
     def StartNotify(self):
         if self.notifying:
             return
@@ -443,63 +891,104 @@ class BatteryCharacteristic(Characteristic):
         logger.info("🔔 Iniciando notificaciones de batería...")
         GLib.timeout_add(10000, self.update_battery)
     
+    @dbus.service.method(GATT_CHRC_IFACE)
     def StopNotify(self):
         self.notifying = False
         logger.info("🔕 Notificaciones de batería detenidas.")
+
+    def notify_acquired(self):
+        self.StartNotify()
+
+    def notify_released(self):
+        self.StopNotify()
     
     def update_battery(self):
         if not self.notifying:
             return False
-        self.value = dbus.Array([dbus.Byte(self.value[0] - 1 if self.value[0] > 0 else 0)], signature='y')
+        self.notify_value(bytes([self.value[0] - 1 if self.value[0] > 0 else 0]))
         logger.info(f"🔋 Battery updated: {self.value[0]}%")
-        self.PropertiesChanged(GATT_CHRC_IFACE, dbus.Dictionary({'Value': self.value}, signature='sv'), [])
         return True
 
 class ModeCharacteristic(Characteristic):
-    def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, MODE_UUID, ['read', 'write'], service)
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(MODE_UUID, device), ['read', 'write'], service)
+        self.controller = controller
         self.value = dbus.Array([dbus.Byte(ord(c)) for c in "NORMAL"], signature='y')
     
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
     def ReadValue(self, options):
         logger.info("📖 Leyendo modo")
         return self.value
     
     @dbus.service.method(GATT_CHRC_IFACE, in_signature='aya{sv}')
     def WriteValue(self, value, options):
-        self.value = value
-        mode_str = ''.join([chr(b) for b in value])
+        self.write_bytes(bytes(value))
+
+    def write_bytes(self, data):
+        self.value = dbus.Array(data, signature='y')
+        mode_str = ''.join([chr(b) for b in data])
         logger.info(f"✏️ Modo escrito: {mode_str}")
-        wm8960.set_mode(mode_str)
+        self.controller.controls.submit("mode", mode_str)
 class StatusCharacteristic(Characteristic):
-    def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, STATUS_UUID, ['read'], service)
-        self.value = dbus.Array([dbus.Byte(ord(c)) for c in "OK"], signature='y')
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(STATUS_UUID, device), ['read', 'notify'], service)
+        self.controller = controller
+        self.value = dbus.Array([dbus.Byte(ord(c)) for c in self.controller.status], signature='y')
+        self.notifying = False
+        self.controller.add_status_listener(self.publish_status)
     
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
     def ReadValue(self, options):
         logger.info("📊 Leyendo status")
         return self.value
 
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StartNotify(self):
+        self.notifying = True
+        logger.info("🔔 Iniciando notificaciones de status...")
+
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StopNotify(self):
+        self.notifying = False
+
+    def publish_status(self, text):
+        # Llega desde el hilo del supervisor: D-Bus solo desde el loop de GLib
+        GLib.idle_add(self._update_status, text)
+
+    def _update_status(self, text):
+        logger.info(f"📊 Status: {text}")
+        self.notify_value(text.encode())
+        return False
+
 class VolumeCharacteristic(Characteristic):
-    def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, VOLUME_UUID, ['read', 'write'], service)
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(VOLUME_UUID, device), ['read', 'write'], service)
+        self.controller = controller
         self.value = dbus.Array([dbus.Byte(65)], signature='y')
     
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
     def ReadValue(self, options):
         logger.info("🔊 Leyendo volumen")
         return self.value
     
     @dbus.service.method(GATT_CHRC_IFACE, in_signature='aya{sv}')
     def WriteValue(self, value, options):
-        self.value = value
-        vol = value[0]
+        self.write_bytes(bytes(value))
+
+    def write_bytes(self, data):
+        self.value = dbus.Array(data, signature='y')
+        vol = data[0]
         logger.info(f"✏️ Volumen escrito: {vol}%")
-        wm8960.set_volume(vol)
+        self.controller.request_volume(vol)
 class AudioStreamCharacteristic(Characteristic):
-    def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, AUDIO_STREAM_UUID, ['notify'], service)
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(AUDIO_STREAM_UUID, device), ['notify'], service)
+        self.controller = controller
         self.notifying = False
         self.audio_read_source = None
+        self.notify_source = self._next_payload
     
+    @dbus.service.method(GATT_CHRC_IFACE)
     def StartNotify(self):
         if self.notifying:
             return
@@ -507,6 +996,7 @@ class AudioStreamCharacteristic(Characteristic):
         logger.info("🎵 Iniciando streaming de audio...")
         self.audio_read_source = GLib.timeout_add(10, self._notify_from_queue)
     
+    @dbus.service.method(GATT_CHRC_IFACE)
     def StopNotify(self):
         if not self.notifying:
             return
@@ -516,19 +1006,202 @@ class AudioStreamCharacteristic(Characteristic):
             GLib.source_remove(self.audio_read_source)
             self.audio_read_source = None
     
+    def notify_acquired(self):
+        # El hilo de E/S toma el tap: el timeout de GLib ya no hace falta
+        self.StopNotify()
+        logger.info("🎵 Streaming de audio por socket adquirido")
+
+    def notify_released(self):
+        logger.info("🛑 Streaming de audio por socket detenido.")
+
+    @staticmethod
+    def _block_bytes(processed):
+        # Con stream int16 el bloque ya está en el formato del BLE
+        if processed.dtype == np.int16:
+            return processed.tobytes()
+        return (processed * 32767).astype(np.int16).tobytes()
+
+    def _next_payload(self):
+        """Fuente del socket adquirido (hilo de E/S)"""
+        processed = self.controller.read_tap()
+        return None if processed is None else self._block_bytes(processed)
+
     def _notify_from_queue(self):
         if not self.notifying:
             return False
         
-        try:
-            processed = audio_queue.get_nowait()
-            data = (processed * 32767).astype(np.int16).tobytes()
+        processed = self.controller.read_tap()
+        if processed is not None:
+            data = self._block_bytes(processed)
             value = dbus.Array([dbus.Byte(b) for b in data], signature='y')
             self.PropertiesChanged(GATT_CHRC_IFACE, dbus.Dictionary({'Value': value}, signature='sv'), [])
-        except queue.Empty:
-            pass
         
         return True
+class SpectrumCharacteristic(Characteristic):
+    """Registros de tearis_spectrum.py (bandas, pico/RMS y VAD) a 10 Hz"""
+
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(SPECTRUM_UUID, device), ['read', 'notify'], service)
+        self.controller = controller
+        self.notifying = False
+        self.acquired = False
+        self.source = None
+        self.sent_seq = None
+        self.notify_source = self._next_record
+
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
+    def ReadValue(self, options):
+        _, record = self.controller.spectrum.latest()
+        return dbus.Array(record or b'', signature='y')
+
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StartNotify(self):
+        if self.notifying:
+            return
+        self.notifying = True
+        logger.info("📈 Iniciando telemetría de espectro...")
+        self.controller.spectrum.start()
+        self.source = GLib.timeout_add(int(1000 / self.controller.spectrum.rate_hz), self._notify_latest)
+
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StopNotify(self):
+        if not self.notifying:
+            return
+        self.notifying = False
+        if self.source:
+            GLib.source_remove(self.source)
+            self.source = None
+        self._maybe_stop()
+        logger.info("🛑 Telemetría de espectro detenida.")
+
+    def notify_acquired(self):
+        # El hilo de E/S toma los registros: el timeout de GLib ya no hace falta
+        self.StopNotify()
+        self.acquired = True
+        self.controller.spectrum.start()
+        logger.info("📈 Telemetría de espectro por socket adquirida")
+
+    def notify_released(self):
+        self.acquired = False
+        self._maybe_stop()
+
+    def _maybe_stop(self):
+        if not self.notifying and not self.acquired:
+            self.controller.spectrum.stop()
+
+    def _next_record(self):
+        """Fuente del socket adquirido (hilo de E/S): solo registros nuevos"""
+        seq, record = self.controller.spectrum.latest()
+        if record is None or seq == self.sent_seq:
+            return None
+        self.sent_seq = seq
+        return record
+
+    def _notify_latest(self):
+        if not self.notifying:
+            return False
+        record = self._next_record()
+        if record is not None:
+            self.notify_value(record)
+        return True
+
+class DoseCharacteristic(Characteristic):
+    """Registro de tearis_dose.py (Leq A de 1 s, 1 min y sesión, picos y dosis) a 1 Hz"""
+
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(DOSE_UUID, device), ['read', 'notify'], service)
+        self.controller = controller
+        self.notifying = False
+        self.source = None
+        self.sent_second = None
+        self.notify_source = self._next_record
+
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
+    def ReadValue(self, options):
+        logger.info("👂 Leyendo dosis de exposición")
+        return dbus.Array(self.controller.dosimeter.record(), signature='y')
+
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StartNotify(self):
+        if self.notifying:
+            return
+        self.notifying = True
+        logger.info("👂 Iniciando notificaciones de dosis...")
+        self.source = GLib.timeout_add(1000, self._notify_latest)
+
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StopNotify(self):
+        if not self.notifying:
+            return
+        self.notifying = False
+        if self.source:
+            GLib.source_remove(self.source)
+            self.source = None
+
+    def notify_acquired(self):
+        # El hilo de E/S toma los registros: el timeout de GLib ya no hace falta
+        self.StopNotify()
+
+    def _next_record(self):
+        """Fuente del socket adquirido (hilo de E/S): un registro por segundo cerrado"""
+        dosimeter = self.controller.dosimeter
+        if dosimeter.seconds == self.sent_second:
+            return None
+        self.sent_second = dosimeter.seconds
+        return dosimeter.record()
+
+    def _notify_latest(self):
+        if not self.notifying:
+            return False
+        record = self._next_record()
+        if record is not None:
+            self.notify_value(record)
+        return True
+
+class CommandCharacteristic(Characteristic):
+    """
+    Lotes binarios de tearis_command.py: una escritura cambia modo, EQ,
+    volumen e interruptores DSP juntos; la confirmación llega por notify
+    """
+
+    def __init__(self, bus, index, service, controller, device=0):
+        Characteristic.__init__(self, bus, index, device_uuid(COMMAND_UUID, device), ['write', 'notify'], service)
+        self.controller = controller
+        self.notifying = False
+        controller.ack_listeners.append(self.publish_ack)
+
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='aya{sv}')
+    def WriteValue(self, value, options):
+        self.write_bytes(bytes(value))
+
+    def write_bytes(self, data):
+        try:
+            batch = decode_batch(data)
+        except CommandError as e:
+            logger.warning(f"⚠️ Lote inválido: {e}")
+            seq = COMMAND_HEADER.unpack_from(data)[1] if len(data) >= COMMAND_HEADER.size else 0
+            self.publish_ack(encode_ack(seq, e.status))
+            return
+        logger.info(f"✏️ Lote {batch['seq']}: {', '.join(batch['params']) or 'vacío'}")
+        self.controller.submit_profile(batch)
+
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StartNotify(self):
+        self.notifying = True
+        logger.info("🔔 Iniciando confirmaciones de comandos...")
+
+    @dbus.service.method(GATT_CHRC_IFACE)
+    def StopNotify(self):
+        self.notifying = False
+
+    def publish_ack(self, ack):
+        # Llega desde el hilo del aplicador o de E/S: D-Bus solo desde el loop de GLib
+        GLib.idle_add(self._send_ack, ack)
+
+    def _send_ack(self, ack):
+        self.notify_value(ack)
+        return False
+
 # ========================================
 # Helper functions
 # ========================================
@@ -560,9 +1233,14 @@ def register_ad_error_cb(error):
 def cleanup_and_exit(signum=None, frame=None):
     global mainloop
     logger.info("🛑 Limpiando...")
+    accountant.stop_monitor()
+    rtlog.stop()
+    gatt_io.stop()
     try:
-        if wm8960:
-            wm8960.cleanup()
+        for controller in controllers:
+            controller.cleanup()
+        if hub:
+            hub.close()
     except Exception as e:
         logger.warning(f"⚠️ Error during cleanup: {e}")
     
@@ -570,16 +1248,27 @@ def cleanup_and_exit(signum=None, frame=None):
         mainloop.quit()
 
 def main():
-    global wm8960, mainloop
+    global wm8960, controllers, hub, mainloop
     
     logger.info("=" * 70)
     logger.info("🎧 TEARIS BLE Server - FINAL VERSION")
     logger.info("=" * 70)
     
-    wm8960 = WM8960Controller()
+    if HUB_DEVICES:
+        # Un controlador por dispositivo; las cadenas corren en los procesos por núcleo del hub
+        hub = Hub(parse_devices(HUB_DEVICES), dtype=AUDIO_DTYPE, channel_strategy=CHANNEL_STRATEGY,
+                  beamformer=BEAMFORMER, denoiser=DENOISER, feedback=FEEDBACK, subband=SUBBAND)
+        controllers = [WM8960Controller(engine=device, card=device.card, name=device.name) for device in hub.devices]
+        logger.info(f"🧭 Hub: {len(controllers)} dispositivos en {len(hub.placement)} núcleo(s)")
+    else:
+        controllers = [WM8960Controller()]
+    wm8960 = controllers[0]
+    # Hilo de E/S de los sockets que BlueZ adquiera (AcquireNotify/AcquireWrite)
+    if GATT_SOCKETS:
+        gatt_io.start()
     
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
-    bus = dbus.SystemBus()
+    bus = dbus.SessionBus() if DBUS_BUS == 'session' else dbus.SystemBus()
     
     adapter_path = find_adapter(bus)
     if not adapter_path:
@@ -592,13 +1281,24 @@ def main():
     service_manager = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter_path), GATT_MANAGER_IFACE)
     ad_manager = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter_path), LE_ADVERTISING_MANAGER_IFACE)
     
-    advertisement = Advertisement(bus, 0, 'peripheral')
-    ad_manager.RegisterAdvertisement(advertisement.get_path(), {}, reply_handler=register_ad_cb, error_handler=register_ad_error_cb)
-    
-    app = Application(bus)
-    service_manager.RegisterApplication(app.get_path(), {}, reply_handler=register_app_cb, error_handler=register_app_error_cb)
+    with accountant.measure("dbus"):
+        advertisement = Advertisement(bus, 0, 'peripheral')
+        ad_manager.RegisterAdvertisement(advertisement.get_path(), {}, reply_handler=register_ad_cb, error_handler=register_ad_error_cb)
+
+        app = Application(bus)
+        service_manager.RegisterApplication(app.get_path(), {}, reply_handler=register_app_cb, error_handler=register_app_error_cb)
     
-    wm8960.set_mode("normal")
+    for controller in controllers:
+        controller.set_mode("normal")
+
+    # Memoria: reporte de arranque y monitor por minuto
+    if MEMORY_REPORT:
+        for name, kb in import_report().items():
+            logger.info(f"📦 import {name}: {'no disponible' if kb is None else f'{kb / 1024:.1f} MB'}")
+    accountant.log_report()
+    accountant.start_monitor()
+    # kill -USR2: prende tracemalloc / vuelca el top y lo apaga
+    signal.signal(signal.SIGUSR2, lambda signum, frame: tracing.toggle())
     
     signal.signal(signal.SIGINT, cleanup_and_exit)
     signal.signal(signal.SIGTERM, cleanup_and_exit)
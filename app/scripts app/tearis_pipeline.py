@@ -0,0 +1,740 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Cadena de procesamiento de audio
+Cancelador de realimentación + RNNoise (o el reductor espectral) + VAD + EQ de software + rampa de ganancia + limitador, armada como
+grafo DSP (tearis_dsp_graph.py) y sin dependencias de D-Bus, para poder
+correrla dentro del servidor BLE o en un proceso de audio aparte.
+"""
+
+import os
+import time
+import logging
+import contextlib
+import numpy as np
+from ctypes import CDLL, c_void_p, POINTER, c_float
+
+from tearis_limiter import PeakLimiter, normalize_mode
+from tearis_vad import VADScheduler
+from tearis_control import GainRamp
+from tearis_memory import accountant
+from tearis_rtlog import rtlog
+from tearis_beamformer import Beamformer, BeamformerNode, BEAM_METHODS, BEAM_MODES
+from tearis_fir import FIRNode
+from tearis_denoise import SpectralDenoiser, AutoChannelPath
+from tearis_feedback import FeedbackCanceller, FeedbackNode, PARTITIONS
+from tearis_subband import SubbandNode, SubbandTap, band_rate
+from tearis_audio_backends import stream_latency
+from tearis_dsp_graph import (DSPGraph, Node, GainNode, LimiterNode, VADGateNode,
+                              TapNode, SOSNode, log_timing, PCM16_SCALE)
+
+logger = logging.getLogger("TEARIS-DSP")
+
+# RNNoise config
+SAMPLE_RATE = 48000
+CHANNELS = 2
+FRAME_SIZE = 480
+
+# Modos que usan RNNoise
+RNNOISE_MODES = ("escuela",)
+
+# Motores de reducción de ruido para el lugar de RNNoise en la cadena:
+#   rnnoise:  red neuronal de librnnoise
+#   spectral: Wiener con estadística de mínimos (tearis_denoise.py); más
+#             barato y respaldo si no se encuentra librnnoise
+DENOISERS = ("rnnoise", "spectral")
+
+# Estrategias de canales de RNNoise:
+#   stereo:   un estado por canal (2 llamadas por frame)
+#   mono:     se limpia el canal medio (L+R)/2 y se copia a ambas salidas
+#   mid_side: se limpia el medio; el lateral (L-R)/2 pasa con la misma
+#             atenuación que RNNoise aplicó al medio, para conservar la imagen
+#   auto:     mono si los micrófonos están correlacionados (o uno está
+#             muerto), stereo si no
+CHANNEL_STRATEGIES = ("stereo", "mono", "mid_side", "auto")
+# (umbrales del modo auto: AUTO_* de tearis_denoise, comunes a los dos reductores)
+
+# Eventos del camino de audio: se anotan en el ring de tearis_rtlog y se
+# escriben desde su hilo, deduplicados
+EV_STATUS = rtlog.register("xrun", logger, logging.WARNING, "⚠️ Audio status: {detail}")
+EV_CALLBACK_ERROR = rtlog.register("error de callback", logger, logging.ERROR,
+                                   "❌ Error en callback: {detail}")
+EV_FRAME_MISMATCH = rtlog.register("frame de tamaño incorrecto", logger, logging.WARNING,
+                                   f"⚠️ Frame size mismatch: {{detail}} != {FRAME_SIZE}")
+EV_FRAME_ERROR = rtlog.register("error de frame", logger, logging.ERROR,
+                                "❌ Error procesando frame: {detail}")
+
+
+# ========================================
+# RNNoise Processor Class
+# ========================================
+class RNNoiseProcessor(AutoChannelPath):
+    """
+    Args:
+        strategy: estrategia de canales (ver CHANNEL_STRATEGIES)
+    """
+
+    def __init__(self, lib_path=None, strategy="stereo"):
+        if strategy not in CHANNEL_STRATEGIES:
+            raise ValueError(f"Estrategia de canales desconocida: {strategy} (opciones: {', '.join(CHANNEL_STRATEGIES)})")
+        self.strategy = strategy
+        if lib_path is None:
+            lib_path = self._find_rnnoise_lib()
+
+        if not lib_path:
+            raise RuntimeError("No se encontró librería RNNoise")
+
+        logger.info(f"🔊 Cargando RNNoise desde: {lib_path}")
+        self.lib = CDLL(lib_path)
+
+        self.lib.rnnoise_create.restype = c_void_p
+        self.lib.rnnoise_create.argtypes = [c_void_p]
+        self.lib.rnnoise_destroy.argtypes = [c_void_p]
+
+        self.lib.rnnoise_process_frame.restype = c_float
+        self.lib.rnnoise_process_frame.argtypes = [
+            c_void_p,
+            POINTER(c_float),  # output
+            POINTER(c_float)   # input
+        ]
+
+        self.states = [self.lib.rnnoise_create(None) for _ in range(CHANNELS)]
+        # Probabilidad de voz del último frame, por canal
+        self.vad_probs = np.zeros(CHANNELS, dtype=np.float32)
+        # Buffers por canal preasignados (contiguos, en escala PCM16)
+        self._in = np.zeros((CHANNELS, FRAME_SIZE), dtype=np.float32)
+        self._out = np.zeros((CHANNELS, FRAME_SIZE), dtype=np.float32)
+        self._in_ptrs = [self._in[ch].ctypes.data_as(POINTER(c_float)) for ch in range(CHANNELS)]
+        self._out_ptrs = [self._out[ch].ctypes.data_as(POINTER(c_float)) for ch in range(CHANNELS)]
+        # Estimación de correlación entre micrófonos (modo auto)
+        self._energy = np.zeros(3)   # LL, RR, LR suavizados
+        self.path = "mono" if strategy in ("mono", "mid_side") else "stereo"
+        self.dead_channel = None
+        self.correlation = 0.0
+        self.frames = 0
+        self.calls = 0
+        self.switches = 0
+        logger.info(f"✅ RNNoise inicializado con {CHANNELS} canales (estrategia {strategy})")
+
+    def _find_rnnoise_lib(self):
+        possible_paths = [
+            "/home/tearis/rnnoise/.libs/librnnoise.so",
+            "/home/tearis/rnnoise/.libs/librnnoise.so.0",
+            "/home/tearis/rnnoise/.libs/librnnoise.so.0.4.1",
+            os.path.expanduser("~/rnnoise/.libs/librnnoise.so"),
+            os.path.expanduser("~/rnnoise/.libs/librnnoise.so.0"),
+            "/usr/local/lib/librnnoise.so",
+            "/usr/lib/librnnoise.so",
+        ]
+
+        for path in possible_paths:
+            if os.path.exists(path):
+                return path
+
+        return None
+
+    def process_into(self, src, dst):
+        """
+        Un frame (FRAME_SIZE, CHANNELS) de `src` a `dst` sin temporales
+
+        La entrada int16 se usa tal cual (ya está en la escala de RNNoise);
+        la float se escala. Separar canales y convertir es una sola pasada,
+        igual que volver a intercalar y escalar la salida float de `dst`.
+        """
+        if src.dtype == np.int16:
+            np.copyto(self._in, src.T, casting="unsafe")
+        else:
+            np.multiply(src.T, PCM16_SCALE, out=self._in, casting="unsafe")
+        self.frames += 1
+        if self.strategy == "auto":
+            self._update_path()
+        if self.strategy == "stereo" or (self.strategy == "auto" and self.path == "stereo"):
+            for ch in range(CHANNELS):
+                self.vad_probs[ch] = self.lib.rnnoise_process_frame(self.states[ch], self._out_ptrs[ch], self._in_ptrs[ch])
+            self.calls += CHANNELS
+            np.multiply(self._out.T, 1.0 / PCM16_SCALE, out=dst, casting="unsafe")
+            return
+
+        mid, side = self._in[0], self._in[1]
+        if self.strategy == "mid_side":
+            np.subtract(mid, side, out=side)
+            side *= 0.5                       # lateral (L-R)/2
+            np.subtract(mid, side, out=mid)   # medio (L+R)/2
+        elif self.dead_channel == 0:
+            # Un solo micrófono útil: se usa tal cual, sin promediar con el muerto
+            mid[:] = side
+        elif self.dead_channel is None:
+            mid += side
+            mid *= 0.5
+        prob = self.lib.rnnoise_process_frame(self.states[0], self._out_ptrs[0], self._in_ptrs[0])
+        self.calls += 1
+        self.vad_probs[:] = prob
+        out_mid = self._out[0]
+        if self.strategy != "mid_side":
+            np.multiply(out_mid[:, None], 1.0 / PCM16_SCALE, out=dst, casting="unsafe")
+            return
+        # Misma atenuación que RNNoise aplicó al medio, sobre el lateral
+        e_in = float(np.dot(mid, mid))
+        gain = min(1.0, np.sqrt(float(np.dot(out_mid, out_mid)) / e_in)) if e_in > 0 else 0.0
+        side *= gain / PCM16_SCALE
+        tmp = self._out[1]
+        np.multiply(out_mid, 1.0 / PCM16_SCALE, out=tmp)
+        np.add(tmp, side, out=dst[:, 0], casting="unsafe")
+        np.subtract(tmp, side, out=dst[:, 1], casting="unsafe")
+
+    def get_channel_stats(self):
+        return {
+            "strategy": self.strategy,
+            "path": self.path if self.strategy == "auto" else self.strategy,
+            "correlation": float(self.correlation),
+            "calls_per_frame": self.calls / self.frames if self.frames else 0.0,
+            "switches": self.switches,
+        }
+
+    def process_frame(self, audio_frame):
+        try:
+            frame = audio_frame
+            if frame.ndim == 1:
+                frame = frame.reshape(-1, 1)
+            if frame.shape[1] == 1:
+                frame = np.hstack([frame, frame])
+            if frame.shape[0] != FRAME_SIZE:
+                rtlog.emit(EV_FRAME_MISMATCH, frame.shape[0])
+                if frame.shape[0] < FRAME_SIZE:
+                    frame = np.pad(frame, ((0, FRAME_SIZE - frame.shape[0]), (0, 0)))
+                else:
+                    frame = frame[:FRAME_SIZE, :]
+            output = np.empty((FRAME_SIZE, CHANNELS), dtype=np.float32)
+            self.process_into(frame, output)
+            return output
+        except Exception as e:
+            rtlog.emit(EV_FRAME_ERROR, e)
+            return audio_frame
+
+    def __del__(self):
+        if hasattr(self, 'states'):
+            for state in self.states:
+                self.lib.rnnoise_destroy(state)
+
+
+class RNNoiseNode(Node):
+    """RNNoise por frames de 480 muestras; actualiza el VAD con cada frame"""
+
+    frame_size = FRAME_SIZE
+    channels = CHANNELS
+    in_place = False
+    accepts_pcm16 = True
+
+    def __init__(self, processor, vad, name="rnnoise"):
+        super().__init__(name)
+        self.processor = processor
+        self.vad = vad
+
+    def process(self, src, dst):
+        self.processor.process_into(src, dst)
+        self.vad.update(self.processor.vad_probs)
+
+
+# ========================================
+# Cadena de audio
+# ========================================
+class AudioPipeline:
+    """
+    Cadena completa del callback: cancelador de realimentación (opcional) ->
+    beamformer (según modo) -> RNNoise (según modo) -> compuerta VAD ->
+    EQ de software y FIR del perfil auditivo (si el modo tiene) -> rampa de
+    ganancia -> limitador ->
+    tap de monitoreo
+
+    Cada cambio de modo arma y compila un grafo nuevo fuera del callback y
+    lo reemplaza de una vez; el callback solo ejecuta el plan vigente.
+
+    Args:
+        tap: función que recibe cada bloque procesado (monitor BLE); debe
+             ser no bloqueante
+        blocksize: tamaño de bloque del stream; si es None se compila en
+                   el primer callback
+        dtype: formato del stream; con int16 la entrada se convierte una
+               sola vez y el tap recibe la salida int16 del códec
+        channel_strategy: estrategia de canales de RNNoise (CHANNEL_STRATEGIES)
+        denoiser: motor de reducción de ruido por defecto (DENOISERS); cada
+                  modo puede tener el suyo con set_denoiser
+        feedback: cancelador de realimentación auriculares -> micrófonos
+                  (tearis_feedback.py) en todos los modos
+        beamformer: método de tearis_beamformer ('off', 'das', 'mvdr') para
+                    los modos de BEAM_MODES; con el beamformer activo
+                    RNNoise limpia un solo canal (camino mono)
+        subband: el cancelador corre sobre la banda baja (0-12 kHz) de un
+                 banco QMF (tearis_subband.py) con la mitad de frames y de
+                 particiones; la banda alta pasa sin cancelar
+    """
+
+    def __init__(self, channels=CHANNELS, sample_rate=SAMPLE_RATE, tap=None, blocksize=None,
+                 dtype=np.float32, channel_strategy="stereo", beamformer="off", denoiser="rnnoise",
+                 feedback=False, subband=False):
+        if channel_strategy not in CHANNEL_STRATEGIES:
+            raise ValueError(f"Estrategia de canales desconocida: {channel_strategy}")
+        if denoiser not in DENOISERS:
+            raise ValueError(f"Reductor de ruido desconocido: {denoiser}")
+        if beamformer not in BEAM_METHODS:
+            raise ValueError(f"Método de beamforming desconocido: {beamformer}")
+        self.channel_strategy = channel_strategy
+        self.beam_method = beamformer
+        self.beamformer = None if beamformer == "off" else Beamformer(beamformer, sample_rate=sample_rate)
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.subband = subband
+        # Latencias del stream abierto (attach_stream): la de salida es lo que
+        # tarda un bloque en llegar al códec; la suma, el lazo del cancelador
+        self.output_latency = 0.0
+        self.loop_latency = 0.0
+        self._feedback_bands = None
+        self.feedback = self._create_feedback() if feedback else None
+        self.tap = tap
+        self.blocksize = blocksize
+        self.dtype = np.dtype(dtype)
+        self.mode = "normal"
+        self.rnnoise_processor = None
+        # Etapa de reducción de ruido encendida, con cualquier motor; el que
+        # corre de verdad es active_denoiser ('spectral' también cuando no
+        # se encontró librnnoise): quien necesite RNNoise tiene que mirarlo
+        self.rnnoise_enabled = False
+        self.denoiser = denoiser
+        self.mode_denoisers = {}
+        self.active_denoiser = None
+        self.limiter = PeakLimiter.from_mode(self.mode, channels=channels, sample_rate=sample_rate)
+        self.vad = VADScheduler()
+        self.gain_ramp = GainRamp()
+        self.eq = {}
+        self.fir = {}
+        self.input_tap = None
+        self.output_tap = None
+        self._batch_depth = 0
+        self._batch_dirty = False
+        self.graph = self.build_graph()
+        self.reset_stats()
+        rtlog.start()
+
+    def reset_stats(self):
+        self.xruns = 0
+        self.callbacks = 0
+        self.callback_max = 0.0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self._last_callback = None
+
+    def resume(self):
+        """Stream reabierto (tearis_supervisor.py): el hueco no cuenta como jitter"""
+        self._last_callback = None
+
+    # ---------- Configuración (fuera del callback) ----------
+
+    def build_graph(self):
+        """Arma y compila el grafo del modo actual"""
+        nodes = []
+        if self.input_tap:
+            # Entrada cruda de los micrófonos (detección de ambiente)
+            nodes.append(TapNode(self.input_tap, name="input_tap"))
+        feedback = self.feedback
+        if feedback:
+            # Primero: el resto de la cadena no debe ver la fuga de los auriculares
+            bands = self._feedback_bands
+            nodes.append(bands[0] if bands else FeedbackNode(feedback))
+        processor = self.rnnoise_processor
+        beam = self.beam_active()
+        if beam:
+            # El MVDR aprende el ruido con el VAD del frame anterior de RNNoise
+            vad = self.vad if self.rnnoise_enabled and processor else None
+            nodes.append(BeamformerNode(self.beamformer, vad))
+        if processor:
+            self._apply_channel_strategy(processor, "mono" if beam else self.channel_strategy)
+        if self.rnnoise_enabled and processor:
+            nodes.append(RNNoiseNode(processor, self.vad, name=self.active_denoiser or "rnnoise"))
+            # Ruido puro sostenido: se atenúa
+            nodes.append(VADGateNode(self.vad))
+        if self.mode in self.eq:
+            nodes.append(self.eq[self.mode])
+        if self.mode in self.fir:
+            nodes.append(self.fir[self.mode])
+        nodes.append(GainNode(self.gain_ramp))
+        # Última etapa de audio: limitador de picos (protección auditiva)
+        nodes.append(LimiterNode(self.limiter))
+        if feedback:
+            # Referencia del cancelador: lo que realmente va al códec
+            bands = self._feedback_bands
+            nodes.append(TapNode(bands[1] if bands else feedback.push_reference, name="feedback_ref"))
+        if self.output_tap:
+            # Salida procesada en cada bloque (telemetría de espectro)
+            nodes.append(TapNode(self.output_tap, name="output_tap"))
+        if self.tap:
+            # Monitor BLE degradado durante silencios largos
+            nodes.append(TapNode(self.tap, stage="ble_monitor", vad=self.vad, name="ble_tap"))
+        graph = DSPGraph(nodes, name=self.mode)
+        if self.blocksize:
+            graph.compile(self.blocksize, self.channels, self.sample_rate, self.dtype)
+        return graph
+
+    def _rebuild(self):
+        if self._batch_depth:
+            self._batch_dirty = True
+            return
+        # El callback toma el grafo nuevo en el próximo bloque
+        self.graph = self.build_graph()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Junta varios cambios (modo, reductor, cancelador, EQ...) en un solo
+        grafo nuevo: el callback sigue con el vigente hasta el final del
+        bloque `with` y nunca ve una combinación a medio aplicar
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_dirty:
+                self._batch_dirty = False
+                self._rebuild()
+
+    def set_eq(self, mode, sos):
+        """
+        EQ de software de un modo (filas SOS); None la quita
+
+        Args:
+            sos: filas [b0, b1, b2, 1, a1, a2], p. ej. de
+                 tearis_dsp_graph.rbj_peaking
+        """
+        mode = normalize_mode(mode)
+        if sos is None or len(sos) == 0:
+            self.eq.pop(mode, None)
+        else:
+            self.eq[mode] = SOSNode(sos, name="eq")
+        if mode == self.mode:
+            self._rebuild()
+
+    def set_input_tap(self, func):
+        """Función no bloqueante que recibe cada bloque de entrada (float); None la quita"""
+        self.input_tap = func
+        self._rebuild()
+
+    def set_output_tap(self, func):
+        """Función no bloqueante que recibe cada bloque de salida, sin degradar en silencios; None la quita"""
+        self.output_tap = func
+        self._rebuild()
+
+    def set_fir(self, mode, taps):
+        """
+        FIR del perfil auditivo de un modo (tearis_fir); None lo quita
+
+        Args:
+            taps: coeficientes, p. ej. de tearis_fir.design_fir
+        """
+        mode = normalize_mode(mode)
+        if taps is None or len(taps) == 0:
+            self.fir.pop(mode, None)
+        else:
+            self.fir[mode] = FIRNode(taps, name="fir")
+        if mode == self.mode:
+            self._rebuild()
+
+    def set_mode(self, mode, rnnoise=None):
+        """
+        Presets del modo y RNNoise encendido/apagado
+
+        Args:
+            rnnoise: forzar RNNoise; None usa el valor del modo
+        """
+        self.mode = normalize_mode(mode)
+        self.limiter = PeakLimiter.from_mode(self.mode, channels=self.channels, sample_rate=self.sample_rate)
+        self.vad.configure(self.mode)
+        if rnnoise is None:
+            rnnoise = self.mode in RNNOISE_MODES
+        if rnnoise:
+            self.start_rnnoise()
+        else:
+            self.stop_rnnoise()
+        self._rebuild()
+
+    def denoiser_for(self, mode):
+        """Motor de reducción de ruido que usa un modo"""
+        return self.mode_denoisers.get(normalize_mode(mode), self.denoiser)
+
+    def set_denoiser(self, engine, mode=None):
+        """
+        Elige el motor de reducción de ruido (p. ej. bajar a 'spectral' con
+        la CPU cargada); si el modo actual está encendido se cambia en caliente
+
+        Args:
+            engine: motor de DENOISERS
+            mode: solo para ese modo; None cambia el motor por defecto
+        """
+        if engine not in DENOISERS:
+            raise ValueError(f"Reductor de ruido desconocido: {engine}")
+        if mode is None:
+            self.denoiser = engine
+        else:
+            self.mode_denoisers[normalize_mode(mode)] = engine
+        if self.rnnoise_enabled and self.active_denoiser != self.denoiser_for(self.mode):
+            self.start_rnnoise()
+
+    def _create_denoiser(self, engine):
+        if engine == "spectral":
+            return SpectralDenoiser(strategy=self.channel_strategy, sample_rate=self.sample_rate)
+        return RNNoiseProcessor(strategy=self.channel_strategy)
+
+    def start_rnnoise(self):
+        engine = self.denoiser_for(self.mode)
+        if self.rnnoise_processor and self.active_denoiser == engine:
+            logger.info(f"ℹ️ Reductor {engine} ya está inicializado.")
+            self.rnnoise_enabled = True
+            self._rebuild()
+            return
+        logger.info(f"🎤 Inicializando reductor de ruido {engine}...")
+        try:
+            with accountant.measure("rnnoise"):
+                processor = self._create_denoiser(engine)
+        except RuntimeError as e:
+            logger.error(f"❌ {e}")
+            logger.error("Compila RNNoise primero: cd ~/rnnoise && ./autogen.sh && ./configure && make")
+            logger.warning("⚠️ Usando el reductor espectral como respaldo")
+            engine = "spectral"
+            processor = self._create_denoiser(engine)
+        # El grafo vigente conserva el procesador anterior hasta el próximo bloque
+        self.rnnoise_processor = processor
+        self.active_denoiser = engine
+        self.rnnoise_enabled = True
+        self._rebuild()
+        logger.info(f"✅ Reductor {engine} activado.")
+
+    def stop_rnnoise(self):
+        if not self.rnnoise_enabled and not self.rnnoise_processor:
+            return
+        logger.info("🛑 Desactivando RNNoise...")
+        self.rnnoise_enabled = False
+        # Sin VAD no hay silencios: todas las etapas vuelven a correr
+        self.vad = VADScheduler()
+        self.vad.configure(self.mode)
+        self._rebuild()
+        if self.rnnoise_processor:
+            del self.rnnoise_processor
+            self.rnnoise_processor = None
+            self.active_denoiser = None
+            logger.info("✅ Procesador RNNoise limpiado")
+
+    def set_channel_strategy(self, strategy):
+        """Cambia la estrategia de canales; RNNoise la toma en el próximo frame"""
+        if strategy not in CHANNEL_STRATEGIES:
+            raise ValueError(f"Estrategia de canales desconocida: {strategy}")
+        self.channel_strategy = strategy
+        processor = self.rnnoise_processor
+        if processor and not self.beam_active():
+            self._apply_channel_strategy(processor, strategy)
+
+    @staticmethod
+    def _apply_channel_strategy(processor, strategy):
+        if processor.strategy == strategy:
+            return
+        processor.path = "mono" if strategy in ("mono", "mid_side") else "stereo"
+        processor.dead_channel = None
+        processor.strategy = strategy
+
+    def _create_feedback(self):
+        if not self.subband:
+            self._feedback_bands = None
+            return FeedbackCanceller(channels=self.channels, sample_rate=self.sample_rate,
+                                     delay=self.loop_latency)
+        # Mismo largo de camino modelado con frames de 20 ms a la tasa de banda; el
+        # nodo y el tap conservan la historia del banco entre grafos
+        canceller = FeedbackCanceller(partitions=PARTITIONS // 2, channels=self.channels,
+                                      sample_rate=band_rate(self.sample_rate), delay=self.loop_latency)
+        self._feedback_bands = (SubbandNode(canceller, name="feedback"),
+                                SubbandTap(canceller.push_reference))
+        return canceller
+
+    def attach_stream(self, stream):
+        """
+        Toma la latencia que informa el stream recién abierto (sin iniciar):
+        el cancelador la descuenta como retardo fijo del lazo. Devuelve el
+        stream, para envolver la función que lo abre
+        """
+        latency = stream_latency(stream)
+        self.output_latency = latency[1]
+        self.set_loop_latency(sum(latency))
+        return stream
+
+    def set_loop_latency(self, seconds):
+        """Retardo fijo salida -> entrada más allá de un bloque (buffers del códec)"""
+        self.loop_latency = seconds
+        if self.feedback:
+            self.feedback.set_delay(seconds)
+
+    def set_feedback(self, enabled):
+        """Agrega o quita el cancelador de realimentación (al agregarlo aprende desde cero)"""
+        if enabled and self.feedback is None:
+            self.feedback = self._create_feedback()
+        elif not enabled:
+            self.feedback = None
+            self._feedback_bands = None
+        self._rebuild()
+
+    def beam_active(self):
+        return self.beamformer is not None and self.mode in BEAM_MODES
+
+    def set_beamformer(self, method):
+        """Cambia el método de beamforming ('off', 'das', 'mvdr')"""
+        if method not in BEAM_METHODS:
+            raise ValueError(f"Método de beamforming desconocido: {method}")
+        self.beam_method = method
+        self.beamformer = None if method == "off" else Beamformer(method, sample_rate=self.sample_rate)
+        self._rebuild()
+
+    # ---------- Callback de audio ----------
+
+    def callback(self, indata, outdata, frames, time_info, status):
+        callback_start = time.perf_counter()
+        self.callbacks += 1
+        if self._last_callback is not None:
+            jitter = abs(callback_start - self._last_callback - frames / self.sample_rate)
+            self.jitter_sum += jitter
+            self.jitter_max = max(self.jitter_max, jitter)
+        self._last_callback = callback_start
+        if status:
+            self.xruns += 1
+            rtlog.emit(EV_STATUS, status)
+        try:
+            graph = self.graph
+            if graph.blocksize != frames:
+                # Primer bloque (o cambio de tamaño): compilar una sola vez
+                self.blocksize = frames
+                graph.compile(frames, self.channels, self.sample_rate, self.dtype)
+            graph.run(indata, outdata)
+        except Exception as e:
+            rtlog.emit(EV_CALLBACK_ERROR, e)
+            # Sin limitador disponible: recorte duro al techo
+            ceiling = self.limiter.ceiling * (PCM16_SCALE if outdata.dtype == np.int16 else 1.0)
+            np.clip(indata, -ceiling, ceiling, out=outdata, casting="unsafe")
+        self.callback_max = max(self.callback_max, time.perf_counter() - callback_start)
+
+    # ---------- Métricas ----------
+
+    def get_vad(self):
+        """Probabilidad de voz del último frame por canal (ceros sin RNNoise)"""
+        processor = self.rnnoise_processor
+        if self.rnnoise_enabled and processor:
+            return processor.vad_probs.copy()
+        return np.zeros(self.channels, dtype=np.float32)
+
+    def get_channel_stats(self):
+        """Estrategia de canales, camino activo y llamadas a RNNoise por frame"""
+        processor = self.rnnoise_processor
+        if self.rnnoise_enabled and processor:
+            return processor.get_channel_stats()
+        return {"strategy": self.channel_strategy, "path": None, "correlation": 0.0,
+                "calls_per_frame": 0.0, "switches": 0}
+
+    def get_beam_stats(self):
+        beamformer = self.beamformer
+        if beamformer is None:
+            return {"method": "off", "active": False}
+        stats = beamformer.get_stats()
+        stats["active"] = self.beam_active()
+        return stats
+
+    def get_feedback_stats(self):
+        feedback = self.feedback
+        if feedback is None:
+            return {"active": False}
+        stats = feedback.get_stats()
+        stats["active"] = True
+        return stats
+
+    def get_node_timing(self):
+        """Tiempo por nodo del grafo vigente (µs y % del bloque)"""
+        return self.graph.get_timing()
+
+    def log_node_timing(self):
+        log_timing(self.get_node_timing(), logger)
+
+    def get_stats(self):
+        intervals = max(self.callbacks - 1, 1)
+        ramp = self.gain_ramp.get_stats()
+        return {
+            "xruns": self.xruns,
+            "callbacks": self.callbacks,
+            "callback_max_ms": self.callback_max * 1000.0,
+            "jitter_avg_ms": 1000.0 * self.jitter_sum / intervals,
+            "jitter_max_ms": 1000.0 * self.jitter_max,
+            "rnnoise": self.rnnoise_enabled,
+            "denoiser": self.active_denoiser if self.rnnoise_enabled else None,
+            "slider_to_sound_avg_ms": ramp["slider_to_sound_avg_ms"],
+            "slider_to_sound_max_ms": ramp["slider_to_sound_max_ms"],
+            "output_latency_ms": 1000.0 * self.output_latency,
+        }
+
+
+# ========== BENCHMARK ==========
+
+def benchmark(blocks=500, blocksize=960, mode="escuela"):
+    """
+    Camino float32 vs. int16 de punta a punta (callback + empaquetado BLE)
+    con la misma entrada: verifica que la salida int16 coincide con la
+    float cuantizada (±1 LSB) y mide el costo por bloque de cada uno
+    """
+    rng = np.random.default_rng(0)
+    n = blocks * blocksize
+    t = np.arange(n) / SAMPLE_RATE
+    signal = 0.3 * np.sin(2 * np.pi * 220.0 * t) * (1 + np.sin(2 * np.pi * 3.0 * t)) / 2
+    signal = signal[:, None] + 0.02 * rng.standard_normal((n, CHANNELS))
+    source = np.clip(signal * PCM16_SCALE, -32768, 32767).astype(np.int16)
+
+    results = {}
+    outputs = {}
+    for dtype in (np.float32, np.int16):
+        name = np.dtype(dtype).name
+        packets = []
+        pipeline = AudioPipeline(blocksize=blocksize, dtype=dtype, tap=packets.append)
+        pipeline.set_mode(mode)
+        if dtype == np.int16:
+            blocks_in = source.reshape(blocks, blocksize, CHANNELS)
+        else:
+            blocks_in = (source / PCM16_SCALE).astype(np.float32).reshape(blocks, blocksize, CHANNELS)
+        outdata = np.empty((blocksize, CHANNELS), dtype=dtype)
+        out = np.empty((blocks, blocksize, CHANNELS), dtype=dtype)
+        elapsed = 0.0
+        for i in range(blocks):
+            start = time.perf_counter()
+            pipeline.callback(blocks_in[i], outdata, blocksize, None, None)
+            block = packets.pop() if packets else outdata
+            # Lo que hace _notify_from_queue con cada bloque
+            if block.dtype == np.int16:
+                block.tobytes()
+            else:
+                (block * 32767).astype(np.int16).tobytes()
+            elapsed += time.perf_counter() - start
+            out[i] = outdata
+        outputs[name] = out.reshape(n, CHANNELS)
+        results[name] = {"block_us": 1e6 * elapsed / blocks, "denoiser": pipeline.active_denoiser or "off"}
+        pipeline.stop_rnnoise()
+
+    quantized = (outputs["float32"] * PCM16_SCALE).astype(np.int16).astype(np.int32)
+    max_lsb = int(np.max(np.abs(outputs["int16"].astype(np.int32) - quantized)))
+    results["max_diff_lsb"] = max_lsb
+    results["speedup"] = results["float32"]["block_us"] / max(results["int16"]["block_us"], 1e-9)
+    results["ok"] = max_lsb <= 1
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Camino float32 vs. int16")
+    print("=" * 60)
+    r = benchmark()
+    for name in ("float32", "int16"):
+        print(f"{name:<8} {r[name]['block_us']:8.1f} µs/bloque (reductor {r[name]['denoiser']})")
+    print(f"Diferencia máx: {r['max_diff_lsb']} LSB | aceleración x{r['speedup']:.2f}")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Modo de tiempo real (opcional)
+Protege el hilo del callback de audio: SCHED_FIFO, memoria bloqueada,
+núcleo aislado y recolector de basura fuera del callback.
+
+Cada paso se intenta por separado y se reporta si funcionó; sin permisos
+(root o CAP_SYS_NICE / CAP_IPC_LOCK) el servidor sigue igual que antes.
+
+Uso (benchmark de jitter normal vs. tiempo real):
+    sudo python3 tearis_rt.py
+"""
+
+import os
+import gc
+import ctypes
+import ctypes.util
+import threading
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger("TEARIS-RT")
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def isolated_cpus():
+    """Núcleos reservados con isolcpus= en la línea de comandos del kernel"""
+    try:
+        with open("/sys/devices/system/cpu/isolated") as f:
+            text = f.read().strip()
+    except OSError:
+        return []
+    cpus = []
+    for part in filter(None, text.split(",")):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def pick_audio_cpu():
+    """Primer núcleo aislado o, si no hay, el último disponible"""
+    isolated = isolated_cpus()
+    if isolated:
+        return isolated[0]
+    available = sorted(os.sched_getaffinity(0))
+    return available[-1] if available else None
+
+
+class RealtimeHardening:
+    """
+    Aplica y reporta los pasos de tiempo real
+
+    Pasos de proceso (prepare): mlockall y el hilo de GC programado.
+    Pasos del hilo de audio (en el primer callback): SCHED_FIFO y afinidad.
+    Tras `warmup_callbacks` callbacks se congela el heap (gc.freeze) y el GC
+    automático queda apagado; se recolecta justo después de un callback,
+    cada `gc_interval` segundos, desde un hilo aparte. Esas recolecciones
+    son de las generaciones jóvenes; cada `full_gc_interval` segundos una
+    es completa, para los ciclos que llegaron a la generación 2 (lo
+    congelado no se recorre, así que sigue siendo corta).
+    """
+
+    def __init__(self, priority=70, cpu=None, warmup_callbacks=200, gc_interval=0.5, full_gc_interval=60.0):
+        self.priority = priority
+        self.cpu = cpu
+        self.warmup_callbacks = warmup_callbacks
+        self.gc_interval = gc_interval
+        self.full_gc_interval = full_gc_interval
+        self.steps = {}
+        self.callbacks = 0
+        self.gc_runs = 0
+        self.gc_time_max = 0.0
+        self.full_gc_runs = 0
+        self.full_gc_time_max = 0.0
+        self._thread_ready = False
+        self._frozen = False
+        self._last_gc = 0.0
+        self._last_full_gc = 0.0
+        self._gc_wake = threading.Event()
+        self._running = False
+
+    def _record(self, step, ok, detail=""):
+        self.steps[step] = {"ok": ok, "detail": detail}
+
+    # ---------- Pasos de proceso ----------
+
+    def prepare(self):
+        """Bloquea memoria y arranca el hilo de GC (fuera del callback)"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            if libc.mlockall(MCL_CURRENT | MCL_FUTURE) == 0:
+                self._record("mlockall", True)
+            else:
+                self._record("mlockall", False, os.strerror(ctypes.get_errno()))
+        except (OSError, AttributeError) as e:
+            self._record("mlockall", False, str(e))
+
+        self._running = True
+        threading.Thread(target=self._gc_worker, name="rt-gc", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._gc_wake.set()
+        if self._frozen:
+            gc.unfreeze()
+            gc.enable()
+            self._frozen = False
+
+    # ---------- Pasos del hilo de audio ----------
+
+    def _setup_thread(self):
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.priority))
+            self._record("sched_fifo", True, f"prioridad {self.priority}")
+        except (OSError, AttributeError) as e:
+            self._record("sched_fifo", False, str(e))
+
+        cpu = self.cpu if self.cpu is not None else pick_audio_cpu()
+        try:
+            os.sched_setaffinity(0, {cpu})
+            isolated = cpu in isolated_cpus()
+            self._record("affinity", True, f"CPU {cpu}{' (aislada)' if isolated else ' (no aislada)'}")
+        except (OSError, TypeError) as e:
+            self._record("affinity", False, str(e))
+        self._thread_ready = True
+
+    def wrap(self, callback):
+        """Envuelve el callback de audio con los pasos de tiempo real"""
+        def rt_callback(indata, outdata, frames, time_info, status):
+            if not self._thread_ready:
+                self._setup_thread()
+            callback(indata, outdata, frames, time_info, status)
+            self.callbacks += 1
+            if not self._frozen and self.callbacks >= self.warmup_callbacks:
+                self._gc_wake.set()
+            elif self._frozen and time.monotonic() - self._last_gc >= self.gc_interval:
+                # Recolectar ahora que falta todo un período para el próximo callback
+                self._last_gc = time.monotonic()
+                self._gc_wake.set()
+        return rt_callback
+
+    def _gc_worker(self):
+        while self._running:
+            self._gc_wake.wait()
+            self._gc_wake.clear()
+            if not self._running:
+                break
+            start = time.perf_counter()
+            if not self._frozen:
+                # Fin del warmup: todo lo vivo pasa a la generación permanente
+                gc.collect()
+                gc.freeze()
+                gc.disable()
+                self._frozen = True
+                self._last_gc = self._last_full_gc = time.monotonic()
+                self._record("gc_freeze", True, f"{gc.get_freeze_count()} objetos congelados")
+                self.log_report()
+            elif time.monotonic() - self._last_full_gc >= self.full_gc_interval:
+                gc.collect()
+                self._last_full_gc = time.monotonic()
+                self.full_gc_runs += 1
+                self.full_gc_time_max = max(self.full_gc_time_max, time.perf_counter() - start)
+            else:
+                gc.collect(1)
+                self.gc_runs += 1
+            self.gc_time_max = max(self.gc_time_max, time.perf_counter() - start)
+
+    # ---------- Reporte ----------
+
+    def report(self):
+        return {
+            "steps": dict(self.steps),
+            "gc_runs": self.gc_runs,
+            "gc_time_max_ms": self.gc_time_max * 1000.0,
+            "full_gc_runs": self.full_gc_runs,
+            "full_gc_time_max_ms": self.full_gc_time_max * 1000.0,
+        }
+
+    def log_report(self):
+        logger.info("⏱️ Modo tiempo real:")
+        for step, result in self.steps.items():
+            logger.info(f"   {'✅' if result['ok'] else '❌'} {step}: {result['detail'] or 'OK'}")
+
+
+# ========== BENCHMARK ==========
+
+def _garbage_load(stop):
+    """Crea basura cíclica como lo hacen D-Bus/GLib en el servidor"""
+    while not stop.is_set():
+        junk = []
+        for _ in range(100):
+            a = {}
+            a["self"] = a
+            junk.append(a)
+        del junk
+        time.sleep(0.002)
+
+
+def benchmark(seconds=5.0, heap_objects=100000):
+    """
+    Jitter del callback con y sin modo de tiempo real, con el mismo
+    generador de basura cíclica corriendo (backend nulo) y un heap del
+    tamaño del de un servidor en marcha.
+
+    Pausa de GC: sin modo de tiempo real, una recolección completa recorre
+    todo el heap (la hace el intérprete cuando le toca, en el hilo que
+    sea); con él, la completa programada solo ve lo no congelado. La
+    comparación de jitter solo se exige con SCHED_FIFO y más de un núcleo:
+    en uno solo el hilo de audio compite con la carga igual
+    """
+    from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS
+    from tearis_audio_backends import open_stream
+
+    # Objetos vivos de larga vida: D-Bus, GLib, caché de logs...
+    heap = [{"id": i, "tags": [i]} for i in range(heap_objects)]
+    results = {}
+    for mode in ("normal", "rt"):
+        pipeline = AudioPipeline()
+        callback = pipeline.callback
+        rt = None
+        if mode == "rt":
+            rt = RealtimeHardening(warmup_callbacks=50, full_gc_interval=1.0).prepare()
+            callback = rt.wrap(callback)
+        stream = open_stream("null", None, SAMPLE_RATE, 480, CHANNELS, np.float32, callback)
+        stop = threading.Event()
+        load = threading.Thread(target=_garbage_load, args=(stop,), daemon=True)
+        stream.start()
+        load.start()
+        time.sleep(1.0)
+        pipeline.reset_stats()
+        time.sleep(seconds)
+        stop.set()
+        stream.close()
+        results[mode] = pipeline.get_stats()
+        if rt:
+            report = rt.report()
+            results["steps"] = report["steps"]
+            results["rt"]["full_gc_ms"] = report["full_gc_time_max_ms"]
+            results["rt"]["full_gc_runs"] = report["full_gc_runs"]
+            rt.stop()
+        else:
+            # La pausa de la recolección completa que el intérprete hará tarde o temprano
+            start = time.perf_counter()
+            gc.collect()
+            results["normal"]["full_gc_ms"] = 1000.0 * (time.perf_counter() - start)
+    del heap
+
+    cores = len(os.sched_getaffinity(0))
+    compared = cores > 1 and results["steps"].get("sched_fifo", {}).get("ok", False)
+    steadier = results["rt"]["jitter_avg_ms"] <= results["normal"]["jitter_avg_ms"]
+    out = {
+        "normal_jitter_avg_ms": results["normal"]["jitter_avg_ms"],
+        "normal_jitter_max_ms": results["normal"]["jitter_max_ms"],
+        "normal_xruns": results["normal"]["xruns"],
+        "normal_full_gc_ms": results["normal"]["full_gc_ms"],
+        "rt_jitter_avg_ms": results["rt"]["jitter_avg_ms"],
+        "rt_jitter_max_ms": results["rt"]["jitter_max_ms"],
+        "rt_xruns": results["rt"]["xruns"],
+        "rt_full_gc_ms": results["rt"]["full_gc_ms"],
+        "rt_full_gc_runs": results["rt"]["full_gc_runs"],
+        "cores": cores,
+        "jitter_compared": compared,
+        "ok": (results["rt"]["callbacks"] > 0 and results["rt"]["full_gc_runs"] > 0
+               and results["rt"]["full_gc_ms"] < results["normal"]["full_gc_ms"]
+               and (steadier or not compared)),
+    }
+    for step, result in results["steps"].items():
+        out[step] = "ok" if result["ok"] else f"falló ({result['detail']})"
+    return out
+
+
+def main():
+    print("=" * 60)
+    print("TEARIS - Jitter del callback: normal vs. tiempo real")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Normal:        jitter prom {r['normal_jitter_avg_ms']:.3f} ms | "
+          f"máx {r['normal_jitter_max_ms']:.3f} ms | xruns {r['normal_xruns']}")
+    print(f"Tiempo real:   jitter prom {r['rt_jitter_avg_ms']:.3f} ms | "
+          f"máx {r['rt_jitter_max_ms']:.3f} ms | xruns {r['rt_xruns']}")
+    print(f"GC completo:   normal {r['normal_full_gc_ms']:.2f} ms | "
+          f"tiempo real {r['rt_full_gc_ms']:.2f} ms ({r['rt_full_gc_runs']} programados)")
+    if not r["jitter_compared"]:
+        print(f"⚠️ Jitter no comparado: {r['cores']} núcleo(s) o sin SCHED_FIFO")
+    for step in ("mlockall", "sched_fifo", "affinity", "gc_freeze"):
+        if step in r:
+            print(f"   {step}: {r[step]}")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Log sin bloqueo para el hilo de audio
+El callback no formatea ni escribe: solo anota un registro fijo (código,
+instante, detalle) en un ring preasignado. Un hilo aparte lo vacía, arma
+los mensajes, los deduplica y limita la tasa ("xrun ×57 en los últimos 5 s").
+
+Con TEARIS_LOG_MODE=sync cada evento se loguea en el momento, como antes.
+
+Uso (peor tiempo de callback bajo una tormenta de xruns, sync vs. ring):
+    python3 tearis_rtlog.py
+"""
+
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger("TEARIS-RTLOG")
+
+LOG_MODES = ("ring", "sync")
+
+
+class RTLog:
+    """
+    Ring de eventos de tiempo real + hilo formateador
+
+    Los eventos se registran antes (fuera del callback) con su logger,
+    nivel y plantilla. `emit` solo escribe en listas de tamaño fijo; si el
+    ring se llena antes de que el formateador lo vacíe se pierden los
+    registros más viejos y se cuentan como descartados.
+
+    Args:
+        window: ventana de deduplicación en segundos; la primera ocurrencia
+                se loguea enseguida y las siguientes se resumen al cerrar
+                la ventana
+        capacity: registros del ring (se redondea a potencia de 2)
+        interval: período del formateador en segundos
+        deferred: False para loguear en el momento (modo sync)
+    """
+
+    def __init__(self, window=5.0, capacity=1024, interval=0.25, deferred=True):
+        self.window = window
+        self.interval = interval
+        self.deferred = deferred
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.capacity = size
+        self._mask = size - 1
+        self._codes = [0] * size
+        self._times = [0.0] * size
+        self._details = [None] * size
+        self._head = 0
+        self._tail = 0
+        self.events = []
+        self.counts = []
+        self.logged = 0
+        self.suppressed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    # ---------- Registro (fuera del callback) ----------
+
+    def register(self, name, log, level, message):
+        """
+        Declara un evento y devuelve su código para `emit`
+
+        Args:
+            name: nombre corto para los resúmenes ("xrun")
+            log: logger donde se escribe
+            level: nivel de logging
+            message: plantilla con {detail}
+        """
+        for code, event in enumerate(self.events):
+            if event["name"] == name:
+                return code
+        self.events.append({"name": name, "log": log, "level": level, "message": message,
+                            "last_logged": None, "pending": 0, "detail": None})
+        self.counts.append(0)
+        return len(self.events) - 1
+
+    # ---------- Camino de tiempo real ----------
+
+    def emit(self, code, detail=None):
+        """Anota un evento; sin formateo, E/S ni locks en modo ring"""
+        self.counts[code] += 1
+        if not self.deferred:
+            event = self.events[code]
+            event["log"].log(event["level"], event["message"].format(detail=detail))
+            return
+        slot = self._head & self._mask
+        self._codes[slot] = code
+        self._times[slot] = time.monotonic()
+        self._details[slot] = detail
+        self._head += 1
+
+    # ---------- Formateador ----------
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="rt-log", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        self.flush(force=True)
+
+    def _worker(self):
+        while self._running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self, force=False):
+        """
+        Vacía el ring y escribe lo que corresponda
+
+        Args:
+            force: cerrar todas las ventanas abiertas (al detener)
+        """
+        with self._lock:
+            head = self._head
+            tail = self._tail
+            if head - tail > self.capacity:
+                self.dropped += head - tail - self.capacity
+                tail = head - self.capacity
+            for i in range(tail, head):
+                slot = i & self._mask
+                event = self.events[self._codes[slot]]
+                detail = self._details[slot]
+                self._details[slot] = None
+                stamp = self._times[slot]
+                if event["last_logged"] is None or stamp - event["last_logged"] >= self.window:
+                    self._summarize(event, stamp)
+                    event["log"].log(event["level"], event["message"].format(detail=detail))
+                    event["last_logged"] = stamp
+                    self.logged += 1
+                else:
+                    event["pending"] += 1
+                    event["detail"] = detail
+                    self.suppressed += 1
+            self._tail = head
+
+            now = time.monotonic()
+            for event in self.events:
+                if event["pending"] and (force or now - event["last_logged"] >= self.window):
+                    self._summarize(event, now)
+                    event["last_logged"] = None if force else now
+
+    def _summarize(self, event, now):
+        """Resume las ocurrencias retenidas desde la última línea escrita"""
+        if not event["pending"]:
+            return
+        elapsed = now - event["last_logged"]
+        icon = "❌" if event["level"] >= logging.ERROR else "⚠️"
+        event["log"].log(event["level"],
+                         f"{icon} {event['name']} ×{event['pending']} en los últimos "
+                         f"{max(elapsed, 0.0):.0f} s (último: {event['detail']})")
+        event["pending"] = 0
+        event["detail"] = None
+        self.logged += 1
+
+    # ---------- Métricas ----------
+
+    def get_stats(self):
+        return {
+            "mode": "ring" if self.deferred else "sync",
+            "events": {event["name"]: count for event, count in zip(self.events, self.counts)},
+            "logged": self.logged,
+            "suppressed": self.suppressed,
+            "dropped": self.dropped,
+        }
+
+
+def log_mode():
+    mode = os.environ.get("TEARIS_LOG_MODE", "ring")
+    if mode not in LOG_MODES:
+        raise ValueError(f"Modo de log desconocido: {mode} (opciones: {', '.join(LOG_MODES)})")
+    return mode
+
+
+rtlog = RTLog(deferred=log_mode() == "ring")
+
+
+# ========== BENCHMARK ==========
+
+class _SlowHandler(logging.Handler):
+    """Handler que tarda como journald/stderr bajo carga"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.records = 0
+
+    def emit(self, record):
+        self.records += 1
+        time.sleep(self.delay)
+
+
+def benchmark(blocks=300, blocksize=480, write_delay=0.002):
+    """
+    Peor tiempo de callback con un xrun en cada bloque (tormenta inducida)
+    y un destino de log que tarda `write_delay` por línea, en modo sync y ring
+    """
+    import numpy as np
+    from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS
+    from tearis_audio_backends import CallbackFlags
+    # El mismo ring que usa la cadena (aunque este archivo corra como __main__)
+    from tearis_rtlog import rtlog
+
+    dsp_logger = logging.getLogger("TEARIS-DSP")
+    handler = _SlowHandler(write_delay)
+    saved = (dsp_logger.handlers[:], dsp_logger.propagate, dsp_logger.level, rtlog.deferred)
+    dsp_logger.handlers = [handler]
+    dsp_logger.propagate = False
+    dsp_logger.setLevel(logging.INFO)
+
+    period = blocksize / float(SAMPLE_RATE)
+    rng = np.random.default_rng(0)
+    indata = (0.1 * rng.standard_normal((blocksize, CHANNELS))).astype(np.float32)
+    outdata = np.empty_like(indata)
+    storm = CallbackFlags(output_underflow=True)
+
+    results = {}
+    try:
+        for mode in ("sync", "ring"):
+            rtlog.deferred = mode == "ring"
+            pipeline = AudioPipeline(blocksize=blocksize)
+            handler.records = 0
+            durations = []
+            deadline = time.monotonic() + period
+            for _ in range(blocks):
+                start = time.perf_counter()
+                pipeline.callback(indata, outdata, blocksize, None, storm)
+                durations.append(time.perf_counter() - start)
+                time.sleep(max(0.0, deadline - time.monotonic()))
+                deadline += period
+            rtlog.stop()
+            durations.sort()
+            results[mode] = {
+                "max_ms": durations[-1] * 1000.0,
+                "p99_ms": durations[int(0.99 * (len(durations) - 1))] * 1000.0,
+                "lines": handler.records,
+            }
+    finally:
+        dsp_logger.handlers, dsp_logger.propagate, level, rtlog.deferred = saved
+        dsp_logger.setLevel(level)
+
+    return {
+        "sync_callback_max_ms": results["sync"]["max_ms"],
+        "sync_callback_p99_ms": results["sync"]["p99_ms"],
+        "sync_log_lines": results["sync"]["lines"],
+        "ring_callback_max_ms": results["ring"]["max_ms"],
+        "ring_callback_p99_ms": results["ring"]["p99_ms"],
+        "ring_log_lines": results["ring"]["lines"],
+        "ok": results["ring"]["p99_ms"] < write_delay * 1000.0
+              and results["ring"]["lines"] < results["sync"]["lines"],
+    }
+
+
+def main():
+    print("=" * 60)
+    print("TEARIS - Callback bajo tormenta de xruns: log sync vs. ring")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Sync:  máx {r['sync_callback_max_ms']:.3f} ms | p99 {r['sync_callback_p99_ms']:.3f} ms | "
+          f"{r['sync_log_lines']} líneas")
+    print(f"Ring:  máx {r['ring_callback_max_ms']:.3f} ms | p99 {r['ring_callback_p99_ms']:.3f} ms | "
+          f"{r['ring_log_lines']} líneas")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -83,6 +83,11 @@ Type=simple
 User=root
 ExecStartPre=/bin/sleep 5
 ExecStart=/usr/bin/python3 /opt/tearis/tearis_server.py
+# Tiempo real del callback (tearis_rt.py) apagado por defecto; para activarlo:
+#   sudo systemctl edit tearis.service  ->  [Service] Environment=TEARIS_REALTIME=1
+# Los límites quedan para que alcance con esa variable
+LimitRTPRIO=95
+LimitMEMLOCK=infinity
 Restart=always
 RestartSec=10
 StandardOutput=append:/opt/tearis/logs/tearis.log
@@ -131,6 +136,10 @@ echo ""
 echo "Para ver el estado:"
 echo "  sudo systemctl status tearis.service"
 echo ""
+echo "Para activar el modo de tiempo real del audio (SCHED_FIFO + mlockall):"
+echo "  sudo systemctl edit tearis.service   # agregar: [Service] Environment=TEARIS_REALTIME=1"
+echo "  sudo systemctl restart tearis.service"
+echo ""
 echo "Para ver los logs:"
 echo "  sudo journalctl -u tearis.service -f"
 echo "  o"
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Telemetría de espectro y nivel para la app
+Resumen compacto de lo que sale por los auriculares: niveles de BANDS
+bandas logarítmicas entre F_MIN y F_MAX, pico y RMS del intervalo y
+probabilidad de voz de RNNoise, RATE_HZ veces por segundo. El callback
+solo copia el bloque de salida a un ring; un hilo aparte hace una rFFT
+con ventana y matriz de bandas precalculadas y arma un registro binario
+fijo para la característica de espectro: unos cientos de bytes por
+segundo en lugar del PCM crudo del stream de audio.
+
+Registro (little endian, HEADER.size + bandas bytes):
+    versión u8 | bandas u8 | secuencia u16 | pico u8 | RMS u8 | VAD u8 | flags u8 | bandas u8...
+Los niveles van como atenuación en pasos de DB_STEP dB respecto de 0 dBFS
+(seno de escala completa): 0 -> 0 dBFS, 255 -> -127.5 dBFS. El VAD va de
+0 a 255. Por PropertiesChanged BlueZ recorta cada notificación a MTU - 3,
+así que la app pide un MTU de al menos HEADER.size + bandas + 3 (35 con
+24 bandas); por el socket adquirido, con MTU 23 el registro llega partido
+en dos paquetes y la cantidad de bandas del encabezado alcanza para
+reensamblarlo.
+
+Uso (costo por registro y ancho de banda vs. el stream PCM):
+    python3 tearis_spectrum.py
+"""
+
+import time
+import struct
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger("TEARIS-SPECTRUM")
+
+SAMPLE_RATE = 48000
+FFT_SIZE = 4096           # ~85 ms, bins de 11.7 Hz
+RATE_HZ = 10.0
+BANDS = 24
+F_MIN = 100.0
+F_MAX = 16000.0
+
+RECORD_VERSION = 1
+HEADER = struct.Struct("<BBHBBBB")
+DB_STEP = 0.5
+FLAG_SPEECH = 0x01        # VAD sobre el umbral
+FLAG_VAD = 0x02           # hay VAD (RNNoise activo)
+FLAG_CLIP = 0x04          # pico a menos de 0.1 dB de la escala completa
+SPEECH_THRESHOLD = 0.5
+
+
+def band_edges(bands=BANDS, f_min=F_MIN, f_max=F_MAX):
+    """Bordes de las bandas, espaciados logarítmicamente"""
+    return np.geomspace(f_min, f_max, bands + 1)
+
+
+def band_matrix(n_fft=FFT_SIZE, sample_rate=SAMPLE_RATE, edges=None):
+    """
+    Matriz (bins, bandas) que suma la potencia de cada banda; las bandas
+    más angostas que un bin toman el bin de su centro geométrico
+    """
+    edges = band_edges() if edges is None else edges
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    bands = len(edges) - 1
+    matrix = np.zeros((freqs.shape[0], bands), dtype=np.float32)
+    for b in range(bands):
+        inside = (freqs >= edges[b]) & (freqs < edges[b + 1])
+        if not inside.any():
+            inside = np.abs(freqs - np.sqrt(edges[b] * edges[b + 1])) == \
+                np.min(np.abs(freqs - np.sqrt(edges[b] * edges[b + 1])))
+        matrix[inside, b] = 1.0
+    return matrix
+
+
+def encode_db(level_db):
+    """dBFS -> u8 (atenuación en pasos de DB_STEP)"""
+    return np.clip(np.round(-np.asarray(level_db) / DB_STEP), 0, 255).astype(np.uint8)
+
+
+def decode_record(data):
+    """Registro binario -> dict (lo que hace la app)"""
+    version, bands, seq, peak, rms, vad, flags = HEADER.unpack_from(data)
+    levels = np.frombuffer(data, dtype=np.uint8, count=bands, offset=HEADER.size)
+    return {
+        "version": version,
+        "seq": seq,
+        "peak_db": -DB_STEP * peak,
+        "rms_db": -DB_STEP * rms,
+        "vad": vad / 255.0 if flags & FLAG_VAD else None,
+        "speech": bool(flags & FLAG_SPEECH),
+        "clipped": bool(flags & FLAG_CLIP),
+        "bands_db": -DB_STEP * levels.astype(np.float32),
+    }
+
+
+class OutputRing:
+    """Últimos bloques de salida (float, todos los canales); se escribe desde el callback"""
+
+    def __init__(self, seconds=1.0, channels=2, sample_rate=SAMPLE_RATE):
+        self.size = int(seconds * sample_rate)
+        self.data = np.zeros((self.size, channels), dtype=np.float32)
+        self.written = 0
+
+    def write(self, block):
+        # Con E/S int16 el tap recibe la salida del códec tal cual
+        scale = 1.0 / 32768.0 if block.dtype == np.int16 else 1.0
+        n = block.shape[0]
+        pos = self.written % self.size
+        first = min(n, self.size - pos)
+        np.multiply(block[:first], scale, out=self.data[pos:pos + first])
+        if first < n:
+            np.multiply(block[first:], scale, out=self.data[:n - first])
+        self.written += n
+
+    def read(self, start, out):
+        """Copia a `out` las muestras desde `start` (índice absoluto)"""
+        n = out.shape[0]
+        pos = start % self.size
+        first = min(n, self.size - pos)
+        out[:first] = self.data[pos:pos + first]
+        if first < n:
+            out[first:] = self.data[:n - first]
+        return out
+
+
+class SpectrumMonitor:
+    """
+    Registros de espectro y nivel a RATE_HZ desde la salida procesada
+
+    Args:
+        vad: función sin argumentos que devuelve la probabilidad de voz
+             (0..1) o None si no hay VAD
+        bands: cantidad de bandas (16 a 32 entran en un registro de <= 40 bytes)
+        rate_hz: registros por segundo
+    """
+
+    def __init__(self, vad=None, bands=BANDS, rate_hz=RATE_HZ, channels=2, sample_rate=SAMPLE_RATE):
+        self.vad = vad
+        self.bands = bands
+        self.rate_hz = rate_hz
+        self.hop = int(sample_rate / rate_hz)
+        self.ring = OutputRing(channels=channels, sample_rate=sample_rate)
+        self.window = np.hanning(FFT_SIZE).astype(np.float32)
+        # Potencia por banda en escala de dBFS (seno de escala completa = 0 dB)
+        self.norm = 4.0 / (FFT_SIZE * float(np.sum(self.window ** 2)))
+        self.matrix = band_matrix(FFT_SIZE, sample_rate, band_edges(bands))
+        self._hop = np.zeros((self.hop, channels), dtype=np.float32)
+        self._frame = np.zeros((FFT_SIZE, channels), dtype=np.float32)
+        self._mono = np.zeros(FFT_SIZE, dtype=np.float32)
+        self._record = bytearray(HEADER.size + bands)
+        self.record = None
+        self.seq = 0
+        self._consumed = 0
+        self._running = False
+        self._thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.records = 0
+        self.compute_time = 0.0
+        self.compute_max = 0.0
+        self.started = time.monotonic()
+
+    # ---------- Callback de audio ----------
+
+    def tap(self, block):
+        """Copia el bloque de salida al ring (nodo al final del grafo)"""
+        if self._running:
+            self.ring.write(block)
+
+    # ---------- Hilo ----------
+
+    def start(self):
+        if self._running:
+            return self
+        self._consumed = self.ring.written
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="spectrum", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def _worker(self):
+        period = 1.0 / self.rate_hz
+        next_at = time.monotonic()
+        while self._running:
+            next_at += period
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            self.update()
+
+    def update(self):
+        """Arma un registro con el último intervalo; False si no llegó audio nuevo"""
+        written = self.ring.written
+        # Medio intervalo alcanza: el jitter del callback no saltea registros
+        if written - self._consumed < self.hop // 2 or written < FFT_SIZE:
+            return False
+        start = time.perf_counter()
+        self._consumed = written
+        self.ring.read(written - self.hop, self._hop)
+        self.ring.read(written - FFT_SIZE, self._frame)
+        peak = float(np.max(np.abs(self._hop)))
+        rms = float(np.sqrt(np.mean(self._hop * self._hop)))
+        np.mean(self._frame, axis=1, out=self._mono)
+        self._mono *= self.window
+        spectrum = np.fft.rfft(self._mono)
+        power = spectrum.real * spectrum.real + spectrum.imag * spectrum.imag
+        bands_db = 10.0 * np.log10(self.norm * (power.astype(np.float32) @ self.matrix) + 1e-13)
+        self.record = self._pack(peak, rms, bands_db)
+        elapsed = time.perf_counter() - start
+        self.records += 1
+        self.compute_time += elapsed
+        self.compute_max = max(self.compute_max, elapsed)
+        return True
+
+    def _pack(self, peak, rms, bands_db):
+        prob = self.vad() if self.vad else None
+        flags = 0
+        if prob is not None:
+            flags |= FLAG_VAD
+            if prob >= SPEECH_THRESHOLD:
+                flags |= FLAG_SPEECH
+        peak_db = 20.0 * np.log10(peak + 1e-9)
+        if peak_db > -0.1:
+            flags |= FLAG_CLIP
+        # RMS de escala completa de un seno = -3 dB: se corrige a dBFS de seno
+        rms_db = 20.0 * np.log10(rms + 1e-9) + 3.01
+        self.seq = (self.seq + 1) & 0xFFFF
+        HEADER.pack_into(self._record, 0, RECORD_VERSION, self.bands, self.seq,
+                         int(encode_db(peak_db)), int(encode_db(rms_db)),
+                         int(round(255 * min(max(prob or 0.0, 0.0), 1.0))), flags)
+        self._record[HEADER.size:] = encode_db(bands_db).tobytes()
+        return bytes(self._record)
+
+    def latest(self):
+        """(secuencia, registro) del último cálculo; registro None si todavía no hay"""
+        return self.seq, self.record
+
+    # ---------- Métricas ----------
+
+    def get_stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        size = HEADER.size + self.bands
+        return {
+            "running": self._running,
+            "records": self.records,
+            "record_bytes": size,
+            "bytes_per_s": size * self.records / elapsed,
+            "compute_avg_us": 1e6 * self.compute_time / self.records if self.records else 0.0,
+            "compute_max_us": 1e6 * self.compute_max,
+            "cpu_pct": 100.0 * self.compute_time / elapsed,
+        }
+
+
+# ========== BENCHMARK ==========
+
+def benchmark(seconds=10.0, blocksize=960):
+    """
+    Tonos de nivel conocido por el tap bloque a bloque: exactitud de las
+    bandas y del RMS, costo por registro y bytes/s contra el PCM del stream
+    """
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    # 1 kHz a -6 dBFS en el canal izquierdo y el derecho (en fase)
+    tone = (0.5 * np.sin(2 * np.pi * 1000.0 * t)).astype(np.float32)
+    audio = np.stack([tone, tone], axis=1)
+    monitor = SpectrumMonitor(vad=lambda: 0.8)
+    monitor._running = True
+    tap_time = 0.0
+    records = []
+    for i in range(0, n - blocksize + 1, blocksize):
+        start = time.perf_counter()
+        monitor.tap(audio[i:i + blocksize])
+        tap_time += time.perf_counter() - start
+        # El hilo corre cada 100 ms: aquí, cada hop de muestras
+        if (i + blocksize) % monitor.hop == 0 and monitor.update():
+            records.append(decode_record(monitor.record))
+    monitor._running = False
+    edges = band_edges()
+    tone_band = int(np.searchsorted(edges, 1000.0)) - 1
+    last = records[-1]
+    others = np.delete(last["bands_db"], tone_band)
+    blocks = n // blocksize
+    stats = monitor.get_stats()
+    pcm_bytes_per_s = SAMPLE_RATE * 2 * 2      # int16 estéreo del stream de audio
+    record_bytes_per_s = stats["record_bytes"] * RATE_HZ
+    return {
+        "records": len(records),
+        "record_bytes": stats["record_bytes"],
+        "telemetry_bytes_per_s": record_bytes_per_s,
+        "pcm_bytes_per_s": pcm_bytes_per_s,
+        "reduction_x": pcm_bytes_per_s / record_bytes_per_s,
+        "tone_band_db": float(last["bands_db"][tone_band]),
+        "other_bands_max_db": float(np.max(others)),
+        "rms_db": last["rms_db"],
+        "peak_db": last["peak_db"],
+        "compute_avg_us": stats["compute_avg_us"],
+        "compute_max_us": stats["compute_max_us"],
+        "tap_us": 1e6 * tap_time / blocks,
+        "cpu_pct": 100.0 * stats["compute_avg_us"] * 1e-6 * RATE_HZ,
+        # Presupuesto: el tono en su banda a ±1 dB, fugas bajo -40 dB y < 1 % de CPU
+        "ok": (abs(last["bands_db"][tone_band] + 6.0) <= 1.0 and abs(last["rms_db"] + 6.0) <= 0.5
+               and float(np.max(others)) < -40.0 and last["speech"]
+               and 100.0 * stats["compute_avg_us"] * 1e-6 * RATE_HZ < 1.0),
+    }
+
+
+def main():
+    print("=" * 60)
+    print("TEARIS - Telemetría de espectro: costo y ancho de banda")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Registro: {r['record_bytes']} bytes x {RATE_HZ:.0f} Hz = {r['telemetry_bytes_per_s']:.0f} B/s "
+          f"(PCM: {r['pcm_bytes_per_s'] / 1000:.0f} kB/s, {r['reduction_x']:.0f}x menos)")
+    print(f"Tono 1 kHz -6 dBFS: banda {r['tone_band_db']:.1f} dB | resto máx {r['other_bands_max_db']:.1f} dB "
+          f"| RMS {r['rms_db']:.1f} dB | pico {r['peak_db']:.1f} dB")
+    print(f"Costo: {r['compute_avg_us']:.0f} µs por registro (máx {r['compute_max_us']:.0f}) | "
+          f"tap {r['tap_us']:.1f} µs por bloque | CPU {r['cpu_pct']:.3f}%")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Procesamiento por sub-bandas (banco QMF de 2 bandas)
+La fuga de los auriculares a los micrófonos y la voz que importa están por
+debajo de 12 kHz, pero el cancelador de realimentación modela el camino a
+48 kHz. Un banco QMF críticamente muestreado parte el stream en banda baja
+(0-12 kHz) y alta (12-24 kHz) a 24 kHz cada una; el cancelador corre solo
+sobre la baja, con frames de 20 ms (la mitad de llamadas) y la mitad de
+particiones para el mismo largo de camino, y la alta pasa por una línea de
+retardo igual a la latencia de la etapa (con una ganancia fija opcional)
+antes de la síntesis. Su referencia pasa por un análisis igual
+(SubbandTap), así que ve el mismo camino que a tasa completa.
+
+Banco: prototipo pasabajos de media banda con ventana de Kaiser y corte
+ajustado para que |H0|² + |H1|² sea plano (diseño de Lin y Vaidyanathan),
+H1(z) = H0(-z) y síntesis F0 = H0, F1 = -H1: el alias entre bandas se
+cancela y queda un retardo de TAPS - 1 muestras (~1 ms) con ondulación de
+amplitud de centésimas de dB. Análisis y síntesis van por las componentes
+polifásicas (E0, E1 de TAPS/2 coeficientes) a la tasa de banda. Con
+LEVELS > 1 la banda baja se vuelve a partir (árbol diádico).
+
+El reductor espectral no gana nada: su costo por frame es casi todo fijo
+por llamada (medido: 146 µs a 24 kHz contra 156 µs a 48 kHz), así que
+partirlo solo suma el banco, o duplica su latencia si se alarga el frame.
+El beamformer tampoco va por el banco: entrega un canal copiado a las dos
+salidas, y con la banda alta por la línea de retardo la salida mezclaría
+arriba de 12 kHz el estéreo crudo (con su ruido) con el haz de abajo.
+
+Uso (reconstrucción, latencia, CPU y silbido contra el cancelador a 48 kHz):
+    python3 tearis_subband.py
+"""
+
+import time
+import logging
+from functools import lru_cache
+import numpy as np
+
+from tearis_dsp_graph import Node, PCM16_SCALE
+
+logger = logging.getLogger("TEARIS-SUBBAND")
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+FRAME_SIZE = 480          # frame de la etapa interna a la tasa de banda (20 ms a 24 kHz)
+TAPS = 48                 # largo del prototipo (retardo del banco: TAPS - 1)
+KAISER_BETA = 8.0         # ~80 dB de rechazo fuera de banda
+LEVELS = 1                # particiones de la banda baja: 1 -> 0-12 kHz a 24 kHz
+DESIGN_GRID = 8192        # puntos de frecuencia para ajustar el corte
+STOP_EDGE = 0.32          # borde de la banda de rechazo (fracción de fs: 15.4 kHz)
+COST_FRAME = 480          # los costos se informan por 10 ms a tasa completa, como en tearis_denoise
+
+
+# ========================================
+# Diseño del prototipo
+# ========================================
+@lru_cache(maxsize=None)
+def qmf_prototype(taps=TAPS, beta=KAISER_BETA):
+    """
+    Prototipo pasabajos del banco, cacheado por (taps, beta)
+
+    Barre el corte justo por encima de π/2 y se queda con el que minimiza la
+    desviación máxima de |H0(ω)|² + |H0(π-ω)|², que es la distorsión de
+    amplitud del banco completo
+
+    Returns:
+        array float64 de solo lectura, simétrico, con Σh² = 1/2
+    """
+    if taps % 2:
+        raise ValueError(f"El prototipo QMF necesita largo par: {taps}")
+    n = np.arange(taps) - (taps - 1) / 2.0
+    window = np.kaiser(taps, beta)
+    best = None
+    for cutoff in np.linspace(0.50, 0.56, 601):
+        h = np.sinc(cutoff * n) * cutoff * window
+        power = np.abs(np.fft.rfft(h, DESIGN_GRID)) ** 2
+        total = power + power[::-1]
+        deviation = np.max(np.abs(np.log10(total / np.mean(total))))
+        if best is None or deviation < best[0]:
+            best = (deviation, h)
+    h = best[1] / np.sqrt(2.0 * np.sum(best[1] ** 2))
+    h.setflags(write=False)
+    return h
+
+
+def bank_response(taps=TAPS, beta=KAISER_BETA, points=DESIGN_GRID):
+    """
+    Respuesta del banco sin procesar la banda baja
+
+    Returns:
+        {ripple_db: ondulación pico a pico de |T(ω)|,
+         stopband_db: rechazo de H0 desde STOP_EDGE}
+    """
+    h = qmf_prototype(taps, beta)
+    H = np.abs(np.fft.rfft(h, 2 * points))
+    total = H ** 2 + H[::-1] ** 2
+    freqs = np.linspace(0.0, 0.5, len(H))
+    return {
+        "ripple_db": float(10.0 * np.log10(total.max() / total.min())),
+        "stopband_db": float(20.0 * np.log10(H[freqs >= STOP_EDGE].max() / H[0])),
+    }
+
+
+def band_rate(sample_rate=SAMPLE_RATE, levels=LEVELS):
+    """Tasa de la banda baja después de `levels` particiones"""
+    return sample_rate >> levels
+
+
+# ========================================
+# Banco de 2 bandas
+# ========================================
+class QMFBank:
+    """
+    Análisis y síntesis de 2 bandas por bloques, con estado entre bloques
+
+    Las convoluciones polifásicas de cada lado (2 fases x canales) van
+    juntas por overlap-save en una sola rFFT: con bloques de 480 muestras
+    de banda cuesta menos de la mitad que np.convolve por fase y canal
+
+    Args:
+        taps: largo del prototipo (par)
+        channels: canales de cada bloque (frames, channels)
+    """
+
+    def __init__(self, taps=TAPS, channels=CHANNELS):
+        h = qmf_prototype(taps)
+        self.taps = taps
+        self.channels = channels
+        self.half = taps // 2
+        # Componentes polifásicas E0, E1. En el análisis E1 lleva una muestra de
+        # retardo porque la fase impar va atrás (x_impar[k] = x[2k-1]): así las
+        # dos fases salen alineadas y la banda baja es una sola irFFT
+        self.phases = np.stack((h[0::2], h[1::2]))
+        self.analysis_phases = np.zeros((2, self.half + 1))
+        self.analysis_phases[0, :-1] = h[0::2]
+        self.analysis_phases[1, 1:] = h[1::2]
+        self.delay = taps - 1
+        self._spectra = {}
+        # Historias por canal (canal, muestras)
+        self._input = np.zeros((channels, taps))
+        self._diff = np.zeros((channels, self.half - 1))
+        self._sum = np.zeros((channels, self.half - 1))
+
+    def reset(self):
+        self._input[:] = 0.0
+        self._diff[:] = 0.0
+        self._sum[:] = 0.0
+
+    def _spectrum(self, m):
+        """(nfft, espectros de análisis, de síntesis) para bloques de banda de m muestras, calculado una vez"""
+        cached = self._spectra.get(m)
+        if cached is None:
+            nfft = 1 << int(np.ceil(np.log2(m + self.half)))
+            # El factor 2 de la síntesis compensa la interpolación
+            cached = self._spectra[m] = (nfft, np.fft.rfft(self.analysis_phases, nfft)[:, None, :],
+                                         np.fft.rfft(2.0 * self.phases, nfft)[:, None, :])
+        return cached
+
+    def analysis(self, x, high=True):
+        """
+        Bloque (n, canales) a tasa completa -> (baja, alta) de (n/2, canales)
+
+        v0 = E0·x_par + E1·x_impar, v1 = E0·x_par - E1·x_impar; con
+        high=False solo calcula la baja (la alta vuelve como None)
+        """
+        m = x.shape[0] // 2
+        half = self.half
+        buf = np.concatenate((self._input, x.T), axis=1)
+        self._input[:] = buf[:, -self.taps:]
+        nfft, spectrum, _ = self._spectrum(m)
+        # (fase, canal, muestra): fila 0 = x[2k], fila 1 = x[2k+1]
+        X = np.fft.rfft(buf.reshape(self.channels, -1, 2).transpose(2, 0, 1), nfft, axis=-1)
+        X *= spectrum
+        if not high:
+            return np.fft.irfft(X[0] + X[1], nfft, axis=-1)[:, half:half + m].T, None
+        bands = np.empty((2,) + X.shape[1:], dtype=X.dtype)
+        np.add(X[0], X[1], out=bands[0])
+        np.subtract(X[0], X[1], out=bands[1])
+        y = np.fft.irfft(bands, nfft, axis=-1)[..., half:half + m]
+        return y[0].T, y[1].T
+
+    def synthesis(self, low, high, out):
+        """
+        (baja, alta) de (m, canales) -> `out` (2m, canales) a tasa completa
+
+        y_par = 2·E0·(v0 - v1), y_impar = 2·E1·(v0 + v1)
+        """
+        m = low.shape[0]
+        keep = self.half - 1
+        seq = np.empty((2, self.channels, keep + m))
+        seq[0, :, :keep] = self._diff
+        seq[1, :, :keep] = self._sum
+        np.subtract(low.T, high.T, out=seq[0, :, keep:])
+        np.add(low.T, high.T, out=seq[1, :, keep:])
+        self._diff[:] = seq[0, :, m:]
+        self._sum[:] = seq[1, :, m:]
+        nfft, _, spectrum = self._spectrum(m)
+        Y = np.fft.rfft(seq, nfft, axis=-1)
+        Y *= spectrum
+        y = np.fft.irfft(Y, nfft, axis=-1)[..., keep:keep + m]
+        np.copyto(out[0::2], y[0].T, casting="unsafe")
+        np.copyto(out[1::2], y[1].T, casting="unsafe")
+        return out
+
+
+class DelayLine:
+    """Retardo fijo de `delay` muestras por bloques (banda que no se procesa)"""
+
+    def __init__(self, delay, channels=CHANNELS):
+        self.delay = delay
+        self._line = np.zeros((delay, channels), dtype=np.float32)
+
+    def process(self, x):
+        if not self.delay:
+            return x
+        buf = np.concatenate((self._line, x))
+        self._line[:] = buf[-self.delay:]
+        return buf[:x.shape[0]]
+
+
+# ========================================
+# Nodos del grafo
+# ========================================
+class SubbandNode(Node):
+    """
+    Etapa cara solo sobre la banda baja; las altas pasan retardadas
+
+    Ocupa el lugar de la etapa en la cadena (p. ej. el de FeedbackNode): el
+    procesador debe trabajar a band_rate() y cumplir process_into(src, dst)
+    por frame de `frame` muestras de banda
+
+    Args:
+        processor: etapa interna (FeedbackCanceller...)
+        latency: latencia propia de la etapa en muestras de banda (0 para
+                 el cancelador: entrega el mismo frame que recibe)
+        frame: frame de la etapa en muestras de banda
+        levels: particiones de la banda baja
+        high_gain_db: ganancia fija de las bandas altas (0 = transparentes)
+    """
+
+    channels = CHANNELS
+
+    def __init__(self, processor, latency=0, frame=FRAME_SIZE, levels=LEVELS, high_gain_db=0.0,
+                 taps=TAPS, name="subband"):
+        super().__init__(name)
+        self.processor = processor
+        self.levels = levels
+        self.frame_size = frame << levels
+        self.high_gain = 10.0 ** (high_gain_db / 20.0)
+        self.banks = [QMFBank(taps) for _ in range(levels)]
+        # Cada banda alta espera lo que tarda todo lo que cuelga de la baja
+        # de su mismo nivel: D_L = latencia de la etapa, D_l = TAPS-1 + 2·D_(l+1)
+        self.lines = []
+        delay = latency
+        for _ in range(levels):
+            self.lines.insert(0, DelayLine(delay))
+            delay = taps - 1 + 2 * delay
+        self.latency = delay
+        self._band = np.zeros((frame, CHANNELS), dtype=np.float32)
+
+    @property
+    def latency_ms(self):
+        return 1000.0 * self.latency / SAMPLE_RATE
+
+    def process(self, src, dst):
+        # El análisis lee todo src antes de que la síntesis escriba dst: sirve en el lugar
+        band = src
+        highs = []
+        for bank, line in zip(self.banks, self.lines):
+            band, high = bank.analysis(band)
+            high = line.process(high)
+            if self.high_gain != 1.0:
+                high = high * self.high_gain
+            highs.append(high)
+        self.processor.process_into(band, self._band)
+        band = self._band
+        for level in range(self.levels - 1, -1, -1):
+            out = dst if level == 0 else np.empty((band.shape[0] * 2, CHANNELS), dtype=np.float32)
+            band = self.banks[level].synthesis(band, highs[level], out)
+
+
+class SubbandTap:
+    """
+    Análisis para un tap que alimenta una etapa de SubbandNode (la
+    referencia del cancelador): entrega a `func` solo la banda baja, con el
+    mismo retardo de banco que ve la etapa en su entrada
+
+    Args:
+        func: recibe la banda baja (frames / 2**levels, canales) en float
+    """
+
+    def __init__(self, func, levels=LEVELS, taps=TAPS):
+        self.func = func
+        self.banks = [QMFBank(taps) for _ in range(levels)]
+
+    def __call__(self, block):
+        band = block * (1.0 / PCM16_SCALE) if block.dtype == np.int16 else block
+        for bank in self.banks:
+            band, _ = bank.analysis(band, high=False)
+        self.func(band)
+
+
+# ========== BENCHMARK ==========
+
+class _Identity:
+    """Etapa interna nula: mide solo el banco"""
+
+    def process_into(self, src, dst):
+        np.copyto(dst, src, casting="unsafe")
+
+
+def reconstruction(seconds=2.0, taps=TAPS, levels=LEVELS):
+    """
+    Banco sin procesar la banda baja sobre ruido blanco
+
+    Returns:
+        {snr_db: error de reconstrucción contra la entrada retardada,
+         delay_samples, bank_us_per_frame: análisis + síntesis por 10 ms}
+    """
+    rng = np.random.default_rng(0)
+    x = (0.25 * rng.standard_normal((int(seconds * SAMPLE_RATE), CHANNELS))).astype(np.float32)
+    node = SubbandNode(_Identity(), frame=FRAME_SIZE >> (levels - 1), levels=levels, taps=taps)
+    y = np.zeros_like(x)
+    step = node.frame_size
+    n = x.shape[0] // step * step
+    start = time.perf_counter()
+    for i in range(0, n, step):
+        node.process(x[i:i + step], y[i:i + step])
+    elapsed = time.perf_counter() - start
+    d = node.latency
+    ref = x[:n - d]
+    err = y[d:n] - ref
+    return {
+        "snr_db": float(10.0 * np.log10(np.sum(ref ** 2) / max(np.sum(err ** 2), 1e-20))),
+        "delay_samples": d,
+        "bank_us_per_frame": 1e6 * elapsed / (n // COST_FRAME),
+    }
+
+
+def stage_cost(seconds=12.0, repeats=5):
+    """
+    Costo por frame de 10 ms del cancelador (etapa + análisis de la
+    referencia) a tasa completa y sobre la banda baja, en el mismo lazo
+    cerrado: mínimo de `repeats` corridas alternando las variantes, así la
+    carga de fondo del equipo infla alguna corrida pero no el mínimo
+
+    Returns:
+        {'on': µs por frame, 'subband': µs por frame}
+    """
+    from tearis_offline import simulate_feedback, synth_stereo, synth_leakage_path, STREAM_LATENCY, BLOCKSIZE
+    from tearis_pipeline import AudioPipeline
+
+    speech, _ = synth_stereo(seconds)
+    leakage = synth_leakage_path()
+    costs = {"on": [], "subband": []}
+    for _ in range(repeats):
+        for name, runs in costs.items():
+            pipeline = AudioPipeline(blocksize=BLOCKSIZE, feedback=True, subband=name == "subband")
+            simulate_feedback(speech, pipeline, leakage, latency=STREAM_LATENCY)
+            timing = pipeline.get_node_timing()
+            runs.append((timing["feedback"]["avg_us"] + timing["feedback_ref"]["avg_us"]) * 480.0 / BLOCKSIZE)
+            pipeline.stop_rnnoise()
+    return {name: min(runs) for name, runs in costs.items()}
+
+
+def benchmark(seconds=12.0):
+    """
+    Presupuesto: el banco reconstruye a más de 50 dB sin la etapa interna
+    y el cancelador sobre la banda baja (lazo cerrado de tearis_offline)
+    evita el silbido como el de banda completa con menos CPU, contando el
+    banco y el análisis de la referencia (stage_cost: 16-25 % menos en el
+    equipo de desarrollo, se exige más del 10 %); la latencia agregada se
+    informa
+    """
+    from tearis_offline import compare_feedback
+    results = compare_feedback(seconds=seconds, variants=("on", "subband"))
+    results.pop("curve")
+    results["bank"] = dict(bank_response(), **reconstruction())
+    results["bank"]["delay_ms"] = 1000.0 * results["bank"]["delay_samples"] / SAMPLE_RATE
+    full, sub = results["on"], results["subband"]
+    cost = stage_cost(seconds)
+    results["cost_us_per_frame"] = cost
+    results["cpu_saved_pct"] = 100.0 * (1.0 - cost["subband"] / cost["on"])
+    results["added_latency_ms"] = results["bank"]["delay_ms"]
+    results["ok"] = (results["bank"]["snr_db"] > 50.0 and results["cpu_saved_pct"] > 10.0
+                     and sub["howl_db"] < full["howl_db"] + 1.0 and sub["resets"] == 0)
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Cancelador de realimentación por sub-bandas (QMF)")
+    print("=" * 60)
+    r = benchmark()
+    bank = r["bank"]
+    print(f"Banco QMF {TAPS} coef.: reconstrucción {bank['snr_db']:.1f} dB | ondulación "
+          f"{bank['ripple_db']:.3f} dB | rechazo {bank['stopband_db']:.1f} dB | "
+          f"retardo {bank['delay_ms']:.2f} ms | {bank['bank_us_per_frame']:.1f} µs/frame")
+    print(f"{'variante':<10} {'µs/frame':>9} {'ref µs':>7} {'ERLE':>6} {'salida':>7} {'reinicios':>9}")
+    for name, label in (("on", "completa"), ("subband", "sub-banda")):
+        e = r[name]
+        print(f"{label:<10} {e['us_per_frame']:9.1f} {e['ref_us_per_frame']:7.1f} {e['erle_db']:5.1f} "
+              f"{e['howl_db']:+6.1f} {e['resets']:9d}")
+    cost = r["cost_us_per_frame"]
+    print(f"Costo mínimo por frame: completa {cost['on']:.1f} µs | sub-banda {cost['subband']:.1f} µs")
+    print(f"CPU ahorrada: {r['cpu_saved_pct']:.0f}% | latencia agregada: {r['added_latency_ms']:.2f} ms")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Supervisor del stream de audio
+Un hilo vigila el latido del callback (el contador de callbacks de la
+cadena). Si el stream deja de estar activo (reset del dispositivo, error
+del callback) o el latido no avanza en STALL_S (callback colgado, placa
+USB trabada), cierra el stream y abre uno nuevo con los parámetros de
+dispositivo ya resueltos, sobre la misma cadena DSP (sin recrear RNNoise
+ni recompilar el grafo). Cada caída y recuperación se avisa por
+`on_event`; el servidor la publica en la característica de status.
+
+Uso (tiempo de recuperación con fallas inyectadas en el backend nulo):
+    python3 tearis_supervisor.py
+"""
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger("TEARIS-SUPERVISOR")
+
+STALL_S = 0.25            # sin latido: ~12 bloques de 20 ms
+CHECK_S = 0.02            # período del vigilante
+# Espera antes de cada reintento de apertura (el último se repite)
+RETRY_BACKOFF_S = (0.0, 0.05, 0.2, 0.5, 1.0, 2.0)
+
+
+class StreamSupervisor:
+    """
+    Abre el stream, vigila su latido y lo reabre si se cae o se traba
+
+    Args:
+        open_stream: función sin argumentos que crea el stream (sin iniciar)
+                     con los parámetros ya resueltos
+        heartbeat: función que devuelve un contador que el callback avanza
+        on_event: función(evento, detalle) para 'down', 'recovered' y
+                  'failed'; se llama desde el hilo del supervisor
+        on_restart: función que se llama antes de reabrir (p. ej. para que
+                    la cadena no cuente el hueco como jitter)
+        stall_s: tiempo sin latido que se considera stream trabado
+    """
+
+    def __init__(self, open_stream, heartbeat, on_event=None, on_restart=None,
+                 stall_s=STALL_S, check_s=CHECK_S):
+        self.open_stream = open_stream
+        self.heartbeat = heartbeat
+        self.on_event = on_event
+        self.on_restart = on_restart
+        self.stall_s = stall_s
+        self.check_s = check_s
+        self.stream = None
+        self.recoveries = 0
+        self.failures = 0
+        self.last_event = None
+        self.recover_sum = 0.0
+        self.recover_max = 0.0
+        self.recover_last = 0.0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    @property
+    def active(self):
+        stream = self.stream
+        return bool(stream and stream.active)
+
+    def start(self):
+        """Abre e inicia el stream (si no está activo) y arranca el vigilante"""
+        with self._lock:
+            if not self.active:
+                self._open()
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._watch, name="stream-supervisor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        with self._lock:
+            self._close()
+
+    # ---------- Stream ----------
+
+    def _open(self):
+        stream = self.open_stream()
+        stream.start()
+        self.stream = stream
+
+    def _close(self):
+        stream, self.stream = self.stream, None
+        if stream is None:
+            return
+        try:
+            stream.stop()
+            stream.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Error cerrando el stream caído: {e}")
+
+    # ---------- Vigilante ----------
+
+    def _watch(self):
+        beat = self.heartbeat()
+        beat_at = time.monotonic()
+        while self._running:
+            time.sleep(self.check_s)
+            now = time.monotonic()
+            current = self.heartbeat()
+            if current != beat:
+                beat, beat_at = current, now
+                continue
+            if self.stream is None:
+                reason = "cerrado"
+            elif not self.stream.active:
+                reason = "inactivo"
+            elif now - beat_at >= self.stall_s:
+                reason = "trabado"
+            else:
+                continue
+            self._recover(reason, beat_at, now)
+            beat = self.heartbeat()
+            beat_at = time.monotonic()
+
+    def _recover(self, reason, beat_at, detected_at):
+        """Cierra, reabre con reintentos y espera el primer callback del stream nuevo"""
+        silent_ms = 1000.0 * (detected_at - beat_at)
+        logger.warning(f"⚠️ Stream de audio {reason} ({silent_ms:.0f} ms sin callbacks): reabriendo...")
+        self._emit("down", {"reason": reason, "silent_ms": silent_ms})
+        attempt = 0
+        while self._running:
+            time.sleep(RETRY_BACKOFF_S[min(attempt, len(RETRY_BACKOFF_S) - 1)])
+            attempt += 1
+            with self._lock:
+                self._close()
+                if self.on_restart:
+                    self.on_restart()
+                beat = self.heartbeat()
+                try:
+                    self._open()
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"❌ Reapertura {attempt} fallida: {e}")
+                    if attempt == len(RETRY_BACKOFF_S):
+                        self._emit("failed", {"reason": reason, "attempts": attempt, "error": str(e)})
+                    continue
+            # Recuperado cuando la cadena vuelve a recibir bloques
+            deadline = time.monotonic() + self.stall_s
+            while self._running and self.heartbeat() == beat and time.monotonic() < deadline:
+                time.sleep(0.001)
+            if self.heartbeat() == beat:
+                self.failures += 1
+                logger.error(f"❌ Reapertura {attempt}: el stream nuevo no entrega callbacks")
+                continue
+            recover_s = time.monotonic() - detected_at
+            self.recoveries += 1
+            self.recover_sum += recover_s
+            self.recover_max = max(self.recover_max, recover_s)
+            self.recover_last = recover_s
+            logger.info(f"✅ Stream de audio recuperado en {1000.0 * recover_s:.0f} ms "
+                        f"({reason}, {attempt} intento{'s' if attempt > 1 else ''})")
+            self._emit("recovered", {"reason": reason, "silent_ms": silent_ms,
+                                     "recover_ms": 1000.0 * recover_s, "attempts": attempt})
+            return
+
+    def _emit(self, event, detail):
+        self.last_event = (event, detail)
+        if self.on_event:
+            try:
+                self.on_event(event, detail)
+            except Exception as e:
+                logger.warning(f"⚠️ Error avisando evento del stream: {e}")
+
+    # ---------- Métricas ----------
+
+    def get_stats(self):
+        return {
+            "active": self.active,
+            "recoveries": self.recoveries,
+            "failures": self.failures,
+            "recover_avg_ms": 1000.0 * self.recover_sum / self.recoveries if self.recoveries else 0.0,
+            "recover_max_ms": 1000.0 * self.recover_max,
+            "recover_last_ms": 1000.0 * self.recover_last,
+            "last_event": self.last_event[0] if self.last_event else None,
+        }
+
+
+def status_text(event, detail):
+    """Texto ASCII corto para la característica de status"""
+    if event == "recovered":
+        return f"RECOVERED {detail['recover_ms']:.0f}ms"
+    if event == "down":
+        return "AUDIO_DOWN"
+    if event == "failed":
+        return "AUDIO_FAILED"
+    return "OK"
+
+
+# ========== BENCHMARK ==========
+
+def benchmark(rounds=5, blocksize=960):
+    """
+    Cadena real sobre el backend nulo: inyecta `rounds` muertes del stream
+    y `rounds` callbacks colgados y mide detección y tiempo hasta el primer
+    callback del stream reabierto
+    """
+    from tearis_pipeline import AudioPipeline, SAMPLE_RATE, CHANNELS
+    from tearis_audio_backends import open_stream
+
+    pipeline = AudioPipeline(blocksize=blocksize)
+    streams = []
+    events = []
+    recovered = threading.Event()
+
+    def open_null():
+        stream = open_stream("null", device=None, samplerate=SAMPLE_RATE, blocksize=blocksize,
+                             channels=CHANNELS, dtype="float32", callback=pipeline.callback)
+        streams.append(stream)
+        return stream
+
+    def on_event(event, detail):
+        events.append((event, detail))
+        if event == "recovered":
+            recovered.set()
+
+    supervisor = StreamSupervisor(open_null, lambda: pipeline.callbacks, on_event=on_event,
+                                  on_restart=pipeline.resume)
+    supervisor.start()
+    results = {}
+    try:
+        time.sleep(0.2)
+        for fault in ("die", "stall"):
+            times = []
+            for _ in range(rounds):
+                recovered.clear()
+                injected = time.monotonic()
+                supervisor.stream.inject_fault(fault)
+                if not recovered.wait(5.0):
+                    break
+                times.append(1000.0 * (time.monotonic() - injected))
+                time.sleep(0.1)
+            results[fault] = times
+    finally:
+        supervisor.stop()
+
+    def summary(times):
+        return (max(times) if times else float("inf"), sum(times) / len(times) if times else float("inf"))
+
+    die_max, die_avg = summary(results.get("die", []))
+    stall_max, stall_avg = summary(results.get("stall", []))
+    return {
+        "die_recover_avg_ms": die_avg,
+        "die_recover_max_ms": die_max,
+        "stall_recover_avg_ms": stall_avg,
+        "stall_recover_max_ms": stall_max,
+        "recoveries": supervisor.recoveries,
+        "streams_opened": len(streams),
+        # Presupuesto: detección + reapertura + primer bloque
+        "ok": (supervisor.recoveries == 2 * rounds
+               and die_max < 1000.0 * (CHECK_S + 0.1)
+               and stall_max < 1000.0 * (STALL_S + CHECK_S + 0.1)),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s:%(name)s: %(message)s')
+    print("=" * 60)
+    print("TEARIS - Supervisor del stream: recuperación ante fallas inyectadas")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Stream muerto:    prom {r['die_recover_avg_ms']:.0f} ms | máx {r['die_recover_max_ms']:.0f} ms")
+    print(f"Callback colgado: prom {r['stall_recover_avg_ms']:.0f} ms | máx {r['stall_recover_max_ms']:.0f} ms")
+    print(f"Recuperaciones: {r['recoveries']} | streams abiertos: {r['streams_opened']}")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
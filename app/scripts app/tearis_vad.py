@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+TEARIS - Planificador guiado por VAD
+Usa la probabilidad de voz que devuelve RNNoise para saltear o degradar
+etapas caras durante silencios largos y opcionalmente silenciar ruido puro.
+"""
+
+import time
+import logging
+import numpy as np
+
+from tearis_limiter import normalize_mode
+
+logger = logging.getLogger("TEARIS-VAD")
+
+FRAME_MS = 10.0
+
+# Política de cada etapa durante silencio:
+#   0 -> no se ejecuta
+#   N -> se ejecuta uno de cada N frames
+# La EQ por software (SOS y FIR) se calcula una vez por modo, no por
+# frame: no hay recálculo que saltear
+STAGE_POLICIES = {
+    "classifier": 0,    # reconfirmación periódica del ambiente (tearis_environment)
+    "ble_monitor": 10,  # envío de audio al monitor BLE de la app
+}
+
+# Configuración por modo
+VAD_PRESETS = {
+    "normal": {"noise_mute": False},
+    "escuela": {"noise_mute": True},
+    "transporte": {"noise_mute": False},
+}
+
+
+class VADScheduler:
+    """
+    Decide qué etapas corren en cada frame según la actividad de voz
+
+    Args:
+        threshold: probabilidad a partir de la cual un frame es voz
+        silence_ms: tiempo sin voz para pasar a estado 'silencio'
+        noise_ms: tiempo sin voz para considerar el segmento ruido puro
+        noise_level: VAD promedio por debajo del cual se silencia
+        mute_db: atenuación aplicada al ruido puro
+        noise_mute: habilita el silenciado de ruido puro
+    """
+
+    def __init__(self, threshold=0.5, silence_ms=1500.0, noise_ms=3000.0,
+                 noise_level=0.1, mute_db=-30.0, noise_mute=False,
+                 frame_ms=FRAME_MS, policies=None):
+        self.threshold = threshold
+        self.frame_ms = frame_ms
+        self.silence_frames = int(silence_ms / frame_ms)
+        self.noise_frames = int(noise_ms / frame_ms)
+        self.noise_level = noise_level
+        self.mute_gain = 10.0 ** (mute_db / 20.0)
+        self.noise_mute = noise_mute
+        self.policies = dict(STAGE_POLICIES if policies is None else policies)
+
+        self.probs = np.zeros(0, dtype=np.float32)
+        self.smoothed = 0.0
+        self.quiet_run = 0
+        self.silent = False
+        self.muted = False
+        self._gate_gain = 1.0
+        self.reset_stats()
+
+    def configure(self, mode):
+        """Aplica el preset del modo"""
+        preset = VAD_PRESETS.get(normalize_mode(mode), VAD_PRESETS["normal"])
+        self.noise_mute = preset["noise_mute"]
+
+    def reset_stats(self):
+        self.started = time.monotonic()
+        self.frames = 0
+        self.speech_frames = 0
+        self.vad_sum = 0.0
+        self.segments = 0
+        self.longest_quiet = 0
+        self.stage_runs = {name: 0 for name in self.policies}
+        self.stage_skips = {name: 0 for name in self.policies}
+        self.stage_time = {name: 0.0 for name in self.policies}
+
+    # ---------- Actualización por frame ----------
+
+    def update(self, probs):
+        """
+        Registra la probabilidad de voz de un frame (una por canal)
+
+        Args:
+            probs: secuencia con la probabilidad de cada canal
+        """
+        self.probs = np.asarray(probs, dtype=np.float32)
+        p = float(self.probs.max()) if self.probs.size else 0.0
+        self.smoothed += 0.05 * (p - self.smoothed)
+        self.frames += 1
+        self.vad_sum += p
+
+        if p >= self.threshold:
+            if self.frames == 1 or self.quiet_run > 0:
+                self.segments += 1
+            self.speech_frames += 1
+            self.quiet_run = 0
+        else:
+            self.quiet_run += 1
+            self.longest_quiet = max(self.longest_quiet, self.quiet_run)
+
+        self.silent = self.quiet_run >= self.silence_frames
+        self.muted = (self.noise_mute and self.quiet_run >= self.noise_frames
+                      and self.smoothed < self.noise_level)
+
+    def should_run(self, stage, force=False):
+        """
+        Indica si la etapa debe correr en este frame y lo contabiliza
+
+        Args:
+            force: corre aunque sea silencio (p. ej. ante un cambio de escena)
+        """
+        policy = self.policies.get(stage, 1)
+        run = (force or not self.silent or policy == 1
+               or (policy > 1 and self.quiet_run % policy == 0))
+        if run:
+            self.stage_runs[stage] = self.stage_runs.get(stage, 0) + 1
+        else:
+            self.stage_skips[stage] = self.stage_skips.get(stage, 0) + 1
+        return run
+
+    def record(self, stage, elapsed):
+        """Acumula el costo medido (segundos) de una ejecución de la etapa"""
+        self.stage_time[stage] = self.stage_time.get(stage, 0.0) + elapsed
+
+    def apply_gate(self, block):
+        """Silencia ruido puro en el lugar con rampa para evitar clicks"""
+        target = self.mute_gain if self.muted else 1.0
+        if target == 1.0 and self._gate_gain == 1.0:
+            return block
+        ramp = np.linspace(self._gate_gain, target, block.shape[0], dtype=np.float32)
+        block *= ramp[:, None] if block.ndim == 2 else ramp
+        self._gate_gain = target
+        return block
+
+    # ---------- Reportes ----------
+
+    def get_stats(self):
+        """Estadísticas de VAD y ahorro de CPU promediado en el tiempo"""
+        wall = max(time.monotonic() - self.started, 1e-9)
+        stages = {}
+        saved = 0.0
+        for name in self.stage_runs:
+            runs = self.stage_runs[name]
+            skips = self.stage_skips.get(name, 0)
+            avg = self.stage_time.get(name, 0.0) / runs if runs else 0.0
+            saved += avg * skips
+            stages[name] = {"runs": runs, "skips": skips, "avg_ms": avg * 1000.0,
+                            "saved_ms": avg * skips * 1000.0}
+        return {
+            "frames": self.frames,
+            "speech_ratio": self.speech_frames / self.frames if self.frames else 0.0,
+            "mean_vad": self.vad_sum / self.frames if self.frames else 0.0,
+            "segments": self.segments,
+            "longest_quiet_s": self.longest_quiet * self.frame_ms / 1000.0,
+            "silent": self.silent,
+            "muted": self.muted,
+            "cpu_saved_pct": 100.0 * saved / wall,
+            "stages": stages,
+        }
+
+
+# ========== BENCHMARK ==========
+
+def _class_audio(seconds, seed=0, sample_rate=48000):
+    """
+    Clase simulada: ráfagas de voz separadas por silencios con ruido de
+    sala (~-46 dBFS); devuelve el audio y la voz limpia para marcar los
+    bloques que tienen voz audible
+    """
+    from tearis_offline import synth_speech, synth_noise
+
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    audio = 0.005 * synth_noise(n, seed=seed + 1)
+    speech = np.zeros(n, dtype=np.float32)
+    i = 0
+    while i < n:
+        talk = int(rng.uniform(2, 8) * sample_rate)
+        quiet = int(rng.uniform(1, 12) * sample_rate)
+        segment = synth_speech(talk / sample_rate, rate=sample_rate, seed=seed + i)[:n - i]
+        audio[i:i + segment.shape[0]] += segment[:, None]
+        speech[i:i + segment.shape[0]] = segment
+        i += talk + quiet
+    return audio, speech
+
+
+def _run_class(audio, speech, blocksize, gated):
+    """
+    La clase por la cadena (reductor espectral, que también estima el VAD),
+    con el monitor BLE y la cascada de ambiente colgados del planificador.
+    Sin `gated` todas las etapas corren en cada frame
+    """
+    from tearis_pipeline import AudioPipeline
+    from tearis_environment import EnvironmentCascade, StandInClassifier
+
+    sample_rate = 48000
+    current = [0]
+    sent = np.zeros(audio.shape[0] // blocksize, dtype=bool)
+
+    def ble_tap(block):
+        # Lo que hacen _queue_tap y _notify_from_queue con cada bloque (el
+        # dbus.Array lleva un elemento por byte)
+        data = (block.copy() * 32767).astype(np.int16).tobytes()
+        list(data)
+        sent[current[0]] = True
+
+    pipeline = AudioPipeline(blocksize=blocksize, tap=ble_tap, denoiser="spectral")
+    pipeline.set_mode("escuela")
+    if not gated:
+        pipeline.vad.policies = dict.fromkeys(STAGE_POLICIES, 1)
+    modes = []
+    cascade = EnvironmentCascade(modes.append, classifier=StandInClassifier(), dwell=5.0,
+                                 vad=lambda: pipeline.vad)
+    pipeline.set_input_tap(cascade.tap)
+    pipeline.vad.reset_stats()
+    outdata = np.empty((blocksize, audio.shape[1]), dtype=np.float32)
+    for k in range(sent.shape[0]):
+        current[0] = k
+        pipeline.callback(audio[k * blocksize:(k + 1) * blocksize], outdata, blocksize, None, None)
+        if k % 5 == 4:
+            cascade.poll((k + 1) * blocksize / sample_rate)
+    # Voz audible: el bloque de voz limpia supera en 6 dB al ruido de sala
+    clean = speech[:sent.shape[0] * blocksize].reshape(-1, blocksize)
+    talking = np.sqrt(np.mean(clean * clean, axis=1)) > 0.01
+    # El primer bloque de una frase puede llegar antes de que el VAD la detecte
+    onset = talking & ~np.concatenate([[False], talking[:-1]])
+    missed = talking & ~sent
+    return pipeline.vad, int(np.count_nonzero(missed & ~onset)), int(np.count_nonzero(missed & onset)), modes
+
+
+def benchmark(seconds=120, seed=0, blocksize=960):
+    """
+    Simula una clase (ráfagas de voz separadas por silencios largos) dos
+    veces: con el planificador y con todas las etapas siempre encendidas.
+    Se mide el tiempo real de cada etapa (monitor BLE y clasificador de
+    ambiente) en las dos corridas.
+
+    Returns:
+        dict con estadísticas y 'ok' (las etapas salteadas cuestan menos
+        medidas, ningún bloque con voz sin monitor salvo el primero de una
+        frase, y la cascada elige los mismos modos)
+    """
+    audio, speech = _class_audio(seconds, seed)
+    sched, missed, missed_onsets, modes = _run_class(audio, speech, blocksize, gated=True)
+    always, _, _, always_modes = _run_class(audio, speech, blocksize, gated=False)
+
+    gated_s = sum(sched.stage_time.values())
+    always_s = sum(always.stage_time.values())
+    # Las etapas que se saltearon tienen que haber costado menos de verdad
+    cheaper = all(sched.stage_time[name] < always.stage_time[name]
+                  for name in STAGE_POLICIES if sched.stage_skips[name])
+    stats = sched.get_stats()
+    return {
+        "speech_ratio": stats["speech_ratio"],
+        "mean_vad": stats["mean_vad"],
+        "segments": stats["segments"],
+        "longest_quiet_s": stats["longest_quiet_s"],
+        "stage_runs": {name: sched.stage_runs[name] for name in STAGE_POLICIES},
+        "stage_skips": {name: sched.stage_skips[name] for name in STAGE_POLICIES},
+        "stage_saved_ms": {name: round(1e3 * (always.stage_time[name] - sched.stage_time[name]), 1)
+                           for name in STAGE_POLICIES},
+        "baseline_cpu_pct": 100.0 * always_s / seconds,
+        "gated_cpu_pct": 100.0 * gated_s / seconds,
+        "cpu_saved_pct": 100.0 * (always_s - gated_s) / seconds,
+        "missed_speech_blocks": missed,
+        "missed_onset_blocks": missed_onsets,
+        "modes": " -> ".join(modes) or "-",
+        "ok": cheaper and missed == 0 and modes == always_modes,
+    }
+
+
+def main():
+    print("=" * 60)
+    print("TEARIS - Planificador VAD (clase simulada)")
+    print("=" * 60)
+    r = benchmark()
+    print(f"Voz: {r['speech_ratio'] * 100:.1f}% | VAD medio {r['mean_vad']:.2f} | "
+          f"segmentos {r['segments']} | silencio más largo {r['longest_quiet_s']:.1f} s")
+    print(f"Etapas corridas {r['stage_runs']} | salteadas {r['stage_skips']}")
+    print(f"CPU medida de etapas: {r['baseline_cpu_pct']:.3f}% → {r['gated_cpu_pct']:.3f}% "
+          f"(ahorro {r['cpu_saved_pct']:.3f}%) | modos {r['modes']}")
+    print(f"{'✅' if r['ok'] else '❌'} Bloques con voz sin monitor: {r['missed_speech_blocks']} "
+          f"(+{r['missed_onset_blocks']} al arrancar una frase)")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -10,6 +10,9 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Frecuencias de las 5 bandas del EQ (shelving bajo, 3 picos, shelving alto)
+EQ_BAND_FREQS = (105.0, 300.0, 850.0, 2400.0, 6900.0)
+
 
 class WM8960Controller:
     """
@@ -65,6 +65,9 @@ class RNNoiseProcessor:
         # Crear estados RNNoise (uno por canal)
         self.states = [self.lib.rnnoise_create(None) for _ in range(CHANNELS)]
         
+        # Probabilidad de voz del último frame, por canal
+        self.vad_probs = np.zeros(CHANNELS, dtype=np.float32)
+        
         logger.info(f"✓ RNNoise inicializado con {CHANNELS} canales")
         logger.info(f"  Frame size: {FRAME_SIZE} samples (10ms)")
         
@@ -117,8 +120,8 @@ class RNNoiseProcessor:
                 # Crear buffer de salida
                 output_buffer = np.zeros(FRAME_SIZE, dtype=np.float32)
                 
-                # Llamar a RNNoise
-                vad_prob = self.lib.rnnoise_process_frame(
+                # Llamar a RNNoise (devuelve la probabilidad de voz)
+                self.vad_probs[ch] = self.lib.rnnoise_process_frame(
                     self.states[ch],
                     output_buffer.ctypes.data_as(POINTER(c_float)),
                     channel_data.ctypes.data_as(POINTER(c_float))
@@ -172,6 +175,8 @@ def processing_thread(processor):
     import time
     frame_count = 0
     total_time = 0
+    vad_sum = 0.0
+    speech_frames = 0
     last_report = time.time()
     
     while True:
@@ -186,6 +191,9 @@ def processing_thread(processor):
             
             frame_count += 1
             total_time += process_time
+            vad = float(processor.vad_probs.max())
+            vad_sum += vad
+            speech_frames += vad >= 0.5
             
             # Reportar cada 10 segundos
             if time.time() - last_report > 10.0:
@@ -195,11 +203,14 @@ def processing_thread(processor):
                 logger.info(
                     f"⚡ Latencia: {avg_time:.2f}ms | "
                     f"CPU: ~{cpu_usage:.1f}% | "
+                    f"VAD: {vad_sum / frame_count:.2f} (voz {100.0 * speech_frames / frame_count:.0f}%) | "
                     f"Queue: {audio_queue.qsize()}/{processed_queue.qsize()}"
                 )
                 
                 frame_count = 0
                 total_time = 0
+                vad_sum = 0.0
+                speech_frames = 0
                 last_report = time.time()
             
         except queue.Empty: